@@ -4,12 +4,147 @@ Simple Weight-Based Gate Assignment Algorithm
 Mimics the C# algorithm logic:
 1. Check piece weight against recipe bounds on each gate
 2. Find all eligible gates (where weight falls within min/max bounds)
-3. Randomly select one eligible gate
+3. Randomly select one eligible gate, in proportion to the gates' shares
 4. If no eligible gates, send to reject gate (gate 0)
+
+Gate bounds are compiled into an interval index when assignments change, so
+finding the eligible gates is a single bisect returning a precomputed tuple.
+assign_pieces() routes a whole NumPy weight array with searchsorted over the
+same index (NumPy is optional; the simulator only needs the scalar path).
+
+Weighted selection: an assignment may carry a 'share' (default 1) to bias
+overlapping gates, e.g. shares 2/1/1 on gates 3/4/5 send 50/25/25 % of the
+pieces all three accept. Every weight segment of the index carries a Walker
+alias table over its gates' shares, so a pick is one random draw and one
+comparison whatever the number of gates. Draws come from the instance's own
+seeded random.Random (and NumPy Generator), so runs are reproducible.
+
+Gate availability: gates can be drained (finishing a batch during a
+transition), disabled (paused) or full at runtime without recompiling. Each
+reason is a bitmask over gate numbers; their union is folded into one
+availability mask, and every weight segment has a precomputed eligibility
+mask, so a decision intersects the two with one integer AND. Segments with
+some gates blocked pick from an alias table for the remaining gates, built
+on first use and cached per snapshot.
+
+Recipe changes are hot-swappable: update_assignments() compiles a new
+immutable AssignmentSnapshot (assignments, index, NumPy tables, generation)
+and publishes it with one reference assignment. A decision reads the snapshot
+reference once, so an assign loop running in another thread sees either the
+old or the new program - never a mix - without taking a lock.
 """
 
 import random
-from typing import Dict, List, Optional
+import threading
+from itertools import count
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # scalar path only
+    np = None
+
+from interval_index import IntervalIndex
+
+_generations = count(1)
+
+GATE_BLOCK_REASONS = ('draining', 'disabled', 'full')
+_ALL_GATES = -1  # every bit set: all gates available
+
+
+def alias_table(weights: List[float]) -> Tuple[Tuple[float, ...], Tuple[int, ...]]:
+    """
+    Walker / Vose alias table for sampling index i with probability
+    weights[i] / sum(weights). Sample: u = random() * n, i = int(u);
+    pick i if u - i < prob[i], else alias[i]. Non-positive weights are never
+    picked; if every weight is non-positive the table is uniform.
+    """
+    n = len(weights)
+    weights = [max(0.0, float(w)) for w in weights]
+    total = sum(weights)
+    prob = [1.0] * n
+    alias = list(range(n))
+    if total <= 0:
+        return tuple(prob), tuple(alias)
+
+    scaled = [w * n / total for w in weights]
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] += scaled[s] - 1.0
+        (small if scaled[l] < 1.0 else large).append(l)
+    # Whatever is left is 1.0 up to rounding: keep prob 1.0 / alias to itself
+    return tuple(prob), tuple(alias)
+
+
+class AssignmentSnapshot:
+    """
+    One compiled program: never mutated after construction, replaced whole.
+    
+    Attributes:
+        generation: Increases with every published snapshot (0 = nothing assigned yet)
+        assignments: Read-only gate -> recipe info mapping
+        gate_index: IntervalIndex of piece weight -> eligible gates (assignment order)
+        alias_tables: Per gate_index segment, (gates, prob, alias) for weighted picks;
+            prob is None when the segment's shares are equal (plain uniform pick)
+        segment_masks: Per gate_index segment, eligible gates as a bitmask (bit g = gate g)
+        segment_arrays: (breaks, gates, counts, prob, alias) NumPy tables for
+            assign_pieces(), or None without NumPy
+    """
+    
+    __slots__ = ('generation', 'assignments', 'gate_index', 'alias_tables', 'segment_masks', 'segment_arrays')
+    
+    def __init__(self, generation: int, assignments: Dict[int, Dict]):
+        assignments = MappingProxyType({gate: MappingProxyType(dict(recipe)) for gate, recipe in assignments.items()})
+        gate_index = IntervalIndex({
+            gate: (recipe['piece_min'], recipe['piece_max'])
+            for gate, recipe in assignments.items()
+        })
+        object.__setattr__(self, 'generation', generation)
+        object.__setattr__(self, 'assignments', assignments)
+        object.__setattr__(self, 'gate_index', gate_index)
+        object.__setattr__(self, 'alias_tables', tuple(
+            self._alias_entry(segment, assignments) for segment in gate_index.segments))
+        object.__setattr__(self, 'segment_masks', tuple(
+            sum(1 << gate for gate in segment) for segment in gate_index.segments))
+        object.__setattr__(self, 'segment_arrays', self._segment_tables(self.alias_tables) if np is not None else None)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    
+    @staticmethod
+    def _alias_entry(segment: Tuple, assignments: Mapping[int, Mapping]) -> Tuple:
+        shares = [assignments[gate]['share'] for gate in segment]
+        if len(set(shares)) <= 1:
+            return segment, None, None
+        prob, alias = alias_table(shares)
+        return segment, prob, alias
+    
+    def _segment_tables(self, alias_tables: Tuple) -> Tuple:
+        """
+        (breaks, gates, counts, prob, alias) for vectorised lookup. Row 0 is the
+        empty segment below the first breakpoint; row i + 1 is
+        gate_index.segments[i], padded to the widest segment (gate 0, prob 1).
+        """
+        rows = [((), None, None)] + list(alias_tables)
+        width = max(1, max(len(seg) for seg, _, _ in rows))
+        gates = np.zeros((len(rows), width), dtype=np.int64)
+        prob = np.ones((len(rows), width), dtype=np.float64)
+        alias = np.tile(np.arange(width, dtype=np.int64), (len(rows), 1))
+        for i, (seg, seg_prob, seg_alias) in enumerate(rows):
+            gates[i, :len(seg)] = seg
+            if seg_prob is not None:
+                prob[i, :len(seg)] = seg_prob
+                alias[i, :len(seg)] = seg_alias
+        counts = np.array([len(seg) for seg, _, _ in rows], dtype=np.int64)
+        breaks = np.asarray(self.gate_index.breaks, dtype=np.float64)
+        for table in (breaks, gates, counts, prob, alias):
+            table.flags.writeable = False
+        return breaks, gates, counts, prob, alias
 
 
 class AssignmentAlgorithm:
@@ -19,11 +154,111 @@ class AssignmentAlgorithm:
     Assigns pieces to gates based on:
     - Piece weight
     - Recipe weight bounds (piece_min, piece_max) on each gate
-    - Random selection among eligible gates
+    - Random selection among eligible gates, weighted by each gate's share
+    
+    Args:
+        seed: Seed for the instance's random streams (None = unpredictable)
     """
     
-    def __init__(self):
-        self.current_assignments = {}  # gate -> recipe info
+    def __init__(self, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed) if np is not None else None
+        self._snapshot = self._compile(0, {})
+        self._publish_lock = threading.Lock()  # serialises writers only; readers never lock
+        self._blocked = {reason: 0 for reason in GATE_BLOCK_REASONS}  # reason -> gate bitmask
+        self._available = _ALL_GATES
+        self._masked_cache = (self._snapshot, {})  # alias tables for partly blocked segments
+    
+    @property
+    def snapshot(self) -> AssignmentSnapshot:
+        """The currently published snapshot"""
+        return self._snapshot
+    
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+    
+    @property
+    def current_assignments(self) -> Mapping[int, Mapping]:
+        """gate -> recipe info (read-only)"""
+        return self._snapshot.assignments
+    
+    @property
+    def gate_index(self) -> IntervalIndex:
+        """piece weight -> eligible gates (assignment order)"""
+        return self._snapshot.gate_index
+    
+    @property
+    def available_mask(self) -> int:
+        """Bitmask of gates currently allowed to take pieces (bit g = gate g)"""
+        return self._available
+    
+    def is_gate_available(self, gate: int) -> bool:
+        return bool(self._available >> gate & 1)
+    
+    def blocked_gates(self) -> Dict[str, List[int]]:
+        """reason -> blocked gate numbers, for display/logging"""
+        return {
+            reason: [gate for gate in range(mask.bit_length()) if mask >> gate & 1]
+            for reason, mask in self._blocked.items()
+        }
+    
+    def set_gate_blocked(self, reason: str, gate: int, blocked: bool = True):
+        """Block / unblock one gate for a reason ('draining', 'disabled' or 'full')"""
+        with self._publish_lock:
+            mask = self._blocked[reason]
+            self._blocked[reason] = mask | (1 << gate) if blocked else mask & ~(1 << gate)
+            self._refresh_available()
+    
+    def set_blocked_gates(self, reason: str, gates) -> None:
+        """Replace the set of gates blocked for a reason (e.g. the paused gates from machine state)"""
+        with self._publish_lock:
+            self._blocked[reason] = sum(1 << int(gate) for gate in set(gates))
+            self._refresh_available()
+    
+    def drain_gate(self, gate: int, draining: bool = True):
+        self.set_gate_blocked('draining', gate, draining)
+    
+    def disable_gate(self, gate: int, disabled: bool = True):
+        self.set_gate_blocked('disabled', gate, disabled)
+    
+    def set_gate_full(self, gate: int, full: bool = True):
+        self.set_gate_blocked('full', gate, full)
+    
+    def _refresh_available(self):
+        blocked = 0
+        for mask in self._blocked.values():
+            blocked |= mask
+        self._available = ~blocked  # single int store: readers see the old or the new mask
+    
+    def _masked_table(self, snapshot: AssignmentSnapshot, segment: int, live: int) -> Tuple:
+        """(gates, prob, alias) for a segment restricted to the gates in `live`"""
+        cache = self._masked_cache
+        if cache[0] is not snapshot:
+            cache = self._masked_cache = (snapshot, {})
+        entry = cache[1].get((segment, live))
+        if entry is None:
+            gates = tuple(gate for gate in snapshot.alias_tables[segment][0] if live >> gate & 1)
+            entry = cache[1][(segment, live)] = snapshot._alias_entry(gates, snapshot.assignments)
+        return entry
+    
+    def _masked_segment_arrays(self, snapshot: AssignmentSnapshot, available: int) -> Tuple:
+        """snapshot.segment_arrays with the blocked gates taken out"""
+        cache = self._masked_cache
+        if cache[0] is not snapshot:
+            cache = self._masked_cache = (snapshot, {})
+        arrays = cache[1].get(('arrays', available))
+        if arrays is None:
+            tables = [
+                entry if (mask & available) == mask else self._masked_table(snapshot, segment, mask & available)
+                for segment, (entry, mask) in enumerate(zip(snapshot.alias_tables, snapshot.segment_masks))
+            ]
+            arrays = cache[1][('arrays', available)] = snapshot._segment_tables(tables)
+        return arrays
+    
+    def _compile(self, generation: int, assignments: Dict[int, Dict]) -> AssignmentSnapshot:
+        """Build the snapshot for a program (subclasses extend it with their own tables)"""
+        return AssignmentSnapshot(generation, assignments)
         
     def update_assignments(self, assignments: List[Dict]):
         """
@@ -39,29 +274,42 @@ class AssignmentAlgorithm:
                 - batch_max (float): Max batch weight in grams
                 - batch_count_type (str): 'exact', 'min', or None
                 - batch_count_value (int): Target count or None
+                - share (float, optional): Relative share of the pieces this gate
+                  takes among the gates eligible with it (default 1)
+        
+        Returns:
+            generation of the published snapshot
         """
-        self.current_assignments = {}
+        compiled = {}
         
         for assign in assignments:
             gate = int(assign['gate'])
-            self.current_assignments[gate] = {
+            compiled[gate] = {
                 'recipe_name': assign['recipe_name'],
                 'piece_min': float(assign.get('piece_min', 0)),
                 'piece_max': float(assign.get('piece_max', 999999)),
                 'batch_min': float(assign.get('batch_min', 0)),
                 'batch_max': float(assign.get('batch_max', 999999)),
                 'batch_count_type': assign.get('batch_count_type'),
-                'batch_count_value': assign.get('batch_count_value')
+                'batch_count_value': assign.get('batch_count_value'),
+                'share': float(assign.get('share', 1.0))
             }
+        
+        # Writers are serialised so generations publish in order; readers never wait -
+        # publishing is the single reference assignment below
+        with self._publish_lock:
+            snapshot = self._compile(next(_generations), compiled)
+            self._snapshot = snapshot
+        return snapshot.generation
     
     def assign_piece(self, weight_g: float) -> int:
         """
         Assign a piece to a gate based on its weight.
         
         Algorithm:
-        1. Check weight against each gate's recipe bounds
-        2. Collect all eligible gates (weight within piece_min and piece_max)
-        3. Randomly select one eligible gate
+        1. Look up the gates whose recipe bounds hold the weight (piece_min <= w <= piece_max)
+        2. Drop gates that are draining, disabled or full (one mask AND)
+        3. Randomly select one eligible gate (alias table when shares differ)
         4. If no eligible gates, return 0 (reject gate)
         
         Args:
@@ -70,23 +318,87 @@ class AssignmentAlgorithm:
         Returns:
             gate: Gate number (0 = reject, 1-8 = production gates)
         """
-        eligible_gates = []
+        return self._pick(self._snapshot, weight_g)
+    
+    def assign_piece_tagged(self, weight_g: float) -> Tuple[int, int]:
+        """
+        assign_piece() plus the generation of the snapshot the decision used.
         
-        # Check each gate's recipe bounds
-        for gate, recipe in self.current_assignments.items():
-            piece_min = recipe['piece_min']
-            piece_max = recipe['piece_max']
-            
-            # Check if weight falls within this recipe's piece bounds
-            if piece_min <= weight_g <= piece_max:
-                eligible_gates.append(gate)
+        Returns:
+            (gate, generation)
+        """
+        snapshot = self._snapshot  # one read: the whole decision uses this program
+        return self._pick(snapshot, weight_g), snapshot.generation
+    
+    def _pick(self, snapshot: AssignmentSnapshot, weight_g: float) -> int:
+        # Precomputed gates / alias table for the weight segment (same order as the assignments)
+        segment = snapshot.gate_index.locate(weight_g)
+        if segment < 0:
+            return 0
+        eligible_gates, prob, alias = snapshot.alias_tables[segment]
+        
+        # Restrict to available gates; usually nothing is blocked and the table stands
+        mask = snapshot.segment_masks[segment]
+        live = mask & self._available
+        if live != mask:
+            eligible_gates, prob, alias = self._masked_table(snapshot, segment, live)
         
         # If no eligible gates, send to reject (gate 0)
         if not eligible_gates:
             return 0
         
-        # Randomly select one eligible gate
-        return random.choice(eligible_gates)
+        # One draw: column i, then keep it or take its alias
+        u = self.rng.random() * len(eligible_gates)
+        i = int(u)
+        if prob is None or u - i < prob[i]:
+            return eligible_gates[i]
+        return eligible_gates[alias[i]]
+    
+    def assign_pieces(self, weights, rng=None):
+        """
+        Assign an array of pieces at once (vectorised assign_piece).
+        
+        Each piece goes to a random available gate among those whose bounds
+        hold its weight (weighted by share), or 0 if none - the same distribution as
+        assign_piece, drawn from a NumPy Generator instead of random.Random.
+        
+        Args:
+            weights: Piece weights in grams (array-like of floats)
+            rng: numpy.random.Generator (default: the instance's seeded np_rng)
+            
+        Returns:
+            np.ndarray of int64 gate numbers
+        """
+        return self.assign_pieces_tagged(weights, rng)[0]
+    
+    def assign_pieces_tagged(self, weights, rng=None) -> Tuple:
+        """
+        assign_pieces() plus the generation of the one snapshot every piece
+        in the call was routed with.
+        
+        Returns:
+            (np.ndarray of int64 gate numbers, generation)
+        """
+        if np is None:
+            raise ImportError("assign_pieces needs numpy (pip install numpy)")
+        if rng is None:
+            rng = self.np_rng
+        
+        weights = np.asarray(weights, dtype=np.float64)
+        snapshot = self._snapshot
+        available = self._available
+        if available == _ALL_GATES:
+            breaks, gates, counts, prob, alias = snapshot.segment_arrays
+        else:
+            breaks, gates, counts, prob, alias = self._masked_segment_arrays(snapshot, available)
+        
+        # Segment row per piece (0 = below every bound; NaN lands past the last break, also empty)
+        rows = np.searchsorted(breaks, weights, side='right')
+        n_eligible = counts[rows]
+        u = rng.random(weights.shape) * n_eligible
+        picks = u.astype(np.int64)
+        picks = np.where(u - picks < prob[rows, picks], picks, alias[rows, picks])
+        return np.where(n_eligible > 0, gates[rows, picks], 0), snapshot.generation
     
     def get_current_recipes(self) -> Dict[int, str]:
         """
@@ -108,7 +420,7 @@ class AssignmentAlgorithm:
             gate: Gate number
             
         Returns:
-            Recipe info dict or None if gate not assigned
+            Recipe info (read-only mapping) or None if gate not assigned
         """
         return self.current_assignments.get(gate)
 
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Assignment Service (Unix socket)
+
+Serves AssignmentAlgorithm decisions over a persistent local socket, as a
+stand-in for the C# AlgorithmService in integration tests:
+1. Unix domain stream socket, one thread per connection
+2. Length-prefixed binary frames: u32 payload length, then u8 type + u32 request id + body
+3. Requests are pipelined: a client may send any number before reading; every
+   complete frame in the receive buffer is handled and the replies go out in
+   one send, in request order
+4. Batch frames route a whole array of weights in one request
+
+Frames (little-endian; reply type = request type | 0x80):
+    ASSIGN        1   f64 weight_g              -> i32 gate, u64 generation
+    ASSIGN_BATCH  2   u32 n, n x f64 weight_g   -> u64 generation, u32 n, n x i32 gate
+    UPDATE        3   UTF-8 JSON list of assignment dicts (as update_assignments)
+                                                -> u64 generation
+    BLOCK         4   UTF-8 JSON {"reason": "draining|disabled|full", "gates": [...]}
+                                                -> u64 available mask (low 64 bits)
+    PING          5   (empty)                   -> u64 generation
+    ERROR      0xFF   (reply only) UTF-8 message
+
+Decisions read the published assignment snapshot without locking, so UPDATE /
+BLOCK can arrive on any connection while others are assigning. With
+--policy batch-aware (stateful), decisions are serialised.
+
+Configuration (env):
+    ASSIGNMENT_SOCKET - socket path (default /tmp/batcher_assignment.sock)
+
+Usage:
+    python assignment_service.py [--socket PATH] [--assignments file.json] [--policy uniform|batch-aware]
+
+    from assignment_service import AssignmentClient
+
+    client = AssignmentClient()
+    client.update_assignments(assignments)
+    gate = client.assign_piece(weight_g)
+    gates = client.assign_pieces(weights)       # one batch frame
+    gates = client.assign_pipelined(weights)    # one frame per piece, pipelined
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from assignment_algorithm import AssignmentAlgorithm, GATE_BLOCK_REASONS, np
+from batch_selector import BatchAwareSelector
+from logger import get_logger
+
+log = get_logger('worker')
+
+ASSIGNMENT_SOCKET = os.getenv("ASSIGNMENT_SOCKET", "/tmp/batcher_assignment.sock")
+
+MSG_ASSIGN = 1
+MSG_ASSIGN_BATCH = 2
+MSG_UPDATE = 3
+MSG_BLOCK = 4
+MSG_PING = 5
+MSG_ERROR = 0xFF
+REPLY = 0x80
+
+MAX_FRAME = 16 * 1024 * 1024
+RECV_SIZE = 256 * 1024
+
+_LEN = struct.Struct('<I')
+_HEAD = struct.Struct('<BI')                 # type, request id
+_ASSIGN_REQ = struct.Struct('<BId')
+_ASSIGN_REPLY = struct.Struct('<IBIiQ')      # length + head + gate + generation
+_BATCH_REQ = struct.Struct('<BII')
+_BATCH_REPLY = struct.Struct('<IBIQI')       # length + head + generation + n
+_GEN_REPLY = struct.Struct('<IBIQ')          # length + head + u64
+
+_ASSIGN_REPLY_LEN = _ASSIGN_REPLY.size - 4
+_GEN_REPLY_LEN = _GEN_REPLY.size - 4
+
+
+def frame(msg_type: int, request_id: int, body: bytes = b'') -> bytes:
+    return _LEN.pack(_HEAD.size + len(body)) + _HEAD.pack(msg_type, request_id) + body
+
+
+class ServiceError(Exception):
+    """An ERROR reply from the service"""
+
+
+# =====================================================================
+# Server
+# =====================================================================
+
+class AssignmentService:
+    """Decodes request frames, runs them against the algorithm, encodes replies"""
+
+    def __init__(self, algorithm: AssignmentAlgorithm):
+        self.algorithm = algorithm
+        # Batch-aware decisions mutate open-batch state: one decision at a time
+        self._decide_lock = threading.Lock() if isinstance(algorithm, BatchAwareSelector) else None
+        self.decisions = 0
+        self.frames = 0
+
+    def handle(self, msg_type: int, request_id: int, payload, out: bytearray):
+        """Append the reply for one request frame (payload includes the head) to out"""
+        self.frames += 1
+        algo = self.algorithm
+        try:
+            if msg_type == MSG_ASSIGN:
+                weight_g = _ASSIGN_REQ.unpack_from(payload)[2]
+                if self._decide_lock is None:
+                    gate, generation = algo.assign_piece_tagged(weight_g)
+                else:
+                    with self._decide_lock:
+                        generation = algo.generation
+                        gate = algo.assign_piece(weight_g)
+                out += _ASSIGN_REPLY.pack(_ASSIGN_REPLY_LEN, MSG_ASSIGN | REPLY, request_id, gate, generation)
+                self.decisions += 1
+
+            elif msg_type == MSG_ASSIGN_BATCH:
+                n = _BATCH_REQ.unpack_from(payload)[2]
+                if len(payload) != _BATCH_REQ.size + 8 * n:
+                    raise ValueError(f"batch of {n} weights needs {_BATCH_REQ.size + 8 * n} bytes, got {len(payload)}")
+                gates, generation = self._assign_batch(payload, n)
+                out += _BATCH_REPLY.pack(_BATCH_REPLY.size - 4 + 4 * n, MSG_ASSIGN_BATCH | REPLY,
+                                         request_id, generation, n)
+                out += gates
+                self.decisions += n
+
+            elif msg_type == MSG_UPDATE:
+                assignments = json.loads(bytes(payload[_HEAD.size:]).decode('utf-8'))
+                generation = algo.update_assignments(assignments)
+                out += _GEN_REPLY.pack(_GEN_REPLY_LEN, MSG_UPDATE | REPLY, request_id, generation)
+                log.info(f"[Service] Assignments updated: {len(assignments)} gates, generation {generation}")
+
+            elif msg_type == MSG_BLOCK:
+                body = json.loads(bytes(payload[_HEAD.size:]).decode('utf-8'))
+                if body.get('reason') not in GATE_BLOCK_REASONS:
+                    raise ValueError(f"reason must be one of {GATE_BLOCK_REASONS}")
+                algo.set_blocked_gates(body['reason'], body.get('gates') or [])
+                out += _GEN_REPLY.pack(_GEN_REPLY_LEN, MSG_BLOCK | REPLY, request_id,
+                                       algo.available_mask & 0xFFFFFFFFFFFFFFFF)
+
+            elif msg_type == MSG_PING:
+                out += _GEN_REPLY.pack(_GEN_REPLY_LEN, MSG_PING | REPLY, request_id, algo.generation)
+
+            else:
+                raise ValueError(f"unknown frame type {msg_type}")
+
+        except Exception as e:
+            out += frame(MSG_ERROR, request_id, str(e).encode('utf-8'))
+
+    def _assign_batch(self, payload, n: int) -> Tuple[bytes, int]:
+        algo = self.algorithm
+        if self._decide_lock is None and np is not None:
+            weights = np.frombuffer(payload, dtype='<f8', count=n, offset=_BATCH_REQ.size)
+            gates, generation = algo.assign_pieces_tagged(weights)
+            return gates.astype('<i4').tobytes(), generation
+
+        weights = struct.unpack_from(f'<{n}d', payload, _BATCH_REQ.size)
+        gates = array('i')
+        if self._decide_lock is None:
+            snapshot = algo.snapshot  # whole batch from one program
+            generation = snapshot.generation
+            for w in weights:
+                gates.append(algo._pick(snapshot, w))
+        else:
+            with self._decide_lock:
+                generation = algo.generation
+                assign = algo.assign_piece
+                for w in weights:
+                    gates.append(assign(w))
+        if sys.byteorder != 'little':
+            gates.byteswap()
+        return gates.tobytes(), generation
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service: AssignmentService = self.server.service
+        sock = self.request
+        buf = bytearray()
+        out = bytearray()
+        while True:
+            try:
+                chunk = sock.recv(RECV_SIZE)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buf += chunk
+
+            # Every complete frame in the buffer, replies flushed together
+            offset = 0
+            available = len(buf)
+            while available - offset >= 4:
+                length = _LEN.unpack_from(buf, offset)[0]
+                if length < _HEAD.size or length > MAX_FRAME:
+                    log.warning(f"[Service] Bad frame length {length}, closing connection")
+                    return
+                end = offset + 4 + length
+                if end > available:
+                    break
+                msg_type, request_id = _HEAD.unpack_from(buf, offset + 4)
+                service.handle(msg_type, request_id, buf[offset + 4:end], out)
+                offset = end
+            if offset:
+                del buf[:offset]
+            if out:
+                try:
+                    sock.sendall(out)
+                except OSError:
+                    return
+                out.clear()
+
+
+class AssignmentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service: AssignmentService):
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        self.service = service
+        super().__init__(path, _ConnectionHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+# =====================================================================
+# Client
+# =====================================================================
+
+class AssignmentClient:
+    """
+    Blocking client with the AssignmentAlgorithm calls the simulator uses
+    (update_assignments / assign_piece), plus batch and pipelined routing.
+    Not thread-safe: one client per thread.
+    """
+
+    def __init__(self, path: str = ASSIGNMENT_SOCKET, timeout: Optional[float] = 5.0):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self._rfile = self.sock.makefile('rb', buffering=RECV_SIZE)
+        self._next_id = 0
+        self.generation = 0  # generation of the last decision / update
+
+    def close(self):
+        try:
+            self._rfile.close()
+        finally:
+            self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request_id(self) -> int:
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        return self._next_id
+
+    def _read_reply(self, request_id: int, expected_type: int) -> bytes:
+        head = self._rfile.read(4)
+        if len(head) < 4:
+            raise ConnectionError("assignment service closed the connection")
+        length = _LEN.unpack(head)[0]
+        payload = self._rfile.read(length)
+        if len(payload) < length:
+            raise ConnectionError("assignment service closed the connection")
+        msg_type, reply_id = _HEAD.unpack_from(payload)
+        if reply_id != request_id:
+            raise ConnectionError(f"reply {reply_id} out of order (expected {request_id})")
+        if msg_type == MSG_ERROR:
+            raise ServiceError(payload[_HEAD.size:].decode('utf-8', 'replace'))
+        if msg_type != expected_type | REPLY:
+            raise ConnectionError(f"unexpected reply type {msg_type:#x}")
+        return payload
+
+    def _call(self, msg_type: int, body: bytes = b'') -> bytes:
+        request_id = self._request_id()
+        self.sock.sendall(frame(msg_type, request_id, body))
+        return self._read_reply(request_id, msg_type)
+
+    def ping(self) -> int:
+        return struct.unpack_from('<Q', self._call(MSG_PING), _HEAD.size)[0]
+
+    def update_assignments(self, assignments: List[Dict]) -> int:
+        payload = self._call(MSG_UPDATE, json.dumps(assignments).encode('utf-8'))
+        self.generation = struct.unpack_from('<Q', payload, _HEAD.size)[0]
+        return self.generation
+
+    def set_blocked_gates(self, reason: str, gates: Sequence[int]) -> int:
+        """Returns the service's availability mask (low 64 bits)"""
+        payload = self._call(MSG_BLOCK, json.dumps({'reason': reason, 'gates': [int(g) for g in gates]}).encode('utf-8'))
+        return struct.unpack_from('<Q', payload, _HEAD.size)[0]
+
+    def assign_piece_tagged(self, weight_g: float) -> Tuple[int, int]:
+        payload = self._call(MSG_ASSIGN, struct.pack('<d', weight_g))
+        gate, self.generation = struct.unpack_from('<iQ', payload, _HEAD.size)
+        return gate, self.generation
+
+    def assign_piece(self, weight_g: float) -> int:
+        return self.assign_piece_tagged(weight_g)[0]
+
+    def assign_pieces(self, weights: Sequence[float]) -> List[int]:
+        """Route many pieces in one batch frame (all from one snapshot)"""
+        n = len(weights)
+        body = struct.pack('<I', n) + struct.pack(f'<{n}d', *weights)
+        payload = self._call(MSG_ASSIGN_BATCH, body)
+        self.generation, count = struct.unpack_from('<QI', payload, _HEAD.size)
+        return list(struct.unpack_from(f'<{count}i', payload, _HEAD.size + 12))
+
+    def assign_pipelined(self, weights: Sequence[float], window: int = 1024) -> List[int]:
+        """One ASSIGN frame per piece, up to `window` requests in flight"""
+        gates = []
+        pack = _ASSIGN_REQ.pack
+        prefix = _LEN.pack(_ASSIGN_REQ.size)
+        for start in range(0, len(weights), window):
+            part = weights[start:start + window]
+            first_id = self._next_id + 1
+            request = bytearray()
+            for w in part:
+                request += prefix
+                request += pack(MSG_ASSIGN, self._request_id(), w)
+            self.sock.sendall(request)
+            for i in range(len(part)):
+                payload = self._read_reply((first_id + i) & 0xFFFFFFFF, MSG_ASSIGN)
+                gate, self.generation = struct.unpack_from('<iQ', payload, _HEAD.size)
+                gates.append(gate)
+        return gates
+
+
+# =====================================================================
+# Entry point
+# =====================================================================
+
+def load_assignments(path: str) -> List[Dict]:
+    """A JSON list of assignment dicts, or {"assignments": [...]}"""
+    with open(path) as f:
+        data = json.load(f)
+    return data['assignments'] if isinstance(data, dict) else data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve gate assignment over a Unix socket")
+    parser.add_argument('--socket', default=ASSIGNMENT_SOCKET)
+    parser.add_argument('--assignments', default=None, help='JSON file with the initial assignments')
+    parser.add_argument('--policy', choices=('uniform', 'batch-aware'), default='uniform')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    algorithm = BatchAwareSelector(args.seed) if args.policy == 'batch-aware' else AssignmentAlgorithm(args.seed)
+    if args.assignments:
+        algorithm.update_assignments(load_assignments(args.assignments))
+
+    service = AssignmentService(algorithm)
+    server = AssignmentServer(args.socket, service)
+    log.section("Assignment Service")
+    log.item("Socket", args.socket)
+    log.item("Policy", args.policy)
+    log.item("Gates", len(algorithm.current_assignments))
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt  # SIGTERM: same clean shutdown as Ctrl+C
+
+    signal.signal(signal.SIGTERM, stop)
+
+    started = time.time()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        elapsed = max(time.time() - started, 1e-9)
+        log.info(f"[Service] Stopped: {service.decisions} decisions in {service.frames} frames "
+                 f"({service.decisions / elapsed:.0f}/s average)")
+
+
+if __name__ == "__main__":
+    main()
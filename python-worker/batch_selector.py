@@ -0,0 +1,246 @@
+"""
+Batch-Aware Gate Selection
+
+Stateful alternative to AssignmentAlgorithm's uniform pick. Every gate keeps
+an accumulator for the batch it is filling (weight, piece count), and each
+piece goes to the gate it helps most:
+1. Eligible gates come from the same interval index (piece_min <= w <= piece_max),
+   minus gates blocked in the availability mask (draining / disabled / full)
+2. Gates the piece would overshoot are skipped: batch weight above batch_max,
+   piece count above an 'exact' / 'max' count, or a batch left unable to close
+   without overshooting (even a piece_min piece would break batch_max / the count)
+3. A gate the piece completes wins, smallest giveaway first; otherwise the gate
+   closest to completion (highest fill fraction); ties keep assignment order
+4. No gate left -> reject gate 0
+5. A completed batch resets that gate's accumulator
+
+Completion follows the worker's M3 definitions: count recipes ('exact' / 'min')
+close on the piece count with giveaway over count x piece_min, weight recipes
+close at batch_min with giveaway over batch_min; a 'max' count only caps the
+batch. batch_min / batch_max <= 0 mean "no limit" (a recipe with no weight or
+count target closes every piece, giveaway 0).
+
+Per-gate limits are compiled into the published snapshot (flat tuples indexed
+by gate number) and the open batches live in flat lists owned by the deciding
+thread, so a decision is one bisect plus one pass over the eligible gates,
+without allocating. A recipe change published from another thread is adopted
+by the next decision: open batches carry over for gates whose recipe is
+unchanged and start empty otherwise.
+
+Usage:
+    from batch_selector import BatchAwareSelector
+
+    selector = BatchAwareSelector()
+    selector.update_assignments(assignments)   # same dicts as AssignmentAlgorithm
+    gate = selector.assign_piece(weight_g)
+    if selector.last_completed: ...            # gate whose batch this piece closed
+"""
+
+import math
+from typing import Dict, List
+
+from assignment_algorithm import AssignmentAlgorithm, AssignmentSnapshot
+
+_NO_LIMIT = math.inf
+
+
+class BatchSnapshot(AssignmentSnapshot):
+    """
+    AssignmentSnapshot plus per-gate batch limits, each a tuple indexed by gate:
+    (piece_min, batch_min, batch_max, count_min, count_max, target_g).
+    count_min is the piece count that closes a count batch (0 = weight recipe);
+    target_g is the giveaway reference weight.
+    """
+
+    __slots__ = ('limits',)
+
+    def __init__(self, generation: int, assignments: Dict[int, Dict]):
+        super().__init__(generation, assignments)
+        size = max(assignments, default=0) + 1
+        piece_min = [0.0] * size
+        batch_min = [0.0] * size
+        batch_max = [_NO_LIMIT] * size
+        count_min = [0] * size
+        count_max = [_NO_LIMIT] * size
+        target_g = [0.0] * size
+
+        for gate, recipe in assignments.items():
+            count_type = recipe['batch_count_type']
+            count_value = int(recipe['batch_count_value'] or 0)
+            piece_min[gate] = recipe['piece_min']
+            batch_min[gate] = max(recipe['batch_min'], 0.0)
+            batch_max[gate] = recipe['batch_max'] if recipe['batch_max'] > 0 else _NO_LIMIT
+            if count_value > 0 and count_type in ('exact', 'min'):
+                count_min[gate] = count_value
+                target_g[gate] = count_value * recipe['piece_min']
+            else:
+                target_g[gate] = batch_min[gate]
+            if count_value > 0 and count_type in ('exact', 'max'):
+                count_max[gate] = count_value
+
+        object.__setattr__(self, 'limits', tuple(tuple(column) for column in (
+            piece_min, batch_min, batch_max, count_min, count_max, target_g)))
+
+
+class BatchAwareSelector(AssignmentAlgorithm):
+    """
+    Batch-aware gate assignment: same inputs and assign_piece() contract as
+    AssignmentAlgorithm, but the choice depends on each gate's open batch.
+    Shares are not used (the choice is deterministic); assign_pieces()
+    (vectorised) stays the stateless share-weighted pick.
+
+    update_assignments() may be called from any thread; assign_piece(),
+    record_piece() and reset_batches() belong to one deciding thread.
+    """
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.last_completed = 0  # gate whose batch the last piece completed (0 = none)
+        # Open batch per gate
+        self.acc_weight: List[float] = []
+        self.acc_count: List[int] = []
+        # Completed batches per gate
+        self.batches: List[int] = []
+        self.batched_weight_g: List[float] = []
+        self.giveaway_g: List[float] = []
+        self.overshoots: List[int] = []      # only via record_piece()
+        self._acc_snapshot = None            # snapshot the accumulators follow
+        self._adopt(self._snapshot)
+
+    def _compile(self, generation: int, assignments: Dict[int, Dict]) -> BatchSnapshot:
+        return BatchSnapshot(generation, assignments)
+
+    def _adopt(self, snapshot: BatchSnapshot):
+        """Bring the accumulators onto a newly published snapshot (deciding thread)"""
+        size = len(snapshot.limits[0])
+        grow = size - len(self.acc_weight)
+        if grow > 0:
+            self.acc_weight.extend([0.0] * grow)
+            self.acc_count.extend([0] * grow)
+            self.batches.extend([0] * grow)
+            self.batched_weight_g.extend([0.0] * grow)
+            self.giveaway_g.extend([0.0] * grow)
+            self.overshoots.extend([0] * grow)
+
+        previous = self._acc_snapshot.assignments if self._acc_snapshot is not None else {}
+        for gate in set(previous) | set(snapshot.assignments):
+            if previous.get(gate) != snapshot.assignments.get(gate):
+                self.acc_weight[gate] = 0.0
+                self.acc_count[gate] = 0
+        self._acc_snapshot = snapshot
+
+    def reset_batches(self):
+        """Empty every open batch (e.g. after the line was cleared)"""
+        if self._snapshot is not self._acc_snapshot:
+            self._adopt(self._snapshot)
+        for gate in range(len(self.acc_weight)):
+            self.acc_weight[gate] = 0.0
+            self.acc_count[gate] = 0
+
+    def assign_piece(self, weight_g: float) -> int:
+        """
+        Assign a piece to the gate that best completes a batch.
+
+        Args:
+            weight_g: Piece weight in grams
+
+        Returns:
+            gate: Gate number (0 = reject, no eligible gate could take it)
+        """
+        snapshot = self._snapshot  # one read: the whole decision uses this program
+        if snapshot is not self._acc_snapshot:
+            self._adopt(snapshot)
+        piece_min, batch_min, batch_max, count_min, count_max, target_g = snapshot.limits
+        acc_weight = self.acc_weight
+        acc_count = self.acc_count
+
+        available = self._available
+
+        best = 0
+        best_score = -1.0
+        for gate in snapshot.gate_index.stab(weight_g):
+            if not available >> gate & 1:
+                continue  # draining / disabled / full
+            weight = acc_weight[gate] + weight_g
+            count = acc_count[gate] + 1
+            if weight > batch_max[gate] or count > count_max[gate]:
+                continue
+
+            need = count_min[gate]
+            if need:
+                done = count >= need
+                # Remaining pieces at piece_min must still fit under batch_max
+                if not done and weight + (need - count) * piece_min[gate] > batch_max[gate]:
+                    continue
+                fill = count / need
+            else:
+                done = weight >= batch_min[gate]
+                if not done and (weight + piece_min[gate] > batch_max[gate] or count >= count_max[gate]):
+                    continue
+                fill = weight / batch_min[gate] if not done else 1.0
+
+            # Completing scores in (1, 2] by giveaway, partial fills in [0, 1)
+            score = 1.0 + 1.0 / (1.0 + max(0.0, weight - target_g[gate])) if done else fill
+            if score > best_score:
+                best = gate
+                best_score = score
+
+        if best:
+            self._accumulate(snapshot, best, weight_g)
+        else:
+            self.last_completed = 0
+        return best
+
+    def record_piece(self, gate: int, weight_g: float):
+        """
+        Book a piece onto a gate chosen elsewhere (e.g. the uniform policy), with
+        the same completion rules; a batch pushed past batch_max or its count cap
+        is counted in overshoots and closed.
+        """
+        self.last_completed = 0
+        snapshot = self._snapshot
+        if snapshot is not self._acc_snapshot:
+            self._adopt(snapshot)
+        if gate <= 0 or gate not in snapshot.assignments:
+            return
+        _, _, batch_max, _, count_max, _ = snapshot.limits
+        weight = self.acc_weight[gate] + weight_g
+        count = self.acc_count[gate] + 1
+        if weight > batch_max[gate] or count > count_max[gate]:
+            self.overshoots[gate] += 1
+            self._close(snapshot, gate, weight)
+            return
+        self._accumulate(snapshot, gate, weight_g)
+
+    def _accumulate(self, snapshot: BatchSnapshot, gate: int, weight_g: float):
+        weight = self.acc_weight[gate] + weight_g
+        count = self.acc_count[gate] + 1
+        need = snapshot.limits[3][gate]
+        if (count >= need) if need else (weight >= snapshot.limits[1][gate]):
+            self._close(snapshot, gate, weight)
+        else:
+            self.acc_weight[gate] = weight
+            self.acc_count[gate] = count
+            self.last_completed = 0
+
+    def _close(self, snapshot: BatchSnapshot, gate: int, weight: float):
+        self.batches[gate] += 1
+        self.batched_weight_g[gate] += weight
+        self.giveaway_g[gate] += max(0.0, weight - snapshot.limits[5][gate])
+        self.acc_weight[gate] = 0.0
+        self.acc_count[gate] = 0
+        self.last_completed = gate
+
+    def get_batch_totals(self) -> Dict[int, Dict]:
+        """Completed-batch totals and open batch per assigned gate"""
+        return {
+            gate: {
+                'batches': self.batches[gate],
+                'batched_weight_g': self.batched_weight_g[gate],
+                'giveaway_g': self.giveaway_g[gate],
+                'overshoots': self.overshoots[gate],
+                'open_weight_g': self.acc_weight[gate],
+                'open_count': self.acc_count[gate],
+            }
+            for gate in self._acc_snapshot.assignments
+        }
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Assignment Algorithm Scaling Benchmark
+
+Generates recipe layouts over the real piece-weight range and measures every
+assignment path on the same weight stream:
+
+    scan        - reference linear scan over the assignments (the algorithm
+                  before the interval index: bounds check per gate + random.choice)
+    indexed     - AssignmentAlgorithm.assign_piece (interval index + alias table)
+    vectorized  - AssignmentAlgorithm.assign_pieces over --chunk pieces per call
+    batch-aware - BatchAwareSelector.assign_piece
+
+Layouts: --gates gates with evenly spaced piece bounds across the 1st-99th
+percentile of the stream, each --depth gates wide, so about `depth` gates are
+eligible for a typical piece (depth 1 = disjoint recipes).
+
+Weights: a recipe-minute from one_time_output/influx_m3_kpi_minute_recipes.csv
+is drawn in proportion to its pieces, and a piece around that minute's mean
+piece weight (sd = --spread x mean).
+
+Per layout and path:
+    decisions/s       - untimed tight loop
+    p50 / p99 ns      - per-decision timer (vectorized: chunk time / chunk size)
+    alloc B/decision  - tracemalloc peak above the starting point per decision
+                        (vectorized: per chunk / chunk size), over --alloc-sample
+
+--json writes the results; --baseline compares decisions/s and p99 with an
+earlier --json file and exits 1 when a path regresses past --tolerance.
+
+Usage:
+    python benchmarks/bench_assignment.py [--gates 8 16 32 64 128] [--depth 1 2 4 8]
+        [--pieces 100000] [--json out.json] [--baseline previous.json]
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assignment_algorithm import AssignmentAlgorithm, np
+from batch_selector import BatchAwareSelector
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'one_time_output')
+PATHS = ('scan', 'indexed', 'vectorized', 'batch-aware')
+
+
+# ---------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------
+
+def load_recipe_minutes(path: str):
+    """(mean piece weight, pieces) per recipe-minute with pieces"""
+    rows = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            pieces = float(row['pieces_processed'] or 0)
+            if pieces > 0:
+                rows.append((float(row['weight_processed_g']) / pieces, pieces))
+    return rows or [(200.0, 1.0)]
+
+
+def make_weights(n: int, recipe_minutes, spread: float, seed: int) -> List[float]:
+    rng = random.Random(seed)
+    means = [m for m, _ in recipe_minutes]
+    counts = [p for _, p in recipe_minutes]
+    weights = []
+    while len(weights) < n:
+        mean = rng.choices(means, counts)[0]
+        for _ in range(min(50, n - len(weights))):
+            weights.append(round(max(1.0, rng.gauss(mean, mean * spread)), 1))
+    return weights
+
+
+def make_layout(gates: int, depth: int, lo: float, hi: float) -> List[Dict]:
+    """`gates` recipes with bounds evenly spread over [lo, hi], each `depth` slots wide"""
+    step = (hi - lo) / gates
+    width = step * depth
+    layout = []
+    for i in range(gates):
+        center = lo + (i + 0.5) * step
+        layout.append({
+            'gate': i + 1,
+            'recipe_name': f"L{gates}_{depth}_{i + 1}",
+            'piece_min': round(center - width / 2, 1),
+            'piece_max': round(center + width / 2, 1),
+            'batch_min': 4875,
+            'batch_max': 9999,
+            'batch_count_type': None,
+            'batch_count_value': None,
+        })
+    return layout
+
+
+def scan_assigner(layout: List[Dict], seed: int) -> Callable[[float], int]:
+    bounds = [(a['gate'], float(a['piece_min']), float(a['piece_max'])) for a in layout]
+    rng = random.Random(seed)
+
+    def assign(weight_g: float) -> int:
+        eligible = [gate for gate, lo, hi in bounds if lo <= weight_g <= hi]
+        return rng.choice(eligible) if eligible else 0
+
+    return assign
+
+
+# ---------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def measure_scalar(assign: Callable[[float], int], weights: List[float], alloc_sample: int) -> Dict:
+    started = time.perf_counter()
+    for w in weights:
+        assign(w)
+    elapsed = time.perf_counter() - started
+
+    clock = time.perf_counter_ns
+    latencies = [0] * len(weights)
+    for i, w in enumerate(weights):
+        t0 = clock()
+        assign(w)
+        latencies[i] = clock() - t0
+    latencies.sort()
+
+    tracemalloc.start()
+    peak_total = 0
+    sample = weights[:alloc_sample]
+    for w in sample:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        assign(w)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {
+        'decisions_per_sec': len(weights) / elapsed if elapsed > 0 else 0.0,
+        'p50_ns': percentile(latencies, 0.50),
+        'p99_ns': percentile(latencies, 0.99),
+        'alloc_b_per_decision': peak_total / max(1, len(sample)),
+    }
+
+
+def measure_vectorized(algo: AssignmentAlgorithm, weights: List[float], chunk: int, alloc_sample: int) -> Dict:
+    array = np.asarray(weights, dtype=np.float64)
+    chunks = [array[i:i + chunk] for i in range(0, len(array), chunk)]
+    rng = np.random.default_rng(0)
+
+    started = time.perf_counter()
+    for part in chunks:
+        algo.assign_pieces(part, rng)
+    elapsed = time.perf_counter() - started
+
+    clock = time.perf_counter_ns
+    per_piece = []
+    for part in chunks:
+        t0 = clock()
+        algo.assign_pieces(part, rng)
+        per_piece.append((clock() - t0) / len(part))
+    per_piece.sort()
+
+    tracemalloc.start()
+    peak_total = 0
+    sampled = 0
+    for part in chunks:
+        if sampled >= alloc_sample:
+            break
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        algo.assign_pieces(part, rng)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+        sampled += len(part)
+    tracemalloc.stop()
+
+    return {
+        'decisions_per_sec': len(array) / elapsed if elapsed > 0 else 0.0,
+        'p50_ns': percentile(per_piece, 0.50),
+        'p99_ns': percentile(per_piece, 0.99),
+        'alloc_b_per_decision': peak_total / max(1, sampled),
+    }
+
+
+def run_layout(layout: List[Dict], weights: List[float], args) -> Dict[str, Dict]:
+    results = {}
+    for path in args.paths:
+        if path == 'scan':
+            results[path] = measure_scalar(scan_assigner(layout, args.seed), weights, args.alloc_sample)
+        elif path == 'indexed':
+            algo = AssignmentAlgorithm(seed=args.seed)
+            algo.update_assignments(layout)
+            results[path] = measure_scalar(algo.assign_piece, weights, args.alloc_sample)
+        elif path == 'vectorized':
+            if np is None:
+                continue
+            algo = AssignmentAlgorithm(seed=args.seed)
+            algo.update_assignments(layout)
+            results[path] = measure_vectorized(algo, weights, args.chunk, args.alloc_sample)
+        elif path == 'batch-aware':
+            selector = BatchAwareSelector()
+            selector.update_assignments(layout)
+            results[path] = measure_scalar(selector.assign_piece, weights, args.alloc_sample)
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Regressions vs an earlier run: decisions/s down or p99 up by more than tolerance"""
+    previous = {(r['gates'], r['depth'], r['path']): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get((r['gates'], r['depth'], r['path']))
+        if old is None:
+            continue
+        label = f"{r['path']} gates={r['gates']} depth={r['depth']}"
+        if r['decisions_per_sec'] < old['decisions_per_sec'] * (1.0 - tolerance):
+            regressions.append(f"{label}: decisions/s {old['decisions_per_sec']:,.0f} -> {r['decisions_per_sec']:,.0f}")
+        if r['p99_ns'] > old['p99_ns'] * (1.0 + tolerance):
+            regressions.append(f"{label}: p99 {old['p99_ns']:.0f} ns -> {r['p99_ns']:.0f} ns")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AssignmentAlgorithm scaling by gate count and overlap")
+    parser.add_argument('--gates', type=int, nargs='+', default=[8, 16, 32, 64, 128])
+    parser.add_argument('--depth', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='gates eligible for a typical piece')
+    parser.add_argument('--paths', nargs='+', default=list(PATHS), choices=PATHS)
+    parser.add_argument('--pieces', type=int, default=100_000)
+    parser.add_argument('--chunk', type=int, default=4096, help='pieces per assign_pieces call')
+    parser.add_argument('--alloc-sample', type=int, default=5_000, help='decisions traced for allocation')
+    parser.add_argument('--spread', type=float, default=0.15, help='piece weight sd as a fraction of the minute mean')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    parser.add_argument('--baseline', default=None, help='earlier --json file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown vs --baseline')
+    args = parser.parse_args()
+
+    recipe_minutes = load_recipe_minutes(os.path.join(OUTPUT_DIR, 'influx_m3_kpi_minute_recipes.csv'))
+    weights = make_weights(args.pieces, recipe_minutes, args.spread, args.seed)
+    ordered = sorted(weights)
+    lo, hi = percentile(ordered, 0.01), percentile(ordered, 0.99)
+    print(f"{len(weights)} pieces, weight p1 {lo:.1f} g / p50 {percentile(ordered, 0.5):.1f} g / p99 {hi:.1f} g")
+    print(f"{'gates':>5} {'depth':>5} {'path':<11} {'decisions/s':>12} {'p50 ns':>8} {'p99 ns':>8} {'alloc B':>8}")
+    print("-" * 64)
+
+    results = []
+    for gates in args.gates:
+        for depth in args.depth:
+            if depth > gates:
+                continue
+            layout = make_layout(gates, depth, lo, hi)
+            for path, r in run_layout(layout, weights, args).items():
+                results.append({'gates': gates, 'depth': depth, 'path': path, **r})
+                print(f"{gates:>5} {depth:>5} {path:<11} {r['decisions_per_sec']:>12,.0f} {r['p50_ns']:>8.0f} "
+                      f"{r['p99_ns']:>8.0f} {r['alloc_b_per_decision']:>8.1f}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        print("-" * 64)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'config': vars(args),
+                'python': sys.version.split()[0],
+                'numpy': np.__version__ if np is not None else None,
+                'weight_range_g': [lo, hi],
+                'results': results,
+            }, f, indent=2)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Batch-Aware Selector Benchmark
+
+Replays every program configuration in one_time_output/sqlite_assignments.csv
+through two policies and reports per-decision latency and batch outcome:
+
+    uniform     - AssignmentAlgorithm.assign_piece (random eligible gate); its
+                  picks are booked on a BatchAwareSelector with record_piece()
+                  so batches close by the same rules
+    batch-aware - BatchAwareSelector.assign_piece
+
+Piece weights are drawn around per-minute mean piece weights from
+one_time_output/influx_m3_kpi_minute_combined.csv. Latency is timed per
+decision (perf_counter_ns, timer overhead included); the target is
+p99 < --target-us.
+
+Usage:
+    python benchmarks/bench_batch_selector.py [--pieces 50000] [--spread 0.25] [--seed 42]
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assignment_algorithm import AssignmentAlgorithm
+from batch_selector import BatchAwareSelector
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'one_time_output')
+
+
+def parse_recipe(gate: int, recipe_name: str):
+    # R_pieceMin_pieceMax_batchMin_batchMax_countType_countVal
+    parts = recipe_name.split('_')
+    if parts[0] != 'R' or len(parts) < 7:
+        return None
+    return {
+        'gate': gate,
+        'recipe_name': recipe_name,
+        'piece_min': int(parts[1]),
+        'piece_max': int(parts[2]),
+        'batch_min': int(parts[3]),
+        'batch_max': int(parts[4]),
+        'batch_count_type': None if parts[5] == 'NA' else parts[5],
+        'batch_count_value': None if parts[6] in ('NA', '0', '') else int(parts[6]),
+    }
+
+
+def load_programs(path: str):
+    """program id -> assignment dicts (one per gate)"""
+    programs = OrderedDict()
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            gates = programs.setdefault(int(row['program']), {})
+            recipe = parse_recipe(int(row['gate']), row['recipe'])
+            if recipe is not None:
+                gates[recipe['gate']] = recipe
+    return OrderedDict((pid, list(gates.values())) for pid, gates in programs.items() if gates)
+
+
+def load_mean_weights(path: str):
+    means = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            pieces = float(row['pieces_processed'] or 0)
+            if pieces > 0:
+                means.append(float(row['weight_processed_g']) / pieces)
+    return means or [200.0]
+
+
+def make_weights(n: int, means, spread: float, seed: int):
+    rng = random.Random(seed)
+    weights = []
+    while len(weights) < n:
+        mean = rng.choice(means)
+        for _ in range(min(200, n - len(weights))):  # ~one minute of pieces per mean
+            weights.append(round(max(1.0, rng.gauss(mean, mean * spread)), 1))
+    return weights
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(policy: str, assignments, weights, seed: int):
+    book = BatchAwareSelector()
+    book.update_assignments(assignments)
+    if policy == 'uniform':
+        algo = AssignmentAlgorithm(seed=seed)
+        algo.update_assignments(assignments)
+        assign = algo.assign_piece
+    else:
+        assign = book.assign_piece
+
+    latencies = [0] * len(weights)
+    rejects = 0
+    clock = time.perf_counter_ns
+    for i, weight in enumerate(weights):
+        t0 = clock()
+        gate = assign(weight)
+        latencies[i] = clock() - t0
+        if policy == 'uniform':
+            book.record_piece(gate, weight)
+        if gate == 0:
+            rejects += 1
+
+    latencies.sort()
+    totals = book.get_batch_totals().values()
+    batches = sum(t['batches'] for t in totals)
+    batched = sum(t['batched_weight_g'] for t in totals)
+    giveaway = sum(t['giveaway_g'] for t in totals)
+    return {
+        'p50_us': percentile(latencies, 0.50) / 1000.0,
+        'p99_us': percentile(latencies, 0.99) / 1000.0,
+        'max_us': latencies[-1] / 1000.0 if latencies else 0.0,
+        'batches': batches,
+        'giveaway_pct': giveaway / (batched - giveaway) * 100.0 if batched > giveaway else 0.0,
+        'overshoots': sum(t['overshoots'] for t in totals),
+        'rejects': rejects,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch-aware vs uniform gate selection")
+    parser.add_argument('--pieces', type=int, default=50_000, help='pieces per program')
+    parser.add_argument('--spread', type=float, default=0.25, help='piece weight sd as a fraction of the minute mean')
+    parser.add_argument('--programs', type=int, default=0, help='limit the number of programs (0 = all)')
+    parser.add_argument('--target-us', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    programs = load_programs(os.path.join(OUTPUT_DIR, 'sqlite_assignments.csv'))
+    if args.programs:
+        programs = OrderedDict(list(programs.items())[:args.programs])
+    means = load_mean_weights(os.path.join(OUTPUT_DIR, 'influx_m3_kpi_minute_combined.csv'))
+    weights = make_weights(args.pieces, means, args.spread, args.seed)
+
+    print(f"{len(programs)} programs x {len(weights)} pieces")
+    print(f"{'program':>7} {'gates':>5} {'policy':<11} {'p50 us':>7} {'p99 us':>7} {'max us':>8} "
+          f"{'batches':>7} {'give %':>7} {'over':>6} {'rejects':>7}")
+    print("-" * 84)
+
+    worst_p99 = 0.0
+    sums = {'uniform': [0, 0.0], 'batch-aware': [0, 0.0]}
+    for program_id, assignments in programs.items():
+        for policy in ('uniform', 'batch-aware'):
+            r = run(policy, assignments, weights, args.seed)
+            sums[policy][0] += r['batches']
+            sums[policy][1] += r['giveaway_pct']
+            if policy == 'batch-aware':
+                worst_p99 = max(worst_p99, r['p99_us'])
+            print(f"{program_id:>7} {len(assignments):>5} {policy:<11} {r['p50_us']:>7.2f} {r['p99_us']:>7.2f} "
+                  f"{r['max_us']:>8.1f} {r['batches']:>7} {r['giveaway_pct']:>7.2f} {r['overshoots']:>6} "
+                  f"{r['rejects']:>7}")
+
+    print("-" * 84)
+    for policy, (batches, give_sum) in sums.items():
+        print(f"{policy:<11} batches {batches:>8}   mean giveaway {give_sum / max(1, len(programs)):.2f}%")
+    verdict = "OK" if worst_p99 < args.target_us else "OVER TARGET"
+    print(f"batch-aware worst p99 {worst_p99:.2f} us (target < {args.target_us:.0f} us): {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Machine-State / Outbound Benchmark (against the stand-in backend)
+
+Runs without the Node server or InfluxDB:
+
+    propagation  - time from a backend state change to the client seeing it,
+                   SSE push vs 200ms conditional polling, plus requests per change
+    transition   - worker-style loop (consume pushed state / fall back to polling,
+                   call transition-complete on 'transitioning'); latency measured
+                   by the backend from entering 'transitioning' to the call
+    outbound     - main-thread cost of gate resets through the dispatcher vs the
+                   previous synchronous requests.post, under injected latency
+
+Usage:
+    python benchmarks/bench_machine_state.py [--changes 50] [--latency-ms 20]
+        [--error-rate 0.0] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from stand_in_backend import StandInBackend, Faults, RECIPES_A, RECIPES_B, DEFAULT_PLC_SECRET
+from machine_client import MachineStateClient
+from outbound import OutboundDispatcher
+
+POLL_INTERVAL_SEC = 0.2  # live_worker STATE_POLL_INTERVAL_SEC
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {'n': 0}
+    s = sorted(samples)
+    pick = lambda q: s[min(len(s) - 1, int(q * len(s)))]
+    return {'n': len(s), 'p50_ms': pick(0.50) * 1000, 'p99_ms': pick(0.99) * 1000, 'max_ms': s[-1] * 1000}
+
+
+# ---------------------------------------------------------------------
+# Propagation
+# ---------------------------------------------------------------------
+
+def bench_propagation(faults: Faults, changes: int, stream: bool) -> Dict:
+    with StandInBackend(faults=faults) as backend:
+        client = MachineStateClient(backend.url)
+        seen: Dict[int, float] = {}
+        stop = threading.Event()
+
+        def observe(state):
+            marker = state.get('currentProgramId')
+            if marker is not None and marker not in seen:
+                seen[marker] = time.monotonic()
+
+        if stream:
+            client.subscribe(on_state=observe)
+            deadline = time.monotonic() + 5
+            while not client.stream_connected and time.monotonic() < deadline:
+                time.sleep(0.01)
+        else:
+            def poller():
+                while not stop.is_set():
+                    state = client.get_state()
+                    if state:
+                        observe(state)
+                    stop.wait(POLL_INTERVAL_SEC)
+            threading.Thread(target=poller, daemon=True).start()
+
+        start_requests = len(backend.requests)
+        latencies = []
+        for i in range(1, changes + 1):
+            version = backend.set_state(state='running', currentProgramId=i)
+            changed_at = backend.state_changed_at[version]
+            wait_until = time.monotonic() + 2.0
+            while i not in seen and time.monotonic() < wait_until:
+                time.sleep(0.001)
+            if i in seen:
+                latencies.append(seen[i] - changed_at)
+            time.sleep(0.05)
+
+        stop.set()
+        client.unsubscribe()
+        http_requests = len(backend.requests) - start_requests
+        not_modified = sum(1 for r in backend.requests[start_requests:] if r.status == 304)
+
+    result = percentiles(latencies)
+    result.update({'mode': 'stream' if stream else 'poll', 'missed': changes - len(latencies),
+                   'requests': http_requests, 'not_modified': not_modified})
+    return result
+
+
+# ---------------------------------------------------------------------
+# Transition
+# ---------------------------------------------------------------------
+
+def bench_transition(faults: Faults, transitions: int) -> Dict:
+    with StandInBackend(faults=faults) as backend:
+        dispatcher = OutboundDispatcher()
+        client = MachineStateClient(backend.url, outbound=dispatcher)
+        client.subscribe()
+        backend.set_state(state='running', currentProgramId=1,
+                          activeRecipes=RECIPES_A, programStartRecipes=RECIPES_A)
+
+        stop = threading.Event()
+        loops = [0]
+
+        def worker_loop():
+            # Mirrors LiveWorker.run(): pushed state first, polling while the stream is down
+            last_poll = 0.0
+            handled_version = None
+            while not stop.is_set():
+                state = client.consume_update() if client.stream_connected else None
+                if state is None and not client.stream_connected and time.time() - last_poll >= POLL_INTERVAL_SEC:
+                    state = client.get_state()
+                    last_poll = time.time()
+                if state and state['state'] == 'transitioning' and client.state_version != handled_version:
+                    handled_version = client.state_version
+                    action = 'recipe_change' if state.get('activeRecipes') else 'stop'
+                    client.notify_transition_complete(state.get('currentProgramId'), action)
+                loops[0] += 1
+                client.wait_for_update(0.05)
+
+        thread = threading.Thread(target=worker_loop, daemon=True)
+        thread.start()
+
+        for i in range(transitions):
+            recipes = RECIPES_B if i % 2 == 0 else RECIPES_A
+            backend.set_state(state='transitioning', activeRecipes=recipes, transitioningGates=[5, 6, 7, 8])
+            wait_until = time.monotonic() + 3.0
+            while len(backend.transition_latencies) <= i and time.monotonic() < wait_until:
+                time.sleep(0.001)
+            backend.set_state(state='running', currentProgramId=i + 2,
+                              activeRecipes=recipes, programStartRecipes=recipes, transitioningGates=[])
+            time.sleep(0.05)
+
+        stop.set()
+        thread.join(1)
+        client.unsubscribe()
+        dispatcher.close()
+        latencies = list(backend.transition_latencies)
+
+    result = percentiles(latencies)
+    result.update({'missed': transitions - len(latencies), 'loop_iterations': loops[0]})
+    return result
+
+
+# ---------------------------------------------------------------------
+# Outbound
+# ---------------------------------------------------------------------
+
+def bench_outbound(faults: Faults, resets: int) -> Dict:
+    headers = {"x-plc-secret": DEFAULT_PLC_SECRET, "Content-Type": "application/json"}
+    out = {}
+    with StandInBackend(faults=faults) as backend:
+        url = f"{backend.url}/api/ingest/gate/reset"
+
+        # Previous behaviour: blocking post per reset on the processing loop
+        t0 = time.perf_counter()
+        for i in range(resets):
+            try:
+                requests.post(url, headers=headers, json={'gate': i % 8 + 1}, timeout=2.0)
+            except requests.exceptions.RequestException:
+                pass
+        out['sync_loop_ms_per_reset'] = (time.perf_counter() - t0) * 1000 / resets
+
+        dispatcher = OutboundDispatcher()
+        before = sum(backend.gate_resets.values())
+        t0 = time.perf_counter()
+        futures = [dispatcher.submit('POST', url, headers=headers, json={'gate': i % 8 + 1},
+                                     coalesce_key=f"gate_reset:{i % 8 + 1}") for i in range(resets)]
+        out['async_loop_ms_per_reset'] = (time.perf_counter() - t0) * 1000 / resets
+        for f in futures:
+            try:
+                f.result()
+            except Exception:
+                pass
+        out['async_drain_ms'] = (time.perf_counter() - t0) * 1000
+        out['async_sent'] = sum(backend.gate_resets.values()) - before
+        out['coalesced'] = dispatcher.coalesced
+        out['failed'] = dispatcher.failed
+        dispatcher.close()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark machine-state propagation and outbound calls")
+    parser.add_argument('--changes', type=int, default=50)
+    parser.add_argument('--transitions', type=int, default=20)
+    parser.add_argument('--resets', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=5.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    args = parser.parse_args()
+
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    error_rate=args.error_rate, seed=args.seed)
+    results = {
+        'config': vars(args),
+        'propagation_stream': bench_propagation(faults, args.changes, stream=True),
+        'propagation_poll': bench_propagation(faults, args.changes, stream=False),
+        'transition': bench_transition(faults, args.transitions),
+        'outbound': bench_outbound(faults, args.resets),
+    }
+
+    for name, value in results.items():
+        if name != 'config':
+            print(f"{name:<20} " + "  ".join(
+                f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in value.items()))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
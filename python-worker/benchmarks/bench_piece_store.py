@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Piece Store Benchmark / Comparison
+
+Times the worker's piece queries against the in-memory ArrowPieceStore:
+
+    poll window   - query_pieces over the worker's 3s-lookback poll window
+    reject totals - query_totals over a program range with weight bounds + gate exclusion
+    minute totals - query_minute_gate_totals over a 1-minute range (M3 pushdown)
+
+With --compare-influx, a time range is pulled from InfluxDB 3 into an
+ArrowPieceStore and the same aggregate queries are run against both stores;
+any difference is reported.
+
+Usage:
+    python benchmarks/bench_piece_store.py [--pieces 500000] [--rate 40] [--repeat 20]
+    python benchmarks/bench_piece_store.py --compare-influx --from 2026-01-07T06:00:00Z --to 2026-01-07T07:00:00Z
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from epoch_time import NS_PER_SEC, NS_PER_MINUTE, iso_to_ns
+from piece_store import ArrowPieceStore, InfluxPieceStore
+
+
+def make_store(n: int, start_ns: int, rate_per_sec: float, seed: int = 42) -> ArrowPieceStore:
+    rng = random.Random(seed)
+    step = int(NS_PER_SEC / rate_per_sec)
+    times = [start_ns + i * step + rng.randrange(step) for i in range(n)]
+    weights = [round(rng.gauss(120, 25), 1) for _ in range(n)]
+    gates = [rng.randrange(9) for _ in range(n)]  # 0 = reject
+    store = ArrowPieceStore()
+    chunk = 10_000
+    for i in range(0, n, chunk):
+        store.write_pieces(times[i:i + chunk], weights[i:i + chunk], gates[i:i + chunk],
+                           [f"p{j}" for j in range(i, min(i + chunk, n))])
+    return store
+
+
+def bench(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn()
+        best = min(best, time.perf_counter_ns() - t0)
+    return best / 1e6
+
+
+def run_benchmark(args):
+    start_ns = iso_to_ns('2026-01-07T06:00:00Z')
+    t0 = time.perf_counter()
+    store = make_store(args.pieces, start_ns, args.rate)
+    len(store.query_pieces(start_ns, start_ns + 1))  # consolidate
+    print(f"loaded {len(store):,} pieces in {time.perf_counter() - t0:.2f}s")
+
+    end_ns = start_ns + int(args.pieces / args.rate * NS_PER_SEC)
+    mid = (start_ns + end_ns) // 2
+
+    print(f"{'query':<16} {'best ms':>10}")
+    print("-" * 28)
+    print(f"{'poll window':<16} {bench(lambda: store.query_pieces(mid - 3 * NS_PER_SEC, mid + NS_PER_SEC), args.repeat):>10.3f}")
+    print(f"{'reject totals':<16} {bench(lambda: store.query_totals(start_ns, end_ns, end_inclusive=True, min_weight=100, max_weight=140, exclude_gates=[1, 2, 3, 4]), args.repeat):>10.3f}")
+    minute = mid // NS_PER_MINUTE * NS_PER_MINUTE
+    print(f"{'minute totals':<16} {bench(lambda: store.query_minute_gate_totals(minute, minute + NS_PER_MINUTE), args.repeat):>10.3f}")
+
+
+def run_compare(args):
+    try:
+        from influxdb_client_3 import InfluxDBClient3
+    except ImportError:
+        print("influxdb_client_3 not installed. Run: pip install influxdb3-python")
+        sys.exit(1)
+
+    client = InfluxDBClient3(
+        host=os.getenv("INFLUXDB3_HOST_URL", "http://127.0.0.1:8181"),
+        token=os.getenv("INFLUXDB3_AUTH_TOKEN"),
+        database=os.getenv("INFLUXDB3_DATABASE", "batching"),
+    )
+    influx = InfluxPieceStore(client)
+    start_ns, end_ns = iso_to_ns(args.from_ts), iso_to_ns(args.to_ts)
+
+    arrow = ArrowPieceStore(influx.query_pieces(start_ns, end_ns))
+    print(f"loaded {len(arrow):,} pieces from InfluxDB")
+
+    mismatches = 0
+    checks = [
+        ('all', {}),
+        ('rejects (gate 0)', {'gates': [0]}),
+        ('eligible 100-140 off gates 1-4', {'min_weight': 100, 'max_weight': 140, 'exclude_gates': [1, 2, 3, 4]}),
+    ]
+    for label, filters in checks:
+        a = arrow.query_totals(start_ns, end_ns, **filters)
+        b = influx.query_totals(start_ns, end_ns, **filters)
+        ok = a[0] == b[0] and abs(a[1] - b[1]) < 1e-6 * max(1.0, abs(b[1]))
+        mismatches += not ok
+        print(f"{'OK ' if ok else 'DIFF'} {label:<32} arrow={a} influx={b}")
+
+    def minute_rows(table):
+        rows = {}
+        for m, g, n, w in zip(table.column('minute').cast('int64').to_pylist(), table.column('gate').to_pylist(),
+                              table.column('pieces').to_pylist(), table.column('weight_g').to_pylist()):
+            rows[(m, int(g))] = (int(n), round(float(w), 6))
+        return rows
+
+    a_rows = minute_rows(arrow.query_minute_gate_totals(start_ns, end_ns))
+    b_rows = minute_rows(influx.query_minute_gate_totals(start_ns, end_ns))
+    diff = {k for k in a_rows.keys() | b_rows.keys() if a_rows.get(k) != b_rows.get(k)}
+    mismatches += bool(diff)
+    print(f"{'OK ' if not diff else 'DIFF'} minute/gate totals               {len(b_rows)} rows, {len(diff)} differ")
+
+    influx.close()
+    sys.exit(1 if mismatches else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ArrowPieceStore / compare with InfluxDB")
+    parser.add_argument('--pieces', type=int, default=500_000)
+    parser.add_argument('--rate', type=float, default=40.0, help='pieces per second')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--compare-influx', action='store_true')
+    parser.add_argument('--from', dest='from_ts', default=None)
+    parser.add_argument('--to', dest='to_ts', default=None)
+    args = parser.parse_args()
+
+    if args.compare_influx:
+        if not args.from_ts or not args.to_ts:
+            parser.error('--compare-influx needs --from and --to')
+        run_compare(args)
+    else:
+        run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
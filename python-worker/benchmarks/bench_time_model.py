@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Time Model Microbenchmark
+
+Compares the per-piece cost of the worker's old datetime-based time handling
+with the int64 epoch-ns model used in live_worker.py:
+
+    old: Arrow to_pydict() datetimes → tz fix-up → .replace(second=0, microsecond=0)
+         → datetime comparison → .isoformat() minute key
+    new: Arrow cast(int64) → ts_ns // NS_PER_MINUTE → int comparison
+         (ISO formatted once per minute at the SQLite writer)
+
+Usage:
+    python benchmarks/bench_time_model.py [--pieces 200000] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from epoch_time import NS_PER_MINUTE, NS_PER_SEC, ARROW_UNIT_TO_NS, iso_to_ns, minute_to_iso
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def make_timestamps(n: int, start_ns: int, rate_per_sec: float = 40.0):
+    step = int(NS_PER_SEC / rate_per_sec)
+    return [start_ns + i * step for i in range(n)]
+
+
+def make_batch_isos(n: int, start_ns: int):
+    # Backend writes completed_at as JS toISOString() ('...Z', millisecond precision)
+    out = []
+    for i in range(n):
+        dt = datetime.fromtimestamp((start_ns + i * 7 * NS_PER_SEC) / NS_PER_SEC, tz=timezone.utc)
+        out.append(dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z")
+    return out
+
+
+# ---------------------------------------------------------------------
+# Piece path
+# ---------------------------------------------------------------------
+
+def old_piece_path(values):
+    """Previous hot path: per-piece datetime normalisation + bucketing + ISO key."""
+    current = None
+    keys = set()
+    for ts in values:
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        elif hasattr(ts, 'to_pydatetime'):
+            ts = ts.to_pydatetime()
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        bucket = ts.replace(second=0, microsecond=0)
+        if current is None or bucket > current:
+            current = bucket
+            keys.add(current.isoformat())
+    return len(keys)
+
+
+def new_piece_path(values):
+    """Current hot path: integer division and comparison only."""
+    current = None
+    keys = set()
+    for ts_ns in values:
+        bucket = ts_ns // NS_PER_MINUTE
+        if current is None or bucket > current:
+            current = bucket
+            keys.add(current)
+    # ISO formatting happens once per minute at the sink
+    return len({minute_to_iso(k) for k in keys})
+
+
+def old_extract(table):
+    return table.to_pydict()['time']
+
+
+def new_extract(table):
+    col = table.column('time')
+    scale = ARROW_UNIT_TO_NS[col.type.unit]
+    values = col.cast(pa.int64()).to_pylist()
+    return values if scale == 1 else [v * scale for v in values]
+
+
+# ---------------------------------------------------------------------
+# Batch path
+# ---------------------------------------------------------------------
+
+def old_batch_path(isos):
+    last = None
+    total = 0.0
+    for s in isos:
+        t = datetime.fromisoformat(s.replace('Z', '+00:00'))
+        _ = t.replace(second=0, microsecond=0)
+        if last is not None:
+            total += (t - last).total_seconds()
+            _ = (last.isoformat(), t.isoformat())
+        last = t
+    return total
+
+
+def new_batch_path(isos):
+    last = None
+    total = 0.0
+    for s in isos:
+        t = iso_to_ns(s)
+        _ = t // NS_PER_MINUTE
+        if last is not None:
+            total += (t - last) / NS_PER_SEC
+        last = t
+    return total
+
+
+def bench(fn, arg, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn(arg)
+        best = min(best, time.perf_counter_ns() - t0)
+    return best
+
+
+def report(label: str, n: int, old_ns: float, new_ns: float):
+    print(f"{label:<28} {old_ns / n:>10.1f} {new_ns / n:>10.1f} {old_ns / max(new_ns, 1):>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark datetime vs epoch-ns time handling")
+    parser.add_argument('--pieces', type=int, default=200_000)
+    parser.add_argument('--batches', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start_ns = iso_to_ns('2026-01-07T06:00:00Z')
+    ts_ns = make_timestamps(args.pieces, start_ns)
+
+    print(f"{'path':<28} {'old ns/op':>10} {'new ns/op':>10} {'speedup':>9}")
+    print("-" * 60)
+
+    if pa is not None:
+        table = pa.table({'time': pa.array(ts_ns, type=pa.timestamp('ns', tz='UTC'))})
+        old_vals = old_extract(table)
+        new_vals = new_extract(table)
+        assert old_piece_path(old_vals) == new_piece_path(new_vals)
+
+        report("arrow extract", args.pieces,
+               bench(old_extract, table, args.repeat), bench(new_extract, table, args.repeat))
+        report("bucket + key", args.pieces,
+               bench(old_piece_path, old_vals, args.repeat), bench(new_piece_path, new_vals, args.repeat))
+        report("piece total", args.pieces,
+               bench(lambda t: old_piece_path(old_extract(t)), table, args.repeat),
+               bench(lambda t: new_piece_path(new_extract(t)), table, args.repeat))
+    else:
+        dts = [datetime.fromtimestamp(t / NS_PER_SEC, tz=timezone.utc) for t in ts_ns]
+        report("bucket + key", args.pieces,
+               bench(old_piece_path, dts, args.repeat), bench(new_piece_path, ts_ns, args.repeat))
+
+    isos = make_batch_isos(args.batches, start_ns)
+    assert abs(old_batch_path(isos) - new_batch_path(isos)) < 1e-3
+    report("batch parse + dwell", args.batches,
+           bench(old_batch_path, isos, args.repeat), bench(new_batch_path, isos, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
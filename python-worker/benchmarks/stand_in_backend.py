@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Stand-In Machine-State Backend
+
+A lightweight localhost replacement for the Node server endpoints the worker
+talks to, so MachineStateClient / the outbound dispatcher / the worker loop
+can be benchmarked without the full backend:
+
+    GET  /api/machine/state                 (ETag + 304 like Express)
+    GET  /api/machine/recipes               (ETag + 304)
+    GET  /api/machine/stream                (SSE: state on connect + on change, ': ping')
+    POST /api/machine/transition-complete   ('stop' → idle, 'recipe_change' → ack)
+    POST /api/ingest/gate/reset             (x-plc-secret, gate 1-8)
+    POST /api/ingest/reload-assignments     (x-plc-secret)
+
+State changes come from a scripted timeline (idle → running → paused →
+transitioning ...) or from set_state(). Latency and faults (HTTP 500s,
+dropped connections) are injected from a seeded RNG so runs are repeatable.
+Every request is recorded, and the time from entering 'transitioning' to the
+worker's transition-complete call is measured as the transition latency.
+
+Usage (in-process):
+    from stand_in_backend import StandInBackend, Faults
+
+    with StandInBackend(faults=Faults(latency_ms=5, error_rate=0.01)) as backend:
+        client = MachineStateClient(backend.url)
+        backend.set_state(state='running', currentProgramId=1)
+
+Usage (standalone, point the worker at it with BACKEND_URL=http://127.0.0.1:5001):
+    python benchmarks/stand_in_backend.py --port 5001 [--timeline demo|file.json]
+        [--speed 1.0] [--latency-ms 0] [--jitter-ms 0] [--error-rate 0] [--drop-rate 0]
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PLC_SECRET = "dev-plc-secret"
+GATE_MIN, GATE_MAX = 1, 8
+PING_INTERVAL_SEC = 15.0
+
+
+@dataclass
+class Faults:
+    """Injected latency/faults; `paths` narrows injection to path prefixes (default: all)"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0  # fraction of requests answered with HTTP 500
+    drop_rate: float = 0.0   # fraction of requests whose connection is closed without a response
+    paths: Tuple[str, ...] = ()
+    seed: int = 42
+
+
+@dataclass
+class RequestRecord:
+    t: float  # time.monotonic() when the request arrived
+    method: str
+    path: str
+    status: int  # 0 = dropped
+    body: Optional[Dict] = None
+
+
+@dataclass
+class TimelineStep:
+    """Apply `updates` to the machine state `at` seconds after play() starts"""
+    at: float
+    updates: Dict = field(default_factory=dict)
+
+
+def _recipe(name: str, gates: List[int], min_g: float = 100.0, max_g: float = 120.0,
+            pieces: int = 8) -> Dict:
+    return {
+        'recipeName': name,
+        'gates': gates,
+        'params': {
+            'pieceMinWeight': min_g - 20, 'pieceMaxWeight': max_g + 20,
+            'batchMinWeight': min_g * pieces, 'batchMaxWeight': max_g * pieces,
+            'minPieces': pieces, 'maxPieces': pieces,
+        },
+    }
+
+
+RECIPES_A = [_recipe('R_A', [1, 2, 3, 4]), _recipe('R_B', [5, 6, 7, 8], 140, 160, 6)]
+RECIPES_B = [_recipe('R_A', [1, 2, 3, 4]), _recipe('R_C', [5, 6, 7, 8], 90, 110, 10)]
+
+# idle → running → paused → running → recipe change → running → stop
+DEMO_TIMELINE = [
+    TimelineStep(0.0, {'state': 'idle', 'currentProgramId': None, 'activeRecipes': [], 'programStartRecipes': []}),
+    TimelineStep(1.0, {'state': 'running', 'currentProgramId': 1,
+                       'activeRecipes': RECIPES_A, 'programStartRecipes': RECIPES_A}),
+    TimelineStep(5.0, {'state': 'paused'}),
+    TimelineStep(7.0, {'state': 'running'}),
+    TimelineStep(10.0, {'state': 'transitioning', 'activeRecipes': RECIPES_B,
+                        'transitioningGates': [5, 6, 7, 8]}),
+    TimelineStep(13.0, {'state': 'running', 'currentProgramId': 2, 'activeRecipes': RECIPES_B,
+                        'programStartRecipes': RECIPES_B, 'transitioningGates': []}),
+    TimelineStep(18.0, {'state': 'transitioning', 'activeRecipes': [],
+                        'transitioningGates': [1, 2, 3, 4, 5, 6, 7, 8]}),
+]
+
+
+def load_timeline(path: str) -> List[TimelineStep]:
+    """Load a timeline from JSON: [{"at": 0.0, "state": "running", ...}, ...]"""
+    with open(path) as f:
+        raw = json.load(f)
+    steps = []
+    for entry in raw:
+        entry = dict(entry)
+        at = float(entry.pop('at'))
+        steps.append(TimelineStep(at, entry))
+    return sorted(steps, key=lambda s: s.at)
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def _etag(body: bytes) -> str:
+    return 'W/"' + hashlib.sha1(body).hexdigest()[:27] + '"'
+
+
+class StandInBackend:
+    """Threaded localhost HTTP server emulating the backend machine/ingest endpoints"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, faults: Optional[Faults] = None,
+                 plc_secret: str = DEFAULT_PLC_SECRET, ping_interval_sec: float = PING_INTERVAL_SEC):
+        self.faults = faults or Faults()
+        self.plc_secret = plc_secret
+        self.ping_interval_sec = ping_interval_sec
+        self._rng = random.Random(self.faults.seed)
+        self._rng_lock = threading.Lock()
+
+        self._lock = threading.Condition()
+        self._state: Dict = {
+            'state': 'idle',
+            'currentProgramId': None,
+            'activeRecipes': [],
+            'programStartRecipes': [],
+            'transitioningGates': [],
+            'transitionStartRecipes': {},
+            'completedTransitionGates': [],
+            'transitionOldProgramId': None,
+            'registeredTransitioningGates': [],
+            'orderQueue': [],
+            'gateSnapshot': [],
+            'pausedGates': [],
+            'weightTareG': 0,
+            'lastUpdated': _now_iso(),
+        }
+        self.state_version = 0
+        self.state_changed_at: Dict[int, float] = {0: time.monotonic()}  # version -> monotonic time
+        self.transition_started_at: Optional[float] = None
+        self.transition_latencies: List[float] = []  # seconds, transitioning → transition-complete
+
+        self.requests: List[RequestRecord] = []
+        self.gate_resets: Dict[int, int] = {}
+        self.reloads = 0
+
+        self._timeline_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._server_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'StandInBackend':
+        self._server_thread = threading.Thread(target=self._server.serve_forever,
+                                               name='stand-in-backend', daemon=True)
+        self._server_thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()  # release SSE handlers
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StandInBackend':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # State control
+    # ------------------------------------------------------------------
+
+    def get_state(self) -> Dict:
+        with self._lock:
+            return dict(self._state)
+
+    def set_state(self, **updates) -> int:
+        """Apply updates, push them to stream subscribers, return the new state version"""
+        with self._lock:
+            entering_transition = (updates.get('state') == 'transitioning'
+                                   and self._state['state'] != 'transitioning')
+            self._state.update(updates)
+            self._state['lastUpdated'] = _now_iso()
+            self.state_version += 1
+            now = time.monotonic()
+            self.state_changed_at[self.state_version] = now
+            if entering_transition:
+                self.transition_started_at = now
+            self._lock.notify_all()
+            return self.state_version
+
+    def play(self, steps: List[TimelineStep], speed: float = 1.0, loop: bool = False):
+        """Play a timeline in the background (`speed` > 1 compresses time)"""
+        def runner():
+            while not self._stop.is_set():
+                start = time.monotonic()
+                for step in steps:
+                    delay = start + step.at / speed - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                    self.set_state(**step.updates)
+                if not loop:
+                    return
+        self._timeline_thread = threading.Thread(target=runner, name='stand-in-timeline', daemon=True)
+        self._timeline_thread.start()
+
+    def wait_timeline(self, timeout: Optional[float] = None) -> bool:
+        if self._timeline_thread is None:
+            return True
+        self._timeline_thread.join(timeout)
+        return not self._timeline_thread.is_alive()
+
+    def count(self, method: str, path: str) -> int:
+        return sum(1 for r in self.requests if r.method == method and r.path == path)
+
+    # ------------------------------------------------------------------
+    # Fault injection
+    # ------------------------------------------------------------------
+
+    def _inject(self, path: str) -> Optional[str]:
+        """Sleep the injected latency; return 'drop', 'error' or None"""
+        f = self.faults
+        if f.paths and not any(path.startswith(p) for p in f.paths):
+            return None
+        with self._rng_lock:
+            delay = f.latency_ms + (self._rng.uniform(-f.jitter_ms, f.jitter_ms) if f.jitter_ms else 0.0)
+            roll = self._rng.random()
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if roll < f.drop_rate:
+            return 'drop'
+        if roll < f.drop_rate + f.error_rate:
+            return 'error'
+        return None
+
+    # ------------------------------------------------------------------
+    # Endpoint handlers: return (status, body dict)
+    # ------------------------------------------------------------------
+
+    def _transition_complete(self, body: Dict) -> Tuple[int, Dict]:
+        action = body.get('action')
+        program_id = body.get('programId')
+        if action not in ('stop', 'recipe_change'):
+            return 400, {'error': 'Invalid action'}
+
+        with self._lock:
+            if self.transition_started_at is not None:
+                self.transition_latencies.append(time.monotonic() - self.transition_started_at)
+                self.transition_started_at = None
+
+        if action == 'stop':
+            self.set_state(state='idle', currentProgramId=None, activeRecipes=[],
+                           programStartRecipes=[], transitioningGates=[])
+            return 200, {'success': True, 'action': 'stopped', 'state': self.get_state()}
+
+        return 200, {
+            'success': True,
+            'action': 'recipe_change_acknowledged',
+            'message': 'Recipe change handled by ingest.js flow',
+            'programId': self.get_state()['currentProgramId'] or program_id,
+            'state': self.get_state(),
+        }
+
+    def _gate_reset(self, body: Dict) -> Tuple[int, Dict]:
+        try:
+            gate = int(body.get('gate'))
+        except (TypeError, ValueError):
+            gate = None
+        if gate is None or not GATE_MIN <= gate <= GATE_MAX:
+            return 400, {'message': 'gate must be 1-8'}
+        with self._lock:
+            self.gate_resets[gate] = self.gate_resets.get(gate, 0) + 1
+        return 200, {'ok': True}
+
+    def _reload_assignments(self, body: Dict) -> Tuple[int, Dict]:
+        with self._lock:
+            self.reloads += 1
+        return 200, {'ok': True}
+
+    def _make_handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like Express
+
+            def log_message(self, *args):
+                pass
+
+            def _record(self, status: int, body: Optional[Dict] = None):
+                with backend._lock:
+                    backend.requests.append(RequestRecord(self._t0, self.command, self.path, status, body))
+
+            def _send(self, status: int, payload: Dict, conditional: bool = False):
+                data = json.dumps(payload).encode()
+                etag = _etag(data) if conditional else None
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return 304
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(data)
+                return status
+
+            def _read_json(self) -> Dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                if not length:
+                    return {}
+                try:
+                    return json.loads(self.rfile.read(length)) or {}
+                except ValueError:
+                    return {}
+
+            def _faulted(self) -> bool:
+                fault = backend._inject(self.path)
+                if fault == 'drop':
+                    self._record(0)
+                    self.close_connection = True
+                    try:
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    return True
+                if fault == 'error':
+                    self._record(self._send(500, {'error': 'Injected fault'}))
+                    return True
+                return False
+
+            def do_GET(self):
+                self._t0 = time.monotonic()
+                if self._faulted():
+                    return
+                if self.path == '/api/machine/state':
+                    self._record(self._send(200, backend.get_state(), conditional=True))
+                elif self.path == '/api/machine/recipes':
+                    recipes = backend.get_state()['activeRecipes']
+                    self._record(self._send(200, {'recipes': recipes}, conditional=True))
+                elif self.path == '/api/machine/stream':
+                    self._record(200)
+                    self._stream()
+                elif self.path == '/':
+                    self._record(self._send(200, {'ok': True}))
+                else:
+                    self._record(self._send(404, {'error': 'Not found'}))
+
+            def do_POST(self):
+                self._t0 = time.monotonic()
+                body = self._read_json()
+                if self._faulted():
+                    return
+                if self.path.startswith('/api/ingest/'):
+                    if self.headers.get('x-plc-secret') != backend.plc_secret:
+                        self._record(self._send(401, {'message': 'Unauthorized (PLC secret invalid)'}), body)
+                        return
+                if self.path == '/api/machine/transition-complete':
+                    status, payload = backend._transition_complete(body)
+                elif self.path == '/api/ingest/gate/reset':
+                    status, payload = backend._gate_reset(body)
+                elif self.path == '/api/ingest/reload-assignments':
+                    status, payload = backend._reload_assignments(body)
+                else:
+                    status, payload = 404, {'error': 'Not found'}
+                self._record(self._send(status, payload), body)
+
+            def _chunk(self, data: bytes):
+                # Chunked framing like Express, so clients see each event as it is written
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self):
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                sent_version = -1
+                last_write = time.monotonic()
+                try:
+                    while not backend._stop.is_set():
+                        with backend._lock:
+                            if backend.state_version == sent_version:
+                                timeout = backend.ping_interval_sec - (time.monotonic() - last_write)
+                                if timeout > 0:
+                                    backend._lock.wait(timeout)
+                            version = backend.state_version
+                            state = dict(backend._state) if version != sent_version else None
+                        if backend._stop.is_set():
+                            break
+                        if state is not None:
+                            self._chunk(f"data: {json.dumps(state)}\n\n".encode())
+                            sent_version = version
+                        elif time.monotonic() - last_write >= backend.ping_interval_sec:
+                            self._chunk(b": ping\n\n")
+                        else:
+                            continue
+                        last_write = time.monotonic()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in machine-state backend for worker benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--timeline', default=None, help="'demo' or a JSON timeline file")
+    parser.add_argument('--speed', type=float, default=1.0, help='timeline speed multiplier')
+    parser.add_argument('--loop', action='store_true', help='repeat the timeline')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--plc-secret', default=os.getenv('PLC_SHARED_SECRET', DEFAULT_PLC_SECRET))
+    args = parser.parse_args()
+
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                    drop_rate=args.drop_rate, seed=args.seed)
+    backend = StandInBackend(args.host, args.port, faults=faults, plc_secret=args.plc_secret)
+    backend.start()
+    print(f"Stand-in backend listening on {backend.url}")
+
+    if args.timeline:
+        steps = DEMO_TIMELINE if args.timeline == 'demo' else load_timeline(args.timeline)
+        backend.play(steps, speed=args.speed, loop=args.loop)
+        print(f"Playing {len(steps)}-step timeline at {args.speed}x")
+
+    last_version = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            if backend.state_version != last_version:
+                last_version = backend.state_version
+                print(f"  state v{last_version}: {backend.get_state()['state']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.stop()
+        if backend.transition_latencies:
+            print("Transition latencies (s): " + ", ".join(f"{t:.3f}" for t in backend.transition_latencies))
+        print(f"Requests: {len(backend.requests)}  gate resets: {sum(backend.gate_resets.values())}  "
+              f"reloads: {backend.reloads}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Integer Epoch Time Helpers
+
+The worker's internal time model:
+- Timestamps are int64 epoch nanoseconds (what InfluxDB stores natively)
+- Minute buckets are int epoch minutes (ts_ns // NS_PER_MINUTE)
+- ISO strings are only produced at the sink boundary (SQLite writes, logs)
+
+Integer division and comparison replace datetime.fromisoformat / .replace() /
+.isoformat() on every piece, which dominated the per-piece cost.
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+NS_PER_US = 1_000
+NS_PER_MS = 1_000_000
+NS_PER_SEC = 1_000_000_000
+NS_PER_MINUTE = 60 * NS_PER_SEC
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Multiplier from an Arrow timestamp unit to nanoseconds
+ARROW_UNIT_TO_NS = {'s': NS_PER_SEC, 'ms': NS_PER_MS, 'us': NS_PER_US, 'ns': 1}
+
+
+def now_ns() -> int:
+    """Current wall-clock time as epoch nanoseconds."""
+    return time.time_ns()
+
+
+def minute_of(ts_ns: int) -> int:
+    """Epoch minute containing ts_ns."""
+    return ts_ns // NS_PER_MINUTE
+
+
+def datetime_to_ns(dt: datetime) -> int:
+    """Exact conversion of a datetime (naive = UTC) to epoch nanoseconds."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return ((dt - EPOCH) // timedelta(microseconds=1)) * NS_PER_US
+
+
+def iso_to_ns(ts_iso: str) -> int:
+    """Parse an ISO timestamp ('...Z', '+00:00' or naive UTC) to epoch nanoseconds."""
+    return datetime_to_ns(datetime.fromisoformat(ts_iso.replace('Z', '+00:00')))
+
+
+def to_ns(value: Any) -> Optional[int]:
+    """Best-effort conversion of int / datetime / pandas Timestamp / ISO string to epoch ns."""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    if hasattr(value, 'value') and hasattr(value, 'to_pydatetime'):
+        # pandas.Timestamp keeps full nanosecond precision in .value (UTC)
+        return int(value.value)
+    if isinstance(value, datetime):
+        return datetime_to_ns(value)
+    return iso_to_ns(str(value))
+
+
+def ns_to_datetime(ts_ns: int) -> datetime:
+    """Epoch nanoseconds to tz-aware UTC datetime (microsecond precision)."""
+    return EPOCH + timedelta(microseconds=ts_ns // NS_PER_US)
+
+
+def ns_to_iso(ts_ns: int) -> str:
+    """Epoch nanoseconds to ISO string (same format as datetime.isoformat() in UTC)."""
+    return ns_to_datetime(ts_ns).isoformat()
+
+
+@lru_cache(maxsize=256)
+def minute_to_iso(minute: int) -> str:
+    """Epoch minute to ISO string, e.g. '2026-01-07T12:34:00+00:00' (cached per minute)."""
+    return ns_to_iso(minute * NS_PER_MINUTE)
+
+
+def minute_label(minute: int) -> str:
+    """Short HH:MM label for log messages."""
+    return ns_to_datetime(minute * NS_PER_MINUTE).strftime('%H:%M')
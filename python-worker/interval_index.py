@@ -0,0 +1,57 @@
+"""
+Interval Stabbing Index
+
+Answers "which intervals contain x?" for a small, rarely-changing set of
+closed intervals (recipe piece-weight bounds):
+1. Every interval [lo, hi] becomes the half-open [lo, nextafter(hi, +inf))
+2. All interval edges are sorted into one breakpoint list
+3. Each elementary segment between two breakpoints stores the keys covering it
+4. A lookup is one bisect over the breakpoints: O(log n) plus the result size
+
+Build cost is O(n^2) in the number of intervals, which is fine for the tens of
+recipes a program runs; rebuild when the set changes.
+
+Usage:
+    from interval_index import IntervalIndex
+
+    index = IntervalIndex({recipe_id: (spec.piece_min, spec.piece_max) for ...})
+    for recipe_id in index.stab(piece.weight_g):
+        ...
+"""
+
+import math
+from bisect import bisect_right
+from typing import Dict, Hashable, List, Tuple
+
+_EMPTY: Tuple = ()
+
+
+class IntervalIndex:
+    """Static index of closed intervals keyed by any hashable"""
+
+    def __init__(self, intervals: Dict[Hashable, Tuple[float, float]]):
+        self.intervals = {k: (float(lo), float(hi)) for k, (lo, hi) in intervals.items() if lo <= hi}
+
+        edges = set()
+        for lo, hi in self.intervals.values():
+            edges.add(lo)
+            edges.add(math.nextafter(hi, math.inf))
+        self.breaks: List[float] = sorted(edges)
+
+        # segments[i] covers [breaks[i], breaks[i+1]); the last one is open-ended (always empty)
+        self.segments: List[Tuple] = []
+        for start in self.breaks:
+            covering = tuple(k for k, (lo, hi) in self.intervals.items() if lo <= start <= hi)
+            self.segments.append(covering)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def stab(self, x: float) -> Tuple:
+        """Keys of every interval with lo <= x <= hi"""
+        i = bisect_right(self.breaks, x) - 1
+        return self.segments[i] if i >= 0 else _EMPTY
+
+    def locate(self, x: float) -> int:
+        """Index into segments of the segment holding x (-1 below the first breakpoint)"""
+        return bisect_right(self.breaks, x) - 1
@@ -0,0 +1,229 @@
+"""
+Live KPI Snapshot (shared memory)
+
+The worker publishes its in-memory live counters to a fixed-layout,
+memory-mapped file after every minute flush and every batch, so local
+readers (dashboard backend, scripts) get current values without waiting
+for - or querying - SQLite.
+
+Layout (little-endian, byte offsets):
+    0     header    64                magic 'BHLS', layout, seq, published_ns,
+                                      program_id, minute, machine state, counts
+    64    combined  128               current minute, rolling window, cumulative
+    192   gates     MAX_GATES x 64    one slot per gate (gate 0 = rejects)
+    2240  recipes   MAX_RECIPES x 128 one slot per active recipe
+
+Seqlock: seq (u64 at offset 8) is odd while the writer is copying a new body
+in and even once it is complete. Readers read seq, copy the file, re-read seq
+and retry if it was odd or changed. Slots past n_gates / n_recipes are zero.
+
+The Node reader (server/lib/liveSnapshot.js) mirrors these formats; change
+both together and bump LAYOUT_VERSION.
+"""
+
+import os
+import mmap
+import struct
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b'BHLS'
+LAYOUT_VERSION = 1
+
+MAX_GATES = 32
+MAX_RECIPES = 32
+RECIPE_NAME_BYTES = 48
+
+HEADER_FMT = '<4sHHQqqqIIIB3x'
+COMBINED_FMT = '<qdqqdddqdqq'
+GATE_FMT = '<iiqdqqdq'
+RECIPE_FMT = f'<ii{RECIPE_NAME_BYTES}sqdqdddddd'
+
+HEADER_SIZE = 64
+COMBINED_SIZE = 128
+GATE_SIZE = 64
+RECIPE_SIZE = 128
+
+SEQ_OFFSET = 8
+BODY_OFFSET = 16  # everything after seq is rewritten on publish
+COMBINED_OFFSET = HEADER_SIZE
+GATES_OFFSET = COMBINED_OFFSET + COMBINED_SIZE
+RECIPES_OFFSET = GATES_OFFSET + MAX_GATES * GATE_SIZE
+SNAPSHOT_SIZE = RECIPES_OFFSET + MAX_RECIPES * RECIPE_SIZE
+
+MACHINE_STATES = ('idle', 'running', 'paused', 'transitioning')
+
+HEADER_FIELDS = ('magic', 'layout', 'reserved', 'seq', 'published_ns', 'program_id', 'minute',
+                 'n_gates', 'n_recipes', 'rolling_minutes', 'machine_state')
+COMBINED_FIELDS = ('minute_pieces', 'minute_weight_g', 'minute_batches',
+                   'minute_reject_pieces', 'minute_reject_weight_g',
+                   'rolling_batches_per_min', 'rolling_giveaway_pct',
+                   'total_rejects_count', 'total_rejects_weight_g',
+                   'pieces_processed', 'batches_detected')
+GATE_FIELDS = ('gate', 'recipe_id', 'minute_pieces', 'minute_weight_g', 'minute_batches',
+               'inflight_pieces', 'inflight_weight_g', 'last_batch_ns')
+RECIPE_FIELDS = ('recipe_id', 'reserved', 'name', 'minute_pieces', 'minute_weight_g', 'minute_batches',
+                 'rolling_batches_per_min', 'rolling_giveaway_pct',
+                 'cum_batches', 'cum_weight_g', 'giveaway_g_per_batch', 'giveaway_pct_avg')
+
+assert struct.calcsize(HEADER_FMT) <= HEADER_SIZE
+assert struct.calcsize(COMBINED_FMT) <= COMBINED_SIZE
+assert struct.calcsize(GATE_FMT) <= GATE_SIZE
+assert struct.calcsize(RECIPE_FMT) <= RECIPE_SIZE
+
+_ZEROS = bytes(SNAPSHOT_SIZE)
+
+
+class RollingWindow:
+    """Per-minute M3 values over the last `minutes` closed minutes"""
+
+    def __init__(self, minutes: int):
+        self.minutes = minutes
+        self._rows: deque = deque()  # (minute, batches, w_give, denom)
+
+    def add(self, minute: int, batches: int, w_give: float, denom: float):
+        self._rows.append((minute, batches, w_give, denom))
+        while self._rows and self._rows[0][0] <= minute - self.minutes:
+            self._rows.popleft()
+
+    def batches_per_min(self) -> float:
+        return sum(r[1] for r in self._rows) / self.minutes if self._rows else 0.0
+
+    def giveaway_pct(self) -> float:
+        denom = sum(r[3] for r in self._rows)
+        return sum(r[2] for r in self._rows) / denom * 100.0 if denom > 0 else 0.0
+
+
+class LiveSnapshotWriter:
+    """
+    Publishes snapshots into the shared file (single writer).
+
+    Usage:
+        writer = LiveSnapshotWriter(path)
+        writer.publish(program_id, minute, 'running', 5, combined, gates, recipes)
+        writer.close()
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(self._fd, SNAPSHOT_SIZE)
+        self._mm = mmap.mmap(self._fd, SNAPSHOT_SIZE)
+        self._buf = bytearray(SNAPSHOT_SIZE)
+
+        # Continue from the file's seq so readers never see it go backwards
+        magic, layout, _, seq = struct.unpack_from('<4sHHQ', self._mm, 0)
+        self._seq = seq + (seq & 1) if magic == MAGIC and layout == LAYOUT_VERSION else 0
+        struct.pack_into('<4sHHQ', self._mm, 0, MAGIC, LAYOUT_VERSION, 0, self._seq)
+        self.published = 0
+
+    def publish(self, program_id: Optional[int], minute: Optional[int], machine_state: str,
+                rolling_minutes: int, combined: Tuple, gates: List[Tuple], recipes: List[Tuple]):
+        """
+        Write one snapshot. combined / gates / recipes are tuples in
+        COMBINED_FIELDS / GATE_FIELDS / RECIPE_FIELDS order (recipe name as str);
+        extra gates / recipes beyond the slot counts are dropped.
+        """
+        gates = gates[:MAX_GATES]
+        recipes = recipes[:MAX_RECIPES]
+        buf = self._buf
+        buf[:] = _ZEROS
+
+        state_code = MACHINE_STATES.index(machine_state) if machine_state in MACHINE_STATES else 255
+        struct.pack_into(HEADER_FMT, buf, 0, MAGIC, LAYOUT_VERSION, 0, 0, time.time_ns(),
+                         program_id if program_id is not None else -1,
+                         minute if minute is not None else -1,
+                         len(gates), len(recipes), rolling_minutes, state_code)
+        struct.pack_into(COMBINED_FMT, buf, COMBINED_OFFSET, *combined)
+        for i, gate in enumerate(gates):
+            struct.pack_into(GATE_FMT, buf, GATES_OFFSET + i * GATE_SIZE, *gate)
+        for i, recipe in enumerate(recipes):
+            name = recipe[2].encode('utf-8')[:RECIPE_NAME_BYTES]
+            struct.pack_into(RECIPE_FMT, buf, RECIPES_OFFSET + i * RECIPE_SIZE,
+                             recipe[0], recipe[1], name, *recipe[3:])
+
+        # Seqlock write: odd while the body is inconsistent, even when done
+        self._seq += 1
+        struct.pack_into('<Q', self._mm, SEQ_OFFSET, self._seq)
+        self._mm[BODY_OFFSET:] = buf[BODY_OFFSET:]
+        self._seq += 1
+        struct.pack_into('<Q', self._mm, SEQ_OFFSET, self._seq)
+        self.published += 1
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+class LiveSnapshotReader:
+    """
+    Reads consistent snapshots from the shared file.
+
+    Usage:
+        reader = LiveSnapshotReader(path)
+        snap = reader.read()   # dict, or None if no consistent copy was obtained
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        self._mm = mmap.mmap(self._fd, SNAPSHOT_SIZE, access=mmap.ACCESS_READ)
+
+    def read_raw(self, retries: int = 100) -> Optional[bytes]:
+        """Consistent copy of the whole file (None if the writer kept it busy)"""
+        for _ in range(retries):
+            seq1 = struct.unpack_from('<Q', self._mm, SEQ_OFFSET)[0]
+            if seq1 == 0:
+                return None  # nothing published yet
+            if seq1 & 1:
+                continue
+            data = self._mm[:SNAPSHOT_SIZE]
+            seq2 = struct.unpack_from('<Q', self._mm, SEQ_OFFSET)[0]
+            if seq1 == seq2:
+                return data
+        return None
+
+    def read(self, retries: int = 100) -> Optional[Dict]:
+        data = self.read_raw(retries)
+        return decode(data) if data is not None else None
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+def decode(data: bytes) -> Optional[Dict]:
+    """Decode a snapshot copy into plain dicts (None if the file isn't a snapshot)"""
+    header = dict(zip(HEADER_FIELDS, struct.unpack_from(HEADER_FMT, data, 0)))
+    if header['magic'] != MAGIC or header['layout'] != LAYOUT_VERSION:
+        return None
+    state = header['machine_state']
+    header['machine_state'] = MACHINE_STATES[state] if state < len(MACHINE_STATES) else None
+    for key in ('magic', 'reserved'):
+        del header[key]
+
+    gates = []
+    for i in range(header['n_gates']):
+        gates.append(dict(zip(GATE_FIELDS, struct.unpack_from(GATE_FMT, data, GATES_OFFSET + i * GATE_SIZE))))
+    recipes = []
+    for i in range(header['n_recipes']):
+        recipe = dict(zip(RECIPE_FIELDS, struct.unpack_from(RECIPE_FMT, data, RECIPES_OFFSET + i * RECIPE_SIZE)))
+        recipe['name'] = recipe['name'].rstrip(b'\0').decode('utf-8', 'replace')
+        del recipe['reserved']
+        recipes.append(recipe)
+
+    return {
+        **header,
+        'combined': dict(zip(COMBINED_FIELDS, struct.unpack_from(COMBINED_FMT, data, COMBINED_OFFSET))),
+        'gates': gates,
+        'recipes': recipes,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    reader = LiveSnapshotReader(sys.argv[1])
+    print(json.dumps(reader.read(), indent=2))
@@ -22,7 +22,7 @@ import time
 import json
 import random
 import sqlite3
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple, Set
 from collections import defaultdict
 from dataclasses import dataclass, field
@@ -31,7 +31,21 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from dotenv import load_dotenv
 import requests
+import pyarrow as pa
 from machine_client import MachineStateClient
+from outbound import OutboundDispatcher
+from quantile_sketch import QuantileSketch
+from weight_histogram import WeightHistogram, SCOPE_GATE0, SCOPE_RECIPE
+from m4_totals import M4Emitter
+from piece_store import PieceStore, InfluxPieceStore
+from program_finalizer import ProgramFinalizer, unfinished_programs
+from live_snapshot import LiveSnapshotWriter, RollingWindow
+from interval_index import IntervalIndex
+from sqlite_contention import connect as sqlite_connect, contention_stats
+from epoch_time import (
+    NS_PER_SEC, NS_PER_MINUTE, ARROW_UNIT_TO_NS,
+    now_ns, minute_of, iso_to_ns, to_ns, ns_to_iso, minute_to_iso, minute_label,
+)
 from logger import get_logger, ENABLE_CONSOLE
 
 # Initialize logger
@@ -63,12 +77,75 @@ SQLITE_DB = os.path.join(SERVER_DIR, "db", "sqlite", "batching_app.sqlite")
 # Polling configuration (only for M3/M4, not M1/M2)
 POLL_INTERVAL_SEC = 60.0  # Poll every 60 seconds for M3/M4 calculations
 
+# Machine state: pushed over SSE when available, polled as fallback
+MACHINE_STATE_STREAM = bool(int(os.getenv("MACHINE_STATE_STREAM", "1")))
+STATE_POLL_INTERVAL_SEC = 0.2  # fallback polling while the stream is down
+STATE_RESYNC_SEC = 30.0  # safety-net poll while the stream is up
+
+# Piece / batch_completions polling cadence while running or transitioning
+PIECE_POLL_INTERVAL_SEC = 0.2
+TRANSITION_BATCH_FALLBACK_SEC = float(os.getenv("TRANSITION_BATCH_FALLBACK_SEC", "1"))  # no pushed batch event
+
+# M3 aggregation pushdown: ask InfluxDB for per-minute per-gate COUNT/SUM (date_bin)
+# for closed minutes instead of computing M3 totals from every raw piece in Python.
+# Raw pieces are not polled at all: in-flight batches come from a per-gate COUNT/SUM
+# since each gate's last batch_completions row. Per-recipe eligible rejects, piece
+# weight sketches and weight histograms need raw pieces and are not produced.
+# Validate mode keeps the raw-piece path running and compares both per minute.
+M3_AGG_PUSHDOWN = bool(int(os.getenv("M3_AGG_PUSHDOWN", "0")))
+M3_AGG_VALIDATE = bool(int(os.getenv("M3_AGG_VALIDATE", "0")))
+M3_AGG_SETTLE_SEC = float(os.getenv("M3_AGG_SETTLE_SEC", "3"))  # wait for late Influx writes
+M3_AGG_RETRY_SEC = 5.0
+M3_RAW_PIECES = not M3_AGG_PUSHDOWN or M3_AGG_VALIDATE  # per-piece M3 accumulation
+
+# In-flight batch tracking per gate (pieces since the gate's last batch_completions row)
+GATE_INFLIGHT_MAX_PIECES = 1000
+
+# Outbound backend calls run on the dispatcher's pool so the processing loop
+# never waits on the network (transition-complete is the explicit sync point)
+OUTBOUND_DEADLINE_SEC = float(os.getenv("OUTBOUND_DEADLINE_SEC", "2"))
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+_outbound: Optional[OutboundDispatcher] = None
+
+def get_outbound() -> OutboundDispatcher:
+    """
+    Process-wide outbound dispatcher, created on first use (not at import:
+    spawned finalizer processes re-import this module and never need one)
+    """
+    global _outbound
+    if _outbound is None:
+        _outbound = OutboundDispatcher(max_workers=OUTBOUND_WORKERS)
+    return _outbound
+
+# Live KPI snapshot: fixed-layout memory-mapped file republished after every
+# batch and minute flush, read by the backend without touching SQLite
+LIVE_SNAPSHOT = bool(int(os.getenv("LIVE_SNAPSHOT", "1")))
+LIVE_SNAPSHOT_PATH = os.path.join(SERVER_DIR, os.getenv("LIVE_SNAPSHOT_PATH", os.path.join("db", "live_snapshot.bin")))
+LIVE_ROLLING_MINUTES = int(os.getenv("LIVE_ROLLING_MINUTES", "5"))
+
+def _log_gate_reset_result(gate: int):
+    def on_done(future):
+        try:
+            r = future.result()
+            r.raise_for_status()
+            log.info(f"Gate {gate} reset successful", category='operations', action='gate_reset')
+        except requests.exceptions.HTTPError as e:
+            log.error(f"HTTP error resetting gate {gate}: {e.response.status_code}", exc=e)
+        except requests.exceptions.ConnectionError as e:
+            log.error(f"Connection error resetting gate {gate}", exc=e)
+        except Exception as e:
+            log.error(f"Failed to reset gate {gate}", exc=e)
+    return on_done
+
 def notify_gate_reset(gate: int, ts_iso: str | None = None) -> None:
     """
     Tell the Node server the batch for `gate` completed so it can:
       - reset in-memory overlay to 0
       - broadcast SSE 'gate' with zeros
       - persist a 0 row to M2 (gate_state)
+
+    Non-blocking: queued on the outbound dispatcher. A reset for the same gate
+    that is still queued is coalesced (latest timestamp wins).
     """
     if ts_iso is None:
         ts_iso = datetime.now(timezone.utc).isoformat()
@@ -76,24 +153,18 @@ def notify_gate_reset(gate: int, ts_iso: str | None = None) -> None:
     payload = {"gate": int(gate), "timestamp": ts_iso}
     log.debug(f"Resetting gate {gate}", category='operations', action='gate_reset')
     
-    try:
-        r = requests.post(
-            BATCHER_RESET_URL,
-            headers={
-                "x-plc-secret": PLC_SHARED_SECRET,
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=2.0,
-        )
-        r.raise_for_status()
-        log.info(f"Gate {gate} reset successful", category='operations', action='gate_reset')
-    except requests.exceptions.HTTPError as e:
-        log.error(f"HTTP error resetting gate {gate}: {e.response.status_code}", exc=e)
-    except requests.exceptions.ConnectionError as e:
-        log.error(f"Connection error resetting gate {gate}", exc=e)
-    except Exception as e:
-        log.error(f"Failed to reset gate {gate}", exc=e)
+    get_outbound().submit(
+        'POST',
+        BATCHER_RESET_URL,
+        headers={
+            "x-plc-secret": PLC_SHARED_SECRET,
+            "Content-Type": "application/json",
+        },
+        json=payload,
+        deadline=OUTBOUND_DEADLINE_SEC,
+        coalesce_key=f"gate_reset:{int(gate)}",
+        on_done=_log_gate_reset_result(gate),
+    )
 
 # InfluxDB Line Protocol Helpers (exact copy from Node.js import-csv-to-influx.js)
 def escape_tag(s):
@@ -218,58 +289,130 @@ def generate_recipe_name(piece_min, piece_max, batch_min, batch_max, bc_min, bc_
 
 @dataclass
 class PieceData:
-    """Single piece"""
-    timestamp: datetime
+    """Single piece (ts_ns = epoch nanoseconds)"""
+    ts_ns: int
     weight_g: float
     gate: int
     piece_id: Optional[str] = None
 
 @dataclass
 class BatchEvent:
-    """Batch completion event"""
-    timestamp: datetime
+    """Batch completion event (ts_ns = epoch nanoseconds)"""
+    ts_ns: int
     gate: int
     weight_g: float
     piece_count: int
 
 @dataclass
 class GateState:
-    """Current accumulation state for a gate"""
+    """
+    In-flight batch on a gate: pieces seen on the piece stream since the gate's
+    last batch_completions row (closed_at_ns). Pieces at or before that time
+    belong to a closed batch even if the piece poll delivers them late.
+    In pushdown mode only the count / weight are kept (set_totals).
+    """
     gate: int
     recipe_id: Optional[int] = None
     pieces: List[PieceData] = field(default_factory=list)
+    piece_count: int = 0
     total_weight: float = 0.0
+    closed_at_ns: int = 0
+    
+    @property
+    def in_flight(self) -> bool:
+        return self.piece_count > 0
+    
+    def add_piece(self, piece: PieceData):
+        if piece.ts_ns <= self.closed_at_ns:
+            return
+        if len(self.pieces) >= GATE_INFLIGHT_MAX_PIECES:
+            # No completion for far longer than any batch - keep memory bounded
+            dropped = self.pieces[:GATE_INFLIGHT_MAX_PIECES // 2]
+            del self.pieces[:GATE_INFLIGHT_MAX_PIECES // 2]
+            self.total_weight -= sum(p.weight_g for p in dropped)
+        self.pieces.append(piece)
+        self.piece_count = len(self.pieces)
+        self.total_weight += piece.weight_g
+    
+    def set_totals(self, piece_count: int, total_weight: float):
+        """Pushdown: in-flight count / weight aggregated by the piece store since closed_at_ns"""
+        self.piece_count = piece_count
+        self.total_weight = total_weight
+    
+    def close(self, ts_ns: int):
+        """Batch completed at ts_ns: drop the pieces it contained, keep any later ones"""
+        self.closed_at_ns = max(self.closed_at_ns, ts_ns)
+        self.pieces = [p for p in self.pieces if p.ts_ns > self.closed_at_ns]
+        self.piece_count = len(self.pieces)
+        self.total_weight = sum(p.weight_g for p in self.pieces)
     
     def reset(self):
-        """Reset after batch completion"""
+        """Discard the in-flight batch"""
         self.pieces = []
+        self.piece_count = 0
         self.total_weight = 0.0
 
 @dataclass
 class MinuteAccumulator:
-    """Accumulates data for a specific minute"""
-    minute_start: datetime
+    """Accumulates data for a specific minute (epoch minute = ts_ns // NS_PER_MINUTE)"""
+    minute: int
     pieces_by_gate: Dict[int, List[PieceData]] = field(default_factory=lambda: defaultdict(list))
     batches_by_gate: Dict[int, List[BatchEvent]] = field(default_factory=lambda: defaultdict(list))
+    gate_totals: Optional[Dict[int, Tuple[int, float]]] = None  # pushdown: gate -> (count, weight_g)
+    rejects_by_recipe: Dict[int, List] = field(default_factory=lambda: defaultdict(lambda: [0, 0.0]))  # recipe_id -> [count, weight_g]
     
     def add_piece(self, piece: PieceData):
         self.pieces_by_gate[piece.gate].append(piece)
     
+    def add_reject(self, recipe_id: int, weight_g: float):
+        """Piece eligible for recipe_id (within its piece bounds) that went to another gate"""
+        counts = self.rejects_by_recipe[recipe_id]
+        counts[0] += 1
+        counts[1] += weight_g
+    
+    def weight_histogram(self, gates) -> Optional[WeightHistogram]:
+        """Weight histogram of the given gates' pieces (None if no pieces), binned in one pass at minute close"""
+        weights = [p.weight_g for gate in gates for p in self.pieces_by_gate.get(gate, ())]
+        if not weights:
+            return None
+        hist = WeightHistogram()
+        hist.add_many(weights)
+        return hist
+    
     def add_batch(self, batch: BatchEvent):
         self.batches_by_gate[batch.gate].append(batch)
     
+    def gate_count_weight(self, gate: int) -> Tuple[int, float]:
+        """(piece count, weight sum) for a gate - pushdown totals if set, else raw pieces"""
+        if self.gate_totals is not None:
+            return self.gate_totals.get(gate, (0, 0.0))
+        pieces = self.pieces_by_gate.get(gate, [])
+        return len(pieces), sum(p.weight_g for p in pieces)
+    
+    def piece_gates(self) -> List[int]:
+        """Gates that received pieces this minute"""
+        if self.gate_totals is not None:
+            return list(self.gate_totals.keys())
+        return [g for g, pieces in self.pieces_by_gate.items() if pieces]
+    
     def has_data(self) -> bool:
-        """Check if accumulator has any pieces or batches"""
-        return bool(self.pieces_by_gate) or bool(self.batches_by_gate)
+        """
+        Check if accumulator has any pieces or batches. Without raw pieces a
+        pushdown minute may have pieces until its query totals are applied.
+        """
+        if not M3_RAW_PIECES and self.gate_totals is None:
+            return True
+        return bool(self.piece_gates()) or bool(self.batches_by_gate)
 
 # ========== SQLite Helper Functions for M3/M4 ==========
+# Writers take the epoch minute (int); ISO strings are only formatted here at the sink.
 
-def write_m3_per_recipe_sqlite(sqlite_conn, timestamp, recipe_name, program_id, 
+def write_m3_per_recipe_sqlite(sqlite_conn, minute, recipe_name, program_id, 
                                  batches_min, giveaway_pct, pieces_processed, 
                                  weight_processed_g, rejects_per_min=0, 
                                  total_rejects_count=0, total_rejects_weight_g=0.0):
     """Write M3 per-recipe KPI to SQLite"""
-    ts_str = timestamp.isoformat()
+    ts_str = minute_to_iso(minute)
     sqlite_conn.execute("""
         INSERT OR REPLACE INTO kpi_minute_recipes (
             timestamp, recipe_name, program_id, batches_min, giveaway_pct,
@@ -281,11 +424,11 @@ def write_m3_per_recipe_sqlite(sqlite_conn, timestamp, recipe_name, program_id,
           total_rejects_count, total_rejects_weight_g))
     sqlite_conn.commit()
 
-def write_m3_combined_sqlite(sqlite_conn, timestamp, batches_min, giveaway_pct,
+def write_m3_combined_sqlite(sqlite_conn, minute, batches_min, giveaway_pct,
                                pieces_processed, weight_processed_g, rejects_per_min,
                                total_rejects_count, total_rejects_weight_g):
     """Write M3 combined (total) KPI to SQLite"""
-    ts_str = timestamp.isoformat()
+    ts_str = minute_to_iso(minute)
     sqlite_conn.execute("""
         INSERT OR REPLACE INTO kpi_minute_combined (
             timestamp, batches_min, giveaway_pct, pieces_processed,
@@ -297,34 +440,84 @@ def write_m3_combined_sqlite(sqlite_conn, timestamp, batches_min, giveaway_pct,
           total_rejects_weight_g))
     sqlite_conn.commit()
 
-def write_m4_totals_sqlite(sqlite_conn, timestamp, recipe_name, program_id,
+def write_m4_totals_sqlite(sqlite_conn, minute, recipe_name, program_id,
                              total_batches, giveaway_g_per_batch, giveaway_pct_avg):
-    """Write M4 cumulative totals to SQLite"""
-    ts_str = timestamp.isoformat()
+    """Write M4 cumulative totals to SQLite (upsert on program, recipe, minute)"""
+    ts_str = minute_to_iso(minute)
     sqlite_conn.execute("""
         INSERT INTO kpi_totals (
             timestamp, recipe_name, program_id, total_batches,
             giveaway_g_per_batch, giveaway_pct_avg
         ) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(program_id, recipe_name, timestamp) DO UPDATE SET
+            total_batches = excluded.total_batches,
+            giveaway_g_per_batch = excluded.giveaway_g_per_batch,
+            giveaway_pct_avg = excluded.giveaway_pct_avg
     """, (ts_str, recipe_name, program_id, total_batches,
           giveaway_g_per_batch, giveaway_pct_avg))
     sqlite_conn.commit()
 
+def write_dwell_sketch_sqlite(sqlite_conn, program_id, gate, sketch: QuantileSketch):
+    """Upsert the dwell-time quantile sketch for (program, gate) - caller commits"""
+    sqlite_conn.execute("""
+        INSERT INTO gate_dwell_sketches (program_id, gate_number, sample_count, sketch, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(program_id, gate_number) DO UPDATE SET
+            sample_count = excluded.sample_count,
+            sketch = excluded.sketch,
+            updated_at = CURRENT_TIMESTAMP
+    """, (program_id, gate, sketch.count, sketch.to_bytes()))
+
+def write_piece_weight_sketch_sqlite(sqlite_conn, minute, recipe_name, program_id,
+                                     sketch: QuantileSketch):
+    """Write the per-minute piece weight quantile sketch for a recipe"""
+    ts_str = minute_to_iso(minute)
+    sqlite_conn.execute("""
+        INSERT OR REPLACE INTO piece_weight_sketches (
+            program_id, recipe_name, timestamp, sample_count, sketch
+        ) VALUES (?, ?, ?, ?, ?)
+    """, (program_id, recipe_name, ts_str, sketch.count, sketch.to_bytes()))
+    sqlite_conn.commit()
+
+def write_weight_histogram_sqlite(sqlite_conn, minute, program_id, scope, recipe_name,
+                                  hist: WeightHistogram):
+    """Write a per-minute piece weight histogram blob (scope 'gate0' or 'recipe')"""
+    ts_str = minute_to_iso(minute)
+    sqlite_conn.execute("""
+        INSERT OR REPLACE INTO piece_weight_histograms (
+            program_id, timestamp, scope, recipe_name, sample_count, counts
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """, (program_id, ts_str, scope, recipe_name, hist.total, hist.to_bytes()))
+    sqlite_conn.commit()
+
 class LiveWorker:
     """Full-featured live mode worker - M3/M4 KPI calculations only"""
     
-    def __init__(self):
+    def __init__(self, piece_store: Optional[PieceStore] = None):
+        """
+        Args:
+            piece_store: M1 piece source; defaults to InfluxDB 3 (created in connect()).
+                         Pass an ArrowPieceStore to run without InfluxDB.
+        """
+        self.piece_store = piece_store
         self.influx_client = None
         self.sqlite_conn = None
+        self.finalizer: Optional[ProgramFinalizer] = None
         self.running = False
         
         # Machine state client
-        self.machine_client = MachineStateClient(BACKEND_URL)
+        self.machine_client = MachineStateClient(BACKEND_URL, outbound=get_outbound())
         self.machine_state = "idle"  # idle, running, paused, transitioning
         self.paused = False
         self.transitioning = False
         self.was_paused_before_transition = False  # Track if transition started from paused state
         self.gates_to_finish = set()  # Gates that need to finish current batch during transition
+        self.transition_pending_gates: Set[int] = set()  # gates_to_finish still holding an open batch
+        self.transition_started_ns: Optional[int] = None
+        self.transition_closed_ns: Optional[int] = None  # when the last pending gate closed
+        self.transition_latency_sketch = QuantileSketch()  # seconds, transition start → backend notified
+        self.last_piece_poll = 0.0  # time.monotonic() of the last piece poll
+        self.last_transition_batch_poll = 0.0  # time.monotonic() of the last batch_completions read while transitioning
         
         # HTTP headers for backend API calls
         self.headers = {
@@ -345,17 +538,33 @@ class LiveWorker:
         
         # Live state
         self.gate_states: Dict[int, GateState] = {}
-        self.last_processed_time = None
+        self.last_processed_time: Optional[int] = None  # epoch ns of last poll
         self.processed_piece_ids: set = set()  # Deduplicate pieces across polls
         self.processed_minutes: set = set()  # Track processed minutes to prevent duplicates
-        self.current_minute = None
+        self.current_minute: Optional[int] = None  # epoch minute
         self.minute_accumulator = None
+        self.pushdown_pending: List[MinuteAccumulator] = []  # closed minutes awaiting Influx totals
+        self.pushdown_retry_at: Optional[int] = None  # epoch ns; back off after a failed query
         
         # M4 data tracking (cumulative totals per recipe)
         self.m4_cumulative: Dict[int, Dict[str, float]] = {}  # recipe_id -> {total_batches, cum_actual, cum_give}
+        self.m4_emitter = M4Emitter()  # change-only kpi_totals emission (M4_EMIT_MODE)
+        
+        # Per-recipe eligible rejects, attributed as pieces are polled (same definition as
+        # program_stats: within the recipe's piece bounds, on a gate not assigned to it)
+        self.recipe_rejects_cum: Dict[int, List] = defaultdict(lambda: [0, 0.0])  # recipe_id -> [count, weight_g]
+        self.reject_index: Optional[IntervalIndex] = None
+        self.reject_index_gates: Dict[int, int] = {}  # gate_to_recipe the index was built for
+        self.recipe_gates: Dict[int, frozenset] = {}  # recipe_id -> assigned gates
+        
+        # Live snapshot (shared-memory KPIs) and rolling M3 windows feeding it
+        self.snapshot_writer: Optional[LiveSnapshotWriter] = None
+        self.rolling_by_recipe: Dict[int, RollingWindow] = {}
+        self.rolling_combined = RollingWindow(LIVE_ROLLING_MINUTES)
         
         # Gate dwell time tracking (last batch timestamp per gate)
-        self.last_batch_time: Dict[int, datetime] = {}  # gate -> last batch timestamp
+        self.last_batch_time: Dict[int, int] = {}  # gate -> last batch timestamp (epoch ns)
+        self.dwell_sketches: Dict[int, QuantileSketch] = {}  # gate -> dwell quantile sketch (current program)
         
         # No time shifting needed - timestamps are already current time from simulator/C# app
         
@@ -378,36 +587,41 @@ class LiveWorker:
         """Connect to databases"""
         log.info("Connecting to databases")
         
-        if not INFLUX_TOKEN:
-            log.error("INFLUXDB3_AUTH_TOKEN not set")
-            sys.exit(1)
-        
-        self.influx_client = InfluxDBClient3(
-            host=INFLUX_HOST,
-            token=INFLUX_TOKEN,
-            database=INFLUX_DB
-        )
-        log.item("InfluxDB", INFLUX_HOST)
+        if self.piece_store is None:
+            if not INFLUX_TOKEN:
+                log.error("INFLUXDB3_AUTH_TOKEN not set")
+                sys.exit(1)
+            
+            influx_config = {'host': INFLUX_HOST, 'token': INFLUX_TOKEN, 'database': INFLUX_DB}
+            self.influx_client = InfluxDBClient3(**influx_config)
+            self.piece_store = InfluxPieceStore(self.influx_client)
+            self.finalizer = ProgramFinalizer(SQLITE_DB, influx_config=influx_config)
+            log.item("InfluxDB", INFLUX_HOST)
+        else:
+            self.finalizer = ProgramFinalizer(SQLITE_DB, piece_store=self.piece_store)
+            log.item("Piece store", type(self.piece_store).__name__)
         
-        self.sqlite_conn = sqlite3.connect(SQLITE_DB)
+        self.sqlite_conn = sqlite_connect(SQLITE_DB)
         self.sqlite_conn.row_factory = sqlite3.Row
         log.item("SQLite", SQLITE_DB)
+        
+        if LIVE_SNAPSHOT:
+            try:
+                self.snapshot_writer = LiveSnapshotWriter(LIVE_SNAPSHOT_PATH)
+                log.item("Live snapshot", LIVE_SNAPSHOT_PATH)
+            except Exception as e:
+                log.warning(f"Live snapshot disabled: {e}")
     
     def recover_incomplete_programs(self):
         """
         Recover programs that were interrupted by worker crash/restart.
-        Finds programs with no end_ts and completes their stats calculation.
+        Finds programs with no end_ts, or whose finalisation was still queued /
+        running, and queues their stats calculation on the background finalizer.
         """
         log.section("Checking for Incomplete Programs")
         
         try:
-            # Find programs with no end_ts (incomplete)
-            incomplete = self.sqlite_conn.execute("""
-                SELECT program_id, start_ts
-                FROM program_stats
-                WHERE end_ts IS NULL
-                ORDER BY start_ts DESC
-            """).fetchall()
+            incomplete = unfinished_programs(self.sqlite_conn)
             
             if not incomplete:
                 log.info("No incomplete programs found")
@@ -416,8 +630,14 @@ class LiveWorker:
             log.warning(f"Found {len(incomplete)} incomplete program(s)")
             
             for prog in incomplete:
-                program_id = prog[0]
-                start_ts = prog[1]
+                program_id = prog['program_id']
+                start_ts = prog['start_ts']
+                
+                if prog['end_ts'] is not None:
+                    # Ended, but finalisation didn't finish before the restart
+                    log.info(f"Resuming finalisation of program {program_id} ({prog['finalize_status']})")
+                    self.calculate_and_write_program_totals(program_id, start_ts, prog['end_ts'])
+                    continue
                 
                 # Get program name
                 prog_info = self.sqlite_conn.execute("""
@@ -454,7 +674,7 @@ class LiveWorker:
                         start_ts=start_ts,
                         end_ts=end_ts
                     )
-                    log.success(f"Recovered program {program_id}")
+                    log.success(f"Queued recovery of program {program_id}")
                     
                 except Exception as e:
                     log.error(f"Error recovering program {program_id}: {e}", exc=e)
@@ -474,18 +694,23 @@ class LiveWorker:
             log.error(f"Error in recover_incomplete_programs: {e}", exc=e)
         
     def disconnect(self):
-        if self.influx_client:
-            self.influx_client.close()
+        if self.finalizer:
+            self.finalizer.shutdown()
+        if self.piece_store:
+            self.piece_store.close()
         if self.sqlite_conn:
             self.sqlite_conn.close()
+        if self.snapshot_writer:
+            self.snapshot_writer.close()
     
     # =====================================================================
     # MACHINE STATE MANAGEMENT
     # =====================================================================
     
-    def poll_machine_state(self):
-        """Poll backend for machine state changes and program_id drift"""
-        state = self.machine_client.get_state()
+    def poll_machine_state(self, state: Optional[Dict] = None):
+        """Poll backend (or apply a pushed state) for machine state changes and program_id drift"""
+        if state is None:
+            state = self.machine_client.get_state()
         if not state:
             return
         
@@ -497,6 +722,7 @@ class LiveWorker:
             log.info(f"[MachineState] {self.machine_state} → {new_state}")
             self.handle_state_change(self.machine_state, new_state, state)
             self.machine_state = new_state
+            self.publish_live_snapshot()
         
         # Detect program_id drift: backend restarted or program changed
         # while the state name stayed the same (e.g. running → running).
@@ -510,7 +736,7 @@ class LiveWorker:
                      f"{self.program_id} → {backend_program_id}  "
                      f"(state='{new_state}')")
             # Flush any pending KPIs for the old program
-            if self.minute_accumulator and self.minute_accumulator.has_data():
+            if self.has_pending_kpis():
                 self.process_minute_kpis()
             self.start_program(backend_program_id, active_recipes)
             if new_state == 'paused':
@@ -561,7 +787,7 @@ class LiveWorker:
             log.info("  Machine stopped - flushing KPIs and clearing state")
             
             # Flush any pending KPIs before clearing state
-            if self.minute_accumulator and self.minute_accumulator.has_data():
+            if self.has_pending_kpis():
                 log.info("  Flushing pending KPIs before stop...")
                 self.process_minute_kpis()
             
@@ -606,21 +832,24 @@ class LiveWorker:
             self.gate_states[gate] = GateState(gate, self.gate_to_recipe[gate])
         
         # Reset minute accumulator
-        self.current_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        self.current_minute = minute_of(now_ns())
         self.minute_accumulator = MinuteAccumulator(self.current_minute)
         
         # Reset M4 cumulative
         self.m4_cumulative.clear()
+        self.m4_emitter.reset()
         
         # Reset batch polling cursor for new program
         self.last_batch_id_processed = 0
         
         # Reset gate dwell time tracking
         self.last_batch_time = {}
+        self.dwell_sketches = {}
         
         # Reset reject counters for new program
         self.total_rejects_count = 0
         self.total_rejects_weight = 0.0
+        self.recipe_rejects_cum.clear()
         log.info(f"Reset reject counters for program {program_id}")
         
         # Reset piece deduplication set for new program
@@ -628,6 +857,11 @@ class LiveWorker:
         
         # Reset processed minutes set for new program
         self.processed_minutes: set = set()
+        
+        # Reset rolling windows and publish the empty program
+        self.rolling_by_recipe.clear()
+        self.rolling_combined = RollingWindow(LIVE_ROLLING_MINUTES)
+        self.publish_live_snapshot()
     
     def reload_gate_to_recipe(self, active_recipes):
         """Reload gate_to_recipe mapping without resetting other state
@@ -675,17 +909,66 @@ class LiveWorker:
     
     def identify_gates_to_finish(self, state_data):
         """Identify which gates have in-progress batches during transition"""
-        # Compare current recipes with program start recipes
-        current_recipes = state_data.get('activeRecipes', [])
-        program_start_recipes = state_data.get('programStartRecipes', [])
-        
-        comparison = self.machine_client.compare_recipes(program_start_recipes, current_recipes)
+        # Compare current recipes with program start recipes (cached per state version)
+        comparison = self.machine_client.transition_recipe_changes(state_data)
         
         # Gates that changed or were removed need to finish their batches
         self.gates_to_finish = set(comparison['gates_changed'] + comparison['gates_removed'])
         
         log.info(f"Gates to finish batches: {self.gates_to_finish}")
         log.info(f"Gates to add: {comparison['gates_added']}")
+        
+        # Only gates with an open batch need to close before the transition can complete
+        self.transition_started_ns = now_ns()
+        self.transition_closed_ns = None
+        self.last_transition_batch_poll = 0.0  # read batch_completions on the first transition loop
+        self.transition_pending_gates = {
+            gate for gate in self.gates_to_finish
+            if gate in self.gate_states and self.gate_states[gate].in_flight
+        }
+        if self.transition_pending_gates:
+            log.info(f"Waiting for open batches on gates {sorted(self.transition_pending_gates)}")
+        else:
+            self.transition_closed_ns = self.transition_started_ns
+    
+    def on_gate_batch_closed(self, gate: int, ts_ns: int):
+        """A batch_completions row closed `gate`'s in-flight batch"""
+        state = self.gate_states.get(gate)
+        if state is not None:
+            state.close(ts_ns)
+        
+        # The batch that was open when the transition started is done; pieces
+        # after it belong to the gate's next recipe and don't hold the transition
+        if not self.transitioning or gate not in self.transition_pending_gates:
+            return
+        
+        self.transition_pending_gates.discard(gate)
+        if not self.transition_pending_gates:
+            self.transition_closed_ns = now_ns()
+            waited_ms = (self.transition_closed_ns - self.transition_started_ns) / 1e6
+            log.info(f"[Transition] Gate {gate} closed the last open batch after {waited_ms:.0f}ms")
+    
+    def poll_transition_progress(self):
+        """
+        Keep processing while transitioning: new pieces extend open batches
+        and count towards the old program's KPIs like any other piece, and
+        batch_completions rows close the open batches.
+        
+        The loop wakes every 50ms, but pieces are polled at the normal
+        PIECE_POLL_INTERVAL_SEC and batch_completions is only read when the
+        backend pushed a batch event (or every TRANSITION_BATCH_FALLBACK_SEC
+        without one, e.g. while the stream is down).
+        """
+        now = time.monotonic()
+        if now - self.last_piece_poll >= PIECE_POLL_INTERVAL_SEC:
+            self.last_piece_poll = now
+            self.poll_pieces()
+        
+        batch_pushed = self.machine_client.consume_batch_event()
+        if batch_pushed or now - self.last_transition_batch_poll >= TRANSITION_BATCH_FALLBACK_SEC:
+            self.last_transition_batch_poll = now
+            for batch in self.poll_completed_batches():
+                self.process_completed_batch(batch)
     
     def check_transition_complete(self):
         """Check if all gates have finished their batches during transition"""
@@ -699,17 +982,12 @@ class LiveWorker:
             # Clear partial batches from affected gates
             for gate in self.gates_to_finish:
                 if gate in self.gate_states:
-                    self.gate_states[gate].pieces.clear()
-                    self.gate_states[gate].total_weight = 0
+                    self.gate_states[gate].reset()
             return True
         
-        # Check if all gates_to_finish have no pending pieces
-        for gate in self.gates_to_finish:
-            if gate in self.gate_states:
-                gate_state = self.gate_states[gate]
-                if len(gate_state.pieces) > 0 or gate_state.total_weight > 0:
-                    # Still has pending batch
-                    return False
+        # Complete once every gate that had an open batch has closed it
+        if self.transition_pending_gates:
+            return False
         
         # All gates finished - transition complete
         log.info(f"[Transition] All batches completed on gates {self.gates_to_finish}")
@@ -723,17 +1001,15 @@ class LiveWorker:
         
         # Write final KPIs
         kpi_start = _time.time()
-        if self.minute_accumulator and self.minute_accumulator.has_data():
+        if self.has_pending_kpis():
             self.process_minute_kpis()
         log.debug(f"  KPI write took {(_time.time() - kpi_start) * 1000:.0f}ms")
         
-        # Get backend state to determine action
+        # Get backend state to determine action (304 + cached parse if unchanged)
         state = self.machine_client.get_state()
-        current_recipes = state.get('activeRecipes', [])
-        program_start_recipes = state.get('programStartRecipes', [])
         
-        # Determine if this is a stop or recipe change
-        recipes_changed = json.dumps(current_recipes) != json.dumps(program_start_recipes)
+        # Determine if this is a stop or recipe change (cached per state version)
+        recipes_changed = self.machine_client.recipes_changed_since_start(state)
         action = 'recipe_change' if recipes_changed else 'stop'
         
         # Notify backend (this is where stats calculation happens)
@@ -758,13 +1034,15 @@ class LiveWorker:
                     self.gate_states.clear()
                     self.gate_to_recipe.clear()
                     self.last_batch_time.clear()
+                    self.dwell_sketches.clear()
                     self.m4_cumulative.clear()
+                    self.m4_emitter.reset()
                     self.last_batch_id_processed = 0
                     self.processed_minutes.clear()
                     self.processed_piece_ids.clear()
                     
                     # FLUSH pending KPIs for the OLD program before resetting
-                    if self.minute_accumulator and self.minute_accumulator.has_data():
+                    if self.has_pending_kpis():
                         log.info("  Flushing pending KPIs for old program before transition...")
                         self.process_minute_kpis()
                     
@@ -774,7 +1052,7 @@ class LiveWorker:
                     log.info("  Reset reject counters for new program")
                     
                     # Reset minute accumulator for new program
-                    self.current_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+                    self.current_minute = minute_of(now_ns())
                     self.minute_accumulator = MinuteAccumulator(self.current_minute)
                     
                     # Start the new program
@@ -796,10 +1074,24 @@ class LiveWorker:
                 log.info("  Reset reject counters")
                 log.debug(f"  Total stop transition took {(_time.time() - transition_start) * 1000:.0f}ms")
         
+        # Transition latency: entering 'transitioning' → backend notified
+        if self.transition_started_ns is not None:
+            total_sec = (now_ns() - self.transition_started_ns) / NS_PER_SEC
+            self.transition_latency_sketch.add(total_sec)
+            closed_sec = ((self.transition_closed_ns or self.transition_started_ns)
+                          - self.transition_started_ns) / NS_PER_SEC
+            log.info(f"  Transition latency: {total_sec * 1000:.0f}ms "
+                     f"(waiting for batches {closed_sec * 1000:.0f}ms)",
+                     category='operations', action='transition_latency',
+                     latency_ms=round(total_sec * 1000, 1), batch_wait_ms=round(closed_sec * 1000, 1))
+        
         # Reset transition state
         self.transitioning = False
         self.was_paused_before_transition = False
         self.gates_to_finish.clear()
+        self.transition_pending_gates.clear()
+        self.transition_started_ns = None
+        self.transition_closed_ns = None
     
     def get_recipe_id_by_name(self, recipe_name):
         """Find recipe_id from recipe name"""
@@ -1034,6 +1326,7 @@ class LiveWorker:
             
             # Reset M4 cumulative data for new program
             self.m4_cumulative = {}
+            self.m4_emitter.reset()
             
             # Reset reject counters for new program
             self.total_rejects_count = 0
@@ -1042,390 +1335,42 @@ class LiveWorker:
             
             # Reset gate dwell time tracking for new program
             self.last_batch_time = {}
+            self.dwell_sketches = {}
             self.last_batch_id_processed = 0  # Reset batch polling cursor
             log.info("  Reset gate dwell time tracking for new program")
             
             log.info(f"  Applied program {program_id} with {len(gate_assignments)} gate assignments")
             
-            # Notify backend to reload recipe assignments
-            try:
-                reload_url = f"{BACKEND_URL}/api/ingest/reload-assignments"
-                resp = requests.post(reload_url, headers=self.headers, timeout=2)
-                if resp.status_code == 200:
-                    log.info("  Backend reloaded assignments")
-                else:
-                    log.warning(f"  Backend reload failed: {resp.status_code}")
-            except Exception as e:
-                log.warning(f"  Failed to notify backend: {e}")
+            # Notify backend to reload recipe assignments (non-blocking, coalesced)
+            get_outbound().submit(
+                'POST',
+                f"{BACKEND_URL}/api/ingest/reload-assignments",
+                headers=self.headers,
+                deadline=OUTBOUND_DEADLINE_SEC,
+                coalesce_key="reload_assignments",
+                on_done=self._log_reload_result,
+            )
             
         except Exception as e:
             log.warning(f"  Error applying program assignment: {e}")
     
-    def calculate_and_write_program_totals(self, program_id: int, start_ts: str, end_ts: str):
-        """
-        Calculate program and recipe totals for the completed program period.
-        Implements the logic from one_time_import.py compute_window_kpis().
-        
-        This queries the batch_completions table to get all batches for this program,
-        then calculates filled batch equivalents and giveaway per recipe.
-        """
+    @staticmethod
+    def _log_reload_result(future):
         try:
-            log.info(f"Calculating totals for Program {program_id} ({start_ts} to {end_ts})")
-            
-            # Get all batches for this program from batch_completions table
-            batches_query = """
-                SELECT id, gate, weight_g, pieces, completed_at
-                FROM batch_completions
-                WHERE completed_at >= ? AND completed_at < ?
-                ORDER BY completed_at
-            """
-            batches = self.sqlite_conn.execute(batches_query, (start_ts, end_ts)).fetchall()
-            
-            if not batches:
-                # IMPORTANT: Still set end_ts to mark program as complete!
-                self.sqlite_conn.execute("""
-                    UPDATE program_stats
-                    SET end_ts = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE program_id = ?
-                """, (end_ts, program_id))
-                self.sqlite_conn.commit()
-                return
-            
-            log.info(f"  Processing {len(batches)} batches")
-            
-            # Build a mapping of gates to recipes for this program
-            # Try method 1: Get from run_configs directly for this program
-            config_row = self.sqlite_conn.execute("""
-                SELECT id FROM run_configs 
-                WHERE program_id = ? 
-                ORDER BY id DESC 
-                LIMIT 1
-            """, (program_id,)).fetchone()
-            
-            if config_row:
-                config_id = config_row[0]
-                log.info(f"  Found run_config {config_id} for program {program_id}")
+            resp = future.result()
+            if resp.status_code == 200:
+                log.info("  Backend reloaded assignments")
             else:
-                # Method 2: For live programs without run_configs (crash before config creation),
-                # try to reconstruct assignments from batch_completions.recipe_id
-                log.warning(f"  No run_config found for program {program_id}, attempting reconstruction...")
-                
-                # Get unique recipe_id and gate combinations from batch_completions
-                recon_query = """
-                    SELECT DISTINCT gate, recipe_id
-                    FROM batch_completions
-                    WHERE program_id = ? AND recipe_id IS NOT NULL
-                    ORDER BY gate
-                """
-                recon_rows = self.sqlite_conn.execute(recon_query, (program_id,)).fetchall()
-                
-                if not recon_rows:
-                    log.error("  Cannot reconstruct - no batch completions with recipe_id found")
-                    log.warning(f"  Marking program {program_id} as ended without stats")
-                    # Just set end_ts and return
-                    self.sqlite_conn.execute("""
-                        UPDATE program_stats
-                        SET end_ts = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE program_id = ?
-                    """, (end_ts, program_id))
-                    self.sqlite_conn.commit()
-                    return
-                
-                # Create temporary config from reconstructed data
-                log.info(f"  Reconstructed {len(recon_rows)} gate assignments from batches:")
-                config_id = None  # Will use reconstructed mapping directly
-                
-                # Build mappings from reconstructed data
-                gate_to_recipe_id = {}
-                gate_to_recipe_name = {}
-                recipe_id_to_gates = defaultdict(list)
-                
-                for gate_num, recipe_id in recon_rows:
-                    # Get recipe name
-                    recipe_row = self.sqlite_conn.execute("SELECT name FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
-                    recipe_name = recipe_row[0] if recipe_row else f"Unknown_{recipe_id}"
-                    
-                    gate_to_recipe_id[gate_num] = recipe_id
-                    gate_to_recipe_name[gate_num] = recipe_name
-                    recipe_id_to_gates[recipe_id].append(gate_num)
-                    log.info(f"      Gate {gate_num} → {recipe_name} (ID: {recipe_id}) [reconstructed]")
-            
-            # Get gate assignments from config (if config_id exists)
-            if config_id is not None:
-                assignments_query = """
-                    SELECT rca.gate_number, rca.recipe_id, r.name
-                    FROM run_config_assignments rca
-                    JOIN recipes r ON r.id = rca.recipe_id
-                    WHERE rca.config_id = ?
-                """
-                assignments_rows = self.sqlite_conn.execute(assignments_query, (config_id,)).fetchall()
-                
-                gate_to_recipe_id = {}
-                gate_to_recipe_name = {}
-                recipe_id_to_gates = defaultdict(list)
-                
-                log.info(f"  Found {len(assignments_rows)} gate assignments at {start_ts}")
-                for gate_num, recipe_id, recipe_name in assignments_rows:
-                    gate_to_recipe_id[gate_num] = recipe_id
-                    gate_to_recipe_name[gate_num] = recipe_name
-                    recipe_id_to_gates[recipe_id].append(gate_num)
-                    log.info(f"      Gate {gate_num} → {recipe_name} (ID: {recipe_id})")
-            
-            if not gate_to_recipe_id:
-                log.warning(f"  No recipe assignments found for program {program_id}")
-                return
-            
-            # Show which gates are assigned
-            assigned_gates = set(gate_to_recipe_id.keys())
-            batch_gates = set(b[1] for b in batches)
-            unassigned_gates = batch_gates - assigned_gates
-            if unassigned_gates:
-                unassigned_count = sum(1 for b in batches if b[1] in unassigned_gates)
-                log.info(f"  Skipping {unassigned_count} batches from unassigned gates: {sorted(unassigned_gates)}")
-            
-            # Calculate per-recipe totals using filled batch equivalent logic
-            per_recipe_totals = {}
-            total_filled = 0.0
-            total_w_batched = 0.0
-            total_w_give = 0.0
-            
-            for recipe_id, gates in recipe_id_to_gates.items():
-                recipe_name = gate_to_recipe_name[gates[0]]
-                
-                # Parse recipe spec from name
-                try:
-                    _, x, y, xx, yy, xxx, yyy = recipe_name.split('_', 6)
-                    lo_p, hi_p = int(x), int(y)
-                    lo_b, hi_b = int(xx), int(yy)
-                    bc_type = None if xxx == 'NA' else xxx
-                    bc_val = None if yyy in ('NA', '', None) else int(float(yyy))
-                except Exception:
-                    lo_p = hi_p = lo_b = hi_b = 0
-                    bc_type = None
-                    bc_val = None
-                
-                # Filter batches for this recipe's gates
-                recipe_batches = [b for b in batches if b[1] in gates]
-                
-                if not recipe_batches:
-                    continue
-                
-                filled_equiv = 0.0
-                w_target_sum = 0.0
-                w_actual_sum = sum(float(b[2]) for b in recipe_batches)
-                
-                for batch in recipe_batches:
-                    weight = float(batch[2])
-                    piece_count = int(batch[3])
-                    
-                    # Apply filled batch equivalent logic (from one_time_import.py)
-                    if bc_type in ('exact', 'min') and bc_val:
-                        if bc_type == 'exact':
-                            this_fill = 1.0 if piece_count == bc_val else (piece_count / float(bc_val))
-                        else:  # 'min'
-                            this_fill = 1.0 if piece_count >= bc_val else (piece_count / float(bc_val))
-                        this_target = this_fill * (bc_val * lo_p if bc_val else 0.0)
-                    else:
-                        # Weight-based recipe
-                        if lo_b <= 0:
-                            this_fill = 1.0
-                            this_target = weight
-                        else:
-                            this_fill = 1.0 if weight >= lo_b else weight / float(lo_b)
-                            this_target = this_fill * lo_b
-                    
-                    filled_equiv += this_fill
-                    w_target_sum += this_target
-                
-                w_give = max(0.0, w_actual_sum - w_target_sum)
-                
-                # Calculate per-recipe rejects: pieces eligible by weight but sent to gate 0
-                # Query InfluxDB for all pieces within this recipe's weight bounds
-                w_rej = 0.0
-                i_rej = 0
-                
-                try:
-                    # Get pieces that match this recipe's piece weight bounds
-                    eligible_query = f"""
-                        SELECT gate, weight_g
-                        FROM pieces
-                        WHERE time >= '{start_ts}' 
-                          AND time <= '{end_ts}'
-                          AND weight_g >= {lo_p}
-                          AND weight_g <= {hi_p}
-                    """
-                    table = self.influx_client.query(eligible_query)
-                    
-                    if table is not None:
-                        # Convert PyArrow table to dict for easier access
-                        reader = table.to_reader()
-                        for batch in reader:
-                            data_dict = batch.to_pydict()
-                            num_rows = len(data_dict['gate'])
-                            
-                            for i in range(num_rows):
-                                gate = int(data_dict['gate'][i]) if data_dict['gate'][i] is not None else 0
-                                weight = float(data_dict['weight_g'][i]) if data_dict['weight_g'][i] is not None else 0.0
-                                
-                                # Reject = eligible piece that didn't go to this recipe's gates
-                                if gate not in gates:
-                                    w_rej += weight
-                                    i_rej += 1
-                    
-                    log.info(f"      Rejects: {i_rej} pieces, {w_rej:.1f}g (eligible but not assigned to gates {sorted(gates)})")
-                
-                except Exception as e:
-                    log.info(f"      ⚠️  Could not query reject data for recipe {recipe_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    w_rej = 0.0
-                    i_rej = 0
-                
-                i_bat = sum(int(b[3]) for b in recipe_batches)
-                
-                # Create gates_assigned string (comma-separated, sorted)
-                gates_str = ','.join(str(g) for g in sorted(gates))
-                
-                per_recipe_totals[recipe_id] = {
-                    "total_batches": float(filled_equiv),
-                    "total_batched_weight_g": int(w_target_sum),
-                    "total_reject_weight_g": int(w_rej),
-                    "total_giveaway_weight_g": int(round(w_give)),
-                    "total_items_batched": i_bat,
-                    "total_items_rejected": i_rej,
-                    "gates_assigned": gates_str
-                }
-                
-                total_filled += filled_equiv
-                total_w_batched += w_target_sum
-                total_w_give += w_give
-                
-                log.info(f"  {recipe_name}: {filled_equiv:.1f} batches, {int(w_target_sum):,}g batched, {int(round(w_give)):,}g giveaway")
-            
-            # Calculate program totals
-            # Query reject totals from SQLite (M3 combined) or InfluxDB
-            reject_count = 0
-            reject_weight = 0.0
-            
-            try:
-                # Try to get from kpi_minute_combined (cumulative totals)
-                reject_query = self.sqlite_conn.execute("""
-                    SELECT MAX(total_rejects_count) as max_count, 
-                           MAX(total_rejects_weight_g) as max_weight
-                    FROM kpi_minute_combined
-                    WHERE timestamp >= ? AND timestamp <= ?
-                """, (start_ts, end_ts)).fetchone()
-                
-                if reject_query and reject_query[0]:
-                    reject_count = int(reject_query[0])
-                    reject_weight = float(reject_query[1])
-                    log.info(f"  Found reject data from SQLite: {reject_count} pieces, {reject_weight:.1f}g")
-                else:
-                    # Fallback: Query InfluxDB for gate 0 pieces
-                    try:
-                        query = f"""
-                            SELECT COUNT(*) as count, SUM(weight_g) as weight
-                            FROM pieces
-                            WHERE gate = 0 
-                              AND time >= '{start_ts}' 
-                              AND time <= '{end_ts}'
-                        """
-                        table = self.influx_client.query(query)
-                        if table is not None:
-                            reader = table.to_reader()
-                            for batch in reader:
-                                data_dict = batch.to_pydict()
-                                if data_dict and 'count' in data_dict and 'weight' in data_dict:
-                                    reject_count = int(data_dict['count'][0]) if data_dict['count'][0] else 0
-                                    reject_weight = float(data_dict['weight'][0]) if data_dict['weight'][0] else 0.0
-                                    log.info(f"  Found reject data from InfluxDB: {reject_count} pieces, {reject_weight:.1f}g")
-                                    break
-                    except Exception as e:
-                        log.warning(f"  Could not query InfluxDB for rejects: {e}")
-                        import traceback
-                        traceback.print_exc()
-            except Exception as e:
-                log.warning(f"  Error querying reject data: {e}")
-            
-            program_totals = {
-                "total_batches": float(total_filled),
-                "total_batched_weight_g": int(total_w_batched),
-                "total_reject_weight_g": int(reject_weight),
-                "total_giveaway_weight_g": int(round(total_w_give)),
-                "total_items_batched": sum(rt["total_items_batched"] for rt in per_recipe_totals.values()),
-                "total_items_rejected": reject_count
-            }
-            
-            # Write program_stats
-            self.sqlite_conn.execute("""
-                UPDATE program_stats
-                SET total_batches = ?,
-                    total_batched_weight_g = ?,
-                    total_reject_weight_g = ?,
-                    total_giveaway_weight_g = ?,
-                    total_items_batched = ?,
-                    total_items_rejected = ?,
-                    start_ts = ?,
-                    end_ts = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE program_id = ?
-            """, (
-                program_totals["total_batches"],
-                program_totals["total_batched_weight_g"],
-                program_totals["total_reject_weight_g"],
-                program_totals["total_giveaway_weight_g"],
-                program_totals["total_items_batched"],
-                program_totals["total_items_rejected"],
-                start_ts,
-                end_ts,
-                program_id
-            ))
-            
-            # Write recipe_stats
-            for recipe_id, totals in per_recipe_totals.items():
-                self.sqlite_conn.execute("""
-                    INSERT INTO recipe_stats (
-                        program_id, recipe_id, gates_assigned,
-                        total_batches, total_batched_weight_g,
-                        total_reject_weight_g, total_giveaway_weight_g,
-                        total_items_batched, total_items_rejected,
-                        updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(program_id, recipe_id) DO UPDATE SET
-                        gates_assigned = excluded.gates_assigned,
-                        total_batches = excluded.total_batches,
-                        total_batched_weight_g = excluded.total_batched_weight_g,
-                        total_reject_weight_g = excluded.total_reject_weight_g,
-                        total_giveaway_weight_g = excluded.total_giveaway_weight_g,
-                        total_items_batched = excluded.total_items_batched,
-                        total_items_rejected = excluded.total_items_rejected,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (
-                    program_id, recipe_id, totals["gates_assigned"],
-                    totals["total_batches"],
-                    totals["total_batched_weight_g"],
-                    totals["total_reject_weight_g"],
-                    totals["total_giveaway_weight_g"],
-                    totals["total_items_batched"],
-                    totals["total_items_rejected"]
-                ))
-            
-            self.sqlite_conn.commit()
-            
-            log.info(f"Program totals: {program_totals['total_batches']:.1f} batches, " +
-                  f"{program_totals['total_batched_weight_g']:,}g batched, " +
-                  f"{program_totals['total_giveaway_weight_g']:,}g giveaway, " +
-                  f"{program_totals['total_items_rejected']} rejects")
-            log.info(f"  Written stats for {len(per_recipe_totals)} recipes")
-            
+                log.warning(f"  Backend reload failed: {resp.status_code}")
         except Exception as e:
-            log.error(f"Error calculating program totals: {e}", exc=e,
-                category='error', action='calculate_program_totals',
-                program_id=program_id, start_ts=start_ts, end_ts=end_ts)
-            
-            if ENABLE_CONSOLE:
-                import traceback
-                traceback.print_exc()
+            log.warning(f"  Failed to notify backend: {e}")
+    
+    def calculate_and_write_program_totals(self, program_id: int, start_ts: str, end_ts: str):
+        """
+        Queue program/recipe totals for the completed program period on the
+        background finalizer (see program_finalizer.py); returns the job's Future.
+        """
+        return self.finalizer.submit(self.sqlite_conn, program_id, start_ts, end_ts)
     
     def check_and_switch_program(self):
         """Check if it's time to switch to next program, and do so if needed"""
@@ -1564,61 +1509,57 @@ class LiveWorker:
             log.error(f"  Error polling completed batches: {e}")
             return []
     
+    @staticmethod
+    def _time_column_ns(column) -> List[int]:
+        """Arrow `time` column → list of epoch ns ints (cast, no datetime objects)"""
+        col_type = getattr(column, 'type', None)
+        unit = getattr(col_type, 'unit', None)
+        if unit in ARROW_UNIT_TO_NS:
+            scale = ARROW_UNIT_TO_NS[unit]
+            values = column.cast(pa.int64()).to_pylist()
+            return values if scale == 1 else [v * scale for v in values]
+        # Fallback for non-timestamp columns (e.g. ISO strings)
+        return [to_ns(v) for v in column.to_pylist()]
+
     def poll_new_pieces(self) -> List[PieceData]:
         """Poll InfluxDB for new pieces with lookback to catch delayed writes"""
         try:
-            to_time = datetime.now(timezone.utc)
-            
+            to_time_ns = now_ns()
+
             # Use 3-second lookback to catch pieces that were written with latency
             # We deduplicate using piece_id to avoid processing the same piece twice
             if self.last_processed_time is None:
-                from_time = to_time - timedelta(seconds=5)
+                from_time_ns = to_time_ns - 5 * NS_PER_SEC
             else:
                 # Look back 3 seconds from last poll to catch delayed writes
-                from_time = self.last_processed_time - timedelta(seconds=3)
-            
-            sql = f"""
-                SELECT time, weight_g, gate, piece_id
-                FROM pieces
-                WHERE time >= '{from_time.isoformat()}'
-                  AND time < '{to_time.isoformat()}'
-                ORDER BY time ASC
-            """
-            
-            table = self.influx_client.query(sql)
+                from_time_ns = self.last_processed_time - 3 * NS_PER_SEC
+
+            table = self.piece_store.query_pieces(from_time_ns, to_time_ns)
             pieces = []
-            
+
             # Process PyArrow table directly
             if table is not None and len(table) > 0:
-                # Convert to Python dictionary for easier access
-                data_dict = table.to_pydict()
-                num_rows = len(data_dict['time'])
-                
+                num_rows = len(table)
+                times_ns = self._time_column_ns(table.column('time'))
+                weights = table.column('weight_g').to_pylist()
+                gates = (table.column('gate').to_pylist()
+                         if 'gate' in table.column_names else [0] * num_rows)
+                piece_ids = (table.column('piece_id').to_pylist()
+                             if 'piece_id' in table.column_names else [None] * num_rows)
+
                 for i in range(num_rows):
-                    piece_id_val = data_dict.get('piece_id', [None] * num_rows)[i]
+                    piece_id_val = piece_ids[i]
                     piece_id_str = str(piece_id_val) if piece_id_val is not None else None
-                    
+
                     # Skip if we've already processed this piece (deduplication)
                     if piece_id_str and piece_id_str in self.processed_piece_ids:
                         continue
-                    
-                    timestamp = data_dict['time'][i]
-                    if isinstance(timestamp, str):
-                        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    elif hasattr(timestamp, 'to_pydatetime'):
-                        timestamp = timestamp.to_pydatetime()
-                    elif not isinstance(timestamp, datetime):
-                        timestamp = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
-                    
-                    # Ensure timestamp is timezone-aware
-                    if isinstance(timestamp, datetime) and timestamp.tzinfo is None:
-                        timestamp = timestamp.replace(tzinfo=timezone.utc)
-                    
-                    gate_val = data_dict.get('gate', [0] * num_rows)[i]
-                    
+
+                    gate_val = gates[i]
+
                     pieces.append(PieceData(
-                        timestamp=timestamp,
-                        weight_g=float(data_dict['weight_g'][i]),
+                        ts_ns=times_ns[i],
+                        weight_g=float(weights[i]),
                         gate=int(gate_val) if gate_val is not None else 0,
                         piece_id=piece_id_str
                     ))
@@ -1627,8 +1568,8 @@ class LiveWorker:
                     if piece_id_str:
                         self.processed_piece_ids.add(piece_id_str)
             
-            self.last_processed_time = to_time
-            
+            self.last_processed_time = to_time_ns
+
             # Limit memory by keeping only recent piece IDs (last 5000)
             if len(self.processed_piece_ids) > 5000:
                 self.processed_piece_ids = set(list(self.processed_piece_ids)[-2500:])
@@ -1647,8 +1588,69 @@ class LiveWorker:
     # ✅ REMOVED: write_m2() - M2 (gate_state) is now written by backend JavaScript in real-time
     # This worker only handles M3/M4 KPI calculations
     
-    def process_piece(self, piece: PieceData):
-        """Process a single piece - update gates, detect batches, accumulate"""
+    def poll_pieces(self):
+        """
+        Poll new pieces and process them in timestamp order. In pushdown mode
+        (without validation) no piece rows are read: M3 totals come from the
+        per-minute query and in-flight batches from poll_in_flight_totals.
+        """
+        if not M3_RAW_PIECES:
+            self.poll_in_flight_totals()
+            return
+        
+        pieces = self.poll_new_pieces()
+        
+        # Sort by timestamp to ensure chronological processing
+        # (lookback can return pieces slightly out of order)
+        pieces.sort(key=lambda p: p.ts_ns)
+        
+        for piece in pieces:
+            self.process_piece(piece)
+    
+    def poll_in_flight_totals(self):
+        """
+        Pushdown: refresh each assigned gate's in-flight batch from one grouped
+        COUNT/SUM over the pieces after the gate's last batch_completions row
+        (a few rows per poll, however many pieces the batches hold).
+        """
+        to_time_ns = now_ns()
+        
+        since_ns = {}
+        for gate, recipe_id in self.gate_to_recipe.items():
+            if gate == 0:
+                continue
+            if gate not in self.gate_states:
+                self.gate_states[gate] = GateState(gate=gate, recipe_id=recipe_id)
+            state = self.gate_states[gate]
+            if state.closed_at_ns == 0:
+                # New gate state: count from the raw piece poll's first window, not
+                # from every piece the gate ever received
+                state.closed_at_ns = to_time_ns - 5 * NS_PER_SEC
+            since_ns[gate] = state.closed_at_ns
+        if not since_ns:
+            return
+        
+        try:
+            table = self.piece_store.query_gate_totals_since(since_ns, to_time_ns)
+        except Exception as e:
+            log.warning(f"Error polling in-flight totals: {e}")
+            self.influx_errors += 1
+            return
+        
+        totals: Dict[int, Tuple[int, float]] = {}
+        if table is not None and len(table) > 0:
+            gates = table.column('gate').to_pylist()
+            counts = table.column('pieces').to_pylist()
+            weights = table.column('weight_g').to_pylist()
+            for i in range(len(table)):
+                gate = int(gates[i]) if gates[i] is not None else 0
+                count, weight = totals.get(gate, (0, 0.0))
+                totals[gate] = (count + int(counts[i] or 0), weight + float(weights[i] or 0.0))
+        for gate in since_ns:
+            self.gate_states[gate].set_totals(*totals.get(gate, (0, 0.0)))
+    
+    def track_in_flight(self, piece: PieceData) -> GateState:
+        """Add a piece to its gate's in-flight batch (closed by batch_completions rows)"""
         gate = piece.gate
         
         # Initialize gate state if needed
@@ -1657,6 +1659,14 @@ class LiveWorker:
             self.gate_states[gate] = GateState(gate=gate, recipe_id=recipe_id)
         
         state = self.gate_states[gate]
+        if gate != 0:
+            state.add_piece(piece)
+        return state
+    
+    def process_piece(self, piece: PieceData):
+        """Process a single piece - update gates, detect batches, accumulate"""
+        gate = piece.gate
+        state = self.track_in_flight(piece)
         
         # Validate piece weight against recipe specifications
         if gate != 0 and state.recipe_id and state.recipe_id in self.recipes:
@@ -1677,6 +1687,25 @@ class LiveWorker:
         # (Batch detection is handled by backend - we'll read completed batches from SQLite)
         self.accumulate_for_minute(piece, None)
         self.pieces_processed += 1
+        
+        # Eligible-reject attribution: every recipe whose bounds hold the piece but whose gates didn't get it
+        for recipe_id in self.eligible_recipe_index().stab(piece.weight_g):
+            if gate not in self.recipe_gates[recipe_id]:
+                self.minute_accumulator.add_reject(recipe_id, piece.weight_g)
+    
+    def eligible_recipe_index(self) -> IntervalIndex:
+        """Interval index over the active recipes' piece bounds (rebuilt when assignments change)"""
+        if self.reject_index is None or self.reject_index_gates != self.gate_to_recipe:
+            recipe_gates = defaultdict(set)
+            for g, rid in self.gate_to_recipe.items():
+                if g != 0 and rid in self.recipes:
+                    recipe_gates[rid].add(g)
+            self.recipe_gates = {rid: frozenset(gates) for rid, gates in recipe_gates.items()}
+            self.reject_index = IntervalIndex({
+                rid: (self.recipes[rid].piece_min, self.recipes[rid].piece_max) for rid in self.recipe_gates
+            })
+            self.reject_index_gates = dict(self.gate_to_recipe)
+        return self.reject_index
     
     def update_gate_dwell_accumulator(self, gate: int, dwell_time_sec: float):
         """Update Welford accumulator for gate dwell statistics"""
@@ -1722,8 +1751,26 @@ class LiveWorker:
         except Exception as e:
             log.warning(f"  Error updating gate dwell accumulator: {e}")
     
-    def get_paused_seconds_between(self, start_iso: str, end_iso: str) -> float:
-        """Calculate total paused seconds between two ISO timestamps for the current program."""
+    def update_gate_dwell_sketch(self, gate: int, dwell_time_sec: float):
+        """Fold a dwell sample into the (program, gate) quantile sketch and persist it"""
+        try:
+            sketch = self.dwell_sketches.get(gate)
+            if sketch is None:
+                # Resume from the stored sketch after a worker restart mid-program
+                row = self.sqlite_conn.execute("""
+                    SELECT sketch FROM gate_dwell_sketches
+                    WHERE program_id = ? AND gate_number = ?
+                """, (self.program_id, gate)).fetchone()
+                sketch = QuantileSketch.from_bytes(row[0]) if row else QuantileSketch()
+                self.dwell_sketches[gate] = sketch
+            
+            sketch.add(dwell_time_sec)
+            write_dwell_sketch_sqlite(self.sqlite_conn, self.program_id, gate, sketch)
+        except Exception as e:
+            log.warning(f"  Error updating gate dwell sketch: {e}")
+    
+    def get_paused_seconds_between(self, start_ns: int, end_ns: int) -> float:
+        """Calculate total paused seconds between two epoch-ns timestamps for the current program."""
         if not self.program_id:
             return 0.0
         try:
@@ -1734,19 +1781,17 @@ class LiveWorker:
                   AND paused_at < ?
                   AND (resumed_at IS NULL OR resumed_at > ?)
                 ORDER BY paused_at ASC
-            """, (self.program_id, end_iso, start_iso)).fetchall()
+            """, (self.program_id, ns_to_iso(end_ns), ns_to_iso(start_ns))).fetchall()
 
-            start_dt = datetime.fromisoformat(start_iso.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end_iso.replace('Z', '+00:00'))
-            total = 0.0
+            total_ns = 0
             for paused_at_str, resumed_at_str in rows:
-                p_start = datetime.fromisoformat(paused_at_str.replace('Z', '+00:00'))
-                p_end = datetime.fromisoformat(resumed_at_str.replace('Z', '+00:00')) if resumed_at_str else end_dt
-                overlap_start = max(p_start, start_dt)
-                overlap_end = min(p_end, end_dt)
+                p_start = iso_to_ns(paused_at_str)
+                p_end = iso_to_ns(resumed_at_str) if resumed_at_str else end_ns
+                overlap_start = max(p_start, start_ns)
+                overlap_end = min(p_end, end_ns)
                 if overlap_end > overlap_start:
-                    total += (overlap_end - overlap_start).total_seconds()
-            return total
+                    total_ns += overlap_end - overlap_start
+            return total_ns / NS_PER_SEC
         except Exception as e:
             log.warning(f"  Error reading pause_intervals: {e}")
             return 0.0
@@ -1754,21 +1799,18 @@ class LiveWorker:
     def process_completed_batch(self, batch: Dict):
         """Process a completed batch from backend for M3/M4 calculations"""
         try:
-            # Parse timestamp
-            batch_time = datetime.fromisoformat(batch['completed_at'].replace('Z', '+00:00'))
-            minute_bucket = batch_time.replace(second=0, microsecond=0)
+            # Parse timestamp once to epoch ns; minute bucket is integer division
+            batch_ns = iso_to_ns(batch['completed_at'])
+            minute_bucket = batch_ns // NS_PER_MINUTE
             gate = batch['gate']
             
             # Track gate dwell time
             if gate != 0:  # Don't track reject gate
                 if gate in self.last_batch_time:
-                    raw_dwell_sec = (batch_time - self.last_batch_time[gate]).total_seconds()
+                    raw_dwell_sec = (batch_ns - self.last_batch_time[gate]) / NS_PER_SEC
 
                     # Subtract any time the machine spent paused between the two batches
-                    paused_sec = self.get_paused_seconds_between(
-                        self.last_batch_time[gate].isoformat(),
-                        batch_time.isoformat()
-                    )
+                    paused_sec = self.get_paused_seconds_between(self.last_batch_time[gate], batch_ns)
                     dwell_time_sec = max(0.0, raw_dwell_sec - paused_sec)
                     
                     # Write to database
@@ -1776,21 +1818,26 @@ class LiveWorker:
                         self.sqlite_conn.execute("""
                             INSERT INTO gate_dwell_times (program_id, gate_number, dwell_time_sec, batch_timestamp)
                             VALUES (?, ?, ?, ?)
-                        """, (self.program_id, gate, dwell_time_sec, batch_time.isoformat()))
+                        """, (self.program_id, gate, dwell_time_sec, ns_to_iso(batch_ns)))
                         
-                        # Also update accumulator for summary stats
+                        # Also update accumulator and quantile sketch for summary stats
                         self.update_gate_dwell_accumulator(gate, dwell_time_sec)
+                        self.update_gate_dwell_sketch(gate, dwell_time_sec)
                         
                         self.sqlite_conn.commit()
                     except Exception as e:
                         log.warning(f"  Error writing gate dwell time: {e}")
                 
                 # Update last batch time for this gate
-                self.last_batch_time[gate] = batch_time
+                self.last_batch_time[gate] = batch_ns
+            
+            # Close the gate's in-flight batch (may complete a transition)
+            if gate != 0:
+                self.on_gate_batch_closed(gate, batch_ns)
             
             # Create BatchEvent for M4 tracking
             batch_event = BatchEvent(
-                timestamp=batch_time,
+                ts_ns=batch_ns,
                 gate=gate,
                 weight_g=batch['weight_g'],
                 piece_count=batch['pieces']
@@ -1800,22 +1847,23 @@ class LiveWorker:
             if self.minute_accumulator is None:
                 # First batch - initialize accumulator
                 self.current_minute = minute_bucket
-                self.minute_accumulator = MinuteAccumulator(minute_start=minute_bucket)
+                self.minute_accumulator = MinuteAccumulator(minute=minute_bucket)
             elif minute_bucket > self.current_minute:
                 # Minute rolled over - PROCESS the old accumulator BEFORE creating new one
                 # This prevents data loss when batches arrive in a new minute
                 if self.minute_accumulator and self.minute_accumulator.has_data():
-                    log.info(f"  Minute rollover in batch processing ({self.current_minute.strftime('%H:%M')} → {minute_bucket.strftime('%H:%M')})")
-                    self.process_minute_kpis()
+                    log.info(f"  Minute rollover in batch processing ({minute_label(self.current_minute)} → {minute_label(minute_bucket)})")
+                    self.close_minute()
                 self.current_minute = minute_bucket
-                self.minute_accumulator = MinuteAccumulator(minute_start=minute_bucket)
+                self.minute_accumulator = MinuteAccumulator(minute=minute_bucket)
             
             # Add batch to minute accumulator
             self.minute_accumulator.add_batch(batch_event)
             
             self.batches_detected += 1
+            self.publish_live_snapshot()
             # Batch logging disabled for cleaner output
-            # log.info(f"  Batch #{batch['id']}: Gate {batch['gate']}, {batch['pieces']} pieces, {batch['weight_g']:.1f}g → minute {minute_bucket.strftime('%H:%M')}")
+            # log.info(f"  Batch #{batch['id']}: Gate {batch['gate']}, {batch['pieces']} pieces, {batch['weight_g']:.1f}g → minute {minute_label(minute_bucket)}")
         except Exception as e:
             log.error(f"  Error processing completed batch: {e}")
             import traceback
@@ -1823,20 +1871,20 @@ class LiveWorker:
     
     def accumulate_for_minute(self, piece: PieceData, batch: Optional[BatchEvent]):
         """Add to minute accumulator"""
-        minute_bucket = piece.timestamp.replace(second=0, microsecond=0)
+        minute_bucket = piece.ts_ns // NS_PER_MINUTE
         
         # Check if we need to roll over to a new minute
         if self.minute_accumulator is None:
             # First piece - initialize accumulator
             self.current_minute = minute_bucket
-            self.minute_accumulator = MinuteAccumulator(minute_start=minute_bucket)
+            self.minute_accumulator = MinuteAccumulator(minute=minute_bucket)
         elif minute_bucket > self.current_minute:
             # Minute rolled over - process old accumulator BEFORE creating new one
             # This ensures data is not lost when pieces cross minute boundaries
             if self.minute_accumulator and self.minute_accumulator.has_data():
-                self.process_minute_kpis()
+                self.close_minute()
             self.current_minute = minute_bucket
-            self.minute_accumulator = MinuteAccumulator(minute_start=minute_bucket)
+            self.minute_accumulator = MinuteAccumulator(minute=minute_bucket)
         
         # Add piece
         self.minute_accumulator.add_piece(piece)
@@ -1845,44 +1893,161 @@ class LiveWorker:
         if batch:
             self.minute_accumulator.add_batch(batch)
     
+    def has_pending_kpis(self) -> bool:
+        """True if the open minute or any parked pushdown minute still needs writing"""
+        return bool(self.pushdown_pending) or bool(self.minute_accumulator and self.minute_accumulator.has_data())
+    
+    def close_minute(self):
+        """
+        Minute rollover: process the current accumulator now, or - in pushdown
+        mode - park it until InfluxDB has settled and its totals can be queried.
+        """
+        if M3_AGG_PUSHDOWN and self.minute_accumulator:
+            self.pushdown_pending.append(self.minute_accumulator)
+            self.minute_accumulator = None
+            return
+        self.process_minute_kpis()
+    
     def process_minute_kpis(self):
         """
         Calculate M3/M4 KPIs for completed minute.
         Delegates to separate M3 and M4 functions.
         """
+        if M3_AGG_PUSHDOWN:
+            # Explicit flush (stop / transition / program change): process everything now
+            self.close_minute()
+            self.flush_settled_minutes(force=True)
+            return
+        
         if not self.minute_accumulator:
             return
         
-        minute_time = self.minute_accumulator.minute_start
+        if self.process_accumulator(self.minute_accumulator):
+            # Clear accumulator for next minute
+            self.minute_accumulator = None
+    
+    def process_accumulator(self, acc: MinuteAccumulator) -> bool:
+        """Write M3/M4 for one minute accumulator (False if the minute was already processed)"""
+        minute_time = acc.minute
         
         # Check if this minute was already processed (prevents duplicate writes)
-        minute_key = minute_time.isoformat()
-        if hasattr(self, 'processed_minutes') and minute_key in self.processed_minutes:
-            log.debug(f"  Minute {minute_time.strftime('%H:%M')} already processed, skipping")
-            return
-        
-        log.info(f"Processing KPIs for {minute_time.strftime('%H:%M')}")
+        if hasattr(self, 'processed_minutes') and minute_time in self.processed_minutes:
+            log.debug(f"  Minute {minute_label(minute_time)} already processed, skipping")
+            return False
         
-        try:
-            # Process M3 per-minute KPIs
-            self.process_m3_kpis(minute_time)
-            
-            # Process M4 cumulative totals
-            self.process_m4_totals(minute_time)
+        # Pushdown minutes with no pieces and no batches (machine idle) write nothing
+        if acc.gate_totals is None or acc.has_data():
+            log.info(f"Processing KPIs for {minute_label(minute_time)}")
             
-        except Exception as e:
-            log.warning(f"Error processing KPIs: {e}")
-            import traceback
-            traceback.print_exc()
+            try:
+                # Process M3 per-minute KPIs
+                self.process_m3_kpis(minute_time, acc)
+                
+                # Process M4 cumulative totals
+                self.process_m4_totals(minute_time, acc)
+                
+            except Exception as e:
+                log.warning(f"Error processing KPIs: {e}")
+                import traceback
+                traceback.print_exc()
         
         # Mark this minute as processed to prevent duplicates
         if hasattr(self, 'processed_minutes'):
-            self.processed_minutes.add(minute_key)
+            self.processed_minutes.add(minute_time)
+        self.publish_live_snapshot()
+        return True
+    
+    # =====================================================================
+    # M3 AGGREGATION PUSHDOWN
+    # =====================================================================
+    
+    def query_minute_gate_totals(self, start_minute: int, end_minute: int) -> Optional[Dict[int, Dict[int, Tuple[int, float]]]]:
+        """
+        Per-minute per-gate piece count / weight sum for [start_minute, end_minute),
+        aggregated by the piece store (gate 0 rows are the reject totals).
         
-        # Clear accumulator for next minute
-        self.minute_accumulator = None
+        Returns:
+            {epoch_minute: {gate: (count, weight_g)}}, or None if the query failed
+        """
+        try:
+            table = self.piece_store.query_minute_gate_totals(
+                start_minute * NS_PER_MINUTE, end_minute * NS_PER_MINUTE
+            )
+            totals: Dict[int, Dict[int, Tuple[int, float]]] = defaultdict(dict)
+            if table is not None and len(table) > 0:
+                minutes_ns = self._time_column_ns(table.column('minute'))
+                gates = table.column('gate').to_pylist()
+                counts = table.column('pieces').to_pylist()
+                weights = table.column('weight_g').to_pylist()
+                for i in range(len(table)):
+                    gate = int(gates[i]) if gates[i] is not None else 0
+                    totals[minutes_ns[i] // NS_PER_MINUTE][gate] = (
+                        int(counts[i] or 0), float(weights[i] or 0.0)
+                    )
+            return totals
+        except Exception as e:
+            log.warning(f"  M3 pushdown query failed: {e}")
+            self.influx_errors += 1
+            return None
+    
+    def flush_settled_minutes(self, force: bool = False):
+        """
+        Fetch pushdown totals for parked minutes and process them in order.
+        
+        A minute is only queried once M3_AGG_SETTLE_SEC have passed since it
+        closed, so late InfluxDB writes are included. force=True (stop, transition,
+        program change) queries everything parked right away without blocking the
+        loop on the settle time; writes landing after that query are not counted.
+        """
+        if not self.pushdown_pending:
+            return
+        
+        settle_ns = int(M3_AGG_SETTLE_SEC * NS_PER_SEC)
+        if force:
+            ready = list(self.pushdown_pending)
+        else:
+            if self.pushdown_retry_at is not None and now_ns() < self.pushdown_retry_at:
+                return
+            settled_before = now_ns() - settle_ns
+            ready = [acc for acc in self.pushdown_pending
+                     if (acc.minute + 1) * NS_PER_MINUTE <= settled_before]
+            if not ready:
+                return
+        
+        # One query covers every ready minute: a few rows per minute instead of every piece
+        totals = self.query_minute_gate_totals(ready[0].minute, ready[-1].minute + 1)
+        if totals is None and not force:
+            self.pushdown_retry_at = now_ns() + int(M3_AGG_RETRY_SEC * NS_PER_SEC)
+            return
+        self.pushdown_retry_at = None
+        
+        self.pushdown_pending = self.pushdown_pending[len(ready):]
+        for acc in ready:
+            if totals is not None:
+                self.apply_pushdown_totals(acc, totals.get(acc.minute, {}))
+            else:
+                # Query failed on an explicit flush - fall back to whatever raw pieces we have
+                log.warning(f"  No pushdown totals for {minute_label(acc.minute)}, using raw pieces")
+                acc.gate_totals = None if acc.pieces_by_gate else {}
+            self.process_accumulator(acc)
+    
+    def apply_pushdown_totals(self, acc: MinuteAccumulator, totals: Dict[int, Tuple[int, float]]):
+        """Attach Influx-aggregated totals to a minute, comparing with raw pieces in validate mode"""
+        if M3_AGG_VALIDATE:
+            mismatched = []
+            for gate in sorted(set(totals) | set(acc.piece_gates())):
+                raw_count, raw_weight = acc.gate_count_weight(gate)
+                agg_count, agg_weight = totals.get(gate, (0, 0.0))
+                if raw_count != agg_count or abs(raw_weight - agg_weight) > 0.01:
+                    mismatched.append(f"G{gate} raw={raw_count}/{raw_weight:.1f}g agg={agg_count}/{agg_weight:.1f}g")
+            if mismatched:
+                log.warning(f"  M3 pushdown mismatch for {minute_label(acc.minute)}: {'; '.join(mismatched)}",
+                    category='kpi', action='m3_pushdown_validate')
+            else:
+                log.debug(f"  M3 pushdown matches raw pieces for {minute_label(acc.minute)}")
+        acc.gate_totals = totals
     
-    def process_m3_kpis(self, minute_time: datetime):
+    def process_m3_kpis(self, minute_time: int, acc: Optional[MinuteAccumulator] = None):
         """
         Calculate M3 per-minute KPIs (per-recipe and combined).
         
@@ -1893,7 +2058,8 @@ class LiveWorker:
         - Giveaway percentage (only for gates with batches)
         """
         m3_start = time.time()
-        acc = self.minute_accumulator
+        if acc is None:
+            acc = self.minute_accumulator
         
         try:
             # Calculate M3 per-recipe KPIs using proper filled batch equivalent logic
@@ -1920,9 +2086,14 @@ class LiveWorker:
                     pieces_for_recipe.extend(acc.pieces_by_gate.get(gate, []))
                     batches_for_recipe.extend(acc.batches_by_gate.get(gate, []))
                 
-                # Count metrics from actual piece data (with 3s lookback + deduplication)
-                pieces_count = len(pieces_for_recipe)
-                weight_sum = sum(p.weight_g for p in pieces_for_recipe)
+                # Count metrics from actual piece data (with 3s lookback + deduplication),
+                # or from the Influx per-gate aggregates in pushdown mode
+                pieces_count = 0
+                weight_sum = 0.0
+                for gate in gates_with_this_recipe:
+                    gate_count, gate_weight = acc.gate_count_weight(gate)
+                    pieces_count += gate_count
+                    weight_sum += gate_weight
                 batch_count = len(batches_for_recipe)
                 
                 # Calculate giveaway only if we have batches
@@ -1966,6 +2137,18 @@ class LiveWorker:
                         'denom': denom
                     }
                 
+                extra = minute_accum_extra.get(recipe_id, {})
+                self.rolling_window(recipe_id).add(
+                    minute_time, batch_count, extra.get('w_give', 0.0), extra.get('denom', 0.0)
+                )
+                
+                # Eligible rejects this minute and since program start (raw pieces only;
+                # stays 0 in pushdown mode without validation)
+                reject_count, reject_weight = acc.rejects_by_recipe.get(recipe_id, (0, 0.0))
+                cum_rejects = self.recipe_rejects_cum[recipe_id]
+                cum_rejects[0] += reject_count
+                cum_rejects[1] += reject_weight
+                
                 # Write M3 per-recipe to SQLite (once per recipe, not per gate)
                 try:
                     write_m3_per_recipe_sqlite(
@@ -1977,17 +2160,44 @@ class LiveWorker:
                         giveaway_pct,
                         pieces_count,
                         weight_sum,
-                        0,   # rejects_per_min (per-recipe, always 0)
-                        0,   # total_rejects_count (per-recipe, always 0)
-                        0.0  # total_rejects_weight_g (per-recipe, always 0)
+                        reject_count,
+                        cum_rejects[0],
+                        cum_rejects[1]
                     )
                     log.info(f"  M3 per-recipe: {recipe_name} → {pieces_count}pcs, {weight_sum:.0f}g, {batch_count}batches, {giveaway_pct:.2f}%")
                 except Exception as e:
                     log.warning(f"  Error writing M3 for {recipe_name}: {e}")
+                
+                # Piece weight distribution for this recipe/minute (mergeable across minutes)
+                if pieces_for_recipe and self.program_id:
+                    try:
+                        sketch = QuantileSketch()
+                        sketch.add_many(p.weight_g for p in pieces_for_recipe)
+                        write_piece_weight_sketch_sqlite(
+                            self.sqlite_conn, minute_time, recipe_name, self.program_id, sketch
+                        )
+                    except Exception as e:
+                        log.warning(f"  Error writing piece weight sketch for {recipe_name}: {e}")
+                
+                # Fixed-bin weight histogram for this recipe/minute
+                recipe_hist = acc.weight_histogram(gates_with_this_recipe)
+                if recipe_hist is not None and self.program_id:
+                    try:
+                        write_weight_histogram_sqlite(
+                            self.sqlite_conn, minute_time, self.program_id,
+                            SCOPE_RECIPE, recipe_name, recipe_hist
+                        )
+                    except Exception as e:
+                        log.warning(f"  Error writing weight histogram for {recipe_name}: {e}")
             
             # Calculate combined M3 (sum across all recipes)
-            total_pieces = sum(len(p) for g, p in acc.pieces_by_gate.items() if g != 0)
-            total_weight = sum(sum(p.weight_g for p in pieces) for g, pieces in acc.pieces_by_gate.items() if g != 0)
+            total_pieces = 0
+            total_weight = 0.0
+            for gate in acc.piece_gates():
+                if gate != 0:
+                    gate_count, gate_weight = acc.gate_count_weight(gate)
+                    total_pieces += gate_count
+                    total_weight += gate_weight
             
             # Count total batches (across all gates)
             total_batches = sum(len(batches) for g, batches in acc.batches_by_gate.items() if g != 0)
@@ -1998,11 +2208,23 @@ class LiveWorker:
                 denom_sum = sum(v['denom'] for v in minute_accum_extra.values())
                 combined_giveaway_pct = (w_give_sum / denom_sum * 100.0) if denom_sum > 0 else 0.0
             else:
+                w_give_sum = denom_sum = 0.0
                 combined_giveaway_pct = 0.0
+            self.rolling_combined.add(minute_time, total_batches, w_give_sum, denom_sum)
             
             # Total rejects this minute (gate 0, all pieces)
-            reject_pieces_min = len(acc.pieces_by_gate.get(0, []))
-            reject_weight_min = sum(p.weight_g for p in acc.pieces_by_gate.get(0, []))
+            reject_pieces_min, reject_weight_min = acc.gate_count_weight(0)
+            
+            # Gate 0 weight histogram for this minute
+            reject_hist = acc.weight_histogram([0])
+            if reject_hist is not None and self.program_id:
+                try:
+                    write_weight_histogram_sqlite(
+                        self.sqlite_conn, minute_time, self.program_id,
+                        SCOPE_GATE0, '', reject_hist
+                    )
+                except Exception as e:
+                    log.warning(f"  Error writing gate 0 weight histogram: {e}")
             
             # Cumulative rejects (across program lifetime)
             self.total_rejects_count += reject_pieces_min
@@ -2036,7 +2258,28 @@ class LiveWorker:
             import traceback
             traceback.print_exc()
     
-    def process_m4_totals(self, minute_time: datetime):
+    def emit_m4_totals(self, minute_time: int, recipe_name: str, total_batches: int,
+                       giveaway_g_per_batch: float, giveaway_pct_avg: float) -> bool:
+        """Write an M4 row unless change-only emission suppresses it (returns True if written)"""
+        if self.program_id is None:
+            # The upsert key includes program_id and SQLite treats NULLs as distinct
+            return False
+        values = (total_batches, giveaway_g_per_batch, giveaway_pct_avg)
+        if not self.m4_emitter.should_emit(recipe_name, minute_time, values):
+            return False
+        write_m4_totals_sqlite(
+            self.sqlite_conn,
+            minute_time,
+            recipe_name,
+            self.program_id,
+            total_batches,
+            giveaway_g_per_batch,
+            giveaway_pct_avg
+        )
+        self.m4_emitter.mark_emitted(recipe_name, minute_time, values)
+        return True
+    
+    def process_m4_totals(self, minute_time: int, acc: Optional[MinuteAccumulator] = None):
         """
         Process M4 cumulative totals per recipe.
         M4 tracks cumulative stats across the entire program lifetime.
@@ -2044,11 +2287,12 @@ class LiveWorker:
         Note: Processes by recipe_id (not by gate) to avoid duplicates when
         a recipe is assigned to multiple gates.
         """
-        if not self.minute_accumulator:
+        if acc is None:
+            acc = self.minute_accumulator
+        if acc is None:
             return
         
         try:
-            acc = self.minute_accumulator
             
             # Build a set of unique recipe IDs that are currently active
             active_recipe_ids = set()
@@ -2078,11 +2322,10 @@ class LiveWorker:
                         giveaway_pct_avg = (cum['cum_give'] / denom * 100.0) if denom > 0 else 0.0
                         
                         try:
-                            write_m4_totals_sqlite(
-                                self.sqlite_conn,
+                            # Change-only mode: unchanged totals are only re-written at the heartbeat
+                            self.emit_m4_totals(
                                 minute_time,
                                 recipe_name,
-                                self.program_id,
                                 int(cum['total_batches']),
                                 giveaway_g_per_batch,
                                 giveaway_pct_avg
@@ -2151,11 +2394,9 @@ class LiveWorker:
                 
                 # Write M4 to SQLite (once per recipe, not per gate)
                 try:
-                    write_m4_totals_sqlite(
-                        self.sqlite_conn,
+                    self.emit_m4_totals(
                         minute_time,
                         recipe_name,
-                        self.program_id,
                         int(cum_filled),
                         giveaway_g_per_batch,
                         giveaway_pct_avg
@@ -2169,6 +2410,80 @@ class LiveWorker:
             import traceback
             traceback.print_exc()
     
+    # =====================================================================
+    # LIVE SNAPSHOT
+    # =====================================================================
+    
+    def rolling_window(self, recipe_id: int) -> RollingWindow:
+        window = self.rolling_by_recipe.get(recipe_id)
+        if window is None:
+            window = self.rolling_by_recipe[recipe_id] = RollingWindow(LIVE_ROLLING_MINUTES)
+        return window
+    
+    def publish_live_snapshot(self):
+        """
+        Publish the open minute's per-gate / per-recipe counters, rolling M3 and
+        cumulative M4 values to the shared snapshot file (see live_snapshot.py).
+        """
+        if self.snapshot_writer is None:
+            return
+        try:
+            acc = self.minute_accumulator
+            
+            gate_rows = []
+            for gate in sorted(set(self.gate_to_recipe) | set(acc.piece_gates() if acc else []) | {0}):
+                count, weight = acc.gate_count_weight(gate) if acc else (0, 0.0)
+                batches = len(acc.batches_by_gate.get(gate, [])) if acc else 0
+                state = self.gate_states.get(gate)
+                gate_rows.append((
+                    gate, self.gate_to_recipe.get(gate) or -1, count, weight, batches,
+                    state.piece_count if state else 0, state.total_weight if state else 0.0,
+                    self.last_batch_time.get(gate, 0),
+                ))
+            
+            recipe_rows = []
+            active_recipe_ids = sorted({rid for g, rid in self.gate_to_recipe.items()
+                                        if g != 0 and rid in self.recipes})
+            for recipe_id in active_recipe_ids:
+                rows = [r for r in gate_rows if r[1] == recipe_id and r[0] != 0]
+                cum = self.m4_cumulative.get(recipe_id, {})
+                cum_batches = cum.get('total_batches', 0.0)
+                cum_actual = cum.get('cum_actual', 0.0)
+                cum_give = cum.get('cum_give', 0.0)
+                denom = cum_actual + cum_give
+                window = self.rolling_by_recipe.get(recipe_id)
+                recipe_rows.append((
+                    recipe_id, 0, self.recipes[recipe_id].recipe_name,
+                    sum(r[2] for r in rows), sum(r[3] for r in rows), sum(r[4] for r in rows),
+                    window.batches_per_min() if window else 0.0,
+                    window.giveaway_pct() if window else 0.0,
+                    cum_batches, cum_actual,
+                    cum_give / max(1.0, cum_batches),
+                    (cum_give / denom * 100.0) if denom > 0 else 0.0,
+                ))
+            
+            products = [r for r in gate_rows if r[0] != 0]
+            rejects = gate_rows[0]  # gate 0 sorts first
+            combined = (
+                sum(r[2] for r in products), sum(r[3] for r in products), sum(r[4] for r in products),
+                rejects[2], rejects[3],
+                self.rolling_combined.batches_per_min(), self.rolling_combined.giveaway_pct(),
+                self.total_rejects_count, self.total_rejects_weight,
+                self.pieces_processed, self.batches_detected,
+            )
+            
+            self.snapshot_writer.publish(
+                self.program_id, self.current_minute, self.machine_state,
+                LIVE_ROLLING_MINUTES, combined, gate_rows, recipe_rows,
+            )
+        except Exception as e:
+            log.warning(f"  Error publishing live snapshot: {e}")
+    
+    @staticmethod
+    def _sketch_ms(sketch: QuantileSketch, q: float) -> Optional[float]:
+        value = sketch.quantile(q)
+        return round(value * 1000, 1) if value is not None else None
+    
     def log_performance(self):
         """Log performance metrics every minute (console output only in dev)"""
         now = datetime.now(timezone.utc)
@@ -2181,6 +2496,10 @@ class LiveWorker:
             total_writes = len(self.m1_write_times) + len(self.m2_write_times) + len(self.m3_write_times)
             error_rate = (self.influx_errors / max(1, total_writes)) * 100
             
+            # SQLite contention with the backend since the last report
+            sqlite_stats = contention_stats.snapshot(reset=True)
+            sqlite_total = contention_stats.totals(sqlite_stats)
+            
             # Log to file (structured JSON)
             log.info("Performance metrics", 
                 category='system', action='performance',
@@ -2188,7 +2507,28 @@ class LiveWorker:
                 m2_avg_ms=round(m2_avg, 2),
                 m3_avg_ms=round(m3_avg, 2),
                 influx_errors=self.influx_errors,
-                error_rate_pct=round(error_rate, 2))
+                error_rate_pct=round(error_rate, 2),
+                transitions=self.transition_latency_sketch.count,
+                transition_p50_ms=self._sketch_ms(self.transition_latency_sketch, 0.50),
+                transition_p95_ms=self._sketch_ms(self.transition_latency_sketch, 0.95),
+                sqlite_statements=sqlite_total.executions,
+                sqlite_busy=sqlite_total.busy,
+                sqlite_retries=sqlite_total.retries,
+                sqlite_lock_waits=sqlite_total.lock_waits,
+                sqlite_failed=sqlite_total.failed,
+                sqlite_wait_ms=round(sqlite_total.wait_sec * 1000, 1),
+                sqlite_exec_ms=round(sqlite_total.exec_sec * 1000, 1),
+                sqlite_max_txn_hold_ms=round(sqlite_total.max_hold_sec * 1000, 1))
+            
+            if sqlite_total.busy or sqlite_total.failed:
+                contended = {
+                    key: {'busy': st.busy, 'retries': st.retries, 'failed': st.failed,
+                          'wait_ms': round(st.wait_sec * 1000, 1), 'hold_ms': round(st.hold_sec * 1000, 1)}
+                    for key, st in sqlite_stats.items() if st.busy or st.failed or st.lock_waits
+                }
+                log.warning(f"SQLite contention: {sqlite_total.busy} busy, {sqlite_total.retries} retries, "
+                            f"{sqlite_total.failed} failed",
+                    category='system', action='sqlite_contention', statements=contended)
             
             # Console output only in development
             if ENABLE_CONSOLE:
@@ -2210,6 +2550,15 @@ class LiveWorker:
                 
                 print(f"\nInfluxDB Errors: {self.influx_errors} ({error_rate:.2f}%)")
                 
+                if sqlite_stats:
+                    print(f"\nSQLite: {sqlite_total.executions} stmts  busy: {sqlite_total.busy}  "
+                          f"retries: {sqlite_total.retries}  failed: {sqlite_total.failed}  "
+                          f"wait: {sqlite_total.wait_sec * 1000:.1f}ms")
+                    by_cost = sorted(sqlite_stats.items(), key=lambda kv: kv[1].wait_sec + kv[1].hold_sec, reverse=True)
+                    for key, st in by_cost[:5]:
+                        print(f"  {key:<36} n={st.executions:<5} busy={st.busy:<3} wait={st.wait_sec * 1000:7.1f}ms "
+                              f"exec={st.exec_sec * 1000:7.1f}ms hold={st.hold_sec * 1000:7.1f}ms")
+                
                 if self.start_time:
                     elapsed = time.time() - self.start_time
                     pieces_per_sec = self.pieces_processed / max(1, elapsed)
@@ -2224,6 +2573,16 @@ class LiveWorker:
             self.influx_errors = 0
             self.last_performance_log = now
     
+    def idle(self, seconds: float):
+        """
+        Sleep between loop iterations; returns early when a state change is pushed
+        (or, while transitioning, a batch completion)
+        """
+        if self.machine_client.stream_connected:
+            self.machine_client.wait_for_update(seconds, include_batches=self.transitioning)
+        else:
+            time.sleep(seconds)
+    
     def print_stats(self):
         """Print statistics (silent in production)"""
         if not ENABLE_CONSOLE or not self.start_time:
@@ -2253,6 +2612,11 @@ class LiveWorker:
             "InfluxDB": INFLUX_HOST,
         })
         
+        if M3_AGG_PUSHDOWN and not M3_AGG_VALIDATE:
+            log.warning("M3 aggregation pushdown without M3_AGG_VALIDATE: per-recipe eligible rejects "
+                        "stay 0 and piece weight sketches / weight histograms are not written",
+                        category='kpi', action='m3_pushdown_gaps')
+        
         self.connect()
         self.load_recipes()
         
@@ -2282,6 +2646,9 @@ class LiveWorker:
             else:
                 self.load_current_assignments()
         
+        if MACHINE_STATE_STREAM:
+            self.machine_client.subscribe()
+        
         self.running = True
         self.start_time = time.time()
         last_stats = time.time()
@@ -2294,41 +2661,52 @@ class LiveWorker:
         
         try:
             while self.running:
-                # ===== MACHINE STATE POLLING =====
-                # Poll machine state frequently (every 200ms) for responsive state changes
-                if time.time() - last_state_poll >= 0.2:
+                # ===== MACHINE STATE =====
+                # Pushed over SSE when the stream is up (with a slow safety-net poll);
+                # otherwise polled every 200ms for responsive state changes
+                if self.machine_client.stream_connected:
+                    pushed_state = self.machine_client.consume_update()
+                    if pushed_state is not None:
+                        self.poll_machine_state(pushed_state)
+                        last_state_poll = time.time()
+                    elif time.time() - last_state_poll >= STATE_RESYNC_SEC:
+                        self.poll_machine_state()
+                        last_state_poll = time.time()
+                elif time.time() - last_state_poll >= STATE_POLL_INTERVAL_SEC:
                     self.poll_machine_state()
                     last_state_poll = time.time()
                 
                 # Skip processing if paused (but still poll state above)
                 if self.paused:
-                    time.sleep(0.05)  # Short sleep, state polling happens above
+                    self.idle(0.05)  # Short sleep, state polling happens above
                     continue
                 
                 # Check if transition is complete
                 if self.transitioning:
+                    # Keep tracking open batches; completes as soon as the last one closes
+                    self.poll_transition_progress()
                     if self.check_transition_complete():
                         self.finalize_transition()
-                    # Don't process new pieces during transition
-                    time.sleep(0.05)  # Short sleep, state polling happens above
+                        continue
+                    # Wakes early on a pushed batch completion
+                    self.idle(0.05)
                     continue
                 
                 # ===== NORMAL PROCESSING (when running) =====
                 # Only process if machine is running
                 if self.machine_state != 'running':
-                    time.sleep(0.05)  # Short sleep, state polling happens above
+                    self.idle(0.05)  # Short sleep, state polling happens above
                     continue
                 
-                # Poll for new pieces for M3/M4 calculations only
+                # Poll for new pieces for M3/M4 calculations and in-flight batch tracking
                 # Batch detection now happens in real-time in the backend!
-                pieces = self.poll_new_pieces()
-                
-                # Sort by timestamp to ensure chronological processing
-                # (lookback can return pieces slightly out of order)
-                pieces.sort(key=lambda p: p.timestamp)
-                
-                for piece in pieces:
-                    self.process_piece(piece)
+                # (pushdown mode polls per-gate in-flight totals only, unless validating)
+                self.last_piece_poll = time.monotonic()
+                self.poll_pieces()
+                if not M3_RAW_PIECES and self.minute_accumulator is None:
+                    # No piece stream opens minutes: park every running minute for its query
+                    self.current_minute = minute_of(now_ns())
+                    self.minute_accumulator = MinuteAccumulator(minute=self.current_minute)
                 
                 # Poll for completed batches from backend (single source of truth)
                 completed_batches = self.poll_completed_batches()
@@ -2341,8 +2719,7 @@ class LiveWorker:
                 # Note: accumulate_for_minute may also trigger KPI processing when piece timestamps
                 # cross minute boundaries. This check handles cases where no pieces arrive but
                 # time still passes.
-                now = datetime.now(timezone.utc)
-                current_minute_bucket = now.replace(second=0, microsecond=0)
+                current_minute_bucket = minute_of(now_ns())
                 
                 if last_minute_check is None:
                     last_minute_check = current_minute_bucket
@@ -2350,12 +2727,15 @@ class LiveWorker:
                     # Minute rolled over - process KPIs for completed minute
                     # Only process if accumulator exists AND is for a previous minute
                     # (accumulate_for_minute may have already processed and created new accumulator)
-                    if self.minute_accumulator and self.minute_accumulator.minute_start < current_minute_bucket:
+                    if self.minute_accumulator and self.minute_accumulator.minute < current_minute_bucket:
                         if self.minute_accumulator.has_data():
-                            log.info(f"  Minute rollover detected in main loop ({self.minute_accumulator.minute_start.strftime('%H:%M')} < {current_minute_bucket.strftime('%H:%M')})")
-                            self.process_minute_kpis()
+                            log.info(f"  Minute rollover detected in main loop ({minute_label(self.minute_accumulator.minute)} < {minute_label(current_minute_bucket)})")
+                            self.close_minute()
                     last_minute_check = current_minute_bucket
                 
+                if M3_AGG_PUSHDOWN:
+                    self.flush_settled_minutes()
+                
                 # Legacy program switching disabled - now controlled by backend machine state
                 # try:
                 #     self.check_and_switch_program()
@@ -2375,16 +2755,18 @@ class LiveWorker:
                     last_stats = time.time()
                 
                 # Short sleep to allow frequent state polling (state check is at top of loop)
-                time.sleep(0.2)  # 200ms - allows state changes to be detected quickly
+                self.idle(PIECE_POLL_INTERVAL_SEC)  # 200ms - allows state changes to be detected quickly
                 
         except KeyboardInterrupt:
             log.info("Interrupted by user")
         finally:
-            if self.minute_accumulator:
+            if self.minute_accumulator or self.pushdown_pending:
                 self.process_minute_kpis()
             
             self.print_stats()
             log.info("Worker stopped")
+            self.machine_client.unsubscribe()
+            get_outbound().close()
             self.disconnect()
 
 def main():
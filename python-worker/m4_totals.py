@@ -0,0 +1,72 @@
+"""
+Change-Only M4 Emission
+
+M4 (kpi_totals) rows are cumulative per recipe, so consecutive minutes without
+batches repeat the previous row. In change-only mode:
+1. A row is emitted only when a recipe's cumulative values change
+2. An unchanged recipe is re-emitted every M4_HEARTBEAT_MIN minutes (liveness)
+3. Rows are upserted on (program_id, recipe_name, timestamp)
+4. Readers (server kpiRepo) treat the rows as a step function: the value at
+   time t is the latest row at or before t
+
+Configuration (env):
+    M4_EMIT_MODE      - 'change' (default) or 'every' (one row per recipe per minute)
+    M4_HEARTBEAT_MIN  - re-emit unchanged totals after this many minutes (0 = never, default 15)
+"""
+
+import os
+from typing import Dict, Tuple
+
+M4_EMIT_MODE = os.getenv("M4_EMIT_MODE", "change").strip().lower()
+M4_HEARTBEAT_MIN = int(os.getenv("M4_HEARTBEAT_MIN", "15"))
+
+# Values are compared after rounding so float noise doesn't count as a change
+_VALUE_DECIMALS = 6
+
+
+class M4Emitter:
+    """
+    Decides per recipe and minute whether a kpi_totals row needs writing.
+
+    Usage:
+        if emitter.should_emit(recipe_name, minute, values):
+            write_m4_totals_sqlite(...)
+            emitter.mark_emitted(recipe_name, minute, values)
+    """
+
+    def __init__(self, mode: str = M4_EMIT_MODE, heartbeat_min: int = M4_HEARTBEAT_MIN):
+        self.mode = mode
+        self.heartbeat_min = heartbeat_min
+        self._last: Dict[str, Tuple[Tuple, int]] = {}  # recipe_name -> (values, epoch minute)
+        self.emitted = 0
+        self.suppressed = 0
+
+    def reset(self):
+        """Forget emitted state (new program)"""
+        self._last.clear()
+
+    @staticmethod
+    def _key(values) -> Tuple:
+        return tuple(round(float(v), _VALUE_DECIMALS) for v in values)
+
+    def should_emit(self, recipe_name: str, minute: int, values) -> bool:
+        if self.mode != 'change':
+            return True
+
+        last = self._last.get(recipe_name)
+        if last is None:
+            return True
+
+        last_values, last_minute = last
+        if self._key(values) != last_values:
+            return True
+        if self.heartbeat_min > 0 and minute - last_minute >= self.heartbeat_min:
+            return True
+
+        self.suppressed += 1
+        return False
+
+    def mark_emitted(self, recipe_name: str, minute: int, values):
+        self._last[recipe_name] = (self._key(values), minute)
+        self.emitted += 1
+
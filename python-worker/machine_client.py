@@ -1,22 +1,68 @@
 """
 machine_client.py
 Client for communicating with the backend machine state API
+
+State is pushed over the backend's SSE stream (/api/machine/stream) when
+subscribe() is active; get_state() polling remains the fallback.
+
+Polling goes through one pooled keep-alive session and is conditional: the
+backend's ETag is sent back as If-None-Match, so an unchanged state costs a
+304 with an empty body. Every new state bumps `state_version`, and derived
+values (recipe comparisons) are cached per version.
+
+Batch-completion events on the stream raise a separate signal
+(consume_batch_event) so a transitioning worker can re-read
+batch_completions as soon as a gate closes.
 """
 
 import time
+import random
+import threading
 import requests
 import json
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# SSE stream: the backend sends a keep-alive comment every 15s, so a silent
+# connection for longer than this is treated as dead and reconnected
+STREAM_READ_TIMEOUT_SEC = 45.0
+STREAM_BACKOFF_MIN_SEC = 0.5
+STREAM_BACKOFF_MAX_SEC = 10.0
+
+# Stream events the backend broadcasts right after inserting into batch_completions
+BATCH_EVENT_TYPES = ('recipe_batch_update', 'order_batch_update', 'gate_handoff')
 
 class MachineStateClient:
     """Client for polling and updating machine state from backend"""
     
-    def __init__(self, base_url: str = "http://localhost:5001"):
+    def __init__(self, base_url: str = "http://localhost:5001", outbound=None):
         self.base_url = base_url
         self.api_url = f"{base_url}/api/machine"
         self.last_state = None
         self.poll_interval = 1.0  # seconds
         
+        # Pooled keep-alive session for request/response calls
+        self.session = requests.Session()
+        # Optional OutboundDispatcher for deadline-bounded, breaker-guarded POSTs
+        self.outbound = outbound
+        
+        # Versioned state cache (conditional GET + derived values per version)
+        self.state_version = 0  # incremented for every new state (polled or pushed)
+        self._state_lock = threading.Lock()
+        self._state_etag: Optional[str] = None
+        self._recipes_etag: Optional[str] = None
+        self._recipes_cache: List[Dict] = []
+        self._derived: Dict[str, Tuple[int, Any]] = {}  # name -> (state_version, value)
+        
+        # Push subscription (SSE)
+        self.stream_connected = False
+        self._state_event = threading.Event()
+        self._batch_event = threading.Event()  # a batch completion was pushed
+        self._wake_event = threading.Event()
+        self._stream_thread: Optional[threading.Thread] = None
+        self._stream_stop = threading.Event()
+        self._stream_response = None
+        self._on_state: Optional[Callable[[Dict], None]] = None
+        
     def get_state(self) -> Optional[Dict]:
         """
         Get current machine state from backend
@@ -29,22 +75,214 @@ class MachineStateClient:
         }
         """
         try:
-            response = requests.get(f"{self.api_url}/state", timeout=2)
+            headers = {}
+            if self._state_etag and self.last_state is not None:
+                headers["If-None-Match"] = self._state_etag
+            response = self.session.get(f"{self.api_url}/state", headers=headers, timeout=2)
+            if response.status_code == 304:
+                return self.last_state  # Unchanged - reuse the parsed state
             response.raise_for_status()
             state = response.json()
-            self.last_state = state
+            self._set_state(state, response.headers.get("ETag"))
             return state
         except requests.exceptions.RequestException as e:
             print(f"[MachineClient] Error fetching state: {e}")
             return self.last_state  # Return cached state on error
     
+    # =====================================================================
+    # PUSH SUBSCRIPTION (SSE)
+    # =====================================================================
+    
+    def subscribe(self, on_state: Optional[Callable[[Dict], None]] = None):
+        """
+        Start a background SSE subscription to /api/machine/stream.
+        
+        The backend sends the full state as the first event of every connection,
+        so each (re)connect is also a resync. Reconnects use exponential backoff
+        with jitter; while disconnected, callers fall back to get_state() polling.
+        
+        Args:
+            on_state: optional callback invoked (on the stream thread) per pushed state
+        """
+        if self._stream_thread and self._stream_thread.is_alive():
+            return
+        self._on_state = on_state
+        self._stream_stop.clear()
+        self._stream_thread = threading.Thread(
+            target=self._stream_loop, name="machine-state-sse", daemon=True
+        )
+        self._stream_thread.start()
+    
+    def unsubscribe(self):
+        """Stop the SSE subscription"""
+        self._stream_stop.set()
+        response = self._stream_response
+        if response is not None:
+            # close() waits for the stream thread's blocking read to return,
+            # so don't hold up the caller on it
+            threading.Thread(target=self._close_quietly, args=(response,), daemon=True).start()
+        self._state_event.set()  # Wake any waiter
+        self._wake_event.set()
+    
+    @staticmethod
+    def _close_quietly(response):
+        try:
+            response.close()
+        except Exception:
+            pass
+    
+    def wait_for_update(self, timeout: float, include_batches: bool = False) -> bool:
+        """
+        Block until a state is pushed (or timeout); does not consume the update.
+        With include_batches, a pushed batch-completion event also returns early.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._state_event.is_set() or (include_batches and self._batch_event.is_set()):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._wake_event.wait(remaining)
+            self._wake_event.clear()
+    
+    def consume_update(self) -> Optional[Dict]:
+        """Return the latest pushed state if one arrived since the last call, else None"""
+        if not self._state_event.is_set():
+            return None
+        self._state_event.clear()
+        return self.last_state
+    
+    def consume_batch_event(self) -> bool:
+        """True if a batch-completion event was pushed since the last call"""
+        if not self._batch_event.is_set():
+            return False
+        self._batch_event.clear()
+        return True
+    
+    def _stream_loop(self):
+        backoff = STREAM_BACKOFF_MIN_SEC
+        session = requests.Session()
+        while not self._stream_stop.is_set():
+            try:
+                with session.get(
+                    f"{self.api_url}/stream",
+                    stream=True,
+                    timeout=(2.0, STREAM_READ_TIMEOUT_SEC),
+                    headers={"Accept": "text/event-stream"},
+                ) as response:
+                    response.raise_for_status()
+                    self._stream_response = response
+                    self.stream_connected = True
+                    backoff = STREAM_BACKOFF_MIN_SEC
+                    print("[MachineClient] State stream connected")
+                    self._read_events(response)
+            except requests.exceptions.RequestException as e:
+                if not self._stream_stop.is_set():
+                    print(f"[MachineClient] State stream error: {e}")
+            except Exception as e:
+                if not self._stream_stop.is_set():  # closed under us by unsubscribe()
+                    print(f"[MachineClient] State stream failed: {e}")
+            finally:
+                self._stream_response = None
+                if self.stream_connected:
+                    print("[MachineClient] State stream disconnected, falling back to polling")
+                self.stream_connected = False
+            
+            if self._stream_stop.wait(backoff * random.uniform(0.5, 1.0)):
+                break
+            backoff = min(backoff * 2, STREAM_BACKOFF_MAX_SEC)
+        session.close()
+    
+    def _read_events(self, response):
+        """Parse SSE frames ('data:' lines terminated by a blank line)"""
+        data_lines: List[str] = []
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stream_stop.is_set():
+                return
+            if line is None:
+                continue
+            if line == '':
+                if data_lines:
+                    self._handle_event('\n'.join(data_lines))
+                    data_lines = []
+                continue
+            if line.startswith(':'):
+                continue  # keep-alive comment
+            if line.startswith('data:'):
+                data_lines.append(line[5:].lstrip())
+        # Server closed the stream
+    
+    def _handle_event(self, data: str):
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            return
+        if not isinstance(payload, dict):
+            return
+        # State events are the raw state object; other events carry a 'type'
+        if 'type' in payload:
+            if payload['type'] in BATCH_EVENT_TYPES:
+                self._batch_event.set()
+                self._wake_event.set()
+            return
+        if 'state' not in payload:
+            return
+        self._set_state(payload)
+        self._state_event.set()
+        self._wake_event.set()
+        if self._on_state:
+            try:
+                self._on_state(payload)
+            except Exception as e:
+                print(f"[MachineClient] State callback error: {e}")
+    
+    def _set_state(self, state: Dict, etag: Optional[str] = None):
+        """Store a new state and bump the version (invalidates derived caches)"""
+        with self._state_lock:
+            self.last_state = state
+            self.state_version += 1
+            self._state_etag = etag
+    
+    def _derived_value(self, name: str, state: Optional[Dict], compute: Callable[[Dict], Any]) -> Any:
+        """Compute a value from `state`, cached per state_version when it is the current state"""
+        with self._state_lock:
+            current, version = self.last_state, self.state_version
+        if state is not None and state is not current:
+            return compute(state)
+        if current is None:
+            return compute({})
+        hit = self._derived.get(name)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        value = compute(current)
+        self._derived[name] = (version, value)
+        return value
+    
+    def transition_recipe_changes(self, state: Optional[Dict] = None) -> Dict:
+        """compare_recipes(programStartRecipes, activeRecipes), cached per state version"""
+        return self._derived_value('transition_recipe_changes', state, lambda st: self.compare_recipes(
+            st.get('programStartRecipes', []), st.get('activeRecipes', [])
+        ))
+    
+    def recipes_changed_since_start(self, state: Optional[Dict] = None) -> bool:
+        """True if activeRecipes differ from programStartRecipes, cached per state version"""
+        return self._derived_value('recipes_changed_since_start', state, lambda st: (
+            st.get('activeRecipes', []) != st.get('programStartRecipes', [])
+        ))
+    
     def get_active_recipes(self) -> List[Dict]:
-        """Get active recipes from backend"""
+        """Get active recipes from backend (conditional GET, cached on 304)"""
         try:
-            response = requests.get(f"{self.api_url}/recipes", timeout=2)
+            headers = {"If-None-Match": self._recipes_etag} if self._recipes_etag else {}
+            response = self.session.get(f"{self.api_url}/recipes", headers=headers, timeout=2)
+            if response.status_code == 304:
+                return self._recipes_cache
             response.raise_for_status()
             data = response.json()
-            return data.get('recipes', [])
+            self._recipes_cache = data.get('recipes', [])
+            self._recipes_etag = response.headers.get("ETag")
+            return self._recipes_cache
         except requests.exceptions.RequestException as e:
             print(f"[MachineClient] Error fetching recipes: {e}")
             return []
@@ -61,11 +299,14 @@ class MachineStateClient:
                 'programId': program_id,
                 'action': action
             }
-            response = requests.post(
-                f"{self.api_url}/transition-complete",
-                json=payload,
-                timeout=5
-            )
+            url = f"{self.api_url}/transition-complete"
+            if self.outbound is not None:
+                # Explicit sync point: the worker needs the new programId.
+                # Not idempotent (recipe_change creates a program), so the
+                # dispatcher only retries if the connection was never made.
+                response = self.outbound.call('POST', url, json=payload, deadline=5.0, idempotent=False)
+            else:
+                response = self.session.post(url, json=payload, timeout=5)
             response.raise_for_status()
             result = response.json()
             print(f"[MachineClient] Transition complete acknowledged: {result}")
@@ -106,7 +347,7 @@ class MachineStateClient:
     def is_connected(self) -> bool:
         """Check if backend is reachable"""
         try:
-            response = requests.get(f"{self.base_url}/", timeout=2)
+            response = self.session.get(f"{self.base_url}/", timeout=2)
             return response.status_code == 200
         except:
             return False
@@ -9,6 +9,8 @@ import numpy as np
 from dateutil import tz
 from dotenv import load_dotenv
 
+from quantile_sketch import QuantileSketch
+
 # Resolve everything relative to this file, not the process cwd
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.normpath(os.path.join(BASE_DIR, ".."))
@@ -99,7 +101,7 @@ def to_utc(ts):
 
 def minute_bucket_utc(dt: pd.Timestamp) -> pd.Timestamp:
     dt = to_utc(pd.Timestamp(dt))
-    return dt.floor("T")
+    return dt.floor("min")
 
 def iso_minute_z(dt: pd.Timestamp) -> str:
     dt = minute_bucket_utc(dt)
@@ -109,73 +111,41 @@ def iso_minute_z(dt: pd.Timestamp) -> str:
 def fix_window_slice(df_slice: pd.DataFrame) -> pd.DataFrame:
     """
     Trim off head/tail partial batches for each gate:
-      - drop the first Batch row and any Pieces on-or-before it
+      - drop the first Batch row and any Pieces before it
       - drop the last Batch row and any Pieces on-or-after the second-to-last Batch
+      - drop the Pieces of gates left without Batch rows (one or two batches in the slice)
     Returns the cleaned slice (both Piece and Batch rows), ready for stats.
-    """
-    df = df_slice.copy()
-    to_drop = set()
-
-    # 1) head/tail trimming per gate
-    batch_events = df[df['Type']=='Batch']
-    for gate, grp in batch_events.groupby('Gate'):
-        b = grp.sort_values('Timestamp')
-        first_idx = b.index[0]
-        last_idx  = b.index[-1]
-
-        # 1) head: drop first batch + any piece ≤ first_ts
-        first_ts = b.at[first_idx, 'Timestamp']
-        to_drop.add(first_idx)
-        head_mask = (
-            (df['Type']=='Piece') &
-            (df['Gate']==gate) &
-            (df['Timestamp'] < first_ts)
-        )
-        to_drop.update(df[head_mask].index)
-
-        # 2) tail: find penultimate batch time
-        if len(b) >= 2:
-            pen_idx = b.index[-2]
-            pen_ts  = b.at[pen_idx, 'Timestamp']
-        else:
-            # if only one batch, everything on-or-after first_ts gets dropped
-            pen_ts = first_ts
-        # drop last batch row
-        to_drop.add(last_idx)
-        # drop any piece on-or-after penultimate timestamp
-        tail_mask = (
-            (df['Type']=='Piece') &
-            (df['Gate']==gate) &
-            (df['Timestamp'] >= pen_ts)
-        )
-        to_drop.update(df[tail_mask].index)
-
-    # apply all drops at once
-    cleaned = df.drop(index=to_drop, errors='ignore')
 
-    # apply all drops at once
-    cleaned = df.drop(index=to_drop, errors='ignore')
-
-    # 2) drop any gates (among the processed ones) that now have zero Batch rows
-    remaining = cleaned
-    processed_gates = set(batch_events['Gate'].unique())
-
-    gates_with_batch = set(
-        remaining[
-            (remaining['Type'] == 'Batch') &
-            (remaining['Gate'].isin(processed_gates))
-        ]['Gate']
-    )
-
-    mask_orphan_pieces = (
-        (remaining['Type'] == 'Piece') &
-        (remaining['Gate'].isin(processed_gates)) &      # <- only gates we trimmed
-        (~remaining['Gate'].isin(gates_with_batch))
-    )
-
-    cleaned = remaining.drop(index=remaining[mask_orphan_pieces].index)
-
-    return cleaned.sort_values('Timestamp').reset_index(drop=True)
+    One groupby over the Batch rows gives each gate's first / penultimate batch
+    time; the drops are a single mask over the slice.
+    """
+    is_batch = (df_slice['Type']=='Batch').to_numpy()
+    is_piece = (df_slice['Type']=='Piece').to_numpy()
+
+    # 1) per gate: batch rows in time order (ties keep slice order)
+    events = df_slice.loc[is_batch, ['Gate', 'Timestamp']].assign(_pos=np.flatnonzero(is_batch))
+    events = events.sort_values(['Gate', 'Timestamp'], kind='mergesort')
+    by_gate = events.groupby('Gate', sort=False)
+    head = (by_gate.cumcount() == 0).to_numpy()
+    tail = (by_gate.cumcount(ascending=False) == 0).to_numpy()
+    n_batches = by_gate.size()
+
+    edges = pd.DataFrame({
+        'first_ts': events['Timestamp'][head].array,
+        # penultimate batch time; with a single batch, everything on-or-after first_ts goes
+        'pen_ts': by_gate['Timestamp'].shift()[tail].array,
+        # one or two batches: none left after trimming, so the gate's pieces are orphans
+        'orphan': n_batches.to_numpy() <= 2,
+    }, index=n_batches.index)
+    edges['pen_ts'] = edges['pen_ts'].where(n_batches > 1, edges['first_ts'])
+
+    # 2) merge the edges back onto every row and drop with one mask
+    rows = df_slice[['Gate', 'Timestamp']].merge(edges, how='left', left_on='Gate', right_index=True)
+    outside = (rows['Timestamp'] < rows['first_ts']) | (rows['Timestamp'] >= rows['pen_ts']) | rows['orphan'].eq(True)
+    drop = is_piece & outside.to_numpy()
+    drop[events['_pos'].to_numpy()[head | tail]] = True
+
+    return df_slice[~drop].sort_values('Timestamp').reset_index(drop=True)
 
 # --------------------- DATA CLASSES ---------------------
 @dataclass(frozen=True)
@@ -410,6 +380,21 @@ class SqliteWriter:
               updated_at   = CURRENT_TIMESTAMP
         """, (program_id, gate_number, n, mean, m2, mn, mx))
 
+        # Mergeable quantile sketch for percentile queries (merge into any existing one)
+        row = self.conn.execute("""
+            SELECT sketch FROM gate_dwell_sketches WHERE program_id=? AND gate_number=?
+        """, (program_id, gate_number)).fetchone()
+        sketch = QuantileSketch.from_bytes(row[0]) if row else QuantileSketch()
+        sketch.add_many(durations_sec)
+        self.conn.execute("""
+            INSERT INTO gate_dwell_sketches (program_id, gate_number, sample_count, sketch, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(program_id, gate_number) DO UPDATE SET
+              sample_count = excluded.sample_count,
+              sketch       = excluded.sketch,
+              updated_at   = CURRENT_TIMESTAMP
+        """, (program_id, gate_number, sketch.count, sketch.to_bytes()))
+
     def write_kpi_minute_recipes(self, program_id: int, recipe_minute: Dict[Tuple[int, str], Dict[str, float]], 
                                   recipe_kpi_minute: Dict[Tuple[int, str], Dict[str, float]], 
                                   assignments: 'WindowAssignments'):
@@ -515,6 +500,10 @@ class SqliteWriter:
                 INSERT INTO kpi_totals
                   (timestamp, recipe_name, program_id, total_batches, giveaway_g_per_batch, giveaway_pct_avg)
                 VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(program_id, recipe_name, timestamp) DO UPDATE SET
+                  total_batches = excluded.total_batches,
+                  giveaway_g_per_batch = excluded.giveaway_g_per_batch,
+                  giveaway_pct_avg = excluded.giveaway_pct_avg
             """, (
                 ts_z,
                 recipe_name,
@@ -656,7 +645,7 @@ class InfluxWriter:
 
         grp = (
             pieces_df
-            .assign(_time=pieces_df['Timestamp'].dt.floor('T'))
+            .assign(_time=pieces_df['Timestamp'].dt.floor('min'))
             .groupby(['Gate', '_time'])['Weight']
             .agg(pieces_in_gate='count', weight_sum_g='sum')
             .reset_index()
@@ -886,6 +875,42 @@ def load_recipe_map(recipe_map_path: str) -> Dict[str, RecipeSpec]:
 
 # --------------------- KPI COMPUTATION ---------------------
 
+def _parse_recipe_name(rname: str) -> Tuple[int, int, int, int, Optional[str], Optional[int]]:
+    """R_pmin_pmax_bmin_bmax_type_val -> (lo_p, hi_p, lo_b, hi_b, bc_type, bc_val); zeros if unparsable"""
+    try:
+        _, x, y, xx, yy, xxx, yyy = rname.split('_', 6)
+        bc_type = None if xxx == 'NA' else xxx
+        bc_val  = None if yyy in ('NA','',None) else int(float(yyy))
+        return int(x), int(y), int(xx), int(yy), bc_type, bc_val
+    except Exception:
+        return 0, 0, 0, 0, None, None
+
+def _batch_fill_target(b: pd.DataFrame, lo_p: int, lo_b: int, bc_type: Optional[str], bc_val: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per batch row: filled-batch equivalent and target weight.
+      - count recipes ('exact'/'min' with a count): fill 1 when the count condition holds, else count/bc_val;
+        target = fill x bc_val x piece_min (unreadable BatchCount counts as 0)
+      - weight recipes: fill min(1, weight/batch_min), target = fill x batch_min (batch_min <= 0: fill 1, target = weight)
+    """
+    weight = b['Weight'].to_numpy(dtype=float)
+    if bc_type in ('exact','min') and bc_val:
+        if 'BatchCount' in b:
+            count = pd.to_numeric(b['BatchCount'], errors='coerce').to_numpy(dtype=float)
+        else:
+            count = np.full(len(b), np.nan)
+        count = np.trunc(np.where(np.isfinite(count), count, 0.0))
+        hit = (count == bc_val) if bc_type == 'exact' else (count >= bc_val)
+        fill = np.where(hit, 1.0, count / float(bc_val))
+        return fill, fill * float(bc_val * lo_p)
+    if lo_b <= 0:
+        return np.ones(len(weight)), weight
+    fill = np.where(weight >= lo_b, 1.0, weight / float(lo_b))
+    return fill, fill * lo_b
+
+def _running_sum(values: np.ndarray) -> float:
+    """Left-to-right float sum (rounds exactly like accumulating row by row)"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
 def compute_window_kpis(df_slice: pd.DataFrame, assignments: WindowAssignments):
     """
     Returns:
@@ -894,70 +919,49 @@ def compute_window_kpis(df_slice: pd.DataFrame, assignments: WindowAssignments):
       - prog_minute: dict[minute_iso] -> {batches_created, pieces_processed, weight_processed_g}
       - recipe_minute: dict[(recipe_id, minute_iso)] -> same fields as prog_minute
       - dwell: dict[gate] -> list[durations_sec]
-      - recipe_kpi_minute: dict[(recipe_id, minute_iso)] -> {batches_min, rejects_per_min, giveaway_pct}
+      - dwell_timestamps: dict[gate] -> list[batch timestamps] (one per dwell entry)
+      - recipe_kpi_minute: dict[(recipe_id, minute_iso)] -> {batches_min, giveaway_pct}
       - combined_kpi_minute: dict[minute_iso] -> {batches_min, rejects_per_min, giveaway_pct}
+
+    Columnar: timestamps are floored to the minute once, fill/target are computed per
+    recipe as arrays, and every (recipe, minute) figure comes from one groupby.
     """
-    pieces = df_slice[df_slice['Type']=='Piece'].copy()
-    batches = df_slice[df_slice['Type']=='Batch'].copy()
+    pieces = df_slice[df_slice['Type']=='Piece']
+    batches = df_slice[df_slice['Type']=='Batch']
+    piece_min = pieces['Timestamp'].dt.floor('min')
+    batch_min = batches['Timestamp'].dt.floor('min')
+
+    recipes = []  # (rid, gates, lo_p, hi_p, lo_b, hi_b, bc_type, bc_val)
+    for rid, gates in assignments.recipe_id_to_gates.items():
+        if rid is None or not gates:
+            continue
+        recipes.append((rid, gates) + _parse_recipe_name(assignments.gate_to_recipe_name[gates[0]]))
 
     # -------- per-recipe totals using "filled batches equiv" logic --------
     per_recipe_totals = {}
     total_filled = 0.0
     total_w_batched = 0.0
     total_w_give = 0.0
-
-    # Build a compact recipe dataframe like in your reference
-    pieces_sorted = df_slice.sort_values(by=['Timestamp','file_order'], ascending=[True, False], kind='mergesort')
-    pieces_only   = pieces_sorted[pieces_sorted['Type']=='Piece']
-
-    for rid, gates in assignments.recipe_id_to_gates.items():
-        if rid is None or not gates: 
-            continue
-
-        rname = assignments.gate_to_recipe_name[gates[0]]
-        try:
-            _, x, y, xx, yy, xxx, yyy = rname.split('_', 6)
-            lo_p, hi_p = int(x), int(y)
-            lo_b, hi_b = int(xx), int(yy)
-            bc_type = None if xxx == 'NA' else xxx
-            bc_val  = None if yyy in ('NA','',None) else int(float(yyy))
-        except Exception:
-            lo_p=hi_p=lo_b=hi_b=0; bc_type=None; bc_val=None
-
-        b = df_slice[(df_slice['Type']=='Batch') & (df_slice['Gate'].isin(gates))].sort_values('Timestamp').copy()
-
-        filled_equiv = 0.0
-        w_target_sum = 0.0
+    frames = []  # per recipe: its batch and piece rows, tagged for the (recipe, minute) groupby
+
+    for pos, (rid, gates, lo_p, hi_p, lo_b, hi_b, bc_type, bc_val) in enumerate(recipes):
+        on_b = batches['Gate'].isin(gates)
+        on_p = pieces['Gate'].isin(gates)
+        b = batches[on_b]
+        fill, target = _batch_fill_target(b, lo_p, lo_b, bc_type, bc_val)
+
+        # totals accumulate in timestamp order (float sums depend on the order)
+        order = b[['Timestamp']].reset_index(drop=True).sort_values('Timestamp').index.to_numpy()
+        filled_equiv = _running_sum(fill[order])
+        w_target_sum = _running_sum(target[order])
         w_actual_sum = float(b['Weight'].sum())
-
-        for _, bb in b.iterrows():
-            weight = float(bb['Weight'])
-            if bc_type in ('exact','min') and bc_val:
-                try:
-                    actual_count = int(float(bb.get('BatchCount', np.nan)))
-                except:
-                    actual_count = 0
-                this_fill = 1.0 if (bc_type=='exact' and actual_count==bc_val) or (bc_type=='min' and actual_count>=bc_val) \
-                        else (actual_count/float(bc_val)) if bc_val else 0.0
-                this_target = this_fill * (bc_val * lo_p if bc_val else 0.0)
-            else:
-                if lo_b <= 0:
-                    this_fill   = 1.0
-                    this_target = weight
-                else:
-                    this_fill   = 1.0 if weight >= lo_b else weight/float(lo_b)
-                    this_target = this_fill * lo_b
-
-            filled_equiv += this_fill
-            w_target_sum += this_target
-
         w_give = max(0.0, w_actual_sum - w_target_sum)
 
         # rejects for SQL totals: gate 0, but eligibility by piece bounds
-        elig = pieces_only[pieces_only['Weight'].between(lo_p, hi_p)]
-        w_rej = float(elig[~elig['Gate'].isin(gates)]['Weight'].sum())
-        i_rej = int(elig[~elig['Gate'].isin(gates)].shape[0])
-        i_bat = int(pieces_only[pieces_only['Gate'].isin(gates)].shape[0])
+        rej = pieces['Weight'].between(lo_p, hi_p) & ~on_p
+        w_rej = float(pieces.loc[rej, 'Weight'].sum())
+        i_rej = int(rej.sum())
+        i_bat = int(on_p.sum())
 
         per_recipe_totals[rid] = {
             "total_batches": float(filled_equiv),                     # NOTE: filled equivalents
@@ -972,10 +976,19 @@ def compute_window_kpis(df_slice: pd.DataFrame, assignments: WindowAssignments):
         total_w_batched  += w_target_sum
         total_w_give     += w_give
 
+        frames.append(pd.DataFrame({
+            'recipe': pos, '_min': batch_min[on_b], 'batches': 1, 'pieces': 0, 'weight': 0,
+            'batch_w': b['Weight'].astype('int64'), 'target': target,
+        }))
+        frames.append(pd.DataFrame({
+            'recipe': pos, '_min': piece_min[on_p], 'batches': 0, 'pieces': 1,
+            'weight': pieces.loc[on_p, 'Weight'].astype('int64'), 'batch_w': 0, 'target': 0.0,
+        }))
+
     # SQL program totals (reject weight = actual gate 0 weight)
-    w_reject_prog = float(df_slice[(df_slice['Type']=='Piece') & (df_slice['Gate']==0)]['Weight'].sum())
-    items_batched = int(pieces_only[pieces_only['Gate']!=0].shape[0])
-    items_reject  = int(pieces_only[pieces_only['Gate']==0].shape[0])
+    w_reject_prog = float(pieces.loc[pieces['Gate']==0, 'Weight'].sum())
+    items_batched = int((pieces['Gate']!=0).sum())
+    items_reject  = int((pieces['Gate']==0).sum())
 
     program_totals = {
         "total_batches": float(total_filled),                      # filled equivalents
@@ -989,123 +1002,71 @@ def compute_window_kpis(df_slice: pd.DataFrame, assignments: WindowAssignments):
     # -------- throughput minute (SQLite 11–13) --------
     prog_minute: Dict[str, Dict[str, float]] = {}
     # batches/min
-    for ts_min, cnt in batches[batches['Gate']!=0].groupby(batches['Timestamp'].dt.floor('T')).size().items():
+    on_gate = batches['Gate']!=0
+    for ts_min, cnt in batch_min[on_gate].groupby(batch_min[on_gate]).size().items():
         z = iso_minute_z(ts_min)
         prog_minute.setdefault(z, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
         prog_minute[z]["batches_created"] += int(cnt)
     # pieces/min (processed = batched + rejected)
-    for ts_min, cnt in pieces.groupby(pieces['Timestamp'].dt.floor('T')).size().items():
+    for ts_min, cnt in piece_min.groupby(piece_min).size().items():
         z = iso_minute_z(ts_min)
         prog_minute.setdefault(z, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
         prog_minute[z]["pieces_processed"] += int(cnt)
     # weight processed/min (non-reject pieces)
-    nonrej = pieces[pieces['Gate']!=0]
-    for ts_min, s in nonrej.groupby(nonrej['Timestamp'].dt.floor('T'))['Weight'].sum().items():
+    nonrej = pieces['Gate']!=0
+    for ts_min, s in pieces.loc[nonrej, 'Weight'].groupby(piece_min[nonrej]).sum().items():
         z = iso_minute_z(ts_min)
         prog_minute.setdefault(z, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
         prog_minute[z]["weight_processed_g"] += int(s)
 
+    # -------- one groupby over (recipe, minute) --------
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        {'recipe': [], '_min': [], 'batches': [], 'pieces': [], 'weight': [], 'batch_w': [], 'target': []})
+    rows = rows[rows['_min'].notna()]
+    grouped = rows.groupby(['recipe', '_min'], sort=True)
+    per_min = grouped[['batches', 'pieces', 'weight', 'batch_w']].sum()
+    # bincount adds in row order (each minute's batches in slice order), as the per-minute loop did
+    per_min['target'] = np.bincount(grouped.ngroup().to_numpy(), weights=rows['target'].to_numpy(dtype=float),
+                                    minlength=len(per_min))
+    minute_z = {ts_min: iso_minute_z(ts_min) for ts_min in per_min.index.unique(level='_min')}
+    recipe_pos = per_min.index.get_level_values('recipe').to_numpy()
+    minutes = per_min.index.get_level_values('_min')
+    n_batches = per_min['batches'].to_numpy()
+    n_pieces = per_min['pieces'].to_numpy()
+    w_pieces = per_min['weight'].to_numpy()
+    w_batches = per_min['batch_w'].to_numpy()
+    w_targets = per_min['target'].to_numpy()
+
+    # per recipe: minutes with batches first, then minutes with pieces only
     recipe_minute: Dict[Tuple[int, str], Dict[str, float]] = {}
-    for rid, gates in assignments.recipe_id_to_gates.items():
-        if rid is None or not gates: continue
-        # batches per minute
-        b = batches[batches['Gate'].isin(gates)]
-        for ts_min, cnt in b.groupby(b['Timestamp'].dt.floor('T')).size().items():
-            key = (rid, iso_minute_z(ts_min))
-            recipe_minute.setdefault(key, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
-            recipe_minute[key]["batches_created"] += int(cnt)
-        # pieces per minute
-        p = pieces[pieces['Gate'].isin(gates)]
-        for ts_min, cnt in p.groupby(p['Timestamp'].dt.floor('T')).size().items():
-            key = (rid, iso_minute_z(ts_min))
-            recipe_minute.setdefault(key, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
-            recipe_minute[key]["pieces_processed"] += int(cnt)
-        # weight processed/min
-        for ts_min, s in p.groupby(p['Timestamp'].dt.floor('T'))['Weight'].sum().items():
-            key = (rid, iso_minute_z(ts_min))
-            recipe_minute.setdefault(key, {"batches_created":0, "pieces_processed":0, "weight_processed_g":0})
-            recipe_minute[key]["weight_processed_g"] += int(s)
+    for i in np.lexsort((n_batches == 0, recipe_pos)):
+        key = (recipes[recipe_pos[i]][0], minute_z[minutes[i]])
+        recipe_minute[key] = {
+            "batches_created": int(n_batches[i]),
+            "pieces_processed": int(n_pieces[i]),
+            "weight_processed_g": int(w_pieces[i]),
+        }
 
     # -------- minute-level KPIs for Influx (M3) --------
     recipe_kpi_minute: Dict[Tuple[int, str], Dict[str, float]] = {}
     # cache per-minute (w_give, denom) to build combined later
     minute_accum_extra: Dict[str, Dict[str, float]] = {}  # ts_z -> {w_give_sum, denom_sum}
-    for rid, gates in assignments.recipe_id_to_gates.items():
-        if rid is None or not gates: continue
+    for i in np.flatnonzero(n_batches > 0):
+        w_actual = float(w_batches[i])
+        w_give = max(0.0, w_actual - float(w_targets[i]))
+        denom = w_actual + w_give
+        gpct = (w_give / denom * 100.0) if denom > 0 else 0.0
+
+        tz_z = minute_z[minutes[i]]
+        recipe_kpi_minute[(recipes[recipe_pos[i]][0], tz_z)] = {
+            "batches_min": int(n_batches[i]),
+            "giveaway_pct": float(gpct),
+        }
 
-        rname = assignments.gate_to_recipe_name[gates[0]]
-        try:
-            _, x, y, xx, yy, xxx, yyy = rname.split('_', 6)
-            lo_p, hi_p = int(x), int(y)
-            lo_b, hi_b = int(xx), int(yy)
-            bc_type = None if xxx == 'NA' else xxx
-            bc_val  = None if yyy in ('NA','',None) else int(float(yyy))
-        except Exception:
-            lo_p=hi_p=lo_b=hi_b=0; bc_type=None; bc_val=None
-
-        # batches and eligible rejects for this recipe
-        b = batches[batches['Gate'].isin(gates)]
-        elig = pieces[pieces['Weight'].between(lo_p, hi_p)]
-        rej = elig[~elig['Gate'].isin(gates)]
-
-        # batches per minute for 'batches_min'
-        b_count_by_min = b.groupby(b['Timestamp'].dt.floor('T')).size()
-
-        # actual batched weight per minute
-        b_w_by_min = b.groupby(b['Timestamp'].dt.floor('T'))['Weight'].sum()
-        # rejected eligible weight per minute
-        rej_w_by_min = rej.groupby(rej['Timestamp'].dt.floor('T'))['Weight'].sum()
-        # rejected count per minute
-        rej_c_by_min = rej.groupby(rej['Timestamp'].dt.floor('T')).size()
-
-        # compute target weight per minute (apply same rules to the minute's batch subset)
-        for ts_min, w_actual in b_w_by_min.items():
-            sub_batches = b[b['Timestamp'].dt.floor('T') == ts_min]
-            w_target = 0.0
-            for _, bb in sub_batches.iterrows():
-                weight = float(bb['Weight'])
-                if bc_type in ('exact','min') and bc_val:
-                    try:
-                        actual_count = int(float(bb.get('BatchCount', np.nan)))
-                    except:
-                        actual_count = 0
-                    fill = 1.0 if (bc_type=='exact' and actual_count==bc_val) or (bc_type=='min' and actual_count>=bc_val) \
-                           else (actual_count/float(bc_val)) if bc_val else 0.0
-                    w_target += fill * (bc_val * lo_p if bc_val else 0.0)
-                else:
-                    if lo_b <= 0:
-                        w_target += weight
-                    else:
-                        fill = 1.0 if weight >= lo_b else weight/float(lo_b)
-                        w_target += fill * lo_b
-
-            w_give = max(0.0, float(w_actual) - float(w_target))
-            denom = float(w_actual) + w_give
-            gpct = (w_give / denom * 100.0) if denom > 0 else 0.0
-
-            key = (rid, iso_minute_z(ts_min))
-            # batches_min
-            bmin = int(b_count_by_min.get(ts_min, 0))
-            # rejects_per_min
-            rmin = int(rej_c_by_min.get(ts_min, 0))
-
-            recipe_kpi_minute[key] = {
-                "batches_min": bmin,
-                "giveaway_pct": float(gpct),
-            }
-
-            # accumulate for combined
-            tz_z = iso_minute_z(ts_min)
-            acc = minute_accum_extra.setdefault(tz_z, {"w_give_sum": 0.0, "denom_sum": 0.0})
-            acc["w_give_sum"] += w_give
-            acc["denom_sum"]  += denom
-
-        # also ensure minutes that had batches but zero giveaway get entries
-        for ts_min, cnt in b_count_by_min.items():
-            key = (rid, iso_minute_z(ts_min))
-            if key not in recipe_kpi_minute:
-                rmin = int(rej_c_by_min.get(ts_min, 0))
-                recipe_kpi_minute[key] = {"batches_min": int(cnt), "rejects_per_min": rmin, "giveaway_pct": 0.0}
+        # accumulate for combined
+        acc = minute_accum_extra.setdefault(tz_z, {"w_give_sum": 0.0, "denom_sum": 0.0})
+        acc["w_give_sum"] += w_give
+        acc["denom_sum"]  += denom
 
     # combined minute roll-up
     combined_kpi_minute: Dict[str, Dict[str, float]] = {}
@@ -1297,9 +1258,9 @@ def main():
             # compute dense minute list for this window if needed
             full_minutes_z = []
             if DENSE_INFLUX_MINUTES:
-                t0 = df_slice['Timestamp'].min().floor('T')
-                t1 = df_slice['Timestamp'].max().floor('T')
-                full_minutes_z = [m.strftime("%Y-%m-%dT%H:%M:00Z") for m in pd.date_range(t0, t1, freq='T')]
+                t0 = df_slice['Timestamp'].min().floor('min')
+                t1 = df_slice['Timestamp'].max().floor('min')
+                full_minutes_z = [m.strftime("%Y-%m-%dT%H:%M:00Z") for m in pd.date_range(t0, t1, freq='min')]
                 # sneak it into assignments for writeKpiMinuteDF (no schema change to that signature)
                 assignments.gate_to_recipe_name['__full_minutes__'] = full_minutes_z
 
@@ -1314,14 +1275,14 @@ def main():
             combined_kpi_minute) = compute_window_kpis(df_slice, assignments)
 
             # Build dense minute list for SQLite always
-            t0 = df_slice['Timestamp'].min().floor('T')
-            t1 = df_slice['Timestamp'].max().floor('T')
-            full_minutes_z_sql = [m.strftime("%Y-%m-%dT%H:%M:00Z") for m in pd.date_range(t0, t1, freq='T')]
+            t0 = df_slice['Timestamp'].min().floor('min')
+            t1 = df_slice['Timestamp'].max().floor('min')
+            full_minutes_z_sql = [m.strftime("%Y-%m-%dT%H:%M:00Z") for m in pd.date_range(t0, t1, freq='min')]
 
             # build Gate-0 (reject) piece-counts and weights per minute (needed for combined KPIs)
             g0 = df_slice[(df_slice['Type'] == 'Piece') & (df_slice['Gate'] == 0)].copy()
             if not g0.empty:
-                g0_with_min = g0.assign(_min=g0['Timestamp'].dt.floor('T'))
+                g0_with_min = g0.assign(_min=g0['Timestamp'].dt.floor('min'))
                 gate0_counts_per_min = g0_with_min.groupby('_min').size()
                 gate0_weights_per_min = g0_with_min.groupby('_min')['Weight'].sum()
                 
@@ -0,0 +1,268 @@
+"""
+Outbound HTTP Dispatcher
+
+Keeps backend notifications off the worker's processing loop:
+1. Requests run on a small thread pool over one pooled keep-alive session
+2. Every call has a deadline budget covering all attempts (not per attempt)
+3. Duplicate queued requests with the same coalesce key collapse into one
+   (e.g. several resets for the same gate - the latest payload wins)
+4. Failures are retried with bounded exponential backoff and jitter
+   (non-idempotent calls only retry when the connection was never made:
+   connect timeout or refused / unresolvable, never a read timeout or a
+   connection dropped mid-request)
+5. A circuit breaker fails calls fast while the backend is down; call() sync
+   points have their own breaker, so failed fire-and-forget calls can't open it
+
+Fire-and-forget calls use submit() and return a Future; explicit sync points
+(e.g. transition-complete, whose response is needed) use call().
+
+Usage:
+    from outbound import OutboundDispatcher
+
+    outbound = OutboundDispatcher()
+    outbound.submit('POST', url, json=payload, coalesce_key=f"gate_reset:{gate}")
+    response = outbound.call('POST', url, json=payload, deadline=5.0, idempotent=False)
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from logger import get_logger
+
+log = get_logger('worker')
+
+DEFAULT_DEADLINE_SEC = 2.0
+DEFAULT_MAX_ATTEMPTS = 3
+BACKOFF_BASE_SEC = 0.1
+BACKOFF_MAX_SEC = 1.0
+
+
+class OutboundError(requests.exceptions.RequestException):
+    """Base class for dispatcher failures (caught by existing RequestException handlers)"""
+
+
+class CircuitOpenError(OutboundError):
+    """Call rejected because the circuit breaker is open"""
+
+
+class DeadlineExceeded(OutboundError):
+    """Deadline budget used up before a successful response"""
+
+
+def never_connected(error: Exception) -> bool:
+    """True if the request failed before a connection was made (safe to retry any method)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the connect failure
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    - calls pass; `failure_threshold` consecutive failures open it
+    open      - calls fail fast for `reset_timeout_sec`
+    half-open - one trial call; success closes, failure re-opens
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_sec: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout_sec:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state_locked()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                log.info("Outbound circuit closed", category='system', action='outbound_circuit')
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if was_trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                log.warning(f"Outbound circuit open after {self._failures} failures",
+                    category='system', action='outbound_circuit')
+
+
+class _Pending:
+    """A queued request that later submits with the same coalesce key may overwrite"""
+    __slots__ = ('kwargs', 'future')
+
+    def __init__(self, kwargs: Dict, future: Future):
+        self.kwargs = kwargs
+        self.future = future
+
+
+class OutboundDispatcher:
+    """Thread-pool HTTP dispatcher with deadlines, coalescing, retries and a circuit breaker"""
+
+    def __init__(self, max_workers: int = 4, breaker: Optional[CircuitBreaker] = None,
+                 call_breaker: Optional[CircuitBreaker] = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = breaker or CircuitBreaker()            # submit()
+        self.call_breaker = call_breaker or CircuitBreaker()  # call() sync points
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='outbound')
+        self._pending: Dict[str, _Pending] = {}
+        self._lock = threading.Lock()
+
+        # Counters for monitoring
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, method: str, url: str, *, json=None, headers: Optional[Dict] = None,
+               deadline: float = DEFAULT_DEADLINE_SEC, coalesce_key: Optional[str] = None,
+               idempotent: bool = True, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+               on_done: Optional[Callable[[Future], None]] = None,
+               breaker: Optional[CircuitBreaker] = None) -> Future:
+        """
+        Queue a request without blocking. The Future resolves to the Response
+        (any status) or raises a RequestException / OutboundError.
+
+        With coalesce_key, a request still waiting in the queue under the same
+        key is updated in place (latest payload wins) and its Future returned.
+        """
+        kwargs = dict(method=method, url=url, json=json, headers=headers,
+                      deadline_at=time.monotonic() + deadline,
+                      idempotent=idempotent, max_attempts=max_attempts,
+                      breaker=breaker or self.breaker)
+
+        if coalesce_key is not None:
+            with self._lock:
+                pending = self._pending.get(coalesce_key)
+                if pending is not None:
+                    pending.kwargs = kwargs
+                    self.coalesced += 1
+                    if on_done:
+                        pending.future.add_done_callback(on_done)
+                    return pending.future
+                future: Future = Future()
+                pending = self._pending[coalesce_key] = _Pending(kwargs, future)
+            if on_done:
+                future.add_done_callback(on_done)
+            self._executor.submit(self._run_pending, coalesce_key, pending)
+            return future
+
+        future = self._executor.submit(self._execute, **kwargs)
+        if on_done:
+            future.add_done_callback(on_done)
+        return future
+
+    def call(self, method: str, url: str, *, deadline: float = DEFAULT_DEADLINE_SEC, **kwargs) -> requests.Response:
+        """Explicit sync point: dispatch and wait (bounded by the deadline) for the response"""
+        future = self.submit(method, url, deadline=deadline, breaker=self.call_breaker, **kwargs)
+        try:
+            # Small grace so the worker thread reports its own DeadlineExceeded
+            return future.result(timeout=deadline + 0.5)
+        except FutureTimeout:
+            raise DeadlineExceeded(f"{method} {url} exceeded {deadline:.1f}s deadline")
+
+    def close(self, wait: bool = True):
+        """Stop accepting work; with wait=True, queued calls drain (each bounded by its deadline)"""
+        self._executor.shutdown(wait=wait)
+        self.session.close()
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def _run_pending(self, key: str, pending: _Pending):
+        # Detach from the coalescing table as soon as we start, so later
+        # submits queue a fresh request instead of mutating this one
+        with self._lock:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            kwargs = pending.kwargs
+        if not pending.future.set_running_or_notify_cancel():
+            return
+        try:
+            pending.future.set_result(self._execute(**kwargs))
+        except BaseException as e:
+            pending.future.set_exception(e)
+
+    def _execute(self, method: str, url: str, json, headers, deadline_at: float,
+                 idempotent: bool, max_attempts: int, breaker: CircuitBreaker) -> requests.Response:
+        attempt = 0
+        last_error: Optional[Exception] = None
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                self.failed += 1
+                raise DeadlineExceeded(f"{method} {url}: deadline exceeded ({last_error})")
+            if not breaker.allow():
+                self.failed += 1
+                raise CircuitOpenError(f"{method} {url}: circuit open")
+
+            attempt += 1
+            try:
+                response = self.session.request(method, url, json=json, headers=headers,
+                                                timeout=(min(remaining, 1.0), remaining))
+                if response.status_code >= 500:
+                    raise requests.exceptions.HTTPError(
+                        f"{response.status_code} from {url}", response=response)
+                breaker.record_success()
+                self.sent += 1
+                return response  # 2xx-4xx: caller decides; 4xx is not retryable
+            except requests.exceptions.RequestException as e:
+                last_error = e
+                breaker.record_failure()
+                retryable = idempotent or never_connected(e)
+                if not retryable or attempt >= max_attempts:
+                    self.failed += 1
+                    raise
+
+            # Bounded exponential backoff with full jitter, never past the deadline
+            backoff = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** (attempt - 1)))
+            sleep_for = random.uniform(0, backoff)
+            if time.monotonic() + sleep_for >= deadline_at:
+                self.failed += 1
+                raise DeadlineExceeded(f"{method} {url}: deadline exceeded ({last_error})")
+            time.sleep(sleep_for)
@@ -0,0 +1,358 @@
+"""
+M1 Piece Store
+
+The worker's reads of the `pieces` measurement go through a small interface
+so the backing store can be swapped:
+
+    InfluxPieceStore - InfluxDB 3 via InfluxDBClient3.query (production)
+    ArrowPieceStore  - in-memory Arrow table (tests, benchmarks, comparisons)
+
+Only the query subset the worker needs is supported:
+1. Piece rows in a time range, ordered by time
+2. Filters: weight range (inclusive), gate include / exclude lists
+3. COUNT(*) / SUM(weight_g) over the same filters
+4. Per-minute per-gate COUNT / SUM (M3 aggregation pushdown)
+5. Per-gate COUNT / SUM after a per-gate start time (pushdown in-flight batches)
+
+Times are epoch nanoseconds. Ranges are [start, end) unless end_inclusive.
+Gates are tags in InfluxDB (strings) and ints in the Arrow store; callers
+normalise with int().
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from epoch_time import NS_PER_MINUTE, ARROW_UNIT_TO_NS, ns_to_iso
+
+PIECE_COLUMNS = ('time', 'weight_g', 'gate', 'piece_id')
+
+PIECE_SCHEMA = pa.schema([
+    ('time', pa.timestamp('ns', tz='UTC')),
+    ('weight_g', pa.float64()),
+    ('gate', pa.int64()),
+    ('piece_id', pa.string()),
+])
+
+MINUTE_TOTALS_SCHEMA = pa.schema([
+    ('minute', pa.timestamp('ns', tz='UTC')),
+    ('gate', pa.int64()),
+    ('pieces', pa.int64()),
+    ('weight_g', pa.float64()),
+])
+
+GATE_TOTALS_SCHEMA = pa.schema([
+    ('gate', pa.int64()),
+    ('pieces', pa.int64()),
+    ('weight_g', pa.float64()),
+])
+
+
+class PieceStore:
+    """Read interface for M1 pieces"""
+
+    def query_pieces(self, start_ns: int, end_ns: int, *, end_inclusive: bool = False,
+                     min_weight: Optional[float] = None, max_weight: Optional[float] = None,
+                     gates: Optional[Iterable[int]] = None, exclude_gates: Optional[Iterable[int]] = None,
+                     columns: Sequence[str] = PIECE_COLUMNS) -> Optional[pa.Table]:
+        """Piece rows matching the filters, ordered by time"""
+        raise NotImplementedError
+
+    def query_totals(self, start_ns: int, end_ns: int, *, end_inclusive: bool = False,
+                     min_weight: Optional[float] = None, max_weight: Optional[float] = None,
+                     gates: Optional[Iterable[int]] = None,
+                     exclude_gates: Optional[Iterable[int]] = None) -> Tuple[int, float]:
+        """(COUNT(*), SUM(weight_g)) over the matching pieces"""
+        raise NotImplementedError
+
+    def query_minute_gate_totals(self, start_ns: int, end_ns: int) -> Optional[pa.Table]:
+        """Table of (minute, gate, pieces, weight_g) for [start_ns, end_ns), minutes as timestamps"""
+        raise NotImplementedError
+
+    def query_gate_totals_since(self, since_ns: Dict[int, int], end_ns: int) -> Optional[pa.Table]:
+        """Table of (gate, pieces, weight_g): each gate's pieces after since_ns[gate] and before end_ns"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# =========================================================
+# INFLUXDB 3
+# =========================================================
+
+def _gate_list(gates: Iterable[int]) -> str:
+    # gate is a string tag in the pieces measurement
+    return ', '.join(f"'{int(g)}'" for g in sorted(set(gates)))
+
+
+class InfluxPieceStore(PieceStore):
+    """Pieces stored in InfluxDB 3 (SQL via InfluxDBClient3.query)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _where(start_ns: int, end_ns: int, end_inclusive: bool, min_weight, max_weight,
+               gates, exclude_gates) -> str:
+        clauses = [
+            f"time >= '{ns_to_iso(start_ns)}'",
+            f"time {'<=' if end_inclusive else '<'} '{ns_to_iso(end_ns)}'",
+        ]
+        if min_weight is not None:
+            clauses.append(f"weight_g >= {float(min_weight)}")
+        if max_weight is not None:
+            clauses.append(f"weight_g <= {float(max_weight)}")
+        # Untagged pieces count as gate 0 (as in ArrowPieceStore), but SQL
+        # IN / NOT IN are never true for a NULL tag
+        if gates is not None:
+            gates = {int(g) for g in gates}
+            if not gates:
+                clauses.append("FALSE")
+            elif 0 in gates:
+                clauses.append(f"(gate IS NULL OR gate IN ({_gate_list(gates)}))")
+            else:
+                clauses.append(f"gate IN ({_gate_list(gates)})")
+        if exclude_gates:
+            exclude_gates = {int(g) for g in exclude_gates}
+            if 0 in exclude_gates:
+                clauses.append(f"gate NOT IN ({_gate_list(exclude_gates)})")
+            else:
+                clauses.append(f"(gate IS NULL OR gate NOT IN ({_gate_list(exclude_gates)}))")
+        return "\n              AND ".join(clauses)
+
+    def query_pieces(self, start_ns, end_ns, *, end_inclusive=False, min_weight=None, max_weight=None,
+                     gates=None, exclude_gates=None, columns=PIECE_COLUMNS):
+        sql = f"""
+            SELECT {', '.join(columns)}
+            FROM pieces
+            WHERE {self._where(start_ns, end_ns, end_inclusive, min_weight, max_weight, gates, exclude_gates)}
+            ORDER BY time ASC
+        """
+        return self.client.query(sql)
+
+    def query_totals(self, start_ns, end_ns, *, end_inclusive=False, min_weight=None, max_weight=None,
+                     gates=None, exclude_gates=None):
+        sql = f"""
+            SELECT COUNT(*) AS count, SUM(weight_g) AS weight
+            FROM pieces
+            WHERE {self._where(start_ns, end_ns, end_inclusive, min_weight, max_weight, gates, exclude_gates)}
+        """
+        table = self.client.query(sql)
+        if table is None or len(table) == 0:
+            return 0, 0.0
+        count = table.column('count')[0].as_py()
+        weight = table.column('weight')[0].as_py()
+        return int(count or 0), float(weight or 0.0)
+
+    def query_minute_gate_totals(self, start_ns, end_ns):
+        sql = f"""
+            SELECT date_bin(INTERVAL '1 minute', time) AS minute,
+                   gate,
+                   COUNT(*) AS pieces,
+                   SUM(weight_g) AS weight_g
+            FROM pieces
+            WHERE time >= '{ns_to_iso(start_ns)}'
+              AND time < '{ns_to_iso(end_ns)}'
+            GROUP BY 1, gate
+        """
+        return self.client.query(sql)
+
+    def query_gate_totals_since(self, since_ns, end_ns):
+        if not since_ns:
+            return GATE_TOTALS_SCHEMA.empty_table()
+        per_gate = []
+        for gate, since in sorted(since_ns.items()):
+            gate_match = "(gate IS NULL OR gate = '0')" if int(gate) == 0 else f"gate = '{int(gate)}'"
+            per_gate.append(f"({gate_match} AND time > '{ns_to_iso(since)}')")
+        sql = f"""
+            SELECT gate,
+                   COUNT(*) AS pieces,
+                   SUM(weight_g) AS weight_g
+            FROM pieces
+            WHERE time > '{ns_to_iso(min(since_ns.values()))}'
+              AND time < '{ns_to_iso(end_ns)}'
+              AND ({' OR '.join(per_gate)})
+            GROUP BY gate
+        """
+        return self.client.query(sql)
+
+    def close(self):
+        self.client.close()
+
+
+# =========================================================
+# IN-MEMORY ARROW
+# =========================================================
+
+class ArrowPieceStore(PieceStore):
+    """
+    Pieces kept in memory as Arrow record batches.
+
+    Appends are buffered and consolidated into one time-sorted table on the
+    next query; time ranges are located by binary search on the int64 time
+    column, other filters use pyarrow.compute.
+
+    Usage:
+        store = ArrowPieceStore()
+        store.write_piece(ts_ns, 123.4, gate=3, piece_id='p1')
+        worker = LiveWorker(piece_store=store)
+    """
+
+    def __init__(self, table: Optional[pa.Table] = None):
+        self._lock = threading.Lock()
+        self._pending: List[pa.Table] = []
+        self._table = PIECE_SCHEMA.empty_table()
+        self._times = np.empty(0, dtype=np.int64)
+        if table is not None:
+            self.append(table)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._table) + sum(len(t) for t in self._pending)
+
+    # -------------------- writes --------------------
+
+    @staticmethod
+    def _normalise(table: pa.Table) -> pa.Table:
+        """Coerce a pieces table (e.g. straight from InfluxDB) to PIECE_SCHEMA"""
+        n = len(table)
+        names = table.column_names
+
+        time_col = table.column('time')
+        unit = getattr(time_col.type, 'unit', None)
+        if unit in ARROW_UNIT_TO_NS:
+            times = pc.multiply(time_col.cast(pa.int64()), ARROW_UNIT_TO_NS[unit])
+        else:
+            times = time_col.cast(pa.int64())
+
+        if 'gate' in names:
+            gate = table.column('gate')
+            if pa.types.is_dictionary(gate.type):
+                gate = gate.cast(pa.string())
+            gate = pc.fill_null(gate.cast(pa.int64()), 0)
+        else:
+            gate = pa.array(np.zeros(n, dtype=np.int64))
+
+        piece_id = (table.column('piece_id').cast(pa.string()) if 'piece_id' in names
+                    else pa.nulls(n, pa.string()))
+
+        return pa.Table.from_arrays([
+            times.cast(pa.timestamp('ns', tz='UTC')),
+            table.column('weight_g').cast(pa.float64()),
+            gate,
+            piece_id,
+        ], schema=PIECE_SCHEMA)
+
+    def append(self, table: pa.Table):
+        """Append a pieces table (any time unit; gate as int or string tag)"""
+        if table is None or len(table) == 0:
+            return
+        normalised = self._normalise(table)
+        with self._lock:
+            self._pending.append(normalised)
+
+    def write_pieces(self, times_ns: Sequence[int], weights_g: Sequence[float],
+                     gates: Sequence[int], piece_ids: Optional[Sequence[Optional[str]]] = None):
+        n = len(times_ns)
+        self.append(pa.Table.from_arrays([
+            pa.array(times_ns, type=pa.int64()).cast(pa.timestamp('ns', tz='UTC')),
+            pa.array(weights_g, type=pa.float64()),
+            pa.array(gates, type=pa.int64()),
+            pa.array(piece_ids if piece_ids is not None else [None] * n, type=pa.string()),
+        ], schema=PIECE_SCHEMA))
+
+    def write_piece(self, ts_ns: int, weight_g: float, gate: int, piece_id: Optional[str] = None):
+        self.write_pieces([ts_ns], [weight_g], [gate], [piece_id])
+
+    def _snapshot(self) -> Tuple[pa.Table, np.ndarray]:
+        with self._lock:
+            if self._pending:
+                combined = pa.concat_tables([self._table] + self._pending)
+                self._pending = []
+                times = combined.column('time').cast(pa.int64()).to_numpy()
+                if len(times) > 1 and np.any(times[1:] < times[:-1]):
+                    order = np.argsort(times, kind='stable')
+                    combined = combined.take(pa.array(order))
+                    times = times[order]
+                self._table = combined.combine_chunks()
+                self._times = times
+            return self._table, self._times
+
+    # -------------------- reads --------------------
+
+    def _select(self, start_ns, end_ns, end_inclusive, min_weight, max_weight,
+                gates, exclude_gates) -> pa.Table:
+        table, times = self._snapshot()
+        lo = int(np.searchsorted(times, start_ns, side='left'))
+        hi = int(np.searchsorted(times, end_ns, side='right' if end_inclusive else 'left'))
+        if hi <= lo:
+            return table.slice(0, 0)
+        table = table.slice(lo, hi - lo)
+
+        mask = None
+
+        def both(m):
+            return m if mask is None else pc.and_(mask, m)
+
+        if min_weight is not None:
+            mask = both(pc.greater_equal(table.column('weight_g'), float(min_weight)))
+        if max_weight is not None:
+            mask = both(pc.less_equal(table.column('weight_g'), float(max_weight)))
+        if gates is not None:
+            mask = both(pc.is_in(table.column('gate'), value_set=pa.array(sorted(set(gates)), type=pa.int64())))
+        if exclude_gates:
+            mask = both(pc.invert(pc.is_in(table.column('gate'),
+                                           value_set=pa.array(sorted(set(exclude_gates)), type=pa.int64()))))
+        return table if mask is None else table.filter(mask)
+
+    def query_pieces(self, start_ns, end_ns, *, end_inclusive=False, min_weight=None, max_weight=None,
+                     gates=None, exclude_gates=None, columns=PIECE_COLUMNS):
+        table = self._select(start_ns, end_ns, end_inclusive, min_weight, max_weight, gates, exclude_gates)
+        return table.select(list(columns))
+
+    def query_totals(self, start_ns, end_ns, *, end_inclusive=False, min_weight=None, max_weight=None,
+                     gates=None, exclude_gates=None):
+        table = self._select(start_ns, end_ns, end_inclusive, min_weight, max_weight, gates, exclude_gates)
+        if len(table) == 0:
+            return 0, 0.0
+        return len(table), float(pc.sum(table.column('weight_g')).as_py() or 0.0)
+
+    def query_minute_gate_totals(self, start_ns, end_ns):
+        table = self._select(start_ns, end_ns, False, None, None, None, None)
+        if len(table) == 0:
+            return MINUTE_TOTALS_SCHEMA.empty_table()
+        minutes = pc.multiply(
+            pc.divide(table.column('time').cast(pa.int64()), NS_PER_MINUTE), NS_PER_MINUTE
+        )
+        grouped = pa.table({
+            'minute': minutes,
+            'gate': table.column('gate'),
+            'weight_g': table.column('weight_g'),
+        }).group_by(['minute', 'gate']).aggregate([('weight_g', 'count'), ('weight_g', 'sum')])
+        return pa.Table.from_arrays([
+            grouped.column('minute').cast(pa.timestamp('ns', tz='UTC')),
+            grouped.column('gate'),
+            grouped.column('weight_g_count').cast(pa.int64()),
+            grouped.column('weight_g_sum'),
+        ], schema=MINUTE_TOTALS_SCHEMA)
+
+    def query_gate_totals_since(self, since_ns, end_ns):
+        if not since_ns:
+            return GATE_TOTALS_SCHEMA.empty_table()
+        table = self._select(min(since_ns.values()) + 1, end_ns, False, None, None, since_ns.keys(), None)
+        times = table.column('time').cast(pa.int64()).to_numpy()
+        gates = table.column('gate').to_numpy()
+        weights = table.column('weight_g').to_numpy()
+        rows = {'gate': [], 'pieces': [], 'weight_g': []}
+        for gate, since in sorted(since_ns.items()):
+            mask = (gates == gate) & (times > since)
+            count = int(np.count_nonzero(mask))
+            if count:
+                rows['gate'].append(int(gate))
+                rows['pieces'].append(count)
+                rows['weight_g'].append(float(weights[mask].sum()))
+        return pa.table(rows, schema=GATE_TOTALS_SCHEMA)
@@ -0,0 +1,540 @@
+"""
+Background Program Finalisation
+
+Program totals (program_stats / recipe_stats) scan batch_completions and the
+piece store, so they run off the worker's main loop:
+1. submit() marks the program 'pending' in program_stats and queues a job
+2. Jobs run in a process pool; each process opens its own SQLite connection
+   and InfluxDB client (a thread pool is used instead when the worker was
+   given an in-process piece store such as ArrowPieceStore)
+3. A job marks the program 'running', writes the totals (upserts), then marks
+   it 'done' (or 'failed') with finalized_at
+4. On restart, programs still 'pending' / 'running' are submitted again; the
+   totals are upserts, so re-running a half-finished job is harmless
+
+Configuration (env):
+    FINALIZE_WORKERS - pool size (default 1)
+"""
+
+import os
+import threading
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from epoch_time import to_ns
+from logger import get_logger, ENABLE_CONSOLE
+from piece_store import PieceStore, InfluxPieceStore
+from sqlite_contention import InstrumentedConnection, connect as sqlite_connect
+
+log = get_logger('worker')
+
+FINALIZE_WORKERS = int(os.getenv("FINALIZE_WORKERS", "1"))
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+# =========================================================
+# PROGRAM TOTALS
+# =========================================================
+
+def calculate_and_write_program_totals(sqlite_conn, piece_store: PieceStore, program_id: int,
+                                       start_ts: str, end_ts: str) -> bool:
+    """
+    Calculate program and recipe totals for the completed program period.
+    Implements the logic from one_time_import.py compute_window_kpis().
+
+    This queries the batch_completions table to get all batches for this program,
+    then calculates filled batch equivalents and giveaway per recipe.
+    """
+    try:
+        log.info(f"Calculating totals for Program {program_id} ({start_ts} to {end_ts})")
+
+        # Piece store ranges are epoch ns (inclusive of end_ts)
+        start_ns, end_ns = to_ns(start_ts), to_ns(end_ts)
+
+        # Get all batches for this program from batch_completions table
+        batches_query = """
+            SELECT id, gate, weight_g, pieces, completed_at
+            FROM batch_completions
+            WHERE completed_at >= ? AND completed_at < ?
+            ORDER BY completed_at
+        """
+        batches = sqlite_conn.execute(batches_query, (start_ts, end_ts)).fetchall()
+
+        if not batches:
+            # IMPORTANT: Still set end_ts to mark program as complete!
+            sqlite_conn.execute("""
+                UPDATE program_stats
+                SET end_ts = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE program_id = ?
+            """, (end_ts, program_id))
+            sqlite_conn.commit()
+            return True
+
+        log.info(f"  Processing {len(batches)} batches")
+
+        # Build a mapping of gates to recipes for this program
+        # Try method 1: Get from run_configs directly for this program
+        config_row = sqlite_conn.execute("""
+            SELECT id FROM run_configs 
+            WHERE program_id = ? 
+            ORDER BY id DESC 
+            LIMIT 1
+        """, (program_id,)).fetchone()
+
+        if config_row:
+            config_id = config_row[0]
+            log.info(f"  Found run_config {config_id} for program {program_id}")
+        else:
+            # Method 2: For live programs without run_configs (crash before config creation),
+            # try to reconstruct assignments from batch_completions.recipe_id
+            log.warning(f"  No run_config found for program {program_id}, attempting reconstruction...")
+
+            # Get unique recipe_id and gate combinations from batch_completions
+            recon_query = """
+                SELECT DISTINCT gate, recipe_id
+                FROM batch_completions
+                WHERE program_id = ? AND recipe_id IS NOT NULL
+                ORDER BY gate
+            """
+            recon_rows = sqlite_conn.execute(recon_query, (program_id,)).fetchall()
+
+            if not recon_rows:
+                log.error("  Cannot reconstruct - no batch completions with recipe_id found")
+                log.warning(f"  Marking program {program_id} as ended without stats")
+                # Just set end_ts and return
+                sqlite_conn.execute("""
+                    UPDATE program_stats
+                    SET end_ts = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE program_id = ?
+                """, (end_ts, program_id))
+                sqlite_conn.commit()
+                return True
+
+            # Create temporary config from reconstructed data
+            log.info(f"  Reconstructed {len(recon_rows)} gate assignments from batches:")
+            config_id = None  # Will use reconstructed mapping directly
+
+            # Build mappings from reconstructed data
+            gate_to_recipe_id = {}
+            gate_to_recipe_name = {}
+            recipe_id_to_gates = defaultdict(list)
+
+            for gate_num, recipe_id in recon_rows:
+                # Get recipe name
+                recipe_row = sqlite_conn.execute("SELECT name FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+                recipe_name = recipe_row[0] if recipe_row else f"Unknown_{recipe_id}"
+
+                gate_to_recipe_id[gate_num] = recipe_id
+                gate_to_recipe_name[gate_num] = recipe_name
+                recipe_id_to_gates[recipe_id].append(gate_num)
+                log.info(f"      Gate {gate_num} → {recipe_name} (ID: {recipe_id}) [reconstructed]")
+
+        # Get gate assignments from config (if config_id exists)
+        if config_id is not None:
+            assignments_query = """
+                SELECT rca.gate_number, rca.recipe_id, r.name
+                FROM run_config_assignments rca
+                JOIN recipes r ON r.id = rca.recipe_id
+                WHERE rca.config_id = ?
+            """
+            assignments_rows = sqlite_conn.execute(assignments_query, (config_id,)).fetchall()
+
+            gate_to_recipe_id = {}
+            gate_to_recipe_name = {}
+            recipe_id_to_gates = defaultdict(list)
+
+            log.info(f"  Found {len(assignments_rows)} gate assignments at {start_ts}")
+            for gate_num, recipe_id, recipe_name in assignments_rows:
+                gate_to_recipe_id[gate_num] = recipe_id
+                gate_to_recipe_name[gate_num] = recipe_name
+                recipe_id_to_gates[recipe_id].append(gate_num)
+                log.info(f"      Gate {gate_num} → {recipe_name} (ID: {recipe_id})")
+
+        if not gate_to_recipe_id:
+            log.warning(f"  No recipe assignments found for program {program_id}")
+            return False
+
+        # Show which gates are assigned
+        assigned_gates = set(gate_to_recipe_id.keys())
+        batch_gates = set(b[1] for b in batches)
+        unassigned_gates = batch_gates - assigned_gates
+        if unassigned_gates:
+            unassigned_count = sum(1 for b in batches if b[1] in unassigned_gates)
+            log.info(f"  Skipping {unassigned_count} batches from unassigned gates: {sorted(unassigned_gates)}")
+
+        # Calculate per-recipe totals using filled batch equivalent logic
+        per_recipe_totals = {}
+        total_filled = 0.0
+        total_w_batched = 0.0
+        total_w_give = 0.0
+
+        for recipe_id, gates in recipe_id_to_gates.items():
+            recipe_name = gate_to_recipe_name[gates[0]]
+
+            # Parse recipe spec from name
+            try:
+                _, x, y, xx, yy, xxx, yyy = recipe_name.split('_', 6)
+                lo_p, hi_p = int(x), int(y)
+                lo_b, hi_b = int(xx), int(yy)
+                bc_type = None if xxx == 'NA' else xxx
+                bc_val = None if yyy in ('NA', '', None) else int(float(yyy))
+            except Exception:
+                lo_p = hi_p = lo_b = hi_b = 0
+                bc_type = None
+                bc_val = None
+
+            # Filter batches for this recipe's gates
+            recipe_batches = [b for b in batches if b[1] in gates]
+
+            if not recipe_batches:
+                continue
+
+            filled_equiv = 0.0
+            w_target_sum = 0.0
+            w_actual_sum = sum(float(b[2]) for b in recipe_batches)
+
+            for batch in recipe_batches:
+                weight = float(batch[2])
+                piece_count = int(batch[3])
+
+                # Apply filled batch equivalent logic (from one_time_import.py)
+                if bc_type in ('exact', 'min') and bc_val:
+                    if bc_type == 'exact':
+                        this_fill = 1.0 if piece_count == bc_val else (piece_count / float(bc_val))
+                    else:  # 'min'
+                        this_fill = 1.0 if piece_count >= bc_val else (piece_count / float(bc_val))
+                    this_target = this_fill * (bc_val * lo_p if bc_val else 0.0)
+                else:
+                    # Weight-based recipe
+                    if lo_b <= 0:
+                        this_fill = 1.0
+                        this_target = weight
+                    else:
+                        this_fill = 1.0 if weight >= lo_b else weight / float(lo_b)
+                        this_target = this_fill * lo_b
+
+                filled_equiv += this_fill
+                w_target_sum += this_target
+
+            w_give = max(0.0, w_actual_sum - w_target_sum)
+
+            # Calculate per-recipe rejects: pieces eligible by weight but sent to gate 0
+            # COUNT/SUM of pieces within this recipe's weight bounds on other gates
+            w_rej = 0.0
+            i_rej = 0
+
+            try:
+                # Reject = eligible piece that didn't go to this recipe's gates
+                i_rej, w_rej = piece_store.query_totals(
+                    start_ns, end_ns, end_inclusive=True,
+                    min_weight=lo_p, max_weight=hi_p, exclude_gates=gates
+                )
+
+                log.info(f"      Rejects: {i_rej} pieces, {w_rej:.1f}g (eligible but not assigned to gates {sorted(gates)})")
+
+            except Exception as e:
+                log.info(f"      ⚠️  Could not query reject data for recipe {recipe_id}: {e}")
+                import traceback
+                traceback.print_exc()
+                w_rej = 0.0
+                i_rej = 0
+
+            i_bat = sum(int(b[3]) for b in recipe_batches)
+
+            # Create gates_assigned string (comma-separated, sorted)
+            gates_str = ','.join(str(g) for g in sorted(gates))
+
+            per_recipe_totals[recipe_id] = {
+                "total_batches": float(filled_equiv),
+                "total_batched_weight_g": int(w_target_sum),
+                "total_reject_weight_g": int(w_rej),
+                "total_giveaway_weight_g": int(round(w_give)),
+                "total_items_batched": i_bat,
+                "total_items_rejected": i_rej,
+                "gates_assigned": gates_str
+            }
+
+            total_filled += filled_equiv
+            total_w_batched += w_target_sum
+            total_w_give += w_give
+
+            log.info(f"  {recipe_name}: {filled_equiv:.1f} batches, {int(w_target_sum):,}g batched, {int(round(w_give)):,}g giveaway")
+
+        # Calculate program totals
+        # Query reject totals from SQLite (M3 combined) or InfluxDB
+        reject_count = 0
+        reject_weight = 0.0
+
+        try:
+            # Try to get from kpi_minute_combined (cumulative totals)
+            reject_query = sqlite_conn.execute("""
+                SELECT MAX(total_rejects_count) as max_count, 
+                       MAX(total_rejects_weight_g) as max_weight
+                FROM kpi_minute_combined
+                WHERE timestamp >= ? AND timestamp <= ?
+            """, (start_ts, end_ts)).fetchone()
+
+            if reject_query and reject_query[0]:
+                reject_count = int(reject_query[0])
+                reject_weight = float(reject_query[1])
+                log.info(f"  Found reject data from SQLite: {reject_count} pieces, {reject_weight:.1f}g")
+            else:
+                # Fallback: Query the piece store for gate 0 pieces
+                try:
+                    reject_count, reject_weight = piece_store.query_totals(
+                        start_ns, end_ns, end_inclusive=True, gates=[0]
+                    )
+                    log.info(f"  Found reject data from piece store: {reject_count} pieces, {reject_weight:.1f}g")
+                except Exception as e:
+                    log.warning(f"  Could not query InfluxDB for rejects: {e}")
+                    import traceback
+                    traceback.print_exc()
+        except Exception as e:
+            log.warning(f"  Error querying reject data: {e}")
+
+        program_totals = {
+            "total_batches": float(total_filled),
+            "total_batched_weight_g": int(total_w_batched),
+            "total_reject_weight_g": int(reject_weight),
+            "total_giveaway_weight_g": int(round(total_w_give)),
+            "total_items_batched": sum(rt["total_items_batched"] for rt in per_recipe_totals.values()),
+            "total_items_rejected": reject_count
+        }
+
+        # Write program_stats
+        sqlite_conn.execute("""
+            UPDATE program_stats
+            SET total_batches = ?,
+                total_batched_weight_g = ?,
+                total_reject_weight_g = ?,
+                total_giveaway_weight_g = ?,
+                total_items_batched = ?,
+                total_items_rejected = ?,
+                start_ts = ?,
+                end_ts = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE program_id = ?
+        """, (
+            program_totals["total_batches"],
+            program_totals["total_batched_weight_g"],
+            program_totals["total_reject_weight_g"],
+            program_totals["total_giveaway_weight_g"],
+            program_totals["total_items_batched"],
+            program_totals["total_items_rejected"],
+            start_ts,
+            end_ts,
+            program_id
+        ))
+
+        # Write recipe_stats
+        for recipe_id, totals in per_recipe_totals.items():
+            sqlite_conn.execute("""
+                INSERT INTO recipe_stats (
+                    program_id, recipe_id, gates_assigned,
+                    total_batches, total_batched_weight_g,
+                    total_reject_weight_g, total_giveaway_weight_g,
+                    total_items_batched, total_items_rejected,
+                    updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(program_id, recipe_id) DO UPDATE SET
+                    gates_assigned = excluded.gates_assigned,
+                    total_batches = excluded.total_batches,
+                    total_batched_weight_g = excluded.total_batched_weight_g,
+                    total_reject_weight_g = excluded.total_reject_weight_g,
+                    total_giveaway_weight_g = excluded.total_giveaway_weight_g,
+                    total_items_batched = excluded.total_items_batched,
+                    total_items_rejected = excluded.total_items_rejected,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (
+                program_id, recipe_id, totals["gates_assigned"],
+                totals["total_batches"],
+                totals["total_batched_weight_g"],
+                totals["total_reject_weight_g"],
+                totals["total_giveaway_weight_g"],
+                totals["total_items_batched"],
+                totals["total_items_rejected"]
+            ))
+
+        sqlite_conn.commit()
+
+        log.info(f"Program totals: {program_totals['total_batches']:.1f} batches, " +
+              f"{program_totals['total_batched_weight_g']:,}g batched, " +
+              f"{program_totals['total_giveaway_weight_g']:,}g giveaway, " +
+              f"{program_totals['total_items_rejected']} rejects")
+        log.info(f"  Written stats for {len(per_recipe_totals)} recipes")
+        return True
+
+    except Exception as e:
+        log.error(f"Error calculating program totals: {e}", exc=e,
+            category='error', action='calculate_program_totals',
+            program_id=program_id, start_ts=start_ts, end_ts=end_ts)
+
+        if ENABLE_CONSOLE:
+            import traceback
+            traceback.print_exc()
+        return False
+
+
+# =========================================================
+# STATUS TRACKING (program_stats.finalize_status / finalized_at)
+# =========================================================
+
+def has_finalize_columns(sqlite_conn) -> bool:
+    """False on databases the backend hasn't migrated yet (status tracking is skipped)"""
+    cols = {row[1] for row in sqlite_conn.execute("PRAGMA table_info(program_stats)")}
+    return 'finalize_status' in cols and 'finalized_at' in cols
+
+
+def set_finalize_status(sqlite_conn, program_id: int, status: str, end_ts: Optional[str] = None):
+    finalized_at = datetime.now(timezone.utc).isoformat() if status in (STATUS_DONE, STATUS_FAILED) else None
+    sqlite_conn.execute("""
+        UPDATE program_stats
+        SET finalize_status = ?,
+            finalized_at = ?,
+            end_ts = COALESCE(?, end_ts),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE program_id = ?
+    """, (status, finalized_at, end_ts, program_id))
+    sqlite_conn.commit()
+
+
+def unfinished_programs(sqlite_conn) -> List[Dict]:
+    """
+    Programs that still need finalising: never ended (end_ts NULL) or queued /
+    interrupted jobs ('pending' / 'running') from before a restart.
+    """
+    if has_finalize_columns(sqlite_conn):
+        rows = sqlite_conn.execute("""
+            SELECT program_id, start_ts, end_ts, finalize_status
+            FROM program_stats
+            WHERE end_ts IS NULL OR finalize_status IN (?, ?)
+            ORDER BY start_ts DESC
+        """, (STATUS_PENDING, STATUS_RUNNING)).fetchall()
+    else:
+        rows = sqlite_conn.execute("""
+            SELECT program_id, start_ts, end_ts, NULL
+            FROM program_stats
+            WHERE end_ts IS NULL
+            ORDER BY start_ts DESC
+        """).fetchall()
+    return [
+        {'program_id': r[0], 'start_ts': r[1], 'end_ts': r[2], 'finalize_status': r[3]}
+        for r in rows
+    ]
+
+
+# =========================================================
+# JOB EXECUTION (runs in pool processes / threads)
+# =========================================================
+
+_job_sqlite_path: Optional[str] = None
+_job_piece_store: Optional[PieceStore] = None
+_job_local = threading.local()
+
+
+def _init_process(sqlite_path: str, influx_config: Dict):
+    """Pool process initializer: own InfluxDB client and piece store"""
+    global _job_sqlite_path, _job_piece_store
+    from influxdb_client_3 import InfluxDBClient3
+    _job_sqlite_path = sqlite_path
+    _job_piece_store = InfluxPieceStore(InfluxDBClient3(**influx_config))
+
+
+def _init_thread(sqlite_path: str, piece_store: PieceStore):
+    global _job_sqlite_path, _job_piece_store
+    _job_sqlite_path = sqlite_path
+    _job_piece_store = piece_store
+
+
+def _job_connection() -> InstrumentedConnection:
+    conn = getattr(_job_local, 'conn', None)
+    if conn is None:
+        # Jobs write while the main loop and the backend also write: busy-retry policy applies
+        conn = _job_local.conn = sqlite_connect(_job_sqlite_path)
+    return conn
+
+
+def _finalize_job(program_id: int, start_ts: str, end_ts: str, track_status: bool) -> bool:
+    conn = _job_connection()
+    if track_status:
+        set_finalize_status(conn, program_id, STATUS_RUNNING)
+    ok = calculate_and_write_program_totals(conn, _job_piece_store, program_id, start_ts, end_ts)
+    if track_status:
+        set_finalize_status(conn, program_id, STATUS_DONE if ok else STATUS_FAILED, end_ts)
+    return ok
+
+
+# =========================================================
+# FINALIZER
+# =========================================================
+
+class ProgramFinalizer:
+    """
+    Queues program finalisation jobs on a background pool.
+
+    Usage:
+        finalizer = ProgramFinalizer(SQLITE_DB, influx_config={'host': ..., 'token': ..., 'database': ...})
+        finalizer.submit(sqlite_conn, program_id, start_ts, end_ts)
+        ...
+        finalizer.shutdown()
+    """
+
+    def __init__(self, sqlite_path: str, influx_config: Optional[Dict] = None,
+                 piece_store: Optional[PieceStore] = None, max_workers: int = FINALIZE_WORKERS):
+        if piece_store is not None:
+            # In-process stores can't be shared with other processes
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix='finalize',
+                initializer=_init_thread, initargs=(sqlite_path, piece_store),
+            )
+        else:
+            # spawn: the worker has live threads (SSE, outbound) that fork would copy mid-state
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process, initargs=(sqlite_path, influx_config or {}),
+            )
+        self._futures: Dict[int, Future] = {}
+
+    def submit(self, sqlite_conn, program_id: int, start_ts: str, end_ts: str) -> Future:
+        """Mark the program pending and queue its finalisation (one job per program at a time)"""
+        existing = self._futures.get(program_id)
+        if existing is not None and not existing.done():
+            return existing
+
+        track_status = has_finalize_columns(sqlite_conn)
+        if track_status:
+            set_finalize_status(sqlite_conn, program_id, STATUS_PENDING, end_ts)
+
+        future = self._executor.submit(_finalize_job, program_id, start_ts, end_ts, track_status)
+        self._futures[program_id] = future
+        future.add_done_callback(lambda f, pid=program_id: self._on_done(pid, f))
+        log.info(f"Queued finalisation for program {program_id}",
+            category='operations', action='finalize_queued', program_id=program_id)
+        return future
+
+    def _on_done(self, program_id: int, future: Future):
+        if future.cancelled():
+            log.warning(f"Finalisation for program {program_id} cancelled (will resume on restart)")
+            return
+        error = future.exception()
+        if error is not None:
+            log.error(f"Finalisation for program {program_id} failed", exc=error)
+        elif future.result():
+            log.info(f"Finalised program {program_id}",
+                category='operations', action='finalize_done', program_id=program_id)
+        else:
+            log.warning(f"Finalisation for program {program_id} did not complete")
+
+    def pending(self) -> List[int]:
+        return [pid for pid, f in self._futures.items() if not f.done()]
+
+    def shutdown(self, wait: bool = True):
+        """Let running jobs finish; queued ones stay 'pending' and are resumed on restart"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,279 @@
+"""
+Mergeable Quantile Sketch (DDSketch-style)
+
+Compact, relative-error quantile summary used for gate dwell times and
+piece weight distributions:
+1. Values are mapped to logarithmic buckets (bucket i covers gamma^(i-1) .. gamma^i)
+2. Each bucket only stores a count, so memory is bounded by the value range
+3. Two sketches with the same accuracy merge by adding bucket counts
+4. Quantile estimates are within `relative_accuracy` of the true value
+
+Sketches are serialised to a small binary blob for SQLite storage, so percentile
+queries read a few kilobytes instead of scanning raw sample rows.
+
+Usage:
+    from quantile_sketch import QuantileSketch
+
+    sk = QuantileSketch()
+    for dwell_sec in samples:
+        sk.add(dwell_sec)
+    blob = sk.to_bytes()
+    p95 = QuantileSketch.from_bytes(blob).quantile(0.95)
+"""
+
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Header: magic, relative accuracy, count, zero_count, min, max, sum, number of bins
+_HEADER = struct.Struct('<4sdQQdddI')
+_BIN = struct.Struct('<iQ')
+_MAGIC = b'QSK1'
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+
+# Values at or below this are counted in the zero bucket (dwell of 0s, empty weights)
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class QuantileSketch:
+    """
+    Logarithmic-bucket quantile sketch with bounded relative error.
+
+    Provides:
+    - add() / add_many() for streaming samples
+    - merge() to combine sketches across minutes, gates or programs
+    - quantile() / quantiles() for percentile estimates
+    - to_bytes() / from_bytes() for SQLite blob storage
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_bins: int = DEFAULT_MAX_BINS):
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = float(relative_accuracy)
+        self.max_bins = int(max_bins)
+        self.gamma = (1.0 + self.relative_accuracy) / (1.0 - self.relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+        self.bins: Dict[int, int] = {}  # bucket index -> count
+        self.count = 0
+        self.zero_count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.sum = 0.0
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def _index(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        # Midpoint (in relative terms) of bucket `index`
+        return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+    def add(self, value: float, count: int = 1):
+        """Add `count` occurrences of `value` to the sketch."""
+        if count <= 0:
+            return
+        value = float(value)
+
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zero_count += count
+        else:
+            idx = self._index(value)
+            self.bins[idx] = self.bins.get(idx, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+
+        self.count += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def add_many(self, values: Iterable[float]):
+        """Add every value from an iterable."""
+        for v in values:
+            self.add(v)
+
+    def _collapse(self):
+        """Fold the lowest buckets together until we are back under max_bins."""
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        if excess <= 0:
+            return
+        target = keys[excess]
+        folded = 0
+        for k in keys[:excess]:
+            folded += self.bins.pop(k)
+        self.bins[target] += folded
+
+    def merge(self, other: 'QuantileSketch'):
+        """Merge another sketch into this one (in place)."""
+        if other.count == 0:
+            return
+        if abs(other.relative_accuracy - self.relative_accuracy) > 1e-12:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        for idx, c in other.bins.items():
+            self.bins[idx] = self.bins.get(idx, 0) + c
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile (0 <= q <= 1).
+
+        Returns:
+            Estimated value, or None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        if q <= 0.0:
+            return self.min
+        if q >= 1.0:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0 if self.min is None or self.min <= 0.0 else self.min
+
+        for idx in sorted(self.bins):
+            seen += self.bins[idx]
+            if rank < seen:
+                # Clamp to observed range so p0/p100 neighbours stay exact
+                return min(max(self._value(idx), self.min), self.max)
+
+        return self.max
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        """Estimate several quantiles at once."""
+        return [self.quantile(q) for q in qs]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    # ------------------------------------------------------------------
+    # Serialisation
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        """Serialise to a compact binary blob."""
+        parts = [_HEADER.pack(
+            _MAGIC,
+            self.relative_accuracy,
+            self.count,
+            self.zero_count,
+            self.min if self.min is not None else math.nan,
+            self.max if self.max is not None else math.nan,
+            self.sum,
+            len(self.bins),
+        )]
+        for idx in sorted(self.bins):
+            parts.append(_BIN.pack(idx, self.bins[idx]))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, max_bins: int = DEFAULT_MAX_BINS) -> 'QuantileSketch':
+        """Deserialise a blob produced by to_bytes()."""
+        magic, alpha, count, zero_count, mn, mx, total, n_bins = _HEADER.unpack_from(blob, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a quantile sketch blob")
+
+        sk = cls(relative_accuracy=alpha, max_bins=max_bins)
+        offset = _HEADER.size
+        for _ in range(n_bins):
+            idx, c = _BIN.unpack_from(blob, offset)
+            sk.bins[idx] = c
+            offset += _BIN.size
+
+        sk.count = count
+        sk.zero_count = zero_count
+        sk.min = None if math.isnan(mn) else mn
+        sk.max = None if math.isnan(mx) else mx
+        sk.sum = total
+        return sk
+
+    @classmethod
+    def merged(cls, blobs: Iterable[bytes]) -> 'QuantileSketch':
+        """Merge a sequence of serialised sketches into a single sketch."""
+        out = None
+        for blob in blobs:
+            if not blob:
+                continue
+            sk = cls.from_bytes(blob)
+            if out is None:
+                out = sk
+            else:
+                out.merge(sk)
+        return out if out is not None else cls()
+
+
+# =========================================================
+# SQLITE QUERY HELPERS
+# =========================================================
+
+def query_dwell_quantiles(sqlite_conn, program_ids: Sequence[int], gate: Optional[int] = None,
+                          qs: Sequence[float] = (0.25, 0.5, 0.75, 0.95)) -> Dict:
+    """
+    Percentiles of gate dwell time merged across programs (and gates if gate is None).
+
+    Returns:
+        {'count': int, 'mean': float|None, 'min': ..., 'max': ..., 'quantiles': {q: value}}
+    """
+    if not program_ids:
+        return _summary(QuantileSketch(), qs)
+
+    placeholders = ','.join('?' for _ in program_ids)
+    sql = f"SELECT sketch FROM gate_dwell_sketches WHERE program_id IN ({placeholders})"
+    params = list(program_ids)
+    if gate is not None:
+        sql += " AND gate_number = ?"
+        params.append(int(gate))
+
+    rows = sqlite_conn.execute(sql, params).fetchall()
+    return _summary(QuantileSketch.merged(r[0] for r in rows), qs)
+
+
+def query_piece_weight_quantiles(sqlite_conn, recipe_name: str, start_ts: str, end_ts: str,
+                                 program_id: Optional[int] = None,
+                                 qs: Sequence[float] = (0.05, 0.25, 0.5, 0.75, 0.95)) -> Dict:
+    """
+    Percentiles of piece weight for a recipe over [start_ts, end_ts), merged across minutes.
+    """
+    sql = """
+        SELECT sketch FROM piece_weight_sketches
+        WHERE recipe_name = ? AND timestamp >= ? AND timestamp < ?
+    """
+    params = [recipe_name, start_ts, end_ts]
+    if program_id is not None:
+        sql += " AND program_id = ?"
+        params.append(program_id)
+
+    rows = sqlite_conn.execute(sql, params).fetchall()
+    return _summary(QuantileSketch.merged(r[0] for r in rows), qs)
+
+
+def _summary(sk: QuantileSketch, qs: Sequence[float]) -> Dict:
+    return {
+        'count': sk.count,
+        'mean': sk.mean,
+        'min': sk.min,
+        'max': sk.max,
+        'quantiles': {q: sk.quantile(q) for q in qs},
+    }
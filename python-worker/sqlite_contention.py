@@ -0,0 +1,243 @@
+"""
+SQLite Contention Instrumentation / Busy Retry
+
+The worker and the Node backend write the same batching_app.sqlite. Worker
+connections are wrapped so contention is measured and retried rather than
+surfacing as dropped KPI rows:
+1. sqlite's own busy handler waits up to SQLITE_BUSY_TIMEOUT_MS per attempt
+2. A statement / commit that still fails with SQLITE_BUSY ("database is locked")
+   is retried with exponential backoff and full jitter, up to SQLITE_BUSY_RETRIES
+   times or SQLITE_BUSY_DEADLINE_SEC overall
+3. Per statement type ("INSERT kpi_minute_recipes", "SELECT", "COMMIT", ...):
+   executions, busy errors, retries, lock waits (attempts slower than
+   SQLITE_LOCK_WAIT_MS), failures, time waiting, time executing, and time the
+   write transaction it opened was held until COMMIT
+
+SQLITE_BUSY_SNAPSHOT (a WAL read snapshot went stale inside an open write
+transaction) is not retried: only a rollback can clear it.
+
+Configuration (env):
+    SQLITE_BUSY_TIMEOUT_MS   - sqlite busy wait per attempt        (default 250)
+    SQLITE_BUSY_RETRIES      - retries after the busy wait expires (default 8)
+    SQLITE_BUSY_BACKOFF_MS   - base backoff, doubled per retry     (default 20)
+    SQLITE_BUSY_DEADLINE_SEC - overall limit per statement         (default 10)
+    SQLITE_LOCK_WAIT_MS      - attempt duration counted as a wait  (default 20)
+
+Usage:
+    from sqlite_contention import connect, contention_stats
+
+    conn = connect(SQLITE_DB)
+    conn.execute("INSERT ...", params)
+    conn.commit()
+    for key, s in contention_stats.snapshot(reset=True).items(): ...
+"""
+
+import os
+import re
+import time
+import random
+import sqlite3
+import threading
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Dict, Optional
+
+SQLITE_BUSY_TIMEOUT_MS = float(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "250"))
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "8"))
+SQLITE_BUSY_BACKOFF_MS = float(os.getenv("SQLITE_BUSY_BACKOFF_MS", "20"))
+SQLITE_BUSY_DEADLINE_SEC = float(os.getenv("SQLITE_BUSY_DEADLINE_SEC", "10"))
+SQLITE_LOCK_WAIT_MS = float(os.getenv("SQLITE_LOCK_WAIT_MS", "20"))
+
+_WRITE_VERBS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'ALTER', 'DROP'}
+_TABLE_RE = re.compile(r'\b(?:INTO|UPDATE|FROM|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?["`\[]?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def statement_key(sql: str) -> str:
+    """'VERB table' for writes, 'VERB' for everything else"""
+    words = sql.lstrip().split(None, 1)
+    verb = words[0].upper() if words else ''
+    if verb in _WRITE_VERBS:
+        match = _TABLE_RE.search(sql)
+        if match:
+            return f"{verb} {match.group(1)}"
+    return verb
+
+
+def is_busy(error: sqlite3.OperationalError) -> bool:
+    name = getattr(error, 'sqlite_errorname', None)
+    if name is not None:
+        return name.startswith('SQLITE_BUSY') or name.startswith('SQLITE_LOCKED')
+    text = str(error).lower()
+    return 'locked' in text or 'busy' in text
+
+
+def is_retryable(error: sqlite3.OperationalError) -> bool:
+    return is_busy(error) and getattr(error, 'sqlite_errorname', None) != 'SQLITE_BUSY_SNAPSHOT'
+
+
+@dataclass
+class StatementStats:
+    executions: int = 0
+    busy: int = 0            # SQLITE_BUSY / SQLITE_LOCKED errors seen (incl. retried)
+    retries: int = 0
+    lock_waits: int = 0      # attempts slower than SQLITE_LOCK_WAIT_MS or ending busy
+    failed: int = 0          # gave up (error raised to the caller)
+    wait_sec: float = 0.0    # busy attempts + backoff sleeps + slow attempts
+    exec_sec: float = 0.0
+    hold_sec: float = 0.0    # write transactions opened by this statement type, until COMMIT
+    max_hold_sec: float = 0.0
+
+
+class ContentionStats:
+    """Thread-safe per-statement-type counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, StatementStats] = {}
+
+    def _get(self, key: str) -> StatementStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = StatementStats()
+        return stats
+
+    def record(self, key: str, exec_sec: float, wait_sec: float, busy: int, retries: int,
+               lock_waits: int, failed: bool):
+        with self._lock:
+            s = self._get(key)
+            s.executions += 1
+            s.exec_sec += exec_sec
+            s.wait_sec += wait_sec
+            s.busy += busy
+            s.retries += retries
+            s.lock_waits += lock_waits
+            s.failed += int(failed)
+
+    def record_hold(self, key: str, hold_sec: float):
+        with self._lock:
+            s = self._get(key)
+            s.hold_sec += hold_sec
+            s.max_hold_sec = max(s.max_hold_sec, hold_sec)
+
+    def snapshot(self, reset: bool = False) -> Dict[str, StatementStats]:
+        with self._lock:
+            copy = {k: StatementStats(**asdict(v)) for k, v in self._stats.items()}
+            if reset:
+                self._stats.clear()
+        return copy
+
+    def totals(self, stats: Optional[Dict[str, StatementStats]] = None) -> StatementStats:
+        total = StatementStats()
+        for s in (stats if stats is not None else self.snapshot()).values():
+            for name, value in asdict(s).items():
+                if name == 'max_hold_sec':
+                    total.max_hold_sec = max(total.max_hold_sec, value)
+                else:
+                    setattr(total, name, getattr(total, name) + value)
+        return total
+
+
+contention_stats = ContentionStats()
+
+
+class InstrumentedConnection:
+    """
+    sqlite3.Connection wrapper: execute / executemany / commit retry on
+    SQLITE_BUSY and feed ContentionStats. Other attributes (row_factory,
+    in_transaction, ...) pass through to the wrapped connection.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, stats: ContentionStats = contention_stats,
+                 retries: int = SQLITE_BUSY_RETRIES, backoff_ms: float = SQLITE_BUSY_BACKOFF_MS,
+                 deadline_sec: float = SQLITE_BUSY_DEADLINE_SEC, lock_wait_ms: float = SQLITE_LOCK_WAIT_MS):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_stats', stats)
+        object.__setattr__(self, '_retries', retries)
+        object.__setattr__(self, '_backoff_sec', backoff_ms / 1000.0)
+        object.__setattr__(self, '_deadline_sec', deadline_sec)
+        object.__setattr__(self, '_lock_wait_sec', lock_wait_ms / 1000.0)
+        object.__setattr__(self, '_rng', random.Random())
+        object.__setattr__(self, '_txn_key', None)
+        object.__setattr__(self, '_txn_started', None)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def execute(self, sql: str, parameters=()):
+        key = statement_key(sql)
+        cursor = self._execute(key, self._conn.execute, sql, parameters)
+        self._track_txn(key)
+        return cursor
+
+    def executemany(self, sql: str, seq_of_parameters):
+        key = statement_key(sql)
+        cursor = self._execute(key, self._conn.executemany, sql, seq_of_parameters)
+        self._track_txn(key)
+        return cursor
+
+    def commit(self):
+        was_open = self._conn.in_transaction
+        self._execute('COMMIT', self._conn.commit)
+        if was_open and self._txn_started is not None:
+            self._stats.record_hold(self._txn_key, time.perf_counter() - self._txn_started)
+        object.__setattr__(self, '_txn_key', None)
+        object.__setattr__(self, '_txn_started', None)
+
+    def rollback(self):
+        self._conn.rollback()
+        object.__setattr__(self, '_txn_key', None)
+        object.__setattr__(self, '_txn_started', None)
+
+    def close(self):
+        self._conn.close()
+
+    def _track_txn(self, key: str):
+        # First write of an implicit transaction: the write lock is held from here until COMMIT
+        if self._txn_started is None and self._conn.in_transaction:
+            object.__setattr__(self, '_txn_key', key)
+            object.__setattr__(self, '_txn_started', time.perf_counter())
+
+    def _execute(self, key: str, fn, *args):
+        started = time.perf_counter()
+        busy = retries = lock_waits = 0
+        wait_sec = 0.0
+        while True:
+            attempt_start = time.perf_counter()
+            try:
+                result = fn(*args)
+            except sqlite3.OperationalError as e:
+                attempt_sec = time.perf_counter() - attempt_start
+                elapsed = time.perf_counter() - started
+                if not is_busy(e):
+                    self._stats.record(key, attempt_sec, wait_sec, busy, retries, lock_waits, failed=True)
+                    raise
+                busy += 1
+                lock_waits += 1
+                wait_sec += attempt_sec
+                if not is_retryable(e) or retries >= self._retries or elapsed >= self._deadline_sec:
+                    self._stats.record(key, 0.0, wait_sec, busy, retries, lock_waits, failed=True)
+                    raise
+                # Full jitter: uniform(0, base * 2^n), capped by the remaining deadline
+                delay = self._rng.uniform(0, self._backoff_sec * (2 ** retries))
+                delay = min(delay, max(0.0, self._deadline_sec - elapsed))
+                time.sleep(delay)
+                wait_sec += delay
+                retries += 1
+                continue
+            attempt_sec = time.perf_counter() - attempt_start
+            if attempt_sec >= self._lock_wait_sec:
+                # Most likely sat in sqlite's busy handler
+                lock_waits += 1
+                wait_sec += attempt_sec
+                attempt_sec = 0.0
+            self._stats.record(key, attempt_sec, wait_sec, busy, retries, lock_waits, failed=False)
+            return result
+
+
+def connect(path: str, busy_timeout_ms: float = SQLITE_BUSY_TIMEOUT_MS, **kwargs) -> InstrumentedConnection:
+    """sqlite3.connect with the configured busy timeout, wrapped for retry + instrumentation"""
+    return InstrumentedConnection(sqlite3.connect(path, timeout=busy_timeout_ms / 1000.0, **kwargs))
@@ -0,0 +1,15 @@
+"""
+Shared pytest setup for the python-worker tests.
+
+The worker modules are flat scripts (no package), so the worker directory is
+put on sys.path the same way the benchmarks do it.
+
+Usage:
+    cd python-worker && python -m pytest -q tests
+"""
+
+import os
+import sys
+
+# dirname twice, not 'tests/..': logger.py derives the shared logs/ dir from its __file__
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,349 @@
+"""Tests for assignment_algorithm.AssignmentAlgorithm (indexed, vectorised, weighted, masked picks)."""
+
+import random
+import threading
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from assignment_algorithm import AssignmentAlgorithm, alias_table
+
+
+def _assignment(gate, piece_min, piece_max, recipe_name=None, **extra):
+    return dict(gate=gate, recipe_name=recipe_name or f"R_{gate}", piece_min=piece_min, piece_max=piece_max,
+                batch_min=0, batch_max=0, batch_count_type=None, batch_count_value=None, **extra)
+
+
+# Overlapping bounds: 3/4/5 share a recipe, 6 overlaps their top, 2 touches 3 at 120
+PROGRAM = [
+    _assignment(2, 80, 120),
+    _assignment(3, 120, 160, 'R_shared'),
+    _assignment(4, 120, 160, 'R_shared'),
+    _assignment(5, 120, 160, 'R_shared'),
+    _assignment(6, 150, 220),
+]
+
+
+def _random_program(rng, n_gates=12):
+    program = []
+    for gate in rng.sample(range(1, 40), n_gates):
+        lo = rng.randrange(50, 300)
+        program.append(_assignment(gate, lo, lo + rng.randrange(0, 120)))
+    return program
+
+
+def _scan_eligible(algo, weight_g):
+    """The original assign_piece: scan every gate's bounds in assignment order"""
+    return [gate for gate, recipe in algo.current_assignments.items()
+            if recipe['piece_min'] <= weight_g <= recipe['piece_max']]
+
+
+def _edge_probes(program, rng, n=2000):
+    bounds = [float(a[k]) for a in program for k in ('piece_min', 'piece_max')]
+    return bounds + [b + d for b in bounds for d in (-0.05, 0.05)] + [rng.uniform(0, 450) for _ in range(n)]
+
+
+def _fractions(picks):
+    counts = Counter(int(g) for g in picks)
+    total = sum(counts.values())
+    return {gate: c / total for gate, c in counts.items()}
+
+
+# ===== Indexed lookup vs the original scan =====
+
+@pytest.mark.parametrize('seed', range(5))
+def test_indexed_eligible_gates_match_scan(seed):
+    rng = random.Random(seed)
+    program = _random_program(rng)
+    algo = AssignmentAlgorithm(seed=seed)
+    algo.update_assignments(program)
+
+    for w in _edge_probes(program, rng):
+        assert list(algo.gate_index.stab(w)) == _scan_eligible(algo, w), w
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pick_is_eligible_or_reject(seed):
+    rng = random.Random(seed)
+    program = _random_program(rng)
+    algo = AssignmentAlgorithm(seed=seed)
+    algo.update_assignments(program)
+
+    for w in _edge_probes(program, rng):
+        eligible = _scan_eligible(algo, w)
+        gate = algo.assign_piece(w)
+        assert gate in eligible if eligible else gate == 0
+
+
+def test_uniform_pick_matches_scan_distribution():
+    algo = AssignmentAlgorithm(seed=1)
+    algo.update_assignments(PROGRAM)
+    picks = [algo.assign_piece(155.0) for _ in range(40_000)]
+    # Scan + random.choice: uniform over 3/4/5/6
+    for gate, frac in _fractions(picks).items():
+        assert gate in (3, 4, 5, 6)
+        assert frac == pytest.approx(0.25, abs=0.01)
+
+
+def test_seeded_instances_are_reproducible():
+    a, b = AssignmentAlgorithm(seed=42), AssignmentAlgorithm(seed=42)
+    a.update_assignments(PROGRAM)
+    b.update_assignments(PROGRAM)
+    weights = [random.Random(0).uniform(60, 240) for _ in range(500)]
+    assert [a.assign_piece(w) for w in weights] == [b.assign_piece(w) for w in weights]
+
+
+def test_no_assignments_rejects_everything():
+    algo = AssignmentAlgorithm(seed=0)
+    assert algo.assign_piece(120.0) == 0
+    algo.update_assignments(PROGRAM)
+    assert algo.assign_piece(50.0) == 0
+    assert algo.assign_piece(221.0) == 0
+    assert algo.assign_piece(float('nan')) == 0
+
+
+# ===== assign_pieces vs the scalar path =====
+
+@pytest.mark.parametrize('seed', range(3))
+def test_assign_pieces_picks_eligible_gates(seed):
+    rng = random.Random(seed)
+    program = _random_program(rng)
+    algo = AssignmentAlgorithm(seed=seed)
+    algo.update_assignments(program)
+
+    weights = np.array(_edge_probes(program, rng))
+    gates = algo.assign_pieces(weights)
+    assert gates.dtype == np.int64 and gates.shape == weights.shape
+    for w, gate in zip(weights, gates):
+        eligible = _scan_eligible(algo, w)
+        assert gate in eligible if eligible else gate == 0
+
+
+def test_assign_pieces_distribution_matches_scalar():
+    algo = AssignmentAlgorithm(seed=3)
+    algo.update_assignments(PROGRAM)
+    weights = np.random.default_rng(0).uniform(60, 240, 200_000)
+
+    vector = _fractions(algo.assign_pieces(weights))
+    scalar = _fractions(algo.assign_piece(w) for w in weights)
+    assert vector.keys() == scalar.keys()
+    for gate in scalar:
+        assert vector[gate] == pytest.approx(scalar[gate], abs=0.005)
+
+
+def test_assign_pieces_edge_cases():
+    algo = AssignmentAlgorithm(seed=0)
+    assert algo.assign_pieces(np.array([120.0, 150.0])).tolist() == [0, 0]
+
+    algo.update_assignments(PROGRAM)
+    assert algo.assign_pieces(np.array([])).shape == (0,)
+    assert algo.assign_pieces([50.0, float('nan'), 300.0]).tolist() == [0, 0, 0]
+    assert algo.assign_pieces([100.0, 220.0]).tolist() == [2, 6]
+    assert algo.assign_pieces(np.full((4, 5), 100.0)).shape == (4, 5)
+
+
+def test_assign_pieces_reproducible_with_explicit_rng():
+    algo = AssignmentAlgorithm()
+    algo.update_assignments(PROGRAM)
+    weights = np.linspace(60, 240, 5000)
+    first = algo.assign_pieces(weights, np.random.default_rng(9))
+    assert np.array_equal(first, algo.assign_pieces(weights, np.random.default_rng(9)))
+
+
+# ===== Immutable snapshots =====
+
+def test_snapshot_is_immutable():
+    algo = AssignmentAlgorithm(seed=0)
+    algo.update_assignments(PROGRAM)
+    snapshot = algo.snapshot
+    with pytest.raises(AttributeError):
+        snapshot.generation = 99
+    with pytest.raises(TypeError):
+        snapshot.assignments[7] = {}
+    with pytest.raises(TypeError):
+        snapshot.assignments[2]['piece_max'] = 999
+    with pytest.raises(ValueError):
+        snapshot.segment_arrays[1][0, 0] = 5
+
+
+def test_generation_increases_and_tags_decisions():
+    algo = AssignmentAlgorithm(seed=0)
+    assert algo.generation == 0
+    first = algo.update_assignments(PROGRAM)
+    second = algo.update_assignments(PROGRAM[:2])
+    assert 0 < first < second == algo.generation
+
+    gate, generation = algo.assign_piece_tagged(100.0)
+    assert (gate, generation) == (2, second)
+    gates, generation = algo.assign_pieces_tagged([100.0, 300.0])
+    assert gates.tolist() == [2, 0] and generation == second
+
+
+def test_hot_swap_never_mixes_programs():
+    # Two programs with disjoint gates: every decision must come wholly from one of them
+    programs = {
+        'a': [_assignment(1, 100, 200), _assignment(2, 100, 200)],
+        'b': [_assignment(7, 100, 200), _assignment(8, 100, 200)],
+    }
+    gates_of = {'a': {1, 2}, 'b': {7, 8}}
+    algo = AssignmentAlgorithm(seed=0)
+    first = algo.update_assignments(programs['a'])
+    swaps = []
+    stop = threading.Event()
+
+    def swap():
+        # Strict alternation: odd generations after `first` are program b
+        name = 'b'
+        while not stop.is_set():
+            swaps.append(algo.update_assignments(programs[name]))
+            name = 'a' if name == 'b' else 'b'
+
+    def program_of(generation):
+        return 'a' if (generation - first) % 2 == 0 else 'b'
+
+    swapper = threading.Thread(target=swap)
+    swapper.start()
+    weights = np.full(64, 150.0)
+    try:
+        for _ in range(3000):
+            gate, generation = algo.assign_piece_tagged(150.0)
+            assert gate in gates_of[program_of(generation)]
+            gates, generation = algo.assign_pieces_tagged(weights)
+            assert set(gates.tolist()) <= gates_of[program_of(generation)]
+    finally:
+        stop.set()
+        swapper.join()
+    assert swaps == list(range(first + 1, first + 1 + len(swaps)))
+    assert len(swaps) > 1
+
+
+# ===== Share-weighted picks =====
+
+SHARED_PROGRAM = [
+    _assignment(3, 120, 160, 'R_shared', share=2),
+    _assignment(4, 120, 160, 'R_shared', share=1),
+    _assignment(5, 120, 160, 'R_shared', share=1),
+    _assignment(6, 150, 220, share=4),
+]
+
+
+def _alias_probabilities(prob, alias):
+    n = len(prob)
+    p = [prob[i] / n for i in range(n)]
+    for i in range(n):
+        p[alias[i]] += (1.0 - prob[i]) / n
+    return p
+
+
+@pytest.mark.parametrize('weights', [
+    [2, 1, 1], [1, 1, 1, 1], [5, 0, 3, 2], [0.1, 10, 3.3, 7, 0.5], [1], [0, 0],
+])
+def test_alias_table_probabilities_are_exact(weights):
+    prob, alias = alias_table(weights)
+    total = sum(weights)
+    expected = [w / total for w in weights] if total > 0 else [1 / len(weights)] * len(weights)
+    assert _alias_probabilities(prob, alias) == pytest.approx(expected, abs=1e-12)
+
+
+@pytest.mark.parametrize('weight_g,expected', [
+    (130.0, {3: 0.5, 4: 0.25, 5: 0.25}),
+    (155.0, {3: 0.25, 4: 0.125, 5: 0.125, 6: 0.5}),
+    (200.0, {6: 1.0}),
+])
+def test_scalar_and_vector_picks_follow_shares(weight_g, expected):
+    algo = AssignmentAlgorithm(seed=5)
+    algo.update_assignments(SHARED_PROGRAM)
+    n = 100_000
+
+    scalar = _fractions(algo.assign_piece(weight_g) for _ in range(n))
+    vector = _fractions(algo.assign_pieces(np.full(n, weight_g)))
+    for picks in (scalar, vector):
+        assert picks.keys() == expected.keys()
+        for gate, frac in expected.items():
+            assert picks[gate] == pytest.approx(frac, abs=0.01)
+
+
+def test_equal_shares_use_plain_uniform_pick():
+    algo = AssignmentAlgorithm(seed=0)
+    algo.update_assignments(PROGRAM)
+    assert all(prob is None for _, prob, _ in algo.snapshot.alias_tables)
+
+    algo.update_assignments(SHARED_PROGRAM)
+    segment = algo.gate_index.locate(130.0)
+    gates, prob, _ = algo.snapshot.alias_tables[segment]
+    assert gates == (3, 4, 5) and prob is not None
+
+
+def test_zero_share_gate_is_never_picked():
+    algo = AssignmentAlgorithm(seed=2)
+    algo.update_assignments([_assignment(1, 100, 200, share=0), _assignment(2, 100, 200, share=1)])
+    assert {algo.assign_piece(150.0) for _ in range(2000)} == {2}
+    assert set(algo.assign_pieces(np.full(2000, 150.0)).tolist()) == {2}
+
+
+# ===== Availability masks =====
+
+def test_blocked_gates_are_never_picked():
+    algo = AssignmentAlgorithm(seed=4)
+    algo.update_assignments(SHARED_PROGRAM)
+    algo.drain_gate(3)
+    algo.set_gate_full(6)
+    n = 60_000
+
+    scalar = _fractions(algo.assign_piece(155.0) for _ in range(n))
+    vector = _fractions(algo.assign_pieces(np.full(n, 155.0)))
+    # Remaining gates 4/5 keep their relative shares (1:1)
+    for picks in (scalar, vector):
+        assert picks.keys() == {4, 5}
+        assert picks[4] == pytest.approx(0.5, abs=0.01)
+
+    assert algo.blocked_gates() == {'draining': [3], 'disabled': [], 'full': [6]}
+    assert not algo.is_gate_available(3) and algo.is_gate_available(4)
+
+
+def test_masked_shares_are_renormalised():
+    algo = AssignmentAlgorithm(seed=4)
+    algo.update_assignments(SHARED_PROGRAM)
+    algo.disable_gate(4)
+    n = 80_000
+    expected = {3: 2 / 7, 5: 1 / 7, 6: 4 / 7}
+    for picks in (_fractions(algo.assign_piece(155.0) for _ in range(n)),
+                  _fractions(algo.assign_pieces(np.full(n, 155.0)))):
+        assert picks.keys() == expected.keys()
+        for gate, frac in expected.items():
+            assert picks[gate] == pytest.approx(frac, abs=0.01)
+
+
+def test_all_eligible_blocked_rejects_and_unblock_restores():
+    algo = AssignmentAlgorithm(seed=0)
+    algo.update_assignments(PROGRAM)
+    algo.set_blocked_gates('disabled', [3, 4, 5])
+    assert algo.assign_piece(130.0) == 0
+    assert algo.assign_pieces([130.0, 100.0]).tolist() == [0, 2]
+
+    # Reasons combine: unblocking one reason leaves the others in force
+    algo.drain_gate(4)
+    algo.set_blocked_gates('disabled', [])
+    assert {algo.assign_piece(130.0) for _ in range(500)} == {3, 5}
+    algo.drain_gate(4, False)
+    assert {algo.assign_piece(130.0) for _ in range(500)} == {3, 4, 5}
+    assert algo.available_mask == -1
+
+
+def test_masks_survive_recipe_change():
+    algo = AssignmentAlgorithm(seed=0)
+    algo.update_assignments(PROGRAM)
+    algo.disable_gate(2)
+    assert algo.assign_piece(100.0) == 0
+    algo.update_assignments(PROGRAM + [_assignment(7, 90, 110)])
+    assert algo.assign_piece(100.0) == 7
+    assert set(algo.assign_pieces(np.full(500, 100.0)).tolist()) == {7}
+
+
+def test_unassigned_gate_mask_does_not_matter():
+    algo = AssignmentAlgorithm(seed=0)
+    algo.update_assignments(PROGRAM)
+    algo.set_gate_full(30)
+    assert algo.assign_piece(100.0) == 2
+    assert algo.assign_pieces([100.0]).tolist() == [2]
@@ -0,0 +1,140 @@
+"""Tests for batch_selector.BatchAwareSelector (completion, overshoot guard, recipe changes)."""
+
+import random
+
+import pytest
+
+from batch_selector import BatchAwareSelector
+
+
+def _assignment(gate, piece_min, piece_max, batch_min=0, batch_max=0, count_type=None, count_value=None,
+                recipe_name=None):
+    return dict(gate=gate, recipe_name=recipe_name or f"R_{gate}", piece_min=piece_min, piece_max=piece_max,
+                batch_min=batch_min, batch_max=batch_max, batch_count_type=count_type,
+                batch_count_value=count_value)
+
+
+def test_exact_count_batch_closes_on_count():
+    sel = BatchAwareSelector()
+    sel.update_assignments([_assignment(1, 100, 200, count_type='exact', count_value=4)])
+
+    for _ in range(3):
+        assert sel.assign_piece(110.0) == 1
+        assert sel.last_completed == 0
+    assert sel.assign_piece(120.0) == 1
+    assert sel.last_completed == 1
+
+    totals = sel.get_batch_totals()[1]
+    assert totals['batches'] == 1
+    assert totals['batched_weight_g'] == pytest.approx(450.0)
+    assert totals['giveaway_g'] == pytest.approx(450.0 - 4 * 100)
+    assert (totals['open_count'], totals['open_weight_g']) == (0, 0.0)
+
+
+def test_weight_batch_never_overshoots():
+    sel = BatchAwareSelector()
+    sel.update_assignments([_assignment(1, 100, 200, batch_min=1000, batch_max=1100)])
+
+    assert [sel.assign_piece(190.0) for _ in range(5)] == [1] * 5   # 950 g open
+    # 950 + 190 > 1100: the piece is rejected rather than overshooting
+    assert sel.assign_piece(190.0) == 0
+    assert sel.assign_piece(120.0) == 1
+    assert sel.last_completed == 1
+    assert sel.get_batch_totals()[1]['giveaway_g'] == pytest.approx(70.0)
+
+
+def test_completing_gate_preferred_then_fill():
+    sel = BatchAwareSelector()
+    sel.update_assignments([
+        _assignment(1, 100, 200, batch_min=600, batch_max=700),
+        _assignment(2, 100, 200, batch_min=300, batch_max=400),
+    ])
+    assert sel.assign_piece(150.0) == 2   # fill 150/300 beats 150/600
+    assert sel.assign_piece(160.0) == 2   # completes gate 2
+    assert sel.last_completed == 2
+    assert sel.assign_piece(150.0) == 2   # empty again: 0.5 still beats 0.25
+
+    # Smallest giveaway wins among completing gates
+    sel.update_assignments([
+        _assignment(1, 100, 200, batch_min=600, batch_max=700),
+        _assignment(2, 100, 200, batch_min=610, batch_max=700),
+    ])
+    for gate in (1, 2):
+        sel.record_piece(gate, 500.0)
+    assert sel.assign_piece(110.0) == 2   # 610 -> giveaway 0, gate 1 would give 10
+
+
+def test_ties_keep_assignment_order():
+    sel = BatchAwareSelector()
+    sel.update_assignments([_assignment(5, 100, 200, batch_min=600), _assignment(3, 100, 200, batch_min=600)])
+    assert sel.assign_piece(150.0) == 5
+
+
+def test_blocked_gate_is_skipped():
+    sel = BatchAwareSelector()
+    sel.update_assignments([_assignment(1, 100, 200), _assignment(2, 100, 200)])
+    sel.drain_gate(1)
+    assert sel.assign_piece(150.0) == 2
+    sel.disable_gate(2)
+    assert sel.assign_piece(150.0) == 0
+
+
+def test_record_piece_counts_overshoots():
+    sel = BatchAwareSelector()
+    sel.update_assignments([_assignment(1, 100, 200, batch_min=300, batch_max=350)])
+    sel.record_piece(1, 200.0)
+    sel.record_piece(1, 200.0)   # 400 > batch_max
+    totals = sel.get_batch_totals()[1]
+    assert totals['overshoots'] == 1
+    assert totals['batches'] == 1
+    assert sel.last_completed == 1
+    sel.record_piece(9, 100.0)   # unassigned gate: ignored
+    assert sel.last_completed == 0
+
+
+def test_recipe_change_keeps_unchanged_open_batches():
+    sel = BatchAwareSelector()
+    gate_1 = _assignment(1, 100, 200, count_type='exact', count_value=5)
+    sel.update_assignments([gate_1, _assignment(2, 300, 400, count_type='exact', count_value=5)])
+    sel.assign_piece(150.0)
+    sel.assign_piece(350.0)
+
+    sel.update_assignments([gate_1, _assignment(2, 300, 400, count_type='exact', count_value=3)])
+    sel.assign_piece(150.0)
+    totals = sel.get_batch_totals()
+    assert totals[1]['open_count'] == 2
+    assert totals[2]['open_count'] == 0
+
+    sel.reset_batches()
+    assert sel.get_batch_totals()[1]['open_count'] == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_closed_batches_respect_limits(seed):
+    rng = random.Random(seed)
+    sel = BatchAwareSelector()
+    sel.update_assignments([
+        _assignment(1, 90, 160, batch_min=1000, batch_max=1060),
+        _assignment(2, 90, 160, batch_min=1000, batch_max=1060),
+        _assignment(3, 120, 200, count_type='exact', count_value=6, batch_max=1100),
+        _assignment(4, 80, 140, count_type='min', count_value=8),
+    ])
+    open_weight = {g: 0.0 for g in range(1, 5)}
+    open_count = {g: 0 for g in range(1, 5)}
+    for _ in range(20_000):
+        w = round(rng.uniform(70, 210), 1)
+        gate = sel.assign_piece(w)
+        if not gate:
+            continue
+        open_weight[gate] += w
+        open_count[gate] += 1
+        if sel.last_completed:
+            weight, count = open_weight[gate], open_count[gate]
+            if gate in (1, 2):
+                assert 1000 <= weight <= 1060
+            elif gate == 3:
+                assert count == 6 and weight <= 1100
+            else:
+                assert count == 8
+            open_weight[gate], open_count[gate] = 0.0, 0
+    assert sum(t['batches'] for t in sel.get_batch_totals().values()) > 100
@@ -0,0 +1,56 @@
+"""Tests for interval_index.IntervalIndex (closed-interval stabbing)."""
+
+import math
+import random
+
+from interval_index import IntervalIndex
+
+
+def _brute(intervals, x):
+    return {k for k, (lo, hi) in intervals.items() if lo <= hi and lo <= x <= hi}
+
+
+def test_hi_edge_is_inclusive():
+    index = IntervalIndex({'a': (100, 200), 'b': (200, 300)})
+    assert set(index.stab(200)) == {'a', 'b'}
+    assert set(index.stab(200.0)) == {'a', 'b'}
+    assert set(index.stab(math.nextafter(200.0, math.inf))) == {'b'}
+    assert index.stab(300) == ('b',)
+    assert index.stab(math.nextafter(300.0, math.inf)) == ()
+
+
+def test_lo_edge_and_outside():
+    index = IntervalIndex({'a': (100, 200)})
+    assert index.stab(100) == ('a',)
+    assert index.stab(math.nextafter(100.0, -math.inf)) == ()
+    assert index.stab(-1e9) == ()
+    assert index.stab(1e9) == ()
+    assert index.locate(50) == -1
+
+
+def test_point_interval_and_inverted_bounds():
+    index = IntervalIndex({'point': (150, 150), 'inverted': (300, 200)})
+    assert len(index) == 1
+    assert index.stab(150) == ('point',)
+    assert index.stab(250) == ()
+
+
+def test_empty_index():
+    index = IntervalIndex({})
+    assert len(index) == 0
+    assert index.stab(1.0) == ()
+
+
+def test_matches_brute_force():
+    rng = random.Random(5)
+    intervals = {}
+    for k in range(40):
+        lo = rng.randrange(0, 500)
+        intervals[k] = (lo, lo + rng.randrange(0, 200))
+    index = IntervalIndex(intervals)
+
+    edges = [v for lo_hi in intervals.values() for v in lo_hi]
+    probes = edges + [math.nextafter(float(e), math.inf) for e in edges] + \
+        [math.nextafter(float(e), -math.inf) for e in edges] + [rng.uniform(-10, 800) for _ in range(2000)]
+    for x in probes:
+        assert set(index.stab(x)) == _brute(intervals, x), x
@@ -0,0 +1,212 @@
+"""Tests for live_snapshot (seqlock writer/reader, decode layout, Node reader parity)."""
+
+import json
+import multiprocessing
+import os
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+import live_snapshot
+from live_snapshot import (GATES_OFFSET, MAX_GATES, RECIPES_OFFSET, RECIPE_NAME_BYTES, SEQ_OFFSET,
+                           SNAPSHOT_SIZE, LiveSnapshotReader, LiveSnapshotWriter, RollingWindow, decode)
+
+NODE_READER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', '..', 'server', 'lib', 'liveSnapshot.js')
+
+COMBINED = (120, 14400.5, 3, 7, 650.25, 2.5, 1.75, 40, 5200.0, 9000, 310)
+
+
+def _gate(i, value=0):
+    return (i, 100 + i, 10 + value, 1200.5 + i, 1, 4, 480.0, 1_767_772_800_000_000_000 + i)
+
+
+def _recipe(i, name=None):
+    return (100 + i, 0, name or f"R_{i}", 30, 3600.0, 2, 1.5, 2.25, 88.0, 9900.0, 3.1, 2.4)
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / 'db' / 'live_snapshot.bin')
+
+
+def _seq(path):
+    with open(path, 'rb') as f:
+        f.seek(SEQ_OFFSET)
+        return struct.unpack('<Q', f.read(8))[0]
+
+
+# ===== Layout =====
+
+def test_layout_offsets():
+    assert (live_snapshot.COMBINED_OFFSET, GATES_OFFSET, RECIPES_OFFSET) == (64, 192, 2240)
+    assert SNAPSHOT_SIZE == 2240 + 32 * 128
+
+
+def test_header_fields_at_documented_offsets(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    writer.publish(7, 29_466_720, 'paused', 5, COMBINED, [_gate(0), _gate(1)], [_recipe(0)])
+    with open(snapshot_path, 'rb') as f:
+        data = f.read()
+    writer.close()
+
+    assert len(data) == SNAPSHOT_SIZE
+    assert data[0:4] == b'BHLS'
+    assert struct.unpack_from('<q', data, 24)[0] == 7
+    assert struct.unpack_from('<q', data, 32)[0] == 29_466_720
+    assert struct.unpack_from('<II', data, 40) == (2, 1)
+    assert struct.unpack_from('<I', data, 48)[0] == 5
+    assert data[52] == live_snapshot.MACHINE_STATES.index('paused')
+    assert struct.unpack_from('<i', data, GATES_OFFSET + 64)[0] == 1
+    assert data[RECIPES_OFFSET + 8:RECIPES_OFFSET + 11] == b'R_0'
+    # Unused slots stay zero
+    assert data[GATES_OFFSET + 2 * 64:RECIPES_OFFSET] == bytes(RECIPES_OFFSET - GATES_OFFSET - 128)
+
+
+# ===== Writer / reader round trip =====
+
+def test_round_trip(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    reader = LiveSnapshotReader(snapshot_path)
+    assert reader.read() is None  # nothing published yet
+
+    gates = [_gate(i) for i in range(3)]
+    recipes = [_recipe(0), _recipe(1)]
+    writer.publish(7, 29_466_720, 'running', 5, COMBINED, gates, recipes)
+    snap = reader.read()
+
+    assert snap['seq'] == 2
+    assert snap['program_id'] == 7
+    assert snap['minute'] == 29_466_720
+    assert snap['machine_state'] == 'running'
+    assert (snap['n_gates'], snap['n_recipes'], snap['rolling_minutes']) == (3, 2, 5)
+    assert snap['combined'] == dict(zip(live_snapshot.COMBINED_FIELDS, COMBINED))
+    assert snap['gates'] == [dict(zip(live_snapshot.GATE_FIELDS, g)) for g in gates]
+    assert snap['recipes'][1]['name'] == 'R_1'
+    assert snap['recipes'][1]['cum_weight_g'] == 9900.0
+    assert 'reserved' not in snap['recipes'][0]
+
+    reader.close()
+    writer.close()
+
+
+def test_missing_values_and_truncation(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    long_name = 'Ä' * RECIPE_NAME_BYTES  # 2 bytes per char in UTF-8
+    writer.publish(None, None, 'unknown', 5, COMBINED,
+                   [_gate(i) for i in range(MAX_GATES + 4)], [_recipe(0, long_name)])
+    snap = LiveSnapshotReader(snapshot_path).read()
+    writer.close()
+
+    assert snap['program_id'] == -1 and snap['minute'] == -1
+    assert snap['machine_state'] is None
+    assert snap['n_gates'] == MAX_GATES
+    assert snap['recipes'][0]['name'] == 'Ä' * (RECIPE_NAME_BYTES // 2)
+
+
+def test_seq_is_even_and_survives_reopen(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    for _ in range(3):
+        writer.publish(1, 1, 'running', 5, COMBINED, [], [])
+    assert _seq(snapshot_path) == 6
+    writer.close()
+
+    # A restarted worker continues the sequence so readers never see it go back
+    writer = LiveSnapshotWriter(snapshot_path)
+    writer.publish(1, 2, 'running', 5, COMBINED, [], [])
+    assert _seq(snapshot_path) == 8
+    writer.close()
+
+
+def test_reader_rejects_write_in_progress(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    writer.publish(1, 1, 'running', 5, COMBINED, [], [])
+    struct.pack_into('<Q', writer._mm, SEQ_OFFSET, 3)  # writer stalled mid-copy
+    reader = LiveSnapshotReader(snapshot_path)
+    assert reader.read(retries=5) is None
+
+    struct.pack_into('<Q', writer._mm, SEQ_OFFSET, 4)
+    assert reader.read()['seq'] == 4
+    reader.close()
+    writer.close()
+
+
+def test_decode_rejects_foreign_data():
+    assert decode(bytes(SNAPSHOT_SIZE)) is None
+    data = bytearray(SNAPSHOT_SIZE)
+    struct.pack_into('<4sH', data, 0, b'BHLS', live_snapshot.LAYOUT_VERSION + 1)
+    assert decode(bytes(data)) is None
+
+
+def _publish_loop(path, n):
+    writer = LiveSnapshotWriter(path)
+    for i in range(1, n + 1):
+        combined = (i,) + COMBINED[1:]
+        writer.publish(1, i, 'running', 5, combined, [_gate(g, i) for g in range(MAX_GATES)],
+                       [_recipe(r) for r in range(8)])
+    writer.close()
+
+
+def test_concurrent_reads_are_never_torn(snapshot_path):
+    LiveSnapshotWriter(snapshot_path).close()
+    ctx = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    proc = ctx.Process(target=_publish_loop, args=(snapshot_path, 20_000))
+    reader = LiveSnapshotReader(snapshot_path)
+    proc.start()
+    consistent = 0
+    try:
+        while proc.is_alive():
+            snap = reader.read(retries=1000)
+            if snap is None:
+                continue
+            i = snap['minute']
+            # Every field written by one publish() carries the same counter
+            assert snap['combined']['minute_pieces'] == i
+            assert all(g['minute_pieces'] == 10 + i for g in snap['gates'])
+            consistent += 1
+    finally:
+        proc.join()
+        reader.close()
+    assert proc.exitcode == 0
+    assert consistent > 0
+
+
+# ===== Node reader =====
+
+@pytest.mark.skipif(shutil.which('node') is None, reason="node not installed")
+def test_node_reader_decodes_python_snapshot(snapshot_path):
+    writer = LiveSnapshotWriter(snapshot_path)
+    writer.publish(7, 29_466_720, 'transitioning', 5, COMBINED, [_gate(0), _gate(3)], [_recipe(0), _recipe(1)])
+    writer.close()
+
+    script = ("const s = require(process.argv[1]);"
+              "console.log(JSON.stringify(s.decode(require('fs').readFileSync(process.argv[2]))));")
+    out = subprocess.run(['node', '-e', script, os.path.abspath(NODE_READER), snapshot_path],
+                         capture_output=True, text=True, check=True, timeout=30)
+    node = json.loads(out.stdout)
+    py = decode(open(snapshot_path, 'rb').read())
+
+    assert node['programId'] == py['program_id']
+    assert node['minute'] == '2026-01-10T00:00:00.000Z'
+    assert node['machineState'] == py['machine_state']
+    assert node['rollingMinutes'] == py['rolling_minutes']
+    assert list(node['combined'].values()) == list(py['combined'].values())
+    assert [g['gate'] for g in node['gates']] == [0, 3]
+    assert node['gates'][1]['minuteWeightG'] == py['gates'][1]['minute_weight_g']
+    assert node['gates'][1]['lastBatchNs'] == str(py['gates'][1]['last_batch_ns'])
+    assert node['recipes'][1]['name'] == 'R_1'
+    assert node['recipes'][1]['giveawayPctAvg'] == py['recipes'][1]['giveaway_pct_avg']
+
+
+# ===== RollingWindow =====
+
+def test_rolling_window_drops_old_minutes():
+    window = RollingWindow(minutes=3)
+    window.add(10, 3, 5.0, 100.0)
+    window.add(11, 6, 5.0, 100.0)
+    window.add(13, 3, 10.0, 100.0)  # minute 10 falls out
+    assert window.batches_per_min() == pytest.approx(3.0)
+    assert window.giveaway_pct() == pytest.approx(7.5)
+    assert RollingWindow(minutes=3).giveaway_pct() == 0.0
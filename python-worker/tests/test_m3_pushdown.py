@@ -0,0 +1,97 @@
+"""
+Tests for the M3 pushdown worker path: in-flight batches from per-gate
+aggregates (no raw piece rows read) and open minutes parked for their query.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import live_worker
+from epoch_time import NS_PER_SEC, now_ns
+from live_worker import GateState, LiveWorker, MinuteAccumulator
+from piece_store import ArrowPieceStore
+
+
+class AggregateOnlyStore(ArrowPieceStore):
+    """Arrow store that fails the test if the worker reads raw piece rows"""
+
+    def query_pieces(self, *args, **kwargs):
+        raise AssertionError("raw piece rows polled in pushdown mode")
+
+
+@pytest.fixture
+def pushdown(monkeypatch):
+    monkeypatch.setattr(live_worker, 'M3_RAW_PIECES', False)
+
+
+def _worker(store):
+    worker = SimpleNamespace(piece_store=store, gate_to_recipe={1: 10, 2: 20, 0: None},
+                             gate_states={}, influx_errors=0)
+    worker.poll_in_flight_totals = lambda: LiveWorker.poll_in_flight_totals(worker)
+    return worker
+
+
+# ===== In-flight totals =====
+
+def test_in_flight_from_aggregate_without_raw_rows(pushdown):
+    store = AggregateOnlyStore()
+    worker = _worker(store)
+    now = now_ns()
+    store.write_pieces([now - 2 * NS_PER_SEC, now - NS_PER_SEC, now - NS_PER_SEC, now - 60 * NS_PER_SEC],
+                       [100.0, 120.0, 90.0, 500.0], [1, 1, 2, 1])
+
+    LiveWorker.poll_pieces(worker)
+    # Pieces before the first poll's window are not part of a tracked batch
+    assert (worker.gate_states[1].piece_count, worker.gate_states[1].total_weight) == (2, 220.0)
+    assert worker.gate_states[2].in_flight
+    assert 0 not in worker.gate_states
+
+    # batch_completions closes gate 1; later pieces open its next batch
+    worker.gate_states[1].close(now - NS_PER_SEC)
+    assert not worker.gate_states[1].in_flight
+    store.write_piece(now_ns() - 1000, 80.0, 1)
+    LiveWorker.poll_pieces(worker)
+    assert (worker.gate_states[1].piece_count, worker.gate_states[1].total_weight) == (1, 80.0)
+    assert worker.gate_states[2].piece_count == 1
+
+
+def test_in_flight_query_failure_keeps_last_totals(pushdown):
+    store = ArrowPieceStore()
+    worker = _worker(store)
+    store.write_piece(now_ns() - NS_PER_SEC, 100.0, 1)
+    LiveWorker.poll_pieces(worker)
+
+    def fail(*args):
+        raise RuntimeError("influx down")
+    store.query_gate_totals_since = fail
+    LiveWorker.poll_pieces(worker)
+    assert worker.gate_states[1].piece_count == 1
+    assert worker.influx_errors == 1
+
+
+# ===== Minute accumulator =====
+
+def test_pushdown_minute_pending_until_totals_applied(pushdown):
+    acc = MinuteAccumulator(minute=100)
+    assert acc.has_data()
+
+    acc.gate_totals = {}
+    assert not acc.has_data()
+    acc.gate_totals = {0: (3, 240.0)}
+    assert acc.has_data()
+
+
+def test_raw_minute_has_data_only_with_pieces_or_batches():
+    acc = MinuteAccumulator(minute=100)
+    assert not acc.has_data()
+    acc.add_piece(live_worker.PieceData(ts_ns=100, weight_g=1.0, gate=1))
+    assert acc.has_data()
+
+
+def test_gate_state_reset_clears_aggregate_totals():
+    state = GateState(gate=1)
+    state.set_totals(4, 410.0)
+    assert state.in_flight
+    state.reset()
+    assert (state.piece_count, state.total_weight, state.in_flight) == (0, 0.0, False)
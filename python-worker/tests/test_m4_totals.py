@@ -0,0 +1,134 @@
+"""Tests for change-only M4 emission and the kpi_totals upsert / dedup migration."""
+
+import os
+import re
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from m4_totals import M4Emitter
+from live_worker import LiveWorker, write_m4_totals_sqlite
+
+SQLITE_SETUP_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', '..', 'server', 'scripts', 'sqlite-setup.js')
+
+
+# ===== M4Emitter =====
+
+def test_first_row_always_emitted():
+    em = M4Emitter(mode='change', heartbeat_min=15)
+    assert em.should_emit('R_a', 100, (1, 2.0, 0.5))
+
+
+def test_unchanged_values_suppressed_until_heartbeat():
+    em = M4Emitter(mode='change', heartbeat_min=15)
+    em.mark_emitted('R_a', 100, (3, 2.0, 0.5))
+
+    assert not em.should_emit('R_a', 101, (3, 2.0, 0.5))
+    assert not em.should_emit('R_a', 114, (3, 2.0, 0.5))
+    assert em.should_emit('R_a', 115, (3, 2.0, 0.5))
+    assert em.suppressed == 2
+
+
+def test_change_and_float_noise():
+    em = M4Emitter(mode='change', heartbeat_min=0)
+    em.mark_emitted('R_a', 100, (3, 2.0, 0.5))
+
+    assert not em.should_emit('R_a', 500, (3, 2.0 + 1e-9, 0.5))  # below rounding, no heartbeat
+    assert em.should_emit('R_a', 101, (4, 2.0, 0.5))
+    assert em.should_emit('R_b', 101, (3, 2.0, 0.5))  # recipes tracked independently
+
+
+def test_every_mode_and_reset():
+    every = M4Emitter(mode='every')
+    every.mark_emitted('R_a', 100, (3, 2.0, 0.5))
+    assert every.should_emit('R_a', 101, (3, 2.0, 0.5))
+
+    em = M4Emitter(mode='change', heartbeat_min=15)
+    em.mark_emitted('R_a', 100, (3, 2.0, 0.5))
+    em.reset()
+    assert em.should_emit('R_a', 101, (3, 2.0, 0.5))
+
+
+# ===== kpi_totals schema, migration and upsert =====
+
+def _setup_js() -> str:
+    with open(SQLITE_SETUP_JS, encoding='utf-8') as f:
+        return f.read()
+
+
+def _kpi_totals_ddl() -> str:
+    return re.search(r"CREATE TABLE IF NOT EXISTS kpi_totals \(.*?\);", _setup_js(), re.S).group(0)
+
+
+def _dedup_migration_sql() -> str:
+    js = _setup_js()
+    start = js.index("if (!indexExists('ux_kpi_totals_program_recipe_time'))")
+    return re.search(r"run\(`(.*?)`\)", js[start:], re.S).group(1)
+
+
+@pytest.fixture
+def legacy_db():
+    """kpi_totals as created by the old schema (no unique key yet)"""
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(_kpi_totals_ddl())
+    return conn
+
+
+def _insert_legacy(conn, ts, recipe, program_id, total_batches):
+    conn.execute("INSERT INTO kpi_totals (timestamp, recipe_name, program_id, total_batches) VALUES (?, ?, ?, ?)",
+                 (ts, recipe, program_id, total_batches))
+
+
+def test_dedup_migration_keeps_newest_row(legacy_db):
+    ts = '2026-01-07T06:00:00+00:00'
+    _insert_legacy(legacy_db, ts, 'R_a', 1, 10)
+    _insert_legacy(legacy_db, ts, 'R_a', 1, 11)
+    _insert_legacy(legacy_db, ts, 'R_a', 2, 20)
+    _insert_legacy(legacy_db, ts, 'R_b', 1, 30)
+    _insert_legacy(legacy_db, '2026-01-07T06:01:00+00:00', 'R_a', 1, 12)
+
+    legacy_db.executescript(_dedup_migration_sql())
+
+    rows = legacy_db.execute(
+        "SELECT timestamp, recipe_name, program_id, total_batches FROM kpi_totals ORDER BY id").fetchall()
+    assert rows == [
+        (ts, 'R_a', 1, 11),
+        (ts, 'R_a', 2, 20),
+        (ts, 'R_b', 1, 30),
+        ('2026-01-07T06:01:00+00:00', 'R_a', 1, 12),
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        _insert_legacy(legacy_db, ts, 'R_a', 1, 99)
+
+
+def test_upsert_replaces_row_for_same_minute(legacy_db):
+    legacy_db.executescript(_dedup_migration_sql())
+    minute = 29_466_720  # 2026-01-10T00:00Z
+
+    write_m4_totals_sqlite(legacy_db, minute, 'R_a', 1, 5, 2.5, 1.1)
+    write_m4_totals_sqlite(legacy_db, minute, 'R_a', 1, 6, 2.4, 1.0)
+    write_m4_totals_sqlite(legacy_db, minute + 1, 'R_a', 1, 7, 2.3, 0.9)
+
+    rows = legacy_db.execute(
+        "SELECT recipe_name, program_id, total_batches, giveaway_g_per_batch, giveaway_pct_avg "
+        "FROM kpi_totals ORDER BY timestamp").fetchall()
+    assert rows == [('R_a', 1, 6, 2.4, 1.0), ('R_a', 1, 7, 2.3, 0.9)]
+
+
+def test_emit_m4_totals_change_only_and_requires_program(legacy_db):
+    legacy_db.executescript(_dedup_migration_sql())
+    worker = SimpleNamespace(program_id=None, sqlite_conn=legacy_db,
+                             m4_emitter=M4Emitter(mode='change', heartbeat_min=15))
+
+    # No program: NULL program_id would bypass the unique key, so nothing is written
+    assert not LiveWorker.emit_m4_totals(worker, 100, 'R_a', 5, 2.5, 1.1)
+    assert worker.m4_emitter.emitted == 0
+
+    worker.program_id = 1
+    assert LiveWorker.emit_m4_totals(worker, 100, 'R_a', 5, 2.5, 1.1)
+    assert not LiveWorker.emit_m4_totals(worker, 101, 'R_a', 5, 2.5, 1.1)
+    assert LiveWorker.emit_m4_totals(worker, 102, 'R_a', 6, 2.5, 1.1)
+
+    assert legacy_db.execute("SELECT COUNT(*) FROM kpi_totals").fetchone()[0] == 2
@@ -0,0 +1,122 @@
+"""
+Tests for one_time_import.fix_window_slice / compute_window_kpis.
+
+fixtures/window_slice.csv is a synthetic 20-minute slice (10 gates, ties on
+timestamps, batches without a count, gates with one or two batches).
+fixtures/window_kpis_expected.json holds the outputs of the row-by-row
+implementations the columnar versions replaced; the current code must
+reproduce them exactly, float rounding and dict order included.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import one_time_import
+from one_time_import import WindowAssignments, compute_window_kpis, fix_window_slice
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_slice() -> pd.DataFrame:
+    df = pd.read_csv(os.path.join(FIXTURES, 'window_slice.csv'))
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'], utc=True, format='ISO8601')
+    return df
+
+
+def window_assignments() -> WindowAssignments:
+    """Gates as build_window_assignments() maps them: 1/2 share a recipe, 7 empty"""
+    names = {
+        1: 'R_100_200_4000_5000_NA_0', 2: 'R_100_200_4000_5000_NA_0',
+        3: 'R_150_250_0_0_exact_20', 4: 'R_150_300_0_9999_min_15', 5: 'R_120_220_3333_4500_NA_0',
+        6: 'R_90_300_0_0_NA_0', 7: None, 8: 'R_200_310_4700_6000_max_25', 9: 'R_80_140_2000_2600_NA_0',
+    }
+    ids = {1: 10, 2: 10, 3: 11, 4: 12, 5: 13, 6: 14, 7: None, 8: 16, 9: 17}
+    recipe_id_to_gates = {}
+    for gate, rid in ids.items():
+        if rid is not None:
+            recipe_id_to_gates.setdefault(rid, []).append(gate)
+    return WindowAssignments(ids, names, recipe_id_to_gates)
+
+
+def plain(obj):
+    """JSON-comparable form: dicts as ordered [key, value] pairs, Timestamps as ISO, NaN as a string"""
+    if isinstance(obj, dict):
+        return [[plain(k), plain(v)] for k, v in obj.items()]
+    if isinstance(obj, (list, tuple)):
+        return [plain(v) for v in obj]
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and math.isnan(obj):
+        return 'NaN'
+    return obj
+
+
+@pytest.fixture(scope='module')
+def expected():
+    with open(os.path.join(FIXTURES, 'window_kpis_expected.json')) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return load_slice()
+
+
+def test_fix_window_slice_matches_reference(raw, expected):
+    fixed = fix_window_slice(raw)
+    assert fixed['file_order'].tolist() == expected['fixed_order']
+    assert list(fixed.columns) == list(raw.columns)
+    assert fixed.index.equals(pd.RangeIndex(len(fixed)))
+    pd.testing.assert_frame_equal(
+        fixed, raw.set_index('file_order', drop=False).loc[expected['fixed_order']].reset_index(drop=True))
+
+
+def test_fix_window_slice_unsorted_input(raw, expected):
+    fixed = fix_window_slice(raw.sample(frac=1, random_state=7))
+    assert fixed['file_order'].tolist() == expected['shuffled_fixed_order']
+
+
+def test_fix_window_slice_trims_edges(raw):
+    fixed = fix_window_slice(raw)
+    batches = raw[raw['Type'] == 'Batch']
+    for gate, grp in batches.groupby('Gate'):
+        kept = fixed[fixed['Gate'] == gate]
+        if len(grp) <= 2:
+            assert kept.empty  # gate 8 (one batch) and 9 (two): nothing complete
+            continue
+        ts = grp['Timestamp'].sort_values()
+        pieces = kept[kept['Type'] == 'Piece']
+        assert len(kept[kept['Type'] == 'Batch']) == len(grp) - 2
+        assert pieces['Timestamp'].min() >= ts.iloc[0]
+        assert pieces['Timestamp'].max() < ts.iloc[-2]
+
+
+def test_fix_window_slice_empty(raw):
+    assert fix_window_slice(raw.iloc[0:0]).empty
+
+
+def test_compute_window_kpis_matches_reference(raw, expected):
+    out = compute_window_kpis(fix_window_slice(raw), window_assignments())
+    assert len(out) == len(expected['kpis'])
+    names = ('program_totals', 'per_recipe_totals', 'prog_minute', 'recipe_minute', 'dwell',
+             'dwell_timestamps', 'recipe_kpi_minute', 'combined_kpi_minute')
+    for name, actual, reference in zip(names, out, expected['kpis']):
+        assert plain(actual) == reference, name
+
+
+def test_compute_window_kpis_empty_slice(raw, expected):
+    out = compute_window_kpis(fix_window_slice(raw).iloc[0:0], window_assignments())
+    assert plain(out) == expected['empty_kpis']
+
+
+def test_minute_helpers():
+    ts = pd.Timestamp('2026-01-07 06:12:59.999', tz='UTC')
+    assert one_time_import.minute_bucket_utc(ts) == pd.Timestamp('2026-01-07 06:12', tz='UTC')
+    assert one_time_import.iso_minute_z(ts) == '2026-01-07T06:12:00Z'
@@ -0,0 +1,208 @@
+"""Tests for outbound (circuit breaker states, deadline budget and retry policy)."""
+
+import socket
+import time
+
+import pytest
+import requests
+
+import outbound
+from outbound import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, OutboundDispatcher,
+                      never_connected)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Replays a script of responses (int status) or exceptions, one per request"""
+
+    def __init__(self, script, delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        step = self.script.pop(0) if self.script else 200
+        if isinstance(step, Exception):
+            raise step
+        return FakeResponse(step)
+
+    def close(self):
+        pass
+
+
+def _refused_error() -> requests.exceptions.ConnectionError:
+    """A real connection-refused error from requests (nothing listens on the port)"""
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    try:
+        requests.post(f'http://127.0.0.1:{port}/x', timeout=1.0)
+    except requests.exceptions.ConnectionError as e:
+        return e
+    pytest.skip("port unexpectedly accepted a connection")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(outbound.random, 'uniform', lambda a, b: 0.0)
+
+
+@pytest.fixture
+def dispatcher():
+    d = OutboundDispatcher(max_workers=2)
+    yield d
+    d.close()
+
+
+# ===== CircuitBreaker =====
+
+def test_breaker_opens_after_threshold_then_half_opens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(outbound.time, 'monotonic', clock)
+    cb = CircuitBreaker(failure_threshold=3, reset_timeout_sec=10)
+
+    for _ in range(2):
+        assert cb.allow()
+        cb.record_failure()
+    assert cb.state == 'closed'
+    cb.record_failure()
+    assert cb.state == 'open'
+    assert not cb.allow()
+
+    clock.now += 10
+    assert cb.state == 'half-open'
+    assert cb.allow()          # single trial call
+    assert not cb.allow()      # others still fail fast while the trial runs
+    cb.record_success()
+    assert cb.state == 'closed'
+    assert cb.allow()
+
+
+def test_breaker_failed_trial_reopens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(outbound.time, 'monotonic', clock)
+    cb = CircuitBreaker(failure_threshold=1, reset_timeout_sec=5)
+
+    cb.record_failure()
+    clock.now += 5
+    assert cb.allow()
+    cb.record_failure()
+    assert cb.state == 'open'
+    clock.now += 4.9
+    assert not cb.allow()
+    clock.now += 0.1
+    assert cb.state == 'half-open'
+
+
+def test_success_resets_consecutive_failures():
+    cb = CircuitBreaker(failure_threshold=2)
+    cb.record_failure()
+    cb.record_success()
+    cb.record_failure()
+    assert cb.state == 'closed'
+
+
+# ===== Retry policy =====
+
+def test_never_connected_classification():
+    assert never_connected(_refused_error())
+    assert never_connected(requests.exceptions.ConnectTimeout())
+    assert not never_connected(requests.exceptions.ReadTimeout())
+    assert not never_connected(requests.exceptions.ConnectionError("Connection aborted."))
+    assert not never_connected(ValueError())
+
+
+def test_idempotent_retries_server_errors(dispatcher):
+    dispatcher.session = FakeSession([503, 502, 200])
+    response = dispatcher.submit('GET', 'http://backend/x').result(timeout=5)
+    assert response.status_code == 200
+    assert dispatcher.session.calls == 3
+
+
+def test_client_error_returned_without_retry(dispatcher):
+    dispatcher.session = FakeSession([404])
+    assert dispatcher.submit('GET', 'http://backend/x').result(timeout=5).status_code == 404
+    assert dispatcher.session.calls == 1
+    assert dispatcher.breaker.state == 'closed'
+
+
+def test_non_idempotent_does_not_retry_read_timeout(dispatcher):
+    dispatcher.session = FakeSession([requests.exceptions.ReadTimeout(), 200])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        dispatcher.call('POST', 'http://backend/x', idempotent=False)
+    assert dispatcher.session.calls == 1
+
+
+def test_non_idempotent_retries_refused_connect(dispatcher):
+    dispatcher.session = FakeSession([_refused_error(), requests.exceptions.ConnectTimeout(), 200])
+    response = dispatcher.call('POST', 'http://backend/x', idempotent=False)
+    assert response.status_code == 200
+    assert dispatcher.session.calls == 3
+
+
+def test_max_attempts_bounds_retries(dispatcher):
+    dispatcher.session = FakeSession([500] * 10)
+    with pytest.raises(requests.exceptions.HTTPError):
+        dispatcher.submit('GET', 'http://backend/x', max_attempts=3).result(timeout=5)
+    assert dispatcher.session.calls == 3
+    assert dispatcher.failed == 1
+
+
+# ===== Deadline =====
+
+def test_deadline_covers_all_attempts(dispatcher):
+    dispatcher.session = FakeSession([500] * 10, delay=0.15)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        dispatcher.submit('GET', 'http://backend/x', deadline=0.4, max_attempts=10).result(timeout=5)
+    assert time.monotonic() - start < 1.0
+    assert dispatcher.session.calls < 10
+
+
+def test_call_deadline_when_worker_is_stuck(dispatcher):
+    dispatcher.session = FakeSession([200], delay=1.5)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        dispatcher.call('POST', 'http://backend/x', deadline=0.2)
+    assert time.monotonic() - start < 1.2
+
+
+# ===== Breaker wiring =====
+
+def test_open_breaker_fails_fast(dispatcher):
+    dispatcher.breaker = CircuitBreaker(failure_threshold=1)
+    dispatcher.breaker.record_failure()
+    dispatcher.session = FakeSession([200])
+    with pytest.raises(CircuitOpenError):
+        dispatcher.submit('POST', 'http://backend/x').result(timeout=5)
+    assert dispatcher.session.calls == 0
+
+
+def test_call_uses_its_own_breaker(dispatcher):
+    dispatcher.breaker = CircuitBreaker(failure_threshold=2)
+    dispatcher.session = FakeSession([500] * 4)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            dispatcher.submit('POST', 'http://backend/x', idempotent=False).result(timeout=5)
+    assert dispatcher.breaker.state == 'open'
+
+    # Fire-and-forget failures must not block explicit sync points
+    dispatcher.session = FakeSession([200])
+    assert dispatcher.call('POST', 'http://backend/x').status_code == 200
+    assert dispatcher.call_breaker.state == 'closed'
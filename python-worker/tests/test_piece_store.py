@@ -0,0 +1,153 @@
+"""
+Tests for piece_store: InfluxPieceStore SQL filters vs ArrowPieceStore parity.
+
+InfluxDB is not needed: a fake client runs the generated SQL against SQLite
+holding the same rows as an Influx `pieces` measurement (time as ISO text,
+gate as a string tag, NULL when a piece was written without one). Piece times
+are whole seconds so ISO strings compare in time order.
+"""
+
+import itertools
+import random
+import sqlite3
+
+import pyarrow as pa
+import pytest
+
+from epoch_time import NS_PER_MINUTE, NS_PER_SEC, ns_to_iso
+from piece_store import ArrowPieceStore, InfluxPieceStore
+
+START_NS = 29_466_720 * NS_PER_MINUTE
+
+
+class SQLiteInfluxClient:
+    """Stands in for InfluxDBClient3: query(sql) -> pyarrow Table"""
+
+    def __init__(self, rows):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE pieces (time TEXT, weight_g REAL, gate TEXT, piece_id TEXT)")
+        self.conn.executemany("INSERT INTO pieces VALUES (?, ?, ?, ?)", rows)
+
+    def query(self, sql):
+        cur = self.conn.execute(sql)
+        names = [d[0] for d in cur.description]
+        return pa.Table.from_pylist([dict(zip(names, r)) for r in cur.fetchall()],
+                                    schema=pa.schema([(n, pa.string() if n in ('time', 'gate', 'piece_id')
+                                                       else pa.float64()) for n in names]))
+
+    def close(self):
+        self.conn.close()
+
+
+@pytest.fixture(scope='module')
+def stores():
+    rng = random.Random(11)
+    times, weights, tags = [], [], []
+    for i in range(400):
+        times.append(START_NS + rng.randrange(300) * NS_PER_SEC)
+        weights.append(round(rng.uniform(50, 200), 1))
+        tags.append(rng.choice([None, '0', '1', '2', '3']))
+    ids = [f"p{i}" for i in range(len(times))]
+
+    influx = InfluxPieceStore(SQLiteInfluxClient(
+        [(ns_to_iso(t), w, g, pid) for t, w, g, pid in zip(times, weights, tags, ids)]))
+
+    # Same rows as they arrive from InfluxDB (string tag with NULLs) - normalised to gate 0
+    arrow = ArrowPieceStore(pa.table({
+        'time': pa.array(times, type=pa.int64()).cast(pa.timestamp('ns', tz='UTC')),
+        'weight_g': pa.array(weights, type=pa.float64()),
+        'gate': pa.array(tags, type=pa.string()),
+        'piece_id': pa.array(ids, type=pa.string()),
+    }))
+    return influx, arrow
+
+
+def _ids(table):
+    return sorted(table.column('piece_id').to_pylist())
+
+
+GATE_FILTERS = [None, set(), {0}, {1, 2}, {0, 3}, {'2'}]
+EXCLUDE_FILTERS = [None, {0}, {1}, {0, 2}]
+WEIGHT_BOUNDS = [(None, None), (80.0, 150.0)]
+
+
+@pytest.mark.parametrize('gates,exclude_gates,bounds',
+                         list(itertools.product(GATE_FILTERS, EXCLUDE_FILTERS, WEIGHT_BOUNDS)))
+def test_filters_match_arrow_store(stores, gates, exclude_gates, bounds):
+    influx, arrow = stores
+    min_w, max_w = bounds
+    arrow_gates = None if gates is None else {int(g) for g in gates}
+    kwargs = dict(min_weight=min_w, max_weight=max_w)
+    start, end = START_NS + 30 * NS_PER_SEC, START_NS + 240 * NS_PER_SEC
+
+    expected = arrow.query_pieces(start, end, gates=arrow_gates, exclude_gates=exclude_gates, **kwargs)
+    actual = influx.query_pieces(start, end, gates=gates, exclude_gates=exclude_gates, **kwargs)
+    assert _ids(actual) == _ids(expected)
+
+    count, weight = influx.query_totals(start, end, gates=gates, exclude_gates=exclude_gates, **kwargs)
+    exp_count, exp_weight = arrow.query_totals(start, end, gates=arrow_gates,
+                                               exclude_gates=exclude_gates, **kwargs)
+    assert count == exp_count
+    assert weight == pytest.approx(exp_weight)
+
+
+def test_untagged_pieces_are_gate_zero(stores):
+    influx, arrow = stores
+    end = START_NS + 300 * NS_PER_SEC
+    untagged = influx.client.conn.execute("SELECT COUNT(*) FROM pieces WHERE gate IS NULL").fetchone()[0]
+    tagged_zero = influx.client.conn.execute("SELECT COUNT(*) FROM pieces WHERE gate = '0'").fetchone()[0]
+    assert untagged > 0
+
+    assert influx.query_totals(START_NS, end, gates=[0])[0] == untagged + tagged_zero
+    assert arrow.query_totals(START_NS, end, gates=[0])[0] == untagged + tagged_zero
+    assert influx.query_totals(START_NS, end, exclude_gates=[1])[0] == \
+        arrow.query_totals(START_NS, end, exclude_gates=[1])[0]
+
+
+def test_time_range_edges(stores):
+    influx, arrow = stores
+    at = START_NS + 120 * NS_PER_SEC
+    for end_inclusive in (False, True):
+        expected = arrow.query_totals(START_NS, at, end_inclusive=end_inclusive)
+        assert influx.query_totals(START_NS, at, end_inclusive=end_inclusive)[0] == expected[0]
+    assert arrow.query_totals(at, at, end_inclusive=True)[0] == \
+        arrow.query_totals(START_NS, at, end_inclusive=True)[0] - arrow.query_totals(START_NS, at)[0]
+
+
+def test_arrow_minute_gate_totals(stores):
+    _, arrow = stores
+    end = START_NS + 3 * NS_PER_MINUTE
+    totals = arrow.query_minute_gate_totals(START_NS, end)
+    assert sum(totals.column('pieces').to_pylist()) == arrow.query_totals(START_NS, end)[0]
+
+    minute_1 = START_NS + NS_PER_MINUTE
+    rows = [r for r in totals.to_pylist()
+            if r['gate'] == 2 and r['minute'].timestamp() * NS_PER_SEC == minute_1]
+    assert len(rows) == 1
+    count, weight = arrow.query_totals(minute_1, minute_1 + NS_PER_MINUTE, gates=[2])
+    assert rows[0]['pieces'] == count
+    assert rows[0]['weight_g'] == pytest.approx(weight)
+
+
+def test_gate_totals_since_match_per_gate_totals(stores):
+    influx, arrow = stores
+    end = START_NS + 280 * NS_PER_SEC
+    since = {0: START_NS + 200 * NS_PER_SEC, 1: START_NS + 10 * NS_PER_SEC,
+             2: START_NS + 150 * NS_PER_SEC, 3: START_NS + 90 * NS_PER_SEC}
+
+    def by_gate(table):
+        rows = {}
+        for r in table.to_pylist():
+            gate = int(r['gate']) if r['gate'] is not None else 0
+            count, weight = rows.get(gate, (0, 0.0))
+            rows[gate] = (count + int(r['pieces']), weight + r['weight_g'])
+        return rows
+
+    expected = arrow.query_gate_totals_since(since, end)
+    for gate, t in since.items():
+        # time > since: the piece at a gate's closing timestamp belongs to the closed batch
+        count, weight = arrow.query_totals(t + 1, end, gates=[gate])
+        assert by_gate(expected)[gate] == (count, pytest.approx(weight))
+    assert by_gate(influx.query_gate_totals_since(since, end)) == \
+        {g: (c, pytest.approx(w)) for g, (c, w) in by_gate(expected).items()}
+    assert len(arrow.query_gate_totals_since({}, end)) == 0
@@ -0,0 +1,198 @@
+"""
+Tests for program_finalizer: finalize_status transitions, one job per program
+and restart recovery, on the thread-pool path with an ArrowPieceStore.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from epoch_time import NS_PER_MINUTE, NS_PER_SEC, ns_to_iso
+from piece_store import ArrowPieceStore
+from program_finalizer import (STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING,
+                               ProgramFinalizer, unfinished_programs)
+
+START_NS = 29_466_720 * NS_PER_MINUTE
+START_TS, END_TS = ns_to_iso(START_NS), ns_to_iso(START_NS + 10 * NS_PER_MINUTE)
+RECIPE = 'R_100_200_500_600_NA_NA'
+
+# Minimal subset of server/scripts/sqlite-setup.js used by the finalizer
+SCHEMA = """
+    CREATE TABLE recipes (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+    CREATE TABLE run_configs (id INTEGER PRIMARY KEY AUTOINCREMENT, program_id INTEGER);
+    CREATE TABLE run_config_assignments (config_id INTEGER, gate_number INTEGER, recipe_id INTEGER);
+    CREATE TABLE batch_completions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, gate INTEGER NOT NULL, completed_at TEXT NOT NULL,
+        pieces INTEGER NOT NULL, weight_g REAL NOT NULL, recipe_id INTEGER NOT NULL, program_id INTEGER
+    );
+    CREATE TABLE kpi_minute_combined (
+        timestamp TEXT NOT NULL, total_rejects_count INTEGER DEFAULT 0, total_rejects_weight_g REAL DEFAULT 0
+    );
+    CREATE TABLE program_stats (
+        program_id INTEGER PRIMARY KEY,
+        total_batches INTEGER NOT NULL DEFAULT 0,
+        total_batched_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_reject_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_giveaway_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_items_batched INTEGER NOT NULL DEFAULT 0,
+        total_items_rejected INTEGER NOT NULL DEFAULT 0,
+        start_ts TEXT, end_ts TEXT,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finalize_status TEXT, finalized_at TEXT
+    );
+    CREATE TABLE recipe_stats (
+        program_id INTEGER NOT NULL, recipe_id INTEGER NOT NULL, gates_assigned TEXT DEFAULT '',
+        total_batches INTEGER NOT NULL DEFAULT 0,
+        total_batched_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_reject_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_giveaway_weight_g INTEGER NOT NULL DEFAULT 0,
+        total_items_batched INTEGER NOT NULL DEFAULT 0,
+        total_items_rejected INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (program_id, recipe_id)
+    );
+"""
+
+
+class BlockingPieceStore(ArrowPieceStore):
+    """Holds the job inside query_totals until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def query_totals(self, *args, **kwargs):
+        self.entered.set()
+        assert self.release.wait(5)
+        return super().query_totals(*args, **kwargs)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'batching_app.sqlite')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO recipes VALUES (1, ?)", (RECIPE,))
+    for program_id in (7, 8):
+        config_id = conn.execute("INSERT INTO run_configs (program_id) VALUES (?)", (program_id,)).lastrowid
+        conn.execute("INSERT INTO run_config_assignments VALUES (?, 1, 1)", (config_id,))
+        conn.execute("INSERT INTO program_stats (program_id, start_ts) VALUES (?, ?)", (program_id, START_TS))
+    conn.executemany(
+        "INSERT INTO batch_completions (gate, completed_at, pieces, weight_g, recipe_id, program_id) "
+        "VALUES (1, ?, ?, ?, 1, 7)",
+        [(ns_to_iso(START_NS + 60 * NS_PER_SEC), 4, 540.0), (ns_to_iso(START_NS + 120 * NS_PER_SEC), 3, 450.0)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    yield conn
+    conn.close()
+
+
+def _pieces(store):
+    # Gate 2 piece within the recipe's piece bounds is an eligible reject; gate 0 pieces are rejects
+    store.write_pieces([START_NS + i * NS_PER_SEC for i in range(4)],
+                       [150.0, 120.0, 90.0, 300.0], [1, 2, 0, 0])
+
+
+def _status(conn, program_id):
+    return conn.execute("SELECT finalize_status, finalized_at, end_ts FROM program_stats WHERE program_id = ?",
+                        (program_id,)).fetchone()
+
+
+# ===== Status transitions =====
+
+def test_pending_running_done(db_path, conn):
+    store = BlockingPieceStore()
+    _pieces(store)
+    finalizer = ProgramFinalizer(db_path, piece_store=store)
+    try:
+        future = finalizer.submit(conn, 7, START_TS, END_TS)
+        assert _status(conn, 7)[0] in (STATUS_PENDING, STATUS_RUNNING)
+        assert _status(conn, 7)[2] == END_TS
+
+        assert store.entered.wait(5)
+        assert _status(conn, 7)[:2] == (STATUS_RUNNING, None)
+        assert finalizer.pending() == [7]
+
+        # Re-submitting while the job runs returns the same job
+        assert finalizer.submit(conn, 7, START_TS, END_TS) is future
+
+        store.release.set()
+        assert future.result(5) is True
+    finally:
+        store.release.set()
+        finalizer.shutdown()
+
+    status, finalized_at, end_ts = _status(conn, 7)
+    assert (status, end_ts) == (STATUS_DONE, END_TS) and finalized_at is not None
+    assert finalizer.pending() == []
+
+    totals = conn.execute("SELECT total_batches, total_items_batched, total_items_rejected, "
+                          "total_reject_weight_g FROM program_stats WHERE program_id = 7").fetchone()
+    assert totals == (pytest.approx(1.9), 7, 2, 390)  # 450g batch is 0.9 of the 500g minimum
+    recipe = conn.execute("SELECT gates_assigned, total_items_rejected, total_reject_weight_g "
+                          "FROM recipe_stats WHERE program_id = 7 AND recipe_id = 1").fetchone()
+    assert recipe == ('1', 1, 120)
+
+
+def test_failed_job_marked_failed(db_path, conn):
+    # Program 8 has batches but its run_config assigns no gates: totals can't be computed
+    conn.execute("DELETE FROM run_config_assignments WHERE config_id = "
+                 "(SELECT id FROM run_configs WHERE program_id = 8)")
+    conn.execute("INSERT INTO batch_completions (gate, completed_at, pieces, weight_g, recipe_id, program_id) "
+                 "VALUES (1, ?, 4, 540.0, 1, 8)", (ns_to_iso(START_NS + 30 * NS_PER_SEC),))
+    conn.commit()
+
+    finalizer = ProgramFinalizer(db_path, piece_store=ArrowPieceStore())
+    try:
+        assert finalizer.submit(conn, 8, START_TS, END_TS).result(5) is False
+    finally:
+        finalizer.shutdown()
+    status, finalized_at, _ = _status(conn, 8)
+    assert status == STATUS_FAILED and finalized_at is not None
+
+
+def test_resubmit_after_done_runs_again(db_path, conn):
+    finalizer = ProgramFinalizer(db_path, piece_store=ArrowPieceStore())
+    try:
+        first = finalizer.submit(conn, 7, START_TS, END_TS)
+        assert first.result(5)
+        second = finalizer.submit(conn, 7, START_TS, END_TS)
+        assert second is not first and second.result(5)
+    finally:
+        finalizer.shutdown()
+    # Upserts: one recipe row however often the program is finalised
+    assert conn.execute("SELECT COUNT(*) FROM recipe_stats WHERE program_id = 7").fetchone()[0] == 1
+
+
+# ===== Restart recovery =====
+
+def test_running_row_recovered_after_restart(db_path, conn):
+    # Worker died mid-job: status left 'running'; program 8 never ended
+    conn.execute("UPDATE program_stats SET end_ts = ?, finalize_status = ? WHERE program_id = 7",
+                 (END_TS, STATUS_RUNNING))
+    conn.commit()
+
+    unfinished = {p['program_id']: p for p in unfinished_programs(conn)}
+    assert set(unfinished) == {7, 8}
+    assert unfinished[7]['finalize_status'] == STATUS_RUNNING
+    assert unfinished[8]['end_ts'] is None
+
+    store = ArrowPieceStore()
+    _pieces(store)
+    finalizer = ProgramFinalizer(db_path, piece_store=store)
+    try:
+        prog = unfinished[7]
+        assert finalizer.submit(conn, 7, prog['start_ts'], prog['end_ts']).result(5)
+    finally:
+        finalizer.shutdown()
+
+    assert _status(conn, 7)[0] == STATUS_DONE
+    assert [p['program_id'] for p in unfinished_programs(conn)] == [8]
@@ -0,0 +1,121 @@
+"""Tests for quantile_sketch.QuantileSketch (merge, blob round-trip, error bound)."""
+
+import random
+import sqlite3
+
+import pytest
+
+from quantile_sketch import QuantileSketch, query_dwell_quantiles
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _samples(n=5000, seed=7):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(3.0, 0.8) for _ in range(n)]
+
+
+@pytest.mark.parametrize('q', [0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+def test_quantile_within_relative_accuracy(q):
+    values = _samples()
+    sk = QuantileSketch(relative_accuracy=0.01)
+    sk.add_many(values)
+
+    exact = _exact_quantile(values, q)
+    assert sk.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_extremes_and_empty():
+    sk = QuantileSketch()
+    assert sk.quantile(0.5) is None
+    assert sk.mean is None
+
+    sk.add_many([0.0, 2.0, 10.0])
+    assert sk.quantile(0.0) == 0.0
+    assert sk.quantile(1.0) == 10.0
+    assert sk.zero_count == 1
+    assert sk.mean == pytest.approx(4.0)
+
+
+def test_merge_matches_single_sketch():
+    values = _samples()
+    whole = QuantileSketch()
+    whole.add_many(values)
+
+    parts = [QuantileSketch() for _ in range(4)]
+    for i, v in enumerate(values):
+        parts[i % 4].add(v)
+    merged = parts[0]
+    for p in parts[1:]:
+        merged.merge(p)
+
+    assert merged.bins == whole.bins
+    assert merged.count == whole.count
+    assert merged.zero_count == whole.zero_count
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    assert merged.sum == pytest.approx(whole.sum)
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == whole.quantile(q)
+
+
+def test_merge_rejects_different_accuracy():
+    a = QuantileSketch(relative_accuracy=0.01)
+    b = QuantileSketch(relative_accuracy=0.02)
+    b.add(1.0)
+    with pytest.raises(ValueError):
+        a.merge(b)
+
+
+def test_bytes_round_trip():
+    sk = QuantileSketch()
+    sk.add_many(_samples(500) + [0.0])
+    restored = QuantileSketch.from_bytes(sk.to_bytes())
+
+    assert restored.bins == sk.bins
+    assert restored.relative_accuracy == sk.relative_accuracy
+    assert (restored.count, restored.zero_count) == (sk.count, sk.zero_count)
+    assert (restored.min, restored.max, restored.sum) == (sk.min, sk.max, sk.sum)
+
+    empty = QuantileSketch.from_bytes(QuantileSketch().to_bytes())
+    assert empty.count == 0 and empty.min is None and empty.max is None
+
+
+def test_from_bytes_rejects_foreign_blob():
+    blob = bytearray(QuantileSketch().to_bytes())
+    blob[:4] = b'XXXX'
+    with pytest.raises(ValueError):
+        QuantileSketch.from_bytes(bytes(blob))
+
+
+def test_collapse_keeps_count_and_upper_quantiles():
+    values = _samples()
+    sk = QuantileSketch(max_bins=32)
+    sk.add_many(values)
+
+    assert len(sk.bins) <= 32
+    assert sk.count == len(values)
+    # Collapsing folds the lowest buckets, so the upper tail keeps its accuracy
+    assert sk.quantile(0.99) == pytest.approx(_exact_quantile(values, 0.99), rel=0.01)
+
+
+def test_query_dwell_quantiles_merges_blobs():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE gate_dwell_sketches (program_id INTEGER, gate_number INTEGER, sketch BLOB)")
+    values = _samples(1000)
+    whole = QuantileSketch()
+    whole.add_many(values)
+    for gate in (1, 2):
+        sk = QuantileSketch()
+        sk.add_many(values[gate - 1::2])
+        conn.execute("INSERT INTO gate_dwell_sketches VALUES (?, ?, ?)", (5, gate, sk.to_bytes()))
+
+    summary = query_dwell_quantiles(conn, [5], qs=(0.5,))
+    assert summary['count'] == 1000
+    assert summary['quantiles'][0.5] == whole.quantile(0.5)
+
+    only_gate_1 = query_dwell_quantiles(conn, [5], gate=1, qs=(0.5,))
+    assert only_gate_1['count'] == 500
+    assert query_dwell_quantiles(conn, [], qs=(0.5,))['count'] == 0
@@ -0,0 +1,148 @@
+"""
+Tests for sqlite_contention: busy retry limits and stats, with a second
+connection holding the database write lock (BEGIN IMMEDIATE).
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from sqlite_contention import ContentionStats, InstrumentedConnection, statement_key
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'contention.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def holder(db_path):
+    """Second connection holding the write lock until released"""
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    conn.execute("BEGIN IMMEDIATE")
+    yield conn
+    if conn.in_transaction:
+        conn.rollback()
+    conn.close()
+
+
+def _connect(db_path, stats, **kwargs):
+    # timeout=0: no sqlite busy wait, every attempt fails fast while locked
+    return InstrumentedConnection(sqlite3.connect(db_path, timeout=0), stats=stats, **kwargs)
+
+
+# ===== Retry limits =====
+
+def test_retries_stop_at_retry_limit(db_path, holder):
+    stats = ContentionStats()
+    conn = _connect(db_path, stats, retries=3, backoff_ms=1, deadline_sec=10)
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO t VALUES (1)")
+
+    s = stats.snapshot()['INSERT t']
+    assert (s.executions, s.busy, s.retries, s.failed) == (1, 4, 3, 1)
+    assert s.lock_waits == 4
+    conn.close()
+
+
+def test_retries_stop_at_deadline(db_path, holder):
+    stats = ContentionStats()
+    conn = _connect(db_path, stats, retries=10_000, backoff_ms=20, deadline_sec=0.2)
+    started = time.perf_counter()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO t VALUES (1)")
+    elapsed = time.perf_counter() - started
+
+    s = stats.snapshot()['INSERT t']
+    assert 0.2 <= elapsed < 2.0
+    assert s.failed == 1 and s.busy == s.retries + 1
+    assert s.retries < 10_000
+    assert s.wait_sec == pytest.approx(elapsed, abs=0.05)
+    conn.close()
+
+
+def test_busy_snapshot_is_not_retried(db_path):
+    setup = sqlite3.connect(db_path)
+    setup.execute("PRAGMA journal_mode=WAL")
+    setup.close()
+
+    stats = ContentionStats()
+    conn = _connect(db_path, stats, retries=5, backoff_ms=1)
+    other = sqlite3.connect(db_path)
+
+    # Read snapshot taken, then another connection commits: upgrading to a write must fail
+    conn.execute("BEGIN")
+    conn.execute("SELECT COUNT(*) FROM t").fetchall()
+    other.execute("INSERT INTO t VALUES (2)")
+    other.commit()
+    with pytest.raises(sqlite3.OperationalError) as exc:
+        conn.execute("INSERT INTO t VALUES (1)")
+    assert exc.value.sqlite_errorname == 'SQLITE_BUSY_SNAPSHOT'
+
+    s = stats.snapshot()['INSERT t']
+    assert (s.busy, s.retries, s.failed) == (1, 0, 1)
+    conn.rollback()
+    other.close()
+    conn.close()
+
+
+# ===== Recovery and stats =====
+
+def test_retry_succeeds_once_lock_released(db_path, holder):
+    stats = ContentionStats()
+    conn = _connect(db_path, stats, retries=50, backoff_ms=10, deadline_sec=5)
+    release = threading.Timer(0.1, holder.commit)
+    release.start()
+
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    release.join()
+
+    s = stats.snapshot()['INSERT t']
+    assert s.failed == 0 and s.executions == 1
+    assert s.busy >= 1 and s.retries == s.busy
+    assert s.wait_sec >= 0.05
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    conn.close()
+
+
+def test_commit_retries_and_hold_time(db_path):
+    stats = ContentionStats()
+    conn = _connect(db_path, stats, retries=2, backoff_ms=1)
+    reader = sqlite3.connect(db_path, isolation_level=None)
+
+    # Rollback journal: an open read transaction blocks the writer's COMMIT
+    reader.execute("BEGIN")
+    reader.execute("SELECT COUNT(*) FROM t").fetchall()
+    conn.execute("INSERT INTO t VALUES (1)")
+    time.sleep(0.05)
+    with pytest.raises(sqlite3.OperationalError):
+        conn.commit()
+    commit = stats.snapshot()['COMMIT']
+    assert (commit.busy, commit.retries, commit.failed) == (3, 2, 1)
+    assert stats.snapshot()['INSERT t'].hold_sec == 0.0  # still open
+
+    reader.commit()
+    conn.commit()
+    s = stats.snapshot()
+    assert s['COMMIT'].executions == 2 and s['COMMIT'].failed == 1
+    assert s['INSERT t'].hold_sec >= 0.05
+    assert s['INSERT t'].max_hold_sec == s['INSERT t'].hold_sec
+
+    totals = stats.totals()
+    assert totals.failed == 1 and totals.busy == 3
+    reader.close()
+    conn.close()
+
+
+def test_statement_keys():
+    assert statement_key("  insert or replace into kpi_minute_recipes (a) VALUES (?)") == 'INSERT kpi_minute_recipes'
+    assert statement_key("CREATE TABLE IF NOT EXISTS gate_dwell_times (x)") == 'CREATE gate_dwell_times'
+    assert statement_key("SELECT * FROM t") == 'SELECT'
@@ -0,0 +1,80 @@
+"""Tests for the transition loop's query cadence (pieces at the normal interval, batches on events)."""
+
+from types import SimpleNamespace
+
+import pytest
+
+import live_worker
+from live_worker import LiveWorker, PIECE_POLL_INTERVAL_SEC, TRANSITION_BATCH_FALLBACK_SEC
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMachineClient:
+    def __init__(self):
+        self.batch_event = False
+
+    def consume_batch_event(self):
+        pushed, self.batch_event = self.batch_event, False
+        return pushed
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(live_worker.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def worker():
+    calls = {'pieces': 0, 'batches': 0}
+    worker = SimpleNamespace(machine_client=FakeMachineClient(), calls=calls,
+                             last_piece_poll=0.0, last_transition_batch_poll=0.0,
+                             process_completed_batch=lambda batch: None)
+
+    def poll_pieces():
+        calls['pieces'] += 1
+
+    def poll_completed_batches():
+        calls['batches'] += 1
+        return []
+    worker.poll_pieces = poll_pieces
+    worker.poll_completed_batches = poll_completed_batches
+    return worker
+
+
+def _loop(worker, clock, seconds, step=0.05):
+    start = clock.now
+    for i in range(int(round(seconds / step))):
+        clock.now = start + i * step + 1e-9  # no float drift across the 200ms boundaries
+        LiveWorker.poll_transition_progress(worker)
+
+
+def test_idle_wakeups_do_not_query(worker, clock):
+    _loop(worker, clock, 2.0)
+
+    # 40 wakeups: pieces at the normal cadence, batch_completions on the fallback timer only
+    assert worker.calls['pieces'] == pytest.approx(2.0 / PIECE_POLL_INTERVAL_SEC, abs=1)
+    assert worker.calls['batches'] == pytest.approx(2.0 / TRANSITION_BATCH_FALLBACK_SEC, abs=1)
+
+
+def test_pushed_batch_event_reads_batch_completions_immediately(worker, clock):
+    LiveWorker.poll_transition_progress(worker)
+    assert worker.calls['batches'] == 1  # first transition loop
+
+    clock.now += 0.05
+    LiveWorker.poll_transition_progress(worker)
+    assert worker.calls['batches'] == 1
+
+    worker.machine_client.batch_event = True
+    clock.now += 0.05
+    LiveWorker.poll_transition_progress(worker)
+    assert worker.calls['batches'] == 2
+    assert worker.calls['pieces'] == 1
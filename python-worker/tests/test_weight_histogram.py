@@ -0,0 +1,138 @@
+"""Tests for weight_histogram (binning, blob round-trip, sum_weight_histograms)."""
+
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+from weight_histogram import SCOPE_GATE0, SCOPE_RECIPE, WeightHistogram, sum_weight_histograms
+
+
+def _weights(n=2000, seed=3):
+    rng = random.Random(seed)
+    return [round(rng.gauss(120, 40), 1) for _ in range(n)]
+
+
+@pytest.mark.parametrize('bin_g', [1.0, 0.1, 2.5])
+def test_add_many_matches_scalar_add(bin_g):
+    weights = _weights() + [-5.0, 0.0, 199.9, 200.0, 1e6]
+    scalar = WeightHistogram(lo_g=0, hi_g=200, bin_g=bin_g)
+    for w in weights:
+        scalar.add(w)
+    vector = WeightHistogram(lo_g=0, hi_g=200, bin_g=bin_g)
+    vector.add_many(weights)
+
+    assert np.array_equal(scalar.counts, vector.counts)
+    assert vector.total == len(weights)
+
+
+def test_under_and_overflow_bins():
+    h = WeightHistogram(lo_g=10, hi_g=20, bin_g=1)
+    h.add_many([9.99, 10.0, 19.99, 20.0, 25.0])
+    assert h.counts[0] == 1
+    assert h.counts[1] == 1
+    assert h.counts[h.n_inner] == 1
+    assert h.counts[-1] == 2
+    assert h.count_between(10, 19.5) == 2
+
+
+def test_bytes_round_trip():
+    h = WeightHistogram(lo_g=0, hi_g=300, bin_g=0.5)
+    h.add_many(_weights())
+    restored = WeightHistogram.from_bytes(h.to_bytes())
+    assert restored.same_layout(h)
+    assert np.array_equal(restored.counts, h.counts)
+
+    with pytest.raises(ValueError):
+        WeightHistogram.from_bytes(b'XXXX' + h.to_bytes()[4:])
+
+
+def test_add_rejects_other_layout():
+    a = WeightHistogram(lo_g=0, hi_g=100, bin_g=1)
+    with pytest.raises(ValueError):
+        a += WeightHistogram(lo_g=0, hi_g=100, bin_g=2)
+
+
+@pytest.fixture
+def hist_db():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE piece_weight_histograms (
+          program_id INTEGER NOT NULL, timestamp TEXT NOT NULL, scope TEXT NOT NULL,
+          recipe_name TEXT NOT NULL DEFAULT '', sample_count INTEGER NOT NULL DEFAULT 0,
+          counts BLOB NOT NULL,
+          PRIMARY KEY (program_id, scope, recipe_name, timestamp))
+    """)
+    weights = _weights(600)
+    rows = [
+        (1, '2026-01-07T06:00:00Z', SCOPE_RECIPE, 'R_a', weights[0:100]),
+        (1, '2026-01-07T06:01:00Z', SCOPE_RECIPE, 'R_a', weights[100:200]),
+        (1, '2026-01-07T06:01:00Z', SCOPE_RECIPE, 'R_b', weights[200:300]),
+        (2, '2026-01-07T06:02:00Z', SCOPE_RECIPE, 'R_a', weights[300:400]),
+        (1, '2026-01-07T06:01:00Z', SCOPE_GATE0, '', weights[400:500]),
+        (1, '2026-01-07T06:03:00Z', SCOPE_RECIPE, 'R_a', weights[500:600]),
+    ]
+    for program_id, ts, scope, recipe, ws in rows:
+        h = WeightHistogram()
+        h.add_many(ws)
+        conn.execute("INSERT INTO piece_weight_histograms VALUES (?, ?, ?, ?, ?, ?)",
+                     (program_id, ts, scope, recipe, len(ws), h.to_bytes()))
+    return conn, weights
+
+
+def _expected(weights):
+    h = WeightHistogram()
+    h.add_many(weights)
+    return h.counts
+
+
+def test_sum_weight_histograms_filters(hist_db):
+    conn, w = hist_db
+    start, end = '2026-01-07T06:00:00Z', '2026-01-07T06:03:00Z'
+
+    all_recipes = sum_weight_histograms(conn, start, end)
+    assert np.array_equal(all_recipes.counts, _expected(w[0:400]))
+
+    one_recipe = sum_weight_histograms(conn, start, end, recipe_name='R_a')
+    assert np.array_equal(one_recipe.counts, _expected(w[0:200] + w[300:400]))
+
+    one_program = sum_weight_histograms(conn, start, end, recipe_name='R_a', program_id=1)
+    assert np.array_equal(one_program.counts, _expected(w[0:200]))
+
+    rejects = sum_weight_histograms(conn, start, end, scope=SCOPE_GATE0)
+    assert np.array_equal(rejects.counts, _expected(w[400:500]))
+
+
+def test_sum_weight_histograms_no_rows(hist_db):
+    conn, _ = hist_db
+    assert sum_weight_histograms(conn, '2026-01-08T00:00:00Z', '2026-01-08T01:00:00Z') is None
+
+
+def test_minute_accumulator_histogram_bins_at_close():
+    from live_worker import MinuteAccumulator, PieceData
+
+    acc = MinuteAccumulator(minute=0)
+    weights = _weights(300)
+    for i, w in enumerate(weights):
+        acc.add_piece(PieceData(ts_ns=i, weight_g=w, gate=i % 3))
+
+    assert acc.weight_histogram([5]) is None
+    rejects = acc.weight_histogram([0])
+    assert np.array_equal(rejects.counts, _expected(weights[0::3]))
+    recipe = acc.weight_histogram([1, 2])
+    assert np.array_equal(recipe.counts, _expected(weights[1::3] + weights[2::3]))
+
+
+def test_extreme_and_non_finite_weights():
+    h = WeightHistogram(lo_g=0, hi_g=200, bin_g=1)
+    h.add_many([1e30, float('inf'), -1e30, float('-inf'), float('nan'), 50.0])
+    assert h.counts[-1] == 2           # overflow, not wrapped into underflow
+    assert h.counts[0] == 2
+    assert h.counts[h.bin_index(50.0)] == 1
+    assert h.total == 5                # NaN is not a weight
+
+    scalar = WeightHistogram(lo_g=0, hi_g=200, bin_g=1)
+    for w in (1e30, float('inf'), -1e30, float('-inf'), 50.0):
+        scalar.add(w)
+    assert np.array_equal(scalar.counts, h.counts)
@@ -0,0 +1,201 @@
+"""
+Fixed-Bin Piece Weight Histograms
+
+Per-minute weight distributions for tuning recipe piece bounds:
+1. Every polled piece is folded into a fixed-bin histogram (default 1 g bins)
+2. One histogram per minute for gate 0 (rejects) and one per active recipe
+3. Histograms are stored as compact zlib-compressed blobs in SQLite
+4. Any time range is summed with plain vector addition
+
+Weights below/above the configured range land in dedicated under/overflow bins,
+so totals always match the piece counts.
+
+Configuration (env):
+    WEIGHT_HIST_MIN_G  - lower edge of the first bin   (default 0)
+    WEIGHT_HIST_MAX_G  - upper edge of the last bin    (default 2000)
+    WEIGHT_HIST_BIN_G  - bin width in grams            (default 1)
+"""
+
+import os
+import math
+import struct
+import zlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+WEIGHT_HIST_MIN_G = float(os.getenv("WEIGHT_HIST_MIN_G", "0"))
+WEIGHT_HIST_MAX_G = float(os.getenv("WEIGHT_HIST_MAX_G", "2000"))
+WEIGHT_HIST_BIN_G = float(os.getenv("WEIGHT_HIST_BIN_G", "1"))
+
+SCOPE_GATE0 = 'gate0'
+SCOPE_RECIPE = 'recipe'
+
+# Header: magic, lo_g, bin_g, number of bins (incl. under/overflow)
+_HEADER = struct.Struct('<4sddI')
+_MAGIC = b'WHG1'
+
+
+class WeightHistogram:
+    """
+    Fixed-bin weight histogram backed by a NumPy count array.
+
+    Bin 0 is underflow (< lo_g), the last bin is overflow (>= hi_g);
+    bins 1..n cover [lo_g + (i-1)*bin_g, lo_g + i*bin_g).
+    """
+
+    def __init__(self, lo_g: float = WEIGHT_HIST_MIN_G, hi_g: float = WEIGHT_HIST_MAX_G,
+                 bin_g: float = WEIGHT_HIST_BIN_G, counts: Optional[np.ndarray] = None):
+        if bin_g <= 0 or hi_g <= lo_g:
+            raise ValueError("Invalid histogram range")
+        self.lo_g = float(lo_g)
+        self.bin_g = float(bin_g)
+        self.n_inner = int(math.ceil((float(hi_g) - self.lo_g) / self.bin_g))
+        self.n_bins = self.n_inner + 2
+        if counts is None:
+            self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        else:
+            if len(counts) != self.n_bins:
+                raise ValueError("Count array does not match histogram layout")
+            self.counts = counts.astype(np.int64, copy=False)
+
+    @property
+    def hi_g(self) -> float:
+        return self.lo_g + self.n_inner * self.bin_g
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def same_layout(self, other: 'WeightHistogram') -> bool:
+        return (self.lo_g == other.lo_g and self.bin_g == other.bin_g
+                and self.n_bins == other.n_bins)
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def bin_index(self, weight_g: float) -> int:
+        """Bin index for a single weight (scalar fast path)."""
+        if math.isinf(weight_g):
+            return 0 if weight_g < 0 else self.n_bins - 1
+        q = (weight_g - self.lo_g) // self.bin_g  # compare as float: huge weights overflow int64
+        if q < 0:
+            return 0
+        if q >= self.n_inner:
+            return self.n_bins - 1
+        return int(q) + 1
+
+    def add(self, weight_g: float):
+        self.counts[self.bin_index(weight_g)] += 1
+
+    def add_many(self, weights: Iterable[float]):
+        """Fold an array of weights in one vectorised pass."""
+        w = np.asarray(weights if isinstance(weights, np.ndarray) else list(weights), dtype=np.float64)
+        w = w[~np.isnan(w)]  # not a weight: skipped
+        if w.size == 0:
+            return
+        # floor_divide, not floor(a / b): same bin edges as bin_index() for fractional bin widths.
+        # Clip while still float - huge weights would overflow the int64 cast; +-inf go straight
+        # to overflow / underflow.
+        finite = np.isfinite(w)
+        q = np.where(w > 0, float(self.n_inner), -1.0)
+        q[finite] = np.floor_divide(w[finite] - self.lo_g, self.bin_g)
+        idx = np.clip(q, -1, self.n_inner).astype(np.int64) + 1
+        self.counts += np.bincount(idx, minlength=self.n_bins)
+
+    def __iadd__(self, other: 'WeightHistogram') -> 'WeightHistogram':
+        if not self.same_layout(other):
+            raise ValueError("Cannot add histograms with different bin layouts")
+        self.counts += other.counts
+        return self
+
+    def copy(self) -> 'WeightHistogram':
+        return WeightHistogram._from_layout(self.lo_g, self.bin_g, self.n_bins, self.counts.copy())
+
+    @classmethod
+    def _from_layout(cls, lo_g: float, bin_g: float, n_bins: int, counts: np.ndarray) -> 'WeightHistogram':
+        # Rebuild from an exact bin count (avoids float drift when re-deriving hi_g)
+        h = cls.__new__(cls)
+        h.lo_g = float(lo_g)
+        h.bin_g = float(bin_g)
+        h.n_inner = int(n_bins) - 2
+        h.n_bins = int(n_bins)
+        h.counts = counts
+        return h
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def bin_edges(self) -> np.ndarray:
+        """Lower edges of the inner bins (underflow/overflow excluded)."""
+        return self.lo_g + self.bin_g * np.arange(self.n_inner, dtype=np.float64)
+
+    def count_between(self, lo_g: float, hi_g: float) -> int:
+        """
+        Pieces in the bins covering [lo_g, hi_g] (at bin resolution) - e.g. how
+        many pieces a recipe with these piece bounds could have captured.
+        """
+        first = self.bin_index(lo_g)
+        last = self.bin_index(hi_g)
+        return int(self.counts[first:last + 1].sum())
+
+    # ------------------------------------------------------------------
+    # Serialisation
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        """Compact blob: header + zlib-compressed little-endian uint32 counts."""
+        body = zlib.compress(self.counts.astype('<u4').tobytes(), 6)
+        return _HEADER.pack(_MAGIC, self.lo_g, self.bin_g, self.n_bins) + body
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'WeightHistogram':
+        magic, lo_g, bin_g, n_bins = _HEADER.unpack_from(blob, 0)
+        if magic != _MAGIC:
+            raise ValueError("Not a weight histogram blob")
+        counts = np.frombuffer(zlib.decompress(blob[_HEADER.size:]), dtype='<u4')
+        if len(counts) != n_bins:
+            raise ValueError("Corrupt weight histogram blob")
+        return cls._from_layout(lo_g, bin_g, n_bins, counts.astype(np.int64))
+
+
+# =========================================================
+# SQLITE QUERY HELPERS
+# =========================================================
+
+def sum_weight_histograms(sqlite_conn, start_ts: str, end_ts: str,
+                          scope: str = SCOPE_RECIPE, recipe_name: Optional[str] = None,
+                          program_id: Optional[int] = None) -> Optional[WeightHistogram]:
+    """
+    Sum stored per-minute histograms over [start_ts, end_ts).
+
+    Args:
+        scope: 'recipe' or 'gate0'
+        recipe_name: restrict to one recipe (None = all recipes in scope)
+        program_id: restrict to one program
+
+    Returns:
+        Summed histogram, or None if no rows matched
+    """
+    sql = """
+        SELECT counts FROM piece_weight_histograms
+        WHERE scope = ? AND timestamp >= ? AND timestamp < ?
+    """
+    params = [scope, start_ts, end_ts]
+    if recipe_name is not None:
+        sql += " AND recipe_name = ?"
+        params.append(recipe_name)
+    if program_id is not None:
+        sql += " AND program_id = ?"
+        params.append(program_id)
+
+    total = None
+    for (blob,) in sqlite_conn.execute(sql, params):
+        h = WeightHistogram.from_bytes(blob)
+        if total is None:
+            total = h
+        else:
+            total += h
+    return total
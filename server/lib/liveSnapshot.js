@@ -0,0 +1,139 @@
+// server/lib/liveSnapshot.js
+// Reads the worker's live KPI snapshot: a fixed-layout file the Python worker
+// rewrites after every batch and minute flush (python-worker/live_snapshot.py).
+// A seqlock counter (u64 at offset 8) is odd while the worker is writing; a read
+// is kept only if the counter was even and unchanged across the copy.
+// Layout constants mirror live_snapshot.py - change both together.
+
+const fs = require('fs');
+const path = require('path');
+
+const MAGIC = 'BHLS';
+const LAYOUT_VERSION = 1;
+
+const MAX_GATES = 32;
+const MAX_RECIPES = 32;
+const RECIPE_NAME_BYTES = 48;
+
+const SEQ_OFFSET = 8;
+const COMBINED_OFFSET = 64;
+const GATES_OFFSET = COMBINED_OFFSET + 128;
+const GATE_SIZE = 64;
+const RECIPES_OFFSET = GATES_OFFSET + MAX_GATES * GATE_SIZE;
+const RECIPE_SIZE = 128;
+const SNAPSHOT_SIZE = RECIPES_OFFSET + MAX_RECIPES * RECIPE_SIZE;
+
+const MACHINE_STATES = ['idle', 'running', 'paused', 'transitioning'];
+
+// Resolve like the worker: relative paths are under /server
+const relPath = process.env.LIVE_SNAPSHOT_PATH || path.join('db', 'live_snapshot.bin');
+const SNAPSHOT_PATH = path.isAbsolute(relPath) ? relPath : path.join(__dirname, '..', relPath);
+
+let fd = null;
+const seqBuf = Buffer.alloc(8);
+const dataBuf = Buffer.alloc(SNAPSHOT_SIZE);
+
+function readSeq() {
+  fs.readSync(fd, seqBuf, 0, 8, SEQ_OFFSET);
+  return seqBuf.readBigUInt64LE(0);
+}
+
+const i64 = (buf, off) => Number(buf.readBigInt64LE(off));
+
+function decode(buf) {
+  if (buf.toString('latin1', 0, 4) !== MAGIC || buf.readUInt16LE(4) !== LAYOUT_VERSION) return null;
+
+  const nGates = Math.min(buf.readUInt32LE(40), MAX_GATES);
+  const nRecipes = Math.min(buf.readUInt32LE(44), MAX_RECIPES);
+  const programId = i64(buf, 24);
+  const minute = i64(buf, 32);
+  const c = COMBINED_OFFSET;
+
+  const gates = [];
+  for (let i = 0; i < nGates; i++) {
+    const o = GATES_OFFSET + i * GATE_SIZE;
+    const recipeId = buf.readInt32LE(o + 4);
+    gates.push({
+      gate: buf.readInt32LE(o),
+      recipeId: recipeId >= 0 ? recipeId : null,
+      minutePieces: i64(buf, o + 8),
+      minuteWeightG: buf.readDoubleLE(o + 16),
+      minuteBatches: i64(buf, o + 24),
+      inflightPieces: i64(buf, o + 32),
+      inflightWeightG: buf.readDoubleLE(o + 40),
+      lastBatchNs: buf.readBigInt64LE(o + 48).toString(),
+    });
+  }
+
+  const recipes = [];
+  for (let i = 0; i < nRecipes; i++) {
+    const o = RECIPES_OFFSET + i * RECIPE_SIZE;
+    const nameEnd = buf.indexOf(0, o + 8);
+    const nameStop = nameEnd === -1 || nameEnd > o + 8 + RECIPE_NAME_BYTES ? o + 8 + RECIPE_NAME_BYTES : nameEnd;
+    const n = o + 8 + RECIPE_NAME_BYTES;
+    recipes.push({
+      recipeId: buf.readInt32LE(o),
+      name: buf.toString('utf8', o + 8, nameStop),
+      minutePieces: i64(buf, n),
+      minuteWeightG: buf.readDoubleLE(n + 8),
+      minuteBatches: i64(buf, n + 16),
+      rollingBatchesPerMin: buf.readDoubleLE(n + 24),
+      rollingGiveawayPct: buf.readDoubleLE(n + 32),
+      cumBatches: buf.readDoubleLE(n + 40),
+      cumWeightG: buf.readDoubleLE(n + 48),
+      giveawayGPerBatch: buf.readDoubleLE(n + 56),
+      giveawayPctAvg: buf.readDoubleLE(n + 64),
+    });
+  }
+
+  return {
+    seq: buf.readBigUInt64LE(SEQ_OFFSET).toString(),
+    publishedAt: new Date(Number(buf.readBigInt64LE(16) / 1000000n)).toISOString(),
+    programId: programId >= 0 ? programId : null,
+    minute: minute >= 0 ? new Date(minute * 60000).toISOString() : null,
+    machineState: MACHINE_STATES[buf.readUInt8(52)] || null,
+    rollingMinutes: buf.readUInt32LE(48),
+    combined: {
+      minutePieces: i64(buf, c),
+      minuteWeightG: buf.readDoubleLE(c + 8),
+      minuteBatches: i64(buf, c + 16),
+      minuteRejectPieces: i64(buf, c + 24),
+      minuteRejectWeightG: buf.readDoubleLE(c + 32),
+      rollingBatchesPerMin: buf.readDoubleLE(c + 40),
+      rollingGiveawayPct: buf.readDoubleLE(c + 48),
+      totalRejectsCount: i64(buf, c + 56),
+      totalRejectsWeightG: buf.readDoubleLE(c + 64),
+      piecesProcessed: i64(buf, c + 72),
+      batchesDetected: i64(buf, c + 80),
+    },
+    gates,
+    recipes,
+  };
+}
+
+/**
+ * Latest consistent snapshot, or null if the worker hasn't published one
+ * (file missing / not yet written) or kept it busy for `retries` attempts.
+ */
+function read(retries = 100) {
+  try {
+    if (fd === null) fd = fs.openSync(SNAPSHOT_PATH, 'r');
+    for (let attempt = 0; attempt < retries; attempt++) {
+      const before = readSeq();
+      if (before === 0n) return null;
+      if (before & 1n) continue;
+      if (fs.readSync(fd, dataBuf, 0, SNAPSHOT_SIZE, 0) < SNAPSHOT_SIZE) return null;
+      if (readSeq() === before) return decode(dataBuf);
+    }
+    return null;
+  } catch (e) {
+    // Worker not started yet, or the file was replaced - reopen next time
+    if (fd !== null) {
+      try { fs.closeSync(fd); } catch (_) { /* already closed */ }
+      fd = null;
+    }
+    return null;
+  }
+}
+
+module.exports = { read, decode, SNAPSHOT_PATH, SNAPSHOT_SIZE };
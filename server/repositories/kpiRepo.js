@@ -216,25 +216,37 @@ function getM3AllCombined({ from, to }) {
  * Returns: [{ recipe, total_batches, giveaway_g_per_batch, giveaway_pct_avg }]
  */
 function getM4Pies({ from, to }) {
-  // Get the LATEST value for each recipe within the time range
-  // This gives us the cumulative totals as of the 'to' timestamp
+  // kpi_totals is cumulative and written change-only (a row only when a recipe's
+  // totals change, plus a periodic heartbeat), so read it as a step function:
+  // the value at 'to' is the latest row at or before 'to'. A recipe counts if it
+  // has a row inside the range or belongs to a program that overlaps the range.
   const rows = db.prepare(`
-    SELECT DISTINCT
+    SELECT
       recipe_name,
       total_batches,
       giveaway_g_per_batch,
       giveaway_pct_avg
     FROM kpi_totals
-    WHERE timestamp >= ? AND timestamp <= ?
-      AND timestamp = (
-        SELECT MAX(timestamp)
-        FROM kpi_totals kt2
-        WHERE kt2.recipe_name = kpi_totals.recipe_name
-          AND kt2.timestamp >= ?
-          AND kt2.timestamp <= ?
-      )
+    WHERE id IN (
+      SELECT MAX(k.id)
+      FROM kpi_totals k
+      JOIN (
+        SELECT recipe_name, MAX(timestamp) AS ts
+        FROM kpi_totals
+        WHERE timestamp <= ?
+          AND (
+            timestamp >= ?
+            OR program_id IN (
+              SELECT program_id FROM program_stats
+              WHERE start_ts <= ? AND (end_ts IS NULL OR end_ts >= ?)
+            )
+          )
+        GROUP BY recipe_name
+      ) latest ON latest.recipe_name = k.recipe_name AND latest.ts = k.timestamp
+      GROUP BY k.recipe_name
+    )
     ORDER BY recipe_name ASC
-  `).all(from, to, from, to);
+  `).all(to, from, to, from);
   
   return rows.map(row => ({
     recipe: row.recipe_name,
@@ -3,6 +3,7 @@ const express = require('express');
 const router = express.Router();
 const { verifyToken } = require('../utils/authMiddleware');
 const kpiRepo = require('../repositories/kpiRepo');
+const liveSnapshot = require('../lib/liveSnapshot');
 
 // GET /api/kpi/history?from=ISO&to=ISO&include=all|recipes|combined
 router.get('/history', verifyToken, (req, res) => {
@@ -20,4 +21,11 @@ router.get('/history', verifyToken, (req, res) => {
   }
 });
 
+// GET /api/kpi/live  (worker's shared-memory snapshot: current minute, rolling, cumulative)
+router.get('/live', verifyToken, (req, res) => {
+  const snapshot = liveSnapshot.read();
+  if (!snapshot) return res.status(503).json({ message: 'Live snapshot not available' });
+  res.json(snapshot);
+});
+
 module.exports = router;
\ No newline at end of file
@@ -1077,6 +1077,7 @@ router.get('/stream', (req, res) => {
     if (cleaned) return;
     cleaned = true;
     clearInterval(bufferCheck);
+    clearInterval(keepAlive);
     eventBus.bus.off('machine:state-changed', stateListener);
     eventBus.bus.off('order_batch_update', orderBatchListener);
     eventBus.bus.off('order_completed', orderCompletedListener);
@@ -1125,6 +1126,13 @@ router.get('/stream', (req, res) => {
       try { res.end(); } catch {}
     }
   }, 10_000);
+
+  // SSE comment line as keep-alive: lets non-browser subscribers (python worker)
+  // detect a dead connection via read timeout. EventSource ignores comments.
+  const keepAlive = setInterval(() => {
+    if (cleaned || res.destroyed || res.writableEnded) { cleanup(); return; }
+    try { res.write(': ping\n\n'); } catch { cleanup(); }
+  }, 15_000);
   
   req.on('close', cleanup);
   res.on('error', cleanup);
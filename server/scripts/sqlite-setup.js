@@ -15,6 +15,10 @@ function columnExists(table, column) {
   const rows = db.prepare(`PRAGMA table_info(${table})`).all();
   return rows.some(r => r.name === column);
 }
+function indexExists(name) {
+  const row = db.prepare(`SELECT name FROM sqlite_master WHERE type='index' AND name = ?`).get(name);
+  return !!row;
+}
 
 /* --------------- base schema --------------- */
 function createBaseSchema() {
@@ -247,6 +251,13 @@ function createStatisticsSchema() {
   if (!columnExists('program_stats', 'end_ts')) {
     run(`ALTER TABLE program_stats ADD COLUMN end_ts TEXT;`);
   }
+  // Worker background finalisation: pending | running | done | failed
+  if (!columnExists('program_stats', 'finalize_status')) {
+    run(`ALTER TABLE program_stats ADD COLUMN finalize_status TEXT;`);
+  }
+  if (!columnExists('program_stats', 'finalized_at')) {
+    run(`ALTER TABLE program_stats ADD COLUMN finalized_at TEXT;`);
+  }
 
   run(`
     -- Totals per (program, recipe, order)
@@ -331,6 +342,41 @@ function createStatisticsSchema() {
     CREATE INDEX IF NOT EXISTS idx_gate_dwell_program ON gate_dwell_times(program_id);
     CREATE INDEX IF NOT EXISTS idx_gate_dwell_gate ON gate_dwell_times(program_id, gate_number);
 
+    -- Mergeable quantile sketches (python-worker/quantile_sketch.py) for percentile queries
+    CREATE TABLE IF NOT EXISTS gate_dwell_sketches (
+      program_id    INTEGER NOT NULL,
+      gate_number   INTEGER NOT NULL,
+      sample_count  INTEGER NOT NULL DEFAULT 0,
+      sketch        BLOB    NOT NULL,
+      updated_at    DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (program_id, gate_number),
+      FOREIGN KEY (program_id) REFERENCES programs(id) ON DELETE CASCADE
+    );
+
+    CREATE TABLE IF NOT EXISTS piece_weight_sketches (
+      program_id    INTEGER NOT NULL,
+      recipe_name   TEXT    NOT NULL,
+      timestamp     TEXT    NOT NULL,          -- minute bucket (ISO)
+      sample_count  INTEGER NOT NULL DEFAULT 0,
+      sketch        BLOB    NOT NULL,
+      PRIMARY KEY (program_id, recipe_name, timestamp),
+      FOREIGN KEY (program_id) REFERENCES programs(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_piece_weight_sketches_recipe ON piece_weight_sketches(recipe_name, timestamp);
+
+    -- Fixed-bin piece weight histograms per minute (python-worker/weight_histogram.py)
+    CREATE TABLE IF NOT EXISTS piece_weight_histograms (
+      program_id    INTEGER NOT NULL,
+      timestamp     TEXT    NOT NULL,          -- minute bucket (ISO)
+      scope         TEXT    NOT NULL,          -- 'gate0' | 'recipe'
+      recipe_name   TEXT    NOT NULL DEFAULT '',  -- '' for gate 0
+      sample_count  INTEGER NOT NULL DEFAULT 0,
+      counts        BLOB    NOT NULL,
+      PRIMARY KEY (program_id, scope, recipe_name, timestamp),
+      FOREIGN KEY (program_id) REFERENCES programs(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_piece_weight_hist_time ON piece_weight_histograms(scope, timestamp);
+
     -- Batch completions (single source of truth for batch events)
     CREATE TABLE IF NOT EXISTS batch_completions (
       id           INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -413,6 +459,21 @@ function createStatisticsSchema() {
     CREATE INDEX IF NOT EXISTS idx_kpi_totals_recipe ON kpi_totals(recipe_name, timestamp);
   `);
 
+  // Migration: kpi_totals is written change-only and upserted per (program, recipe, minute).
+  // Drop duplicate rows left by the old plain-INSERT writer (keep the newest) before adding the key.
+  if (!indexExists('ux_kpi_totals_program_recipe_time')) {
+    console.log('[SQLite] Deduplicating kpi_totals and adding unique (program_id, recipe_name, timestamp) index...');
+    run(`
+      DELETE FROM kpi_totals
+      WHERE id NOT IN (
+        SELECT MAX(id) FROM kpi_totals
+        GROUP BY program_id, recipe_name, timestamp
+      );
+      CREATE UNIQUE INDEX IF NOT EXISTS ux_kpi_totals_program_recipe_time
+        ON kpi_totals(program_id, recipe_name, timestamp);
+    `);
+  }
+
   // ---------- Views ----------
   run(`
     DROP VIEW IF EXISTS program_stats_view;
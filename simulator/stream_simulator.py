@@ -4,6 +4,8 @@ Real-Time Data Stream Simulator
 
 Simulates the C# algorithm by streaming piece data to the server in real-time.
 Mimics actual production timing with configurable speed multipliers.
+Gate assignment runs in-process, or in the assignment service
+(python-worker/assignment_service.py) with --assignment-socket.
 """
 
 import os
@@ -40,13 +42,15 @@ class SimulatorConfig:
         server_url: str = DEFAULT_SERVER_URL,
         start_offset: int = 0,
         max_pieces: Optional[int] = None,
-        batch_size: int = 1
+        batch_size: int = 1,
+        assignment_socket: Optional[str] = None
     ):
         self.pieces_per_second = pieces_per_second
         self.server_url = server_url
         self.start_offset = start_offset
         self.max_pieces = max_pieces
         self.batch_size = batch_size
+        self.assignment_socket = assignment_socket
 
 class DataStreamSimulator:
     """Simulates real-time piece data streaming"""
@@ -60,7 +64,11 @@ class DataStreamSimulator:
         self.pieces_sent = 0
         self.start_time = None
         self.session = requests.Session()
-        self.assignment_algorithm = AssignmentAlgorithm()
+        if config.assignment_socket:
+            from assignment_service import AssignmentClient  # type: ignore
+            self.assignment_algorithm = AssignmentClient(config.assignment_socket)
+        else:
+            self.assignment_algorithm = AssignmentAlgorithm()
         
     def load_data(self):
         """Load pieces and assignments from JSON files"""
@@ -335,6 +343,12 @@ def main():
         default=1,
         help="Batch size for sending pieces (default: 1)"
     )
+    parser.add_argument(
+        "--assignment-socket",
+        type=str,
+        default=os.getenv("ASSIGNMENT_SOCKET"),
+        help="Use the assignment service on this Unix socket instead of the in-process algorithm"
+    )
     
     args = parser.parse_args()
     
@@ -344,7 +358,8 @@ def main():
         server_url=args.server,
         start_offset=args.start,
         max_pieces=args.max,
-        batch_size=args.batch
+        batch_size=args.batch,
+        assignment_socket=args.assignment_socket
     )
     
     # Create and run simulator